@@ -1,4 +1,8 @@
-import urllib
+import urllib.parse
+
+# Note: keep the imports here light, as these run on every viewer request. The origin-response
+# handler, which needs Pillow, is in the thumbnails package.
+from .thumbnails.paths import negotiate_path
 
 
 def viewer_request(event, context):
@@ -6,6 +10,8 @@ def viewer_request(event, context):
     Handler to run on viewer_request events which:
       * authorizes the http method based on the Method querystirng parameter
       * authorized methods default to read-only methods (GET, HEAD) if not specified
+      * rewrites requests for jpeg thumbnails to a variant encoding (ex: webp) if the client accepts it.
+        This happens before the cache lookup, so cloudfront caches each encoding separately.
     """
     # https://docs.aws.amazon.com/AmazonCloudFront/latest/DeveloperGuide/lambda-event-structure.html
     request = event['Records'][0]['cf']['request']
@@ -18,6 +24,10 @@ def viewer_request(event, context):
 
     # strip the querystring to avoid splitting the cloudfront cache by http method
     request['querystring'] = ''
+
+    if http_method in ('GET', 'HEAD'):
+        accept = ','.join(header['value'] for header in request['headers'].get('accept', []))
+        request['uri'] = negotiate_path(request['uri'], accept)
     return request
 
 
@@ -0,0 +1,90 @@
+import base64
+import logging
+import urllib.parse
+
+import boto3
+
+from .images import build_thumbnail, encode
+from .paths import parse_thumbnail_path
+
+logger = logging.getLogger()
+
+# lambda@edge caps the size of a response generated by an origin-response function
+# https://docs.aws.amazon.com/AmazonCloudFront/latest/DeveloperGuide/lambda-requirements-limits.html
+MAX_GENERATED_RESPONSE_BYTES = 1000 * 1000
+
+# if a freshly built thumbnail is too big to serve directly, serve it at these lower qualities just this once
+FALLBACK_QUALITIES = (70, 50, 30)
+
+# kept across invocations of a warm lambda
+s3_clients = {}
+
+
+def origin_response(event, context):
+    """
+    Handler to run on origin_response events which:
+      * on a 404 for a thumbnail (or a variant encoding of one), builds it from the native image
+        next to it, writes it back to S3 and serves it. This lets the backend skip building
+        thumbnails and variants that aren't needed right away, as they're built here the first
+        time they're fetched.
+    """
+    request = event['Records'][0]['cf']['request']
+    response = event['Records'][0]['cf']['response']
+    if response['status'] != '404' or request['method'] not in ('GET', 'HEAD'):
+        return response
+
+    parsed = parse_thumbnail_path(urllib.parse.unquote(request['uri']))
+    if not parsed:
+        return response
+    native_path, size, encoder = parsed
+    path = urllib.parse.unquote(request['uri']).lstrip('/')
+
+    # the origin domain name is of the form '{bucket}.s3.amazonaws.com' or '{bucket}.s3.{region}.amazonaws.com'
+    s3_origin = request['origin']['s3']
+    bucket = s3_origin['domainName'].split('.s3.')[0]
+    s3_client = get_s3_client(s3_origin.get('region'))
+
+    try:
+        native_fh = s3_client.get_object(Bucket=bucket, Key=native_path)['Body']
+    except s3_client.exceptions.NoSuchKey:
+        return response
+    try:
+        image = build_thumbnail(native_fh, size)
+        data = encode(image, encoder)
+    except Exception as err:
+        logger.warning(f'Unable to build thumbnail `{path}` from `{native_path}`: {err}')
+        return response
+    s3_client.put_object(Bucket=bucket, Key=path, Body=data, ContentType=encoder.content_type)
+
+    headers = {
+        'content-type': [{'key': 'Content-Type', 'value': encoder.content_type}],
+    }
+    if request['method'] == 'HEAD':
+        return {'status': '200', 'statusDescription': 'OK', 'headers': headers}
+
+    body = base64.b64encode(data).decode()
+    if len(body) > MAX_GENERATED_RESPONSE_BYTES:
+        # the full quality thumbnail is in S3 now, so make sure this degraded one doesn't get cached
+        headers['cache-control'] = [{'key': 'Cache-Control', 'value': 'no-store'}]
+        for quality in FALLBACK_QUALITIES:
+            body = base64.b64encode(encode(image, encoder, quality=quality)).decode()
+            if len(body) <= MAX_GENERATED_RESPONSE_BYTES:
+                break
+        else:
+            logger.warning(f'Thumbnail `{path}` too big to serve from the edge, even at reduced quality')
+            headers['retry-after'] = [{'key': 'Retry-After', 'value': '1'}]
+            return {'status': '503', 'statusDescription': 'Service Unavailable', 'headers': headers}
+
+    return {
+        'status': '200',
+        'statusDescription': 'OK',
+        'headers': headers,
+        'body': body,
+        'bodyEncoding': 'base64',
+    }
+
+
+def get_s3_client(region=None):
+    if region not in s3_clients:
+        s3_clients[region] = boto3.client('s3', region_name=region)
+    return s3_clients[region]
@@ -0,0 +1,75 @@
+import math
+
+# Keep in sync with real-main/app/utils/image_size.py, which can't be imported from the edge. A test there
+# checks the two agree. Pillow isn't imported here, as the viewer-request function uses these tables too.
+
+
+class EncoderProfile:
+    """
+    How an image is encoded when saved: the file format, whether to carry over its exif data, and the
+    kwargs to pass to Pillow's Image.save()
+    """
+
+    def __init__(self, image_format, content_type, file_ext, keep_exif=True, **save_kwargs):
+        self.image_format = image_format
+        self.content_type = content_type
+        self.file_ext = file_ext
+        self.keep_exif = keep_exif
+        self.save_kwargs = save_kwargs
+
+
+# thumbnails are built already rotated upright, so they have no use for the exif data
+
+
+def jpeg(quality):
+    return EncoderProfile(
+        'JPEG', 'image/jpeg', 'jpg', keep_exif=False, quality=quality, progressive=True, optimize=True
+    )
+
+
+def webp(quality):
+    return EncoderProfile('WEBP', 'image/webp', 'webp', keep_exif=False, quality=quality, method=4)
+
+
+class _ImageSize:
+    def __init__(self, name, max_dimensions, encoder=None, variants=()):
+        self.name = name
+        self.max_dimensions = max_dimensions
+        self.filename = f'{self.name}.jpg'
+        self.encoder = encoder
+        self.variants = variants
+
+    def get_variant_filename(self, variant):
+        return f'{self.name}.{variant.file_ext}'
+
+    def get_thumbnail_dimensions(self, width, height):
+        """
+        The (width, height) an image of the given dimensions should be shrunk to so that it fits
+        within max_dimensions, preserving aspect ratio. Matches the rounding of PIL's Image.thumbnail().
+        """
+        if not self.max_dimensions:
+            return width, height
+        max_width, max_height = self.max_dimensions
+        if max_width >= width and max_height >= height:
+            return width, height
+
+        def round_aspect(number, key):
+            return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+        aspect = width / height
+        if max_width / max_height >= aspect:
+            new_width = round_aspect(max_height * aspect, key=lambda n: abs(aspect - n / max_height))
+            return new_width, max_height
+        new_height = round_aspect(max_width / aspect, key=lambda n: 0 if n == 0 else abs(aspect - max_width / n))
+        return max_width, new_height
+
+
+# The native image is the master copy that every thumbnail and variant built at the edge is re-encoded from,
+# so it is kept at quality 100, and isn't made progressive or optimized as those only help serving it.
+NATIVE = _ImageSize('native', None, encoder=EncoderProfile('JPEG', 'image/jpeg', 'jpg', quality=100))
+K4 = _ImageSize('4K', (3840, 2160), encoder=jpeg(90), variants=(webp(85),))
+P1080 = _ImageSize('1080p', (1920, 1080), encoder=jpeg(90), variants=(webp(85),))
+P480 = _ImageSize('480p', (854, 480), encoder=jpeg(85), variants=(webp(80),))
+P64 = _ImageSize('64p', (114, 64), encoder=jpeg(80), variants=(webp(75),))
+
+THUMBNAILS = (K4, P1080, P480, P64)  # ordered by decreasing size
@@ -0,0 +1,41 @@
+import io
+
+import PIL.Image
+import PIL.ImageOps
+
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_ORIENTATIONS_TRANSPOSED = (5, 6, 7, 8)  # orientations that swap width and height
+
+
+def build_thumbnail(fh, size, reducing_gap=2.0):
+    """
+    Build the thumbnail from the native jpeg with the same rules as the backend uses: respect the exif
+    orientation, decode at reduced scale where possible, and resize down to fit within the size.
+    """
+    image = PIL.Image.open(fh)
+    width, height = image.size
+    if image.getexif().get(EXIF_ORIENTATION_TAG) in EXIF_ORIENTATIONS_TRANSPOSED:
+        height, width = width, height
+    dimensions = size.get_thumbnail_dimensions(width, height)
+    image.draft(None, tuple(d * reducing_gap for d in dimensions))
+    image = PIL.ImageOps.exif_transpose(image)
+    if image.size != dimensions:
+        image = image.resize(dimensions, resample=PIL.Image.LANCZOS, reducing_gap=reducing_gap)
+    return image
+
+
+def encode(image, encoder, **overrides):
+    "Returns the image encoded with the EncoderProfile, preserving its color profile and, if kept, its exif data"
+    fh = io.BytesIO()
+    kwargs = {  # Note: Pillow's Image.save treats None differently than not present for some kwargs
+        k: v
+        for k, v in {
+            'icc_profile': image.info.get('icc_profile'),
+            'exif': image.info.get('exif') if encoder.keep_exif else None,
+            **encoder.save_kwargs,
+            **overrides,
+        }.items()
+        if v is not None
+    }
+    image.save(fh, format=encoder.image_format, **kwargs)
+    return fh.getvalue()
@@ -0,0 +1,38 @@
+from . import image_size
+
+# filename -> (image_size, encoder), for thumbnails and all their variants
+THUMBNAILS_BY_FILENAME = {
+    filename: (size, encoder)
+    for size in image_size.THUMBNAILS
+    for filename, encoder in (
+        (size.filename, size.encoder),
+        *((size.get_variant_filename(variant), variant) for variant in size.variants),
+    )
+}
+
+
+def parse_thumbnail_path(path):
+    """
+    If the path is that of a thumbnail (or a variant encoding of one), returns (native_path, image_size, encoder).
+    Works for any directory holding a native image, so covers posts, profile photos & album art alike.
+    """
+    directory, _, filename = path.lstrip('/').rpartition('/')
+    if not directory or filename not in THUMBNAILS_BY_FILENAME:
+        return None
+    return (f'{directory}/{image_size.NATIVE.filename}', *THUMBNAILS_BY_FILENAME[filename])
+
+
+def negotiate_path(path, accept):
+    """
+    Given the path of a jpeg thumbnail and the request's Accept header, returns the path of the
+    first variant encoding of that size the client accepts, if any.
+    """
+    directory, _, filename = path.rpartition('/')
+    if filename not in THUMBNAILS_BY_FILENAME or not accept:
+        return path
+    size, _ = THUMBNAILS_BY_FILENAME[filename]
+    accepted = {media_range.split(';')[0].strip() for media_range in accept.split(',')}
+    for variant in size.variants:
+        if variant.content_type in accepted:
+            return f'{directory}/{size.get_variant_filename(variant)}'
+    return path
@@ -0,0 +1,46 @@
+from edge_app.handlers import origin_request, viewer_request
+
+
+def build_event(method='GET', uri='/user-id/post/post-id/image/native.jpg', querystring='', accept=None):
+    headers = {}
+    if accept is not None:
+        headers['accept'] = [{'key': 'Accept', 'value': accept}]
+    request = {'method': method, 'uri': uri, 'querystring': querystring, 'headers': headers}
+    return {'Records': [{'cf': {'request': request}}]}
+
+
+def test_viewer_request_allowed_methods():
+    # defaults to read-only methods
+    assert viewer_request(build_event(method='GET'), None)['uri'] == '/user-id/post/post-id/image/native.jpg'
+    assert viewer_request(build_event(method='HEAD'), None)['method'] == 'HEAD'
+    assert viewer_request(build_event(method='PUT'), None) == {'status': 403}
+
+    # the Method querystring param overrides that, and is stripped
+    request = viewer_request(build_event(method='PUT', querystring='Method=PUT'), None)
+    assert request['method'] == 'PUT'
+    assert request['querystring'] == ''
+    assert viewer_request(build_event(method='GET', querystring='Method=PUT'), None) == {'status': 403}
+
+
+def test_viewer_request_negotiates_thumbnail_encoding():
+    uri = '/user-id/post/post-id/image/480p.jpg'
+    assert viewer_request(build_event(uri=uri), None)['uri'] == uri
+    assert viewer_request(build_event(uri=uri, accept='image/jpeg'), None)['uri'] == uri
+    webp_uri = '/user-id/post/post-id/image/480p.webp'
+    assert viewer_request(build_event(uri=uri, accept='image/webp,*/*;q=0.8'), None)['uri'] == webp_uri
+    assert viewer_request(build_event(method='HEAD', uri=uri, accept='image/webp'), None)['uri'] == webp_uri
+
+    # native images and writes are never rewritten
+    native_uri = '/user-id/post/post-id/image/native.jpg'
+    assert viewer_request(build_event(uri=native_uri, accept='image/webp'), None)['uri'] == native_uri
+    event = build_event(method='PUT', querystring='Method=PUT', uri=uri, accept='image/webp')
+    assert viewer_request(event, None)['uri'] == uri
+
+
+def test_origin_request():
+    request = origin_request(build_event(method='GET'), None)
+    assert 'x-amz-acl' not in request['headers']
+
+    for method in ('PUT', 'POST', 'PATCH'):
+        request = origin_request(build_event(method=method), None)
+        assert request['headers']['x-amz-acl'] == [{'key': 'x-amz-acl', 'value': 'bucket-owner-full-control'}]
@@ -0,0 +1,31 @@
+from edge_app.thumbnails import image_size
+from edge_app.thumbnails.paths import negotiate_path, parse_thumbnail_path
+
+
+def test_parse_thumbnail_path():
+    native_path = 'user-id/post/post-id/image/native.jpg'
+    assert parse_thumbnail_path('/user-id/post/post-id/image/native.jpg') is None
+    assert parse_thumbnail_path('/user-id/post/post-id/image/other.jpg') is None
+    assert parse_thumbnail_path('/480p.jpg') is None
+
+    native, size, encoder = parse_thumbnail_path('/user-id/post/post-id/image/480p.jpg')
+    assert (native, size, encoder) == (native_path, image_size.P480, image_size.P480.encoder)
+
+    native, size, encoder = parse_thumbnail_path('/user-id/post/post-id/image/4K.webp')
+    assert (native, size) == (native_path, image_size.K4)
+    assert encoder.content_type == 'image/webp'
+
+    # works for other directories holding native images too
+    native, size, _ = parse_thumbnail_path('/user-id/profile-photo/photo-id/64p.jpg')
+    assert (native, size) == ('user-id/profile-photo/photo-id/native.jpg', image_size.P64)
+
+
+def test_negotiate_path():
+    path = '/user-id/post/post-id/image/1080p.jpg'
+    assert negotiate_path(path, None) == path
+    assert negotiate_path(path, '') == path
+    assert negotiate_path(path, 'image/jpeg,image/*;q=0.8') == path
+    assert negotiate_path(path, 'image/avif, image/webp;q=0.9') == '/user-id/post/post-id/image/1080p.webp'
+    assert negotiate_path('/user-id/post/post-id/image/native.jpg', 'image/webp') == (
+        '/user-id/post/post-id/image/native.jpg'
+    )
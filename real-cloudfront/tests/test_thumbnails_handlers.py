@@ -0,0 +1,132 @@
+import base64
+import io
+import unittest.mock
+
+import PIL.Image
+import pytest
+
+from edge_app.thumbnails import handlers
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+@pytest.fixture
+def native_jpeg():
+    fh = io.BytesIO()
+    PIL.Image.new('RGB', (2000, 1000), 'red').save(fh, format='JPEG')
+    return fh.getvalue()
+
+
+@pytest.fixture
+def s3_client(native_jpeg):
+    client = unittest.mock.Mock(exceptions=unittest.mock.Mock(NoSuchKey=NoSuchKey))
+    client.get_object.side_effect = lambda **kwargs: {'Body': io.BytesIO(native_jpeg)}
+    with unittest.mock.patch.object(handlers, 'get_s3_client', return_value=client):
+        yield client
+
+
+def build_event(status='404', method='GET', uri='/user-id/post/post-id/image/480p.jpg'):
+    request = {
+        'method': method,
+        'uri': uri,
+        'origin': {'s3': {'domainName': 'the-bucket.s3.amazonaws.com', 'region': 'us-east-1'}},
+    }
+    response = {'status': status, 'headers': {}}
+    return {'Records': [{'cf': {'request': request, 'response': response}}]}
+
+
+def test_passes_through_non_thumbnail_responses(s3_client):
+    for event in (
+        build_event(status='200'),
+        build_event(status='403'),
+        build_event(method='PUT'),
+        build_event(uri='/user-id/post/post-id/image/native.jpg'),
+    ):
+        assert handlers.origin_response(event, None) == event['Records'][0]['cf']['response']
+    assert s3_client.mock_calls == []
+
+
+def test_native_image_missing(s3_client):
+    s3_client.get_object.side_effect = NoSuchKey
+    event = build_event()
+    assert handlers.origin_response(event, None) == event['Records'][0]['cf']['response']
+    assert s3_client.get_object.mock_calls == [
+        unittest.mock.call(Bucket='the-bucket', Key='user-id/post/post-id/image/native.jpg')
+    ]
+    assert s3_client.put_object.mock_calls == []
+
+
+def test_native_image_not_decodable(s3_client, caplog):
+    s3_client.get_object.side_effect = lambda **kwargs: {'Body': io.BytesIO(b'not an image')}
+    event = build_event()
+    assert handlers.origin_response(event, None) == event['Records'][0]['cf']['response']
+    assert s3_client.put_object.mock_calls == []
+    assert len(caplog.records) == 1
+    assert 'Unable to build thumbnail' in caplog.records[0].msg
+
+
+@pytest.mark.parametrize(
+    'uri, content_type, image_format, size',
+    [
+        ['/user-id/post/post-id/image/480p.jpg', 'image/jpeg', 'JPEG', (854, 427)],
+        ['/user-id/post/post-id/image/64p.webp', 'image/webp', 'WEBP', (114, 57)],
+    ],
+)
+def test_builds_thumbnail(s3_client, uri, content_type, image_format, size):
+    resp = handlers.origin_response(build_event(uri=uri), None)
+    assert resp['status'] == '200'
+    assert resp['headers'] == {'content-type': [{'key': 'Content-Type', 'value': content_type}]}
+    assert resp['bodyEncoding'] == 'base64'
+
+    # the thumbnail is written back to S3 and served
+    put_kwargs = s3_client.put_object.call_args.kwargs
+    assert put_kwargs['Bucket'] == 'the-bucket'
+    assert put_kwargs['Key'] == uri.lstrip('/')
+    assert put_kwargs['ContentType'] == content_type
+    assert base64.b64decode(resp['body']) == put_kwargs['Body']
+    image = PIL.Image.open(io.BytesIO(put_kwargs['Body']))
+    assert image.format == image_format
+    assert image.size == size
+
+
+def test_builds_thumbnail_without_exif(s3_client):
+    exif = PIL.Image.Exif()
+    exif[0x0112] = 6  # orientation: rotated 90 degrees
+    exif[0x010E] = 'description'
+    fh = io.BytesIO()
+    PIL.Image.new('RGB', (2000, 1000), 'red').save(fh, format='JPEG', exif=exif.tobytes())
+    s3_client.get_object.side_effect = lambda **kwargs: {'Body': io.BytesIO(fh.getvalue())}
+
+    resp = handlers.origin_response(build_event(), None)
+    assert resp['status'] == '200'
+    image = PIL.Image.open(io.BytesIO(base64.b64decode(resp['body'])))
+    assert image.size == (240, 480)  # rotated upright, so there's no orientation left to record
+    assert 'exif' not in image.info
+
+
+def test_builds_thumbnail_head_request(s3_client):
+    resp = handlers.origin_response(build_event(method='HEAD'), None)
+    assert resp['status'] == '200'
+    assert 'body' not in resp
+    assert s3_client.put_object.call_count == 1
+
+
+def test_thumbnail_too_big_to_serve(s3_client):
+    # too big at full quality, small enough at the first fallback quality
+    full_size = handlers.MAX_GENERATED_RESPONSE_BYTES + 1
+    with unittest.mock.patch.object(handlers, 'encode', side_effect=[b'a' * full_size, b'a' * 10]):
+        resp = handlers.origin_response(build_event(), None)
+    assert resp['status'] == '200'
+    assert resp['headers']['cache-control'] == [{'key': 'Cache-Control', 'value': 'no-store'}]
+    assert base64.b64decode(resp['body']) == b'a' * 10
+    assert len(s3_client.put_object.call_args.kwargs['Body']) == full_size
+
+    # too big even at the lowest quality
+    encoded = [b'a' * full_size] * (len(handlers.FALLBACK_QUALITIES) + 1)
+    with unittest.mock.patch.object(handlers, 'encode', side_effect=encoded):
+        resp = handlers.origin_response(build_event(), None)
+    assert resp['status'] == '503'
+    assert resp['headers']['retry-after'] == [{'key': 'Retry-After', 'value': '1'}]
+    assert 'body' not in resp
@@ -10,8 +10,16 @@ from cryptography.hazmat.primitives.asymmetric.padding import PKCS1v15
 from cryptography.hazmat.primitives.hashes import SHA1
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
 
+from app import metrics
+from app.utils import LruCache
+
 CLOUDFRONT_UPLOADS_DOMAIN = os.environ.get('CLOUDFRONT_UPLOADS_DOMAIN')
 
+# Default expiries are rounded up to the end of a fixed bucket, so every signature generated for the
+# same path within a bucket is identical and can be reused across requests in a warm lambda
+EXPIRY_BUCKET_SECONDS = 60 * 60
+SIGNED_CACHE_SIZE = 4096
+
 
 class CloudFrontClient:
 
@@ -21,6 +29,7 @@ class CloudFrontClient:
         assert domain, "CloudFront domain is required"
         self.domain = domain
         self.key_pair_getter = key_pair_getter
+        self.signed_cache = LruCache(SIGNED_CACHE_SIZE)
 
     def get_key_pair(self):
         if not hasattr(self, '_key_pair'):
@@ -54,25 +63,52 @@ class CloudFrontClient:
     def generate_unsigned_url(self, path):
         return f'https://{self.domain}/{path}'
 
+    def get_default_expires_at(self, now=None):
+        "At least `lifetime` from now, rounded up to the end of the current expiry bucket"
+        timestamp = (now or pendulum.now('utc')).add(seconds=self.lifetime.in_seconds()).int_timestamp
+        return pendulum.from_timestamp(-(-timestamp // EXPIRY_BUCKET_SECONDS) * EXPIRY_BUCKET_SECONDS)
+
     def generate_presigned_url(self, path, methods, expires_at=None):
         # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudfront.html#examples
-        expires_at = expires_at or pendulum.now('utc') + self.lifetime
+        expires_at = expires_at or self.get_default_expires_at()
+        key = ('url', path, tuple(methods), expires_at.int_timestamp)
+        if (signed_url := self.signed_cache.get(key)) is not None:
+            return signed_url
         qs = urllib.parse.urlencode([('Method', m) for m in methods])
         url = f'https://{self.domain}/{path}?{qs}'
-        return self.get_cloudfront_signer().generate_presigned_url(url, date_less_than=expires_at)
+        signer = self.get_cloudfront_signer()
+        with metrics.timed_dependency('cloudfrontSign'):
+            signed_url = signer.generate_presigned_url(url, date_less_than=expires_at)
+        self.signed_cache.put(key, signed_url)
+        return signed_url
+
+    def generate_presigned_urls(self, paths, methods, expires_at=None):
+        """
+        Shorthand for generate_presigned_url() on each of the paths, with the expiry picked once so they all
+        share it. Each url is still signed (or found in the cache) on its own.
+        """
+        expires_at = expires_at or self.get_default_expires_at()
+        return [self.generate_presigned_url(path, methods, expires_at=expires_at) for path in paths]
 
     def generate_presigned_cookies(self, path, expires_at=None):
         # https://gist.github.com/mjohnsullivan/31064b04707923f82484c54981e4749e
-        expires_at = expires_at or pendulum.now('utc') + self.lifetime
+        expires_at = expires_at or self.get_default_expires_at()
+        key = ('cookies', path, expires_at.int_timestamp)
+        if (cookies := self.signed_cache.get(key)) is not None:
+            return cookies.copy()
         url = self.generate_unsigned_url(path)
         policy = self.generate_cookie_policy(url, expires_at)
-        signature = self.get_private_key().sign(policy, PKCS1v15(), SHA1())
-        return {
+        private_key = self.get_private_key()
+        with metrics.timed_dependency('cloudfrontSign'):
+            signature = private_key.sign(policy, PKCS1v15(), SHA1())
+        cookies = {
             'ExpiresAt': expires_at.to_iso8601_string(),
             'CloudFront-Policy': self._encode(policy),
             'CloudFront-Signature': self._encode(signature),
             'CloudFront-Key-Pair-Id': self.get_key_pair()['keyId'],
         }
+        self.signed_cache.put(key, cookies)
+        return cookies.copy()
 
     def generate_cookie_policy(self, path, expires_at):
         policy_dict = {
@@ -1,12 +1,25 @@
 import base64
+import concurrent.futures
+import itertools
 import json
 import logging
 import os
 import re
+import time
 
-import boto3
+from boto3.dynamodb.types import TypeSerializer
+
+from .thread_local import ThreadLocalResource, get_default_session
 
 DYNAMO_TABLE = os.environ.get('DYNAMO_TABLE')
+
+# dynamo's limits on items per batch request, and bounds on how hard we push batch requests
+BATCH_GET_SIZE = 100
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_WORKERS = 8
+BATCH_MAX_ATTEMPTS = 5
+BATCH_BACKOFF_SECONDS = 0.05
+
 logger = logging.getLogger()
 
 
@@ -19,16 +32,24 @@ class DynamoClient:
         assert table_name, "Table name is required"
         self.table_name = table_name
 
-        boto3_resource = boto3.resource('dynamodb')
+        session = get_default_session()
+        self.resources = ThreadLocalResource('dynamodb', session)
 
         if create_table_schema:
             create_table_schema['TableName'] = table_name
-            boto3_resource.create_table(**create_table_schema)
+            self.boto3_resource.create_table(**create_table_schema)
 
-        self.table = boto3_resource.Table(table_name)
-        self.boto3_client = boto3.client('dynamodb')
+        self.boto3_client = session.client('dynamodb')
         self.exceptions = self.boto3_client.exceptions
 
+    @property
+    def boto3_resource(self):
+        return self.resources.resource
+
+    @property
+    def table(self):
+        return self.resources.get_sub_resource('Table', self.table_name)
+
     def add_item(self, query_kwargs):
         "Put an item and return what was putted"
         # ensure query fails if the item already exists
@@ -60,6 +81,30 @@ class DynamoClient:
             kwargs['RequestItems'][self.table_name]['ProjectionExpression'] = projection_expression
         return self.boto3_client.batch_get_item(**kwargs)['Responses'][self.table_name]
 
+    def batch_get(self, keys, projection_expression=None, max_attempts=BATCH_MAX_ATTEMPTS):
+        """
+        Get a bunch of items by their keys, in as few batch requests as possible.
+        Unlike batch_get_items(), keys & items are in the same format as the rest of this client uses.
+        Order *not* maintained, and items that do not exist are omitted.
+        """
+        keys = list(keys)
+        items = []
+        for i in range(0, len(keys), BATCH_GET_SIZE):
+            request = {'Keys': keys[i : i + BATCH_GET_SIZE]}
+            if projection_expression:
+                request['ProjectionExpression'] = projection_expression
+            for attempt in range(max_attempts):
+                if attempt:
+                    time.sleep(BATCH_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                resp = self.boto3_resource.batch_get_item(RequestItems={self.table_name: request})
+                items.extend(resp['Responses'].get(self.table_name, []))
+                request = resp.get('UnprocessedKeys', {}).get(self.table_name)
+                if not request:
+                    break
+            else:
+                raise Exception(f'Failed to get {len(request["Keys"])} items in {max_attempts} attempts')
+        return items
+
     def update_item(self, query_kwargs, failure_warning=None):
         """
         Update an item and return the new item.
@@ -145,6 +190,32 @@ class DynamoClient:
                 cnt += 1
         return cnt
 
+    def parallel_batch_delete(self, key_generator, max_workers=BATCH_WRITE_MAX_WORKERS):
+        """
+        Batch delete items by keys yielded by `generator`, with up to `max_workers` batches in flight at once.
+        Uses the low-level client, as (unlike boto resources) it is thread-safe.
+        Returns count of how many deletes requested.
+        """
+        serialize = TypeSerializer().serialize
+        requests = (
+            {'DeleteRequest': {'Key': {k: serialize(v) for k, v in key.items()}}} for key in key_generator
+        )
+        batches = iter(lambda: list(itertools.islice(requests, BATCH_WRITE_SIZE)), [])
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return sum(executor.map(self.batch_write_with_retries, batches))
+
+    def batch_write_with_retries(self, write_requests, max_attempts=BATCH_MAX_ATTEMPTS):
+        "Write one batch of typed write requests, retrying any unprocessed with backoff. Returns count requested."
+        unprocessed = write_requests
+        for attempt in range(max_attempts):
+            if attempt:
+                time.sleep(BATCH_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            resp = self.boto3_client.batch_write_item(RequestItems={self.table_name: unprocessed})
+            unprocessed = resp.get('UnprocessedItems', {}).get(self.table_name)
+            if not unprocessed:
+                return len(write_requests)
+        raise Exception(f'Failed to write {len(unprocessed)} items in {max_attempts} batch write attempts')
+
     def encode_pagination_token(self, last_evaluated_key):
         "From a LastEvaluatedKey to a obfucated string"
         # https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Query.html#Query.Pagination
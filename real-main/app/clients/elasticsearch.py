@@ -1,3 +1,5 @@
+import contextlib
+import itertools
 import json
 import logging
 import os
@@ -10,15 +12,24 @@ logger = logging.getLogger()
 
 ELASTICSEARCH_DOMAIN = os.environ.get('ELASTICSEARCH_DOMAIN')
 
+# max actions sent in one request to the _bulk api
+BULK_MAX_ACTIONS = 500
+# max connections kept open to the domain, enough for each thread of a parallel reindex
+POOL_MAXSIZE = 16
+
 
 class ElasticSearchClient:
 
     service = 'es'
     headers = {'Content-Type': 'application/json'}
+    bulk_headers = {'Content-Type': 'application/x-ndjson'}
+    index = 'users'
 
     def __init__(self, domain=ELASTICSEARCH_DOMAIN):
         assert domain, '`domain` is required'
         self.domain = domain
+        # while batching, userId -> the latest action for that user, to be sent together with the _bulk api
+        self.batched_actions = None
 
     @property
     def awsauth(self):
@@ -34,16 +45,28 @@ class ElasticSearchClient:
             )
         return self._awsauth
 
+    @property
+    def session(self):
+        "A session that keeps connections to the domain open across requests"
+        if not hasattr(self, '_session'):
+            session = requests.Session()
+            session.auth = self.awsauth
+            session.mount(
+                'https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+            )
+            self._session = session
+        return self._session
+
     def query_users(self, query):
         "`query` should be dict-like structure that can be serialized to json"
-        url = f'https://{self.domain}/users/_search'
-        resp = requests.get(url, auth=self.awsauth, json={'query': query}, headers=self.headers)
+        url = f'https://{self.domain}/{self.index}/_search'
+        resp = self.session.get(url, json={'query': query}, headers=self.headers)
         if resp.status_code != 200:
             logging.warning(f'ElasticSearch: Recieved non-200 response of {resp.status_code} when querying users')
         return resp.json()
 
     def build_user_url(self, user_id):
-        return f'https://{self.domain}/users/_doc/{user_id}'
+        return f'https://{self.domain}/{self.index}/_doc/{user_id}'
 
     def build_user_doc(self, user_id, username, full_name):
         doc = {'userId': user_id, 'username': username, 'fullName': full_name}
@@ -51,15 +74,77 @@ class ElasticSearchClient:
 
     def put_user(self, user_id, username, full_name):
         doc = self.build_user_doc(user_id, username, full_name)
+        if self.batched_actions is not None:
+            self.batched_actions[user_id] = ('index', user_id, doc)
+            return
         url = self.build_user_url(user_id)
         logging.info(f'ElasticSearch: Putting user to index at `{url}` ' + json.dumps(doc))
-        resp = requests.put(url, auth=self.awsauth, json=doc, headers=self.headers)
+        resp = self.session.put(url, json=doc, headers=self.headers)
         if resp.status_code // 100 != 2:
             logging.warning(f'ElasticSearch: Recieved non-2XX response of {resp.status_code} when adding user')
 
     def delete_user(self, user_id):
+        if self.batched_actions is not None:
+            self.batched_actions[user_id] = ('delete', user_id, None)
+            return
         url = self.build_user_url(user_id)
         logging.info(f'ElasticSearch: Deleting user from index at `{url}`')
-        resp = requests.delete(url, auth=self.awsauth)
+        resp = self.session.delete(url)
         if resp.status_code != 200:
             logging.warning(f'ElasticSearch: Recieved non-200 response of {resp.status_code} when deleting user')
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Within this context, users put & deleted are held back, keeping only the latest of each user,
+        then sent with the _bulk api on the way out. Errors sending them are logged, not raised.
+        """
+        if self.batched_actions is not None:
+            yield  # already batching, the outermost batch sends
+            return
+        self.batched_actions = {}
+        try:
+            yield
+        finally:
+            actions, self.batched_actions = self.batched_actions.values(), None
+            try:
+                self.bulk(actions)
+            except Exception as err:
+                logger.exception(f'ElasticSearch: Unable to send batch of {len(actions)} actions: {err}')
+
+    def build_bulk_body(self, actions):
+        "NDJSON body for the _bulk api, from (action, user_id, doc) tuples with action 'index' or 'delete'"
+        lines = []
+        for action, user_id, doc in actions:
+            lines.append(json.dumps({action: {'_index': self.index, '_id': user_id}}))
+            if doc is not None:
+                lines.append(json.dumps(doc))
+        return '\n'.join(lines) + '\n'
+
+    def bulk(self, actions):
+        """
+        Send (action, user_id, doc) tuples with the _bulk api, in chunks of up to BULK_MAX_ACTIONS.
+        Returns count of actions that succeeded.
+        """
+        url = f'https://{self.domain}/_bulk'
+        actions = iter(actions)
+        success_cnt = 0
+        while chunk := list(itertools.islice(actions, BULK_MAX_ACTIONS)):
+            logging.info(f'ElasticSearch: Sending {len(chunk)} actions to `{url}`')
+            body = self.build_bulk_body(chunk).encode('utf-8')
+            resp = self.session.post(url, data=body, headers=self.bulk_headers)
+            if resp.status_code // 100 != 2:
+                logging.warning(
+                    f'ElasticSearch: Recieved non-2XX response of {resp.status_code} for bulk actions'
+                )
+                continue
+            for item in resp.json()['items']:
+                action, result = next(iter(item.items()))
+                # deleting a user that isn't indexed is fine
+                if result['status'] // 100 == 2 or (action == 'delete' and result['status'] == 404):
+                    success_cnt += 1
+                else:
+                    logging.warning(
+                        f'ElasticSearch: Failed to {action} user `{result["_id"]}`: {result.get("error")}'
+                    )
+        return success_cnt
@@ -1,3 +1,5 @@
+import contextlib
+import itertools
 import logging
 import os
 import uuid
@@ -6,6 +8,9 @@ import boto3
 
 PINPOINT_APPLICATION_ID = os.environ.get('PINPOINT_APPLICATION_ID')
 
+# max endpoints in one request to update_endpoints_batch
+UPDATE_BATCH_MAX_ITEMS = 100
+
 logger = logging.getLogger()
 
 
@@ -13,6 +18,8 @@ class PinpointClient:
     def __init__(self, app_id=PINPOINT_APPLICATION_ID):
         self.app_id = app_id
         self.client = boto3.client('pinpoint')
+        # while batching, userId -> the changes to make to that user's endpoints
+        self.batched_changes = None
 
     def send_user_apns(self, user_id, url, title, body=None):
         "Returns a bool representing if the APNS was successfully sent"
@@ -36,29 +43,16 @@ class PinpointClient:
         The user should have at most one active endpoint of each `channel_type`.
         If this method finds more than one active endpoint for the given
         `channel_type`, it will set `address` on one of them and delete the extras.
+
+        Returns the endpoint id, or None if batching, as then the endpoint isn't written until the batch ends.
         """
-        endpoints = self.get_user_endpoints(user_id, channel_type=channel_type)
-        endpoint_ids = []
-        for this_endpoint_id, this_endpoint in endpoints.items():
-            # put the endpoint to keep at the front
-            if this_endpoint.get('Address') == address:
-                endpoint_ids.insert(0, this_endpoint_id)
-            else:
-                endpoint_ids.append(this_endpoint_id)
-
-        # delete extras
-        while len(endpoint_ids) > 1:
-            self.delete_endpoint(endpoint_ids.pop())
-
-        endpoint_id = endpoint_ids[0] if endpoint_ids else str(uuid.uuid4())
-        if endpoints.get(endpoint_id) != address:
-            kwargs = {
-                'ApplicationId': self.app_id,
-                'EndpointId': endpoint_id,
-                'EndpointRequest': {'Address': address, 'ChannelType': channel_type, 'User': {'UserId': user_id}},
-            }
-            self.client.update_endpoint(**kwargs)
-        return endpoint_id
+        if self.batched_changes is not None:
+            self.change_user_endpoints(user_id, addresses={channel_type: address})
+            return None
+        changes = self.merge_changes(self.new_changes(), addresses={channel_type: address})
+        items = self.apply_changes(user_id, changes)
+        self.update_endpoints(items)
+        return items[0]['Id']
 
     def get_user_endpoints(self, user_id, channel_type=None):
         """
@@ -82,26 +76,12 @@ class PinpointClient:
         }
 
     def enable_user_endpoints(self, user_id):
-        "Disable all of a user's endpoints"
-        endpoints = self.get_user_endpoints(user_id)
-        for endpoint_id in endpoints.keys():
-            kwargs = {
-                'ApplicationId': self.app_id,
-                'EndpointId': endpoint_id,
-                'EndpointRequest': {'EndpointStatus': 'ACTIVE'},
-            }
-            self.client.update_endpoint(**kwargs)
+        "Enable all of a user's endpoints"
+        self.change_user_endpoints(user_id, status='ACTIVE')
 
     def disable_user_endpoints(self, user_id):
         "Disable all of a user's endpoints"
-        endpoints = self.get_user_endpoints(user_id)
-        for endpoint_id in endpoints.keys():
-            kwargs = {
-                'ApplicationId': self.app_id,
-                'EndpointId': endpoint_id,
-                'EndpointRequest': {'EndpointStatus': 'INACTIVE'},
-            }
-            self.client.update_endpoint(**kwargs)
+        self.change_user_endpoints(user_id, status='INACTIVE')
 
     def delete_endpoint(self, endpoint_id):
         "Delete a specific endpoint"
@@ -113,14 +93,144 @@ class PinpointClient:
 
     def delete_user_endpoint(self, user_id, channel_type):
         "Delete a user's endpoint of a specific `channel_type`"
-        endpoints = self.get_user_endpoints(user_id, channel_type=channel_type)
-        for endpoint_id in endpoints.keys():
-            self.delete_endpoint(endpoint_id)
+        self.change_user_endpoints(user_id, addresses={channel_type: None})
 
     def delete_user_endpoints(self, user_id):
         "Delete all of a user's endpoints"
-        kwargs = {
-            'ApplicationId': self.app_id,
-            'UserId': user_id,
-        }
-        self.client.delete_user_endpoints(**kwargs)
+        self.change_user_endpoints(user_id, delete_all=True)
+
+    def change_user_endpoints(self, user_id, addresses=None, status=None, delete_all=False):
+        """
+        Change a user's endpoints: set or delete (address None) the endpoint of each channel type in
+        `addresses`, set the status of all of them, or delete all of them. If batching, the changes are
+        merged into those already held back for the user. Else they are made now.
+        """
+        if self.batched_changes is None:
+            changes = self.merge_changes(self.new_changes(), addresses, status, delete_all)
+            self.update_endpoints(self.apply_changes(user_id, changes))
+            return
+        changes = self.batched_changes.setdefault(user_id, self.new_changes())
+        self.merge_changes(changes, addresses, status, delete_all)
+
+    def new_changes(self):
+        return {'deleteAll': False, 'addresses': {}, 'status': None}
+
+    def merge_changes(self, changes, addresses=None, status=None, delete_all=False):
+        if delete_all:
+            # anything before a delete of everything is moot
+            changes.update({'deleteAll': True, 'addresses': {}, 'status': None})
+        changes['addresses'].update(addresses or {})
+        changes['status'] = status or changes['status']
+        return changes
+
+    def apply_changes(self, user_id, changes):
+        """
+        Make the deletes among a user's endpoint changes, and return the EndpointBatchItems
+        for the rest, to be sent with update_endpoints_batch.
+
+        The user's endpoints are always listed first (unless they're all being deleted), as other
+        lambdas may write them at any time and a user should have at most one endpoint per channel type.
+        """
+        if changes['deleteAll']:
+            self.client.delete_user_endpoints(ApplicationId=self.app_id, UserId=user_id)
+            endpoint_ids = {}
+        else:
+            endpoint_ids = self.list_user_endpoint_ids(user_id, keep_addresses=changes['addresses'])
+
+        items = {}
+        for channel_type, address in changes['addresses'].items():
+            endpoint_id = endpoint_ids.pop(channel_type, None)
+            if address is None:
+                if endpoint_id:
+                    self.delete_endpoint(endpoint_id)
+                continue
+            endpoint_id = endpoint_ids[channel_type] = endpoint_id or str(uuid.uuid4())
+            items[endpoint_id] = {
+                'Id': endpoint_id,
+                'Address': address,
+                'ChannelType': channel_type,
+                'User': {'UserId': user_id},
+            }
+        if changes['status']:
+            for endpoint_id in endpoint_ids.values():
+                item = items.setdefault(endpoint_id, {'Id': endpoint_id, 'User': {'UserId': user_id}})
+                item['EndpointStatus'] = changes['status']
+        return list(items.values())
+
+    def list_user_endpoint_ids(self, user_id, keep_addresses=None):
+        """
+        Returns {channelType: endpointId} of a user's endpoints. Extra endpoints of the same channel type
+        are deleted, keeping the one already at the address in `keep_addresses` for that type, if any.
+        """
+        keep_addresses = keep_addresses or {}
+        endpoint_ids = {}
+        for endpoint_id, endpoint in self.get_user_endpoints(user_id).items():
+            channel_type = endpoint['ChannelType']
+            if channel_type not in endpoint_ids:
+                endpoint_ids[channel_type] = endpoint_id
+                continue
+            if endpoint.get('Address') == keep_addresses.get(channel_type):
+                endpoint_id, endpoint_ids[channel_type] = endpoint_ids[channel_type], endpoint_id
+            self.delete_endpoint(endpoint_id)
+        return endpoint_ids
+
+    def update_endpoints(self, items):
+        "Create or update endpoints from EndpointBatchItems, in chunks of up to UPDATE_BATCH_MAX_ITEMS"
+        items = iter(items)
+        while chunk := list(itertools.islice(items, UPDATE_BATCH_MAX_ITEMS)):
+            self.client.update_endpoints_batch(ApplicationId=self.app_id, EndpointBatchRequest={'Item': chunk})
+
+    def update_users_endpoints(self, user_items):
+        """
+        Create or update the endpoints of many users from {userId: EndpointBatchItems}, sending the items of
+        as many users together as fit in a request. One rejected item fails its whole request, so the users
+        of a failed request are retried one by one, and only those with bad items lose their changes.
+        Errors are logged, not raised.
+        """
+        chunks, chunk_item_cnt = [[]], 0  # lists of user ids
+        for user_id, items in user_items.items():
+            if chunk_item_cnt + len(items) > UPDATE_BATCH_MAX_ITEMS and chunks[-1]:
+                chunks.append([])
+                chunk_item_cnt = 0
+            chunks[-1].append(user_id)
+            chunk_item_cnt += len(items)
+
+        for user_ids in chunks:
+            if len(user_ids) > 1:
+                items = [item for user_id in user_ids for item in user_items[user_id]]
+                try:
+                    self.update_endpoints(items)
+                    continue
+                except Exception as err:
+                    logger.warning(
+                        f'Pinpoint: Unable to update batch of {len(items)} endpoints, retrying per user: {err}'
+                    )
+            for user_id in user_ids:
+                try:
+                    self.update_endpoints(user_items[user_id])
+                except Exception as err:
+                    logger.exception(f'Pinpoint: Unable to update endpoints of user `{user_id}`: {err}')
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Within this context, changes to users' endpoints are held back and merged per user, then made on
+        the way out: each user's endpoints are listed once, and the updates of many users are sent together
+        with update_endpoints_batch. Errors making them are logged, not raised.
+        """
+        if self.batched_changes is not None:
+            yield  # already batching, the outermost batch sends
+            return
+        self.batched_changes = {}
+        try:
+            yield
+        finally:
+            batched_changes, self.batched_changes = self.batched_changes, None
+            user_items = {}
+            for user_id, changes in batched_changes.items():
+                try:
+                    if items := self.apply_changes(user_id, changes):
+                        user_items[user_id] = items
+                except Exception as err:
+                    logger.exception(f'Pinpoint: Unable to change endpoints of user `{user_id}`: {err}')
+            self.update_users_endpoints(user_items)
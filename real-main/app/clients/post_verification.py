@@ -1,9 +1,66 @@
+import logging
+import threading
+import time
+
 import requests
+import requests.adapters
+
+logger = logging.getLogger()
+
+
+class PostVerificationServiceUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fail fast when a downstream service is degraded.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls are refused
+    for `reset_seconds`. After that a single trial call is let through: success closes the
+    circuit again, failure re-opens it for another `reset_seconds`.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failure_count = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at < self.reset_seconds:
+                return False
+            # half open: let this call through as a trial, but hold everyone else off while it runs
+            self.opened_at = self.clock()
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failure_count = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failure_count += 1
+            if self.failure_count >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f'Circuit breaker opened after `{self.failure_count}` consecutive failures')
+                self.opened_at = self.clock()
 
 
 class PostVerificationClient:
-    def __init__(self, api_creds_getter):
+
+    # (connect, read) in seconds
+    timeout = (3.05, 15)
+
+    def __init__(self, api_creds_getter, circuit_breaker=None):
         self.api_creds_getter = api_creds_getter
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
 
     @property
     def api_creds(self):
@@ -11,7 +68,18 @@ class PostVerificationClient:
             self._api_creds = self.api_creds_getter()
         return self._api_creds
 
+    @property
+    def session(self):
+        # a pooled session kept across invocations of a warm lambda, so connections get re-used
+        if not hasattr(self, '_session'):
+            self._session = requests.Session()
+            self._session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=10))
+        return self._session
+
     def verify_image(self, image_url, image_format=None, original_format=None, taken_in_real=None):
+        if not self.circuit_breaker.allow():
+            raise PostVerificationServiceUnavailable('Post verification service circuit breaker is open')
+
         headers = {'x-api-key': self.api_creds['key']}
         api_url = self.api_creds['root'] + 'verify/image'
 
@@ -26,8 +94,16 @@ class PostVerificationClient:
         if taken_in_real:
             data['metadata']['takenInReal'] = taken_in_real
 
-        # synchronous for now. Note this generally runs in an async env already: an s3-object-created handler
-        resp = requests.post(api_url, headers=headers, json=data)
+        try:
+            resp = self.session.post(api_url, headers=headers, json=data, timeout=self.timeout)
+        except requests.exceptions.RequestException as err:
+            self.circuit_breaker.record_failure()
+            raise PostVerificationServiceUnavailable(f'Post verification service request failed: {err}') from err
+        if resp.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+
         if resp.status_code != 200:
             raise Exception(f'Post verification service error `{resp.status_code}` with body `{resp.text}`')
         try:
@@ -1,6 +1,13 @@
-import boto3
+import concurrent.futures
+
 import botocore
 
+from .thread_local import ThreadLocalResource, get_default_session
+
+# s3's limit on objects per delete call, and a bound on how many calls are in flight at once
+DELETE_BATCH_SIZE = 1000
+DELETE_MAX_WORKERS = 8
+
 
 class S3Client:
     def __init__(self, bucket_name, create_bucket=False):
@@ -8,15 +15,23 @@ class S3Client:
         The create_bucket kwarg is intended for use with moto in the test suite.
         """
         assert bucket_name, "Bucket name is required"
-        self.boto_client = boto3.client('s3')
+        session = get_default_session()
+        self.boto_client = session.client('s3')
         self.bucket_name = bucket_name
-        self.s3 = boto3.resource('s3')
-        self.bucket = self.s3.Bucket(bucket_name)
+        self.resources = ThreadLocalResource('s3', session)
         self.exceptions = self.boto_client.exceptions
 
         if create_bucket:
             self.s3.create_bucket(Bucket=bucket_name)
 
+    @property
+    def s3(self):
+        return self.resources.resource
+
+    @property
+    def bucket(self):
+        return self.resources.get_sub_resource('Bucket', self.bucket_name)
+
     def get_object_data_stream(self, path):
         return self.bucket.Object(path).get()['Body']
 
@@ -46,12 +61,43 @@ class S3Client:
         "Delete mutliple objects with the same prefix in one call to S3"
         self.bucket.objects.filter(Prefix=path_prefix).delete()
 
+    def delete_objects_with_prefixes(self, path_prefixes, max_workers=DELETE_MAX_WORKERS):
+        """
+        Delete all objects under any of the prefixes, listing the prefixes in parallel and then
+        deleting in batches of up to 1000 objects per call to S3. Returns count of objects deleted.
+        Raises if S3 fails to delete any of the objects, after all batches have been attempted.
+        """
+
+        def list_keys(path_prefix):
+            paginator = self.boto_client.get_paginator('list_objects_v2')
+            pages = paginator.paginate(Bucket=self.bucket_name, Prefix=path_prefix)
+            return [obj['Key'] for page in pages for obj in page.get('Contents', [])]
+
+        def delete_keys(keys):
+            kwargs = {'Delete': {'Objects': [{'Key': key} for key in keys], 'Quiet': True}}
+            resp = self.boto_client.delete_objects(Bucket=self.bucket_name, **kwargs)
+            # in quiet mode, only the keys that failed to delete are in the response
+            return resp.get('Errors', [])
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            keys = [key for keys in executor.map(list_keys, path_prefixes) for key in keys]
+            batches = [keys[i : i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+            errors = [error for errors in executor.map(delete_keys, batches) for error in errors]
+        if errors:
+            error = errors[0]
+            raise Exception(
+                f'Failed to delete {len(errors)} of {len(keys)} objects from S3, '
+                + f'ex: `{error["Key"]}` with `{error["Code"]}: {error["Message"]}`'
+            )
+        return len(keys)
+
     def copy_object(self, old_path, new_path):
         new_obj = self.bucket.Object(new_path)
         new_obj.copy({'Bucket': self.bucket.name, 'Key': old_path})
 
     def put_object(self, path, body, content_type):
-        self.bucket.put_object(Key=path, Body=body, ContentType=content_type)
+        # use the low-level client, as it (unlike boto resources) is thread-safe
+        self.boto_client.put_object(Bucket=self.bucket_name, Key=path, Body=body, ContentType=content_type)
 
     def exists(self, path):
         # https://stackoverflow.com/a/33843019
@@ -0,0 +1,37 @@
+import threading
+
+import boto3
+
+# boto3 sessions, which the resources are created from, aren't thread-safe either
+session_lock = threading.Lock()
+
+
+def get_default_session():
+    "boto3's default session, set up if need be"
+    with session_lock:
+        if boto3.DEFAULT_SESSION is None:
+            boto3.setup_default_session()
+        return boto3.DEFAULT_SESSION
+
+
+class ThreadLocalResource(threading.local):
+    """
+    A boto3 resource for each thread, as boto3 resources aren't thread-safe. A thread's resource is
+    created the first time that thread uses this. Sub-resources (ex: a dynamo table) should be gotten
+    with get_sub_resource(), so they're also kept per thread.
+
+    All the resources are created from `session`, so that the exceptions they raise are the same classes
+    as those of the session's clients. A worker thread must not fall back to whatever boto3's default
+    session has become since.
+    """
+
+    def __init__(self, service_name, session):
+        with session_lock:
+            self.resource = session.resource(service_name)
+        self.sub_resources = {}
+
+    def get_sub_resource(self, name, *identifiers):
+        key = (name, *identifiers)
+        if key not in self.sub_resources:
+            self.sub_resources[key] = getattr(self.resource, name)(*identifiers)
+        return self.sub_resources[key]
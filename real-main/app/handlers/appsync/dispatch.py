@@ -1,19 +1,30 @@
 "AppSync GraphQL data source"
 import logging
 import os
+import time
 
+from app import metrics
 from app.logging import LogLevelContext, handler_logging
 
 from . import routes
 from .exceptions import ClientException
 
+METRICS_NAMESPACE = 'Real/AppSync'
+METRICS_SAMPLE_RATE = float(os.environ.get('APPSYNC_METRICS_SAMPLE_RATE') or 0)
+
 logger = logging.getLogger()
+metrics.patch_all()
 
 # use this in the test suite to turn off auto-disocvery of routes
 route_path = os.environ.get('APPSYNC_ROUTE_AUTODISCOVERY_PATH', 'app.handlers.appsync.handlers')
+discover_started_at = time.perf_counter()
 if route_path:
     routes.discover(route_path)
 
+# importing the handlers registers the routes, while the clients & managers they use are built lazily on
+# first use. Reported along with the metrics of the first call.
+init_ms = (time.perf_counter() - discover_started_at) * 1000
+
 
 def get_client_details(event):
     headers = event['headers']  # most of the request headers
@@ -36,14 +47,36 @@ def get_gql_details(event):
 
 
 def event_to_extras(event):
+    if isinstance(event, list):
+        # a BatchInvoke, all events are for the same field from the same caller
+        extras = event_to_extras(event[0]) if event else {}
+        extras.get('gq', {}).pop('source', None)
+        extras['batchSize'] = len(event)
+        return extras
     client = get_client_details(event)
     gql = get_gql_details(event)
     return {'gq': gql, 'client': client}
 
 
+def record_metrics(field, batch_size=None):
+    properties = {'initTime': init_ms} if metrics.is_cold_start() else {}
+    if batch_size is not None:
+        properties['batchSize'] = batch_size
+    return metrics.record(METRICS_NAMESPACE, {'field': field}, METRICS_SAMPLE_RATE, **properties)
+
+
+def client_error_response(err):
+    msg = 'ClientError: ' + str(err)
+    logger.warning(msg)
+    return {'error': {'message': msg, 'data': err.data, 'info': err.info}}
+
+
 @handler_logging(event_to_extras=event_to_extras)
 def dispatch(event, context):
     "Top-level dispatch of appsync event to the correct handler"
+    if isinstance(event, list):
+        return dispatch_batch(event, context)
+
     # it is a sin that python has no dictionary destructing asignment
     client = get_client_details(event)
     gql = get_gql_details(event)
@@ -53,7 +86,8 @@ def dispatch(event, context):
     source = gql.get('source')
 
     handler = routes.get_handler(field)
-    if not handler:
+    batch_handler = routes.get_batch_handler(field)
+    if not handler and not batch_handler:
         # should not be able to get here
         msg = f'No handler for field `{field}` found'
         logger.exception(msg)
@@ -66,10 +100,73 @@ def dispatch(event, context):
     try:
         # Once support for direct-to-lambda resolvers lands, would be good to simplify this interface
         # to match that. https://github.com/sid88in/serverless-appsync-plugin/pull/350
-        resp = handler(caller_user_id, arguments, source=source, context=context, client=client)
+        with record_metrics(field):
+            if handler:
+                resp = handler(caller_user_id, arguments, source=source, context=context, client=client)
+            else:
+                resp = batch_handler(caller_user_id, [(source, arguments)], context=context, client=client)[0]
+                if isinstance(resp, ClientException):
+                    raise resp
     except ClientException as err:
-        msg = 'ClientError: ' + str(err)
-        logger.warning(msg)
-        return {'error': {'message': msg, 'data': err.data, 'info': err.info}}
+        return client_error_response(err)
 
     return {'success': resp}
+
+
+def dispatch_batch(events, context):
+    "Dispatch of an appsync BatchInvoke, a list of events for the same field, to the correct handler"
+    if not events:
+        return []
+    client = get_client_details(events[0])
+    gqls = [get_gql_details(event) for event in events]
+    field = gqls[0].get('field')
+    caller_user_id = gqls[0].get('callerUserId')
+    if any(gql.get('field') != field or gql.get('callerUserId') != caller_user_id for gql in gqls):
+        # appsync batches per resolver per request, so should not be able to get here
+        msg = f'Batch for field `{field}` has events for other fields or callers'
+        logger.exception(msg)
+        raise Exception(msg)
+
+    handler = routes.get_handler(field)
+    batch_handler = routes.get_batch_handler(field)
+    if not handler and not batch_handler:
+        # should not be able to get here
+        msg = f'No handler for field `{field}` found'
+        logger.exception(msg)
+        raise Exception(msg)
+
+    # we suppress INFO logging, except this message
+    with LogLevelContext(logger, logging.INFO):
+        logger.info(f'Handling AppSync GQL batch resolution of `{field}` for {len(events)} sources')
+
+    sources_and_arguments = [(gql.get('source'), gql.get('arguments')) for gql in gqls]
+    if not batch_handler:
+        resps = []
+        with record_metrics(field, batch_size=len(events)):
+            for source, arguments in sources_and_arguments:
+                try:
+                    resp = handler(caller_user_id, arguments, source=source, context=context, client=client)
+                except ClientException as err:
+                    resps.append(client_error_response(err))
+                else:
+                    resps.append({'success': resp})
+        return resps
+
+    def resolve(sources_and_arguments):
+        return batch_handler(caller_user_id, sources_and_arguments, context=context, client=client)
+
+    with record_metrics(field, batch_size=len(events)):
+        try:
+            resps = resolve(sources_and_arguments)
+        except ClientException:
+            # the error may be due to only some of the events, so resolve them one at a time to find out
+            resps = []
+            for source_and_arguments in sources_and_arguments:
+                try:
+                    resps.extend(resolve([source_and_arguments]))
+                except ClientException as err:
+                    resps.append(err)
+    assert len(resps) == len(events), f'Batch handler for `{field}` returned the wrong number of results'
+    return [
+        client_error_response(resp) if isinstance(resp, ClientException) else {'success': resp} for resp in resps
+    ]
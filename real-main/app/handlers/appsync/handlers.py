@@ -1,3 +1,4 @@
+import functools
 import logging
 import os
 
@@ -23,7 +24,7 @@ from app.models.post.enums import PostStatus, PostType
 from app.models.post.exceptions import PostException
 from app.models.user.enums import UserStatus
 from app.models.user.exceptions import UserException
-from app.utils import image_size
+from app.utils import LazyObject, image_size
 
 from .. import xray
 from . import routes
@@ -32,45 +33,70 @@ from .exceptions import ClientException
 S3_UPLOADS_BUCKET = os.environ.get('S3_UPLOADS_BUCKET')
 S3_PLACEHOLDER_PHOTOS_BUCKET = os.environ.get('S3_PLACEHOLDER_PHOTOS_BUCKET')
 
+# fields of the graphql Image type, and the size each one points to
+image_url_fields = {
+    'url': image_size.NATIVE,
+    'url64p': image_size.P64,
+    'url480p': image_size.P480,
+    'url1080p': image_size.P1080,
+    'url4k': image_size.K4,
+}
+
 logger = logging.getLogger()
 xray.patch_all()
 
-secrets_manager_client = clients.SecretsManagerClient()
+# Clients & managers are only constructed when a route first uses them, so a cold start only pays
+# for what the route being resolved depends on. Constructing the managers doesn't use the clients.
+secrets_manager_client = LazyObject(clients.SecretsManagerClient)
 clients = {
-    'apple': clients.AppleClient(),
-    'appstore': clients.AppStoreClient(),
-    'appsync': clients.AppSyncClient(),
-    'cloudfront': clients.CloudFrontClient(secrets_manager_client.get_cloudfront_key_pair),
-    'cognito': clients.CognitoClient(),
-    'dynamo': clients.DynamoClient(),
-    'facebook': clients.FacebookClient(),
-    'google': clients.GoogleClient(secrets_manager_client.get_google_client_ids),
-    'pinpoint': clients.PinpointClient(),
-    'post_verification': clients.PostVerificationClient(secrets_manager_client.get_post_verification_api_creds),
-    's3_uploads': clients.S3Client(S3_UPLOADS_BUCKET),
-    's3_placeholder_photos': clients.S3Client(S3_PLACEHOLDER_PHOTOS_BUCKET),
+    'apple': LazyObject(clients.AppleClient),
+    'appstore': LazyObject(clients.AppStoreClient),
+    'appsync': LazyObject(clients.AppSyncClient),
+    'cloudfront': LazyObject(
+        functools.partial(clients.CloudFrontClient, lambda: secrets_manager_client.get_cloudfront_key_pair())
+    ),
+    'cognito': LazyObject(clients.CognitoClient),
+    'dynamo': LazyObject(clients.DynamoClient),
+    'facebook': LazyObject(clients.FacebookClient),
+    'google': LazyObject(
+        functools.partial(clients.GoogleClient, lambda: secrets_manager_client.get_google_client_ids())
+    ),
+    'pinpoint': LazyObject(clients.PinpointClient),
+    'post_verification': LazyObject(
+        functools.partial(
+            clients.PostVerificationClient, lambda: secrets_manager_client.get_post_verification_api_creds()
+        )
+    ),
+    's3_uploads': LazyObject(functools.partial(clients.S3Client, S3_UPLOADS_BUCKET)),
+    's3_placeholder_photos': LazyObject(functools.partial(clients.S3Client, S3_PLACEHOLDER_PHOTOS_BUCKET)),
 }
 
 # shared hash table of all managers, enables inter-manager communication
 managers = {}
-appstore_manager = managers.get('appstore') or models.AppStoreManager(clients, managers=managers)
-album_manager = managers.get('album') or models.AlbumManager(clients, managers=managers)
-block_manager = managers.get('block') or models.BlockManager(clients, managers=managers)
-card_manager = managers.get('card') or models.CardManager(clients, managers=managers)
-chat_manager = managers.get('chat') or models.ChatManager(clients, managers=managers)
-chat_message_manager = managers.get('chat_message') or models.ChatMessageManager(clients, managers=managers)
-comment_manager = managers.get('comment') or models.CommentManager(clients, managers=managers)
-follower_manager = managers.get('follower') or models.FollowerManager(clients, managers=managers)
-like_manager = managers.get('like') or models.LikeManager(clients, managers=managers)
-post_manager = managers.get('post') or models.PostManager(clients, managers=managers)
-user_manager = managers.get('user') or models.UserManager(clients, managers=managers)
-
-
-def validate_caller(func):
+
+
+def lazy_manager(name, manager_class):
+    return LazyObject(lambda: managers.get(name) or manager_class(clients, managers=managers))
+
+
+appstore_manager = lazy_manager('appstore', models.AppStoreManager)
+album_manager = lazy_manager('album', models.AlbumManager)
+block_manager = lazy_manager('block', models.BlockManager)
+card_manager = lazy_manager('card', models.CardManager)
+chat_manager = lazy_manager('chat', models.ChatManager)
+chat_message_manager = lazy_manager('chat_message', models.ChatMessageManager)
+comment_manager = lazy_manager('comment', models.CommentManager)
+follower_manager = lazy_manager('follower', models.FollowerManager)
+like_manager = lazy_manager('like', models.LikeManager)
+post_manager = lazy_manager('post', models.PostManager)
+user_manager = lazy_manager('user', models.UserManager)
+
+
+def validate_caller(func, cached=False):
     "Decorator that inits a caller_user model and verifies the caller is ACTIVE"
 
     def wrapper(caller_user_id, arguments, **kwargs):
-        caller_user = user_manager.get_user(caller_user_id)
+        caller_user = (user_manager.get_caller_user if cached else user_manager.get_user)(caller_user_id)
         if not caller_user:
             raise ClientException(f'User `{caller_user_id}` does not exist')
         if caller_user.status != UserStatus.ACTIVE:
@@ -80,6 +106,14 @@ def validate_caller(func):
     return wrapper
 
 
+def validate_cached_caller(func):
+    """
+    Like validate_caller, but the caller's profile usually comes from a warm-lambda cache.
+    For hot mutations that only depend on the caller's id & status being fresh.
+    """
+    return validate_caller(func, cached=True)
+
+
 def update_last_client(func):
     "Decorator that updates User.lastClient if as needed"
 
@@ -304,7 +338,10 @@ def reset_user(caller_user_id, arguments, client=None, **kwargs):
     # resetUser may be called when user exists in cognito but not in dynamo
     user = user_manager.get_user(caller_user_id)
     if user:
-        user.delete(skip_cognito=True)
+        try:
+            user.delete(skip_cognito=True)
+        except UserException as err:
+            raise ClientException(str(err)) from err
 
     if new_username:
         # equivalent to calling Mutation.createCognitoOnlyUser()
@@ -336,7 +373,8 @@ def delete_user(caller_user_id, arguments, client=None, **kwargs):
         raise ClientException(f'User `{caller_user_id}` does not exist')
 
     user.set_last_client(client)
-    user.delete()
+    # the rest of the deletion is done by the deleteUsers job
+    user.start_delete()
     return user.serialize(caller_user_id)
 
 
@@ -363,19 +401,14 @@ def add_app_store_receipt(caller_user, arguments, **kwargs):
     return True
 
 
-@routes.register('User.photo')
-def user_photo(caller_user_id, arguments, source=None, **kwargs):
-    user = user_manager.init_user(source)
-    native_url = user.get_photo_url(image_size.NATIVE)
-    if not native_url:
-        return None
-    return {
-        'url': native_url,
-        'url64p': user.get_photo_url(image_size.P64),
-        'url480p': user.get_photo_url(image_size.P480),
-        'url1080p': user.get_photo_url(image_size.P1080),
-        'url4k': user.get_photo_url(image_size.K4),
-    }
+@routes.register_batch('User.photo')
+def user_photos(caller_user_id, sources_and_arguments, **kwargs):
+    resps = []
+    for source, _ in sources_and_arguments:
+        user = user_manager.init_user(source)
+        urls = {field: user.get_photo_url(size) for field, size in image_url_fields.items()}
+        resps.append(urls if urls['url'] else None)
+    return resps
 
 
 @routes.register('Mutation.followUser')
@@ -562,10 +595,14 @@ def add_post(caller_user, arguments, **kwargs):
     return post.serialize(caller_user.id)
 
 
-@routes.register('Post.image')
-def post_image(caller_user_id, arguments, source=None, **kwargs):
-    post = post_manager.get_post(source['postId'])
+@routes.register_batch('Post.image')
+def post_images(caller_user_id, sources_and_arguments, **kwargs):
+    post_ids = [source['postId'] for source, _ in sources_and_arguments]
+    posts = post_manager.get_posts(post_ids, with_image_items=True)
+    return [post_image(posts.get(post_id)) for post_id in post_ids]
 
+
+def post_image(post):
     if not post or post.status == PostStatus.DELETING:
         return None
 
@@ -576,18 +613,15 @@ def post_image(caller_user_id, arguments, source=None, **kwargs):
         return None
 
     image_item = post.image_item.copy() if post.image_item else {}
-    image_item.update(
-        {
-            'url': post.get_image_readonly_url(image_size.NATIVE),
-            'url64p': post.get_image_readonly_url(image_size.P64),
-            'url480p': post.get_image_readonly_url(image_size.P480),
-            'url1080p': post.get_image_readonly_url(image_size.P1080),
-            'url4k': post.get_image_readonly_url(image_size.K4),
-        }
-    )
+    image_item.update(post_image_urls(post))
     return image_item
 
 
+def post_image_urls(post):
+    urls = post.get_image_readonly_urls(image_url_fields.values())
+    return dict(zip(image_url_fields.keys(), urls))
+
+
 @routes.register('Post.imageUploadUrl')
 def post_image_upload_url(caller_user_id, arguments, source=None, **kwargs):
     post_id = source['postId']
@@ -603,10 +637,14 @@ def post_image_upload_url(caller_user_id, arguments, source=None, **kwargs):
     return post.get_image_writeonly_url()
 
 
-@routes.register('Post.video')
-def post_video(caller_user_id, arguments, source=None, **kwargs):
-    post = post_manager.get_post(source['postId'])
+@routes.register_batch('Post.video')
+def post_videos(caller_user_id, sources_and_arguments, **kwargs):
+    post_ids = [source['postId'] for source, _ in sources_and_arguments]
+    posts = post_manager.get_posts(post_ids)
+    return [post_video(posts.get(post_id)) for post_id in post_ids]
+
 
+def post_video(post):
     statuses = (PostStatus.COMPLETED, PostStatus.ARCHIVED)
     if not post or post.type != PostType.VIDEO or post.status not in statuses:
         return None
@@ -810,7 +848,7 @@ def restore_archived_post(caller_user, arguments, **kwargs):
 
 
 @routes.register('Mutation.onymouslyLikePost')
-@validate_caller
+@validate_cached_caller
 @update_last_client
 def onymously_like_post(caller_user, arguments, **kwargs):
     post_id = arguments['postId']
@@ -830,7 +868,7 @@ def onymously_like_post(caller_user, arguments, **kwargs):
 
 
 @routes.register('Mutation.anonymouslyLikePost')
-@validate_caller
+@validate_cached_caller
 @update_last_client
 def anonymously_like_post(caller_user, arguments, **kwargs):
     post_id = arguments['postId']
@@ -875,7 +913,7 @@ def dislike_post(caller_user, arguments, **kwargs):
 
 
 @routes.register('Mutation.reportPostViews')
-@validate_caller
+@validate_cached_caller
 @update_last_client
 def report_post_views(caller_user, arguments, **kwargs):
     post_ids = arguments['postIds']
@@ -964,18 +1002,17 @@ def delete_card(caller_user, arguments, **kwargs):
     return card.serialize(caller_user.id)
 
 
-@routes.register('Card.thumbnail')
-def card_thumbnail(caller_user_id, arguments, source=None, **kwargs):
-    card = card_manager.get_card(source['cardId'])
-    if card and card.post and card.post.type != PostType.TEXT_ONLY:
-        return {
-            'url': card.post.get_image_readonly_url(image_size.NATIVE),
-            'url64p': card.post.get_image_readonly_url(image_size.P64),
-            'url480p': card.post.get_image_readonly_url(image_size.P480),
-            'url1080p': card.post.get_image_readonly_url(image_size.P1080),
-            'url4k': card.post.get_image_readonly_url(image_size.K4),
-        }
-    return None
+@routes.register_batch('Card.thumbnail')
+def card_thumbnails(caller_user_id, sources_and_arguments, **kwargs):
+    # the card may have been deleted since its source was read, in which case it has no thumbnail
+    cards = card_manager.get_cards(source['cardId'] for source, _ in sources_and_arguments)
+    posts = post_manager.get_posts(card.post_id for card in cards.values() if card.post_id)
+    resps = []
+    for source, _ in sources_and_arguments:
+        card = cards.get(source['cardId'])
+        post = posts.get(card.post_id) if card else None
+        resps.append(post_image_urls(post) if post and post.type != PostType.TEXT_ONLY else None)
+    return resps
 
 
 @routes.register('Mutation.addAlbum')
@@ -1041,16 +1078,13 @@ def delete_album(caller_user, arguments, **kwargs):
     return album.serialize(caller_user.id)
 
 
-@routes.register('Album.art')
-def album_art(caller_user_id, arguments, source=None, **kwargs):
-    album = album_manager.init_album(source)
-    return {
-        'url': album.get_art_image_url(image_size.NATIVE),
-        'url64p': album.get_art_image_url(image_size.P64),
-        'url480p': album.get_art_image_url(image_size.P480),
-        'url1080p': album.get_art_image_url(image_size.P1080),
-        'url4k': album.get_art_image_url(image_size.K4),
-    }
+@routes.register_batch('Album.art')
+def album_arts(caller_user_id, sources_and_arguments, **kwargs):
+    resps = []
+    for source, _ in sources_and_arguments:
+        album = album_manager.init_album(source)
+        resps.append({field: album.get_art_image_url(size) for field, size in image_url_fields.items()})
+    return resps
 
 
 @routes.register('Mutation.createDirectChat')
@@ -1151,7 +1185,7 @@ def leave_group_chat(caller_user, arguments, **kwargs):
 
 
 @routes.register('Mutation.reportChatViews')
-@validate_caller
+@validate_cached_caller
 @update_last_client
 def report_chat_views(caller_user, arguments, **kwargs):
     chat_ids = arguments['chatIds']
@@ -1186,7 +1220,7 @@ def flag_chat(caller_user, arguments, **kwargs):
 
 
 @routes.register('Mutation.addChatMessage')
-@validate_caller
+@validate_cached_caller
 @update_last_client
 def add_chat_message(caller_user, arguments, **kwargs):
     chat_id, message_id, text = arguments['chatId'], arguments['messageId'], arguments['text']
@@ -1200,8 +1234,9 @@ def add_chat_message(caller_user, arguments, **kwargs):
     except ChatException as err:
         raise ClientException(str(err)) from err
 
-    message.trigger_notifications(ChatMessageNotificationType.ADDED)
-    return message.serialize(caller_user.id)
+    context = user_manager.serializer_context()
+    message.trigger_notifications(ChatMessageNotificationType.ADDED, context=context)
+    return message.serialize(caller_user.id, context=context)
 
 
 @routes.register('Mutation.editChatMessage')
@@ -1219,8 +1254,9 @@ def edit_chat_message(caller_user, arguments, **kwargs):
     except ChatException as err:
         raise ClientException(str(err)) from err
 
-    message.trigger_notifications(ChatMessageNotificationType.EDITED)
-    return message.serialize(caller_user.id)
+    context = user_manager.serializer_context()
+    message.trigger_notifications(ChatMessageNotificationType.EDITED, context=context)
+    return message.serialize(caller_user.id, context=context)
 
 
 @routes.register('Mutation.deleteChatMessage')
@@ -1238,8 +1274,9 @@ def delete_chat_message(caller_user, arguments, **kwargs):
     except ChatException as err:
         raise ClientException(str(err)) from err
 
-    message.trigger_notifications(ChatMessageNotificationType.DELETED)
-    return message.serialize(caller_user.id)
+    context = user_manager.serializer_context()
+    message.trigger_notifications(ChatMessageNotificationType.DELETED, context=context)
+    return message.serialize(caller_user.id, context=context)
 
 
 @routes.register('Mutation.flagChatMessage')
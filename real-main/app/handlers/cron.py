@@ -1,5 +1,6 @@
 import logging
 import os
+import time
 
 import pendulum
 
@@ -12,14 +13,21 @@ S3_UPLOADS_BUCKET = os.environ.get('S3_UPLOADS_BUCKET')
 USER_NOTIFICATIONS_ENABLED = os.environ.get('USER_NOTIFICATIONS_ENABLED')
 USER_NOTIFICATIONS_ONLY_USERNAMES = os.environ.get('USER_NOTIFICATIONS_ONLY_USERNAMES')
 
+# stop starting new work this long before the lambda times out
+DELETE_USERS_MARGIN_SECONDS = 60
+
 logger = logging.getLogger()
 xray.patch_all()
 
+secrets_manager_client = clients.SecretsManagerClient()
 clients = {
     'appstore': clients.AppStoreClient(),
+    'appsync': clients.AppSyncClient(),
+    'cloudfront': clients.CloudFrontClient(secrets_manager_client.get_cloudfront_key_pair),
     'dynamo': clients.DynamoClient(),
     'cognito': clients.CognitoClient(),
     'pinpoint': clients.PinpointClient(),
+    'post_verification': clients.PostVerificationClient(secrets_manager_client.get_post_verification_api_creds),
     's3_uploads': clients.S3Client(S3_UPLOADS_BUCKET),
 }
 
@@ -70,6 +78,14 @@ def delete_older_expired_posts(event, context):
     post_manager.delete_older_expired_posts(now=now)
 
 
+@handler_logging
+def retry_post_verifications(event, context):
+    now = pendulum.now('utc')
+    total_cnt, verified_cnt = post_manager.retry_post_verifications(now=now)
+    with LogLevelContext(logger, logging.INFO):
+        logger.info(f'Post verifications retried successfully: {verified_cnt} out of {total_cnt}')
+
+
 @handler_logging
 def send_user_notifications(event, context):
     if not USER_NOTIFICATIONS_ENABLED:
@@ -80,9 +96,22 @@ def send_user_notifications(event, context):
     with LogLevelContext(logger, logging.INFO):
         logger.info(f'Preparing to send notifications as needed to users: {only_usernames or "all"}')
     now = pendulum.now('utc')
+    started_at = time.monotonic()
     total_cnt, success_cnt = card_manager.notify_users(now=now, only_usernames=only_usernames)
+    elapsed = time.monotonic() - started_at
     with LogLevelContext(logger, logging.INFO):
         logger.info(f'User notifications sent successfully: {success_cnt} out of {total_cnt}')
+        logger.info(f'User notifications took {elapsed:.1f}s, {total_cnt / max(elapsed, 0.001):.1f} per second')
+
+
+@handler_logging
+def delete_users(event, context):
+    deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - DELETE_USERS_MARGIN_SECONDS
+    finished = user_manager.run_delete_jobs(deadline=deadline)
+    with LogLevelContext(logger, logging.INFO):
+        for user_id, stage_counts in finished.items():
+            logger.info(f'User `{user_id}` deleted: {dict(sorted(stage_counts.items()))}')
+        logger.info(f'Users deleted: {len(finished)}')
 
 
 @handler_logging
@@ -17,13 +17,16 @@ S3_UPLOADS_BUCKET = os.environ.get('S3_UPLOADS_BUCKET')
 logger = logging.getLogger()
 xray.patch_all()
 
+secrets_manager_client = clients.SecretsManagerClient()
 clients = {
     'appstore': clients.AppStoreClient(),
     'appsync': clients.AppSyncClient(),
+    'cloudfront': clients.CloudFrontClient(secrets_manager_client.get_cloudfront_key_pair),
     'dynamo': clients.DynamoClient(),
     'dynamo_feed': clients.DynamoClient(table_name=DYNAMO_FEED_TABLE),
     'elasticsearch': clients.ElasticSearchClient(),
     'pinpoint': clients.PinpointClient(),
+    'post_verification': clients.PostVerificationClient(secrets_manager_client.get_post_verification_api_creds),
     's3_uploads': clients.S3Client(S3_UPLOADS_BUCKET),
 }
 
@@ -144,6 +147,7 @@ register(
     {'verificationHidden': False},
 )
 register('post', '-', ['MODIFY'], post_manager.on_post_status_change_fire_gql_notifications, {'postStatus': None})
+register('post', '-', ['MODIFY'], post_manager.on_post_status_change_verify_image, {'postStatus': None})
 register('post', '-', ['MODIFY'], user_manager.on_post_status_change_sync_counts, {'postStatus': None})
 register('post', '-', ['REMOVE'], card_manager.on_post_delete_delete_cards)
 register('post', '-', ['REMOVE'], post_manager.on_item_delete_delete_flags)
@@ -224,6 +228,18 @@ register(
     user_manager.sync_pinpoint_user_status,
     {'userStatus': UserStatus.ACTIVE},
 )
+register(
+    'user',
+    'profile',
+    ['MODIFY'],
+    user_manager.on_user_status_change_bump_caller_cache_version,
+    {'userStatus': UserStatus.ACTIVE},
+)
+register('user', 'profile', ['REMOVE'], user_manager.on_user_status_change_bump_caller_cache_version)
+register(
+    'user', 'profile', ['MODIFY'], user_manager.on_username_change_bump_username_cache_version, {'username': None}
+)
+register('user', 'profile', ['REMOVE'], user_manager.on_username_change_bump_username_cache_version)
 register(
     'user',
     'profile',
@@ -266,26 +282,32 @@ register('user', 'profile', ['REMOVE'], user_manager.on_user_delete)
 
 @handler_logging
 def process_records(event, context):
-    for record in event['Records']:
+    # elasticsearch updates are collapsed to the latest per user and sent in bulk at the end of the batch,
+    # and likewise pinpoint endpoint changes are merged per user and sent with its batch api
+    with clients['elasticsearch'].batch(), clients['pinpoint'].batch():
+        for record in event['Records']:
+            process_record(record)
 
-        name = record['eventName']
-        pk = deserialize(record['dynamodb']['Keys']['partitionKey'])
-        sk = deserialize(record['dynamodb']['Keys']['sortKey'])
-        old_item = {k: deserialize(v) for k, v in record['dynamodb'].get('OldImage', {}).items()}
-        new_item = {k: deserialize(v) for k, v in record['dynamodb'].get('NewImage', {}).items()}
 
-        with LogLevelContext(logger, logging.INFO):
-            logger.info(f'{name}: `{pk}` / `{sk}` starting processing')
+def process_record(record):
+    name = record['eventName']
+    pk = deserialize(record['dynamodb']['Keys']['partitionKey'])
+    sk = deserialize(record['dynamodb']['Keys']['sortKey'])
+    old_item = {k: deserialize(v) for k, v in record['dynamodb'].get('OldImage', {}).items()}
+    new_item = {k: deserialize(v) for k, v in record['dynamodb'].get('NewImage', {}).items()}
 
-        # we still have some pks in an old (& deprecated) format with more than one item_id in the pk
-        pk_prefix, item_id = pk.split('/')[:2]
-        sk_prefix = sk.split('/')[0]
+    with LogLevelContext(logger, logging.INFO):
+        logger.info(f'{name}: `{pk}` / `{sk}` starting processing')
 
-        item_kwargs = {k: v for k, v in {'new_item': new_item, 'old_item': old_item}.items() if v}
-        for func in dispatch.search(pk_prefix, sk_prefix, name, old_item, new_item):
-            with LogLevelContext(logger, logging.INFO):
-                logger.info(f'{name}: `{pk}` / `{sk}` running: {func}')
-            try:
-                func(item_id, **item_kwargs)
-            except Exception as err:
-                logger.exception(str(err))
+    # we still have some pks in an old (& deprecated) format with more than one item_id in the pk
+    pk_prefix, item_id = pk.split('/')[:2]
+    sk_prefix = sk.split('/')[0]
+
+    item_kwargs = {k: v for k, v in {'new_item': new_item, 'old_item': old_item}.items() if v}
+    for func in dispatch.search(pk_prefix, sk_prefix, name, old_item, new_item):
+        with LogLevelContext(logger, logging.INFO):
+            logger.info(f'{name}: `{pk}` / `{sk}` running: {func}')
+        try:
+            func(item_id, **item_kwargs)
+        except Exception as err:
+            logger.exception(str(err))
@@ -0,0 +1,131 @@
+"""
+Per-call metrics of lambda handlers: wall time, cold or warm start, and the count & latency of
+calls to the services we depend on. Emitted as CloudWatch embedded metric format lines.
+
+https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+"""
+import collections
+import contextlib
+import json
+import random
+import threading
+import time
+
+import botocore.client
+import requests
+
+# botocore service name -> our name for the dependency, other aws services are lumped together
+AWS_DEPENDENCY_NAMES = {
+    'cognito-identity': 'cognito',
+    'cognito-idp': 'cognito',
+    'dynamodb': 'dynamo',
+    's3': 's3',
+}
+OTHER_AWS_DEPENDENCY_NAME = 'aws'
+
+_cold_start = True
+_current = None  # the Recording in progress, at most one per lambda process
+_patched = False
+
+
+class Recording:
+    "Counts & latencies of the dependency calls made during one handler call, from any thread"
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.seconds = collections.Counter()
+        self.lock = threading.Lock()
+
+    def add(self, dependency, seconds):
+        with self.lock:
+            self.counts[dependency] += 1
+            self.seconds[dependency] += seconds
+
+
+def is_cold_start():
+    "True until the first recording in this lambda process has started"
+    return _cold_start
+
+
+@contextlib.contextmanager
+def timed_dependency(dependency):
+    "Context manager to record a call to a dependency, if a recording is in progress"
+    recording = _current
+    if recording is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recording.add(dependency, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def record(namespace, dimensions, sample_rate, **properties):
+    """
+    Context manager to record the metrics of one handler call. Emitted for a random `sample_rate`
+    fraction of calls, and always for cold starts.
+    """
+    global _cold_start, _current
+    cold_start, _cold_start = _cold_start, False
+    recording = _current = Recording()
+    start = time.perf_counter()
+    try:
+        yield recording
+    finally:
+        wall_seconds = time.perf_counter() - start
+        _current = None
+        if cold_start or random.random() < sample_rate:
+            print(format_line(namespace, dimensions, recording, wall_seconds, cold_start, properties), flush=True)
+
+
+def format_line(namespace, dimensions, recording, wall_seconds, cold_start, properties):
+    values = {'wallTime': wall_seconds * 1000, 'coldStart': int(cold_start)}
+    units = {'wallTime': 'Milliseconds', 'coldStart': 'Count'}
+    for dependency, count in sorted(recording.counts.items()):
+        values[f'{dependency}Calls'] = count
+        values[f'{dependency}Time'] = recording.seconds[dependency] * 1000
+        units[f'{dependency}Calls'] = 'Count'
+        units[f'{dependency}Time'] = 'Milliseconds'
+    data = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [
+                {
+                    'Namespace': namespace,
+                    'Dimensions': [list(dimensions.keys())],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, unit in units.items()],
+                }
+            ],
+        },
+        **dimensions,
+        **properties,
+        **values,
+    }
+    return json.dumps(data)
+
+
+def patch_all():
+    "Wrap botocore & requests so their calls are recorded. Idempotent."
+    global _patched
+    if _patched:
+        return
+    _patched = True
+
+    make_api_call = botocore.client.BaseClient._make_api_call
+
+    def _make_api_call(client, operation_name, api_params):
+        service_name = client.meta.service_model.service_name
+        with timed_dependency(AWS_DEPENDENCY_NAMES.get(service_name, OTHER_AWS_DEPENDENCY_NAME)):
+            return make_api_call(client, operation_name, api_params)
+
+    botocore.client.BaseClient._make_api_call = _make_api_call
+
+    send = requests.Session.send
+
+    def _send(session, request, **kwargs):
+        with timed_dependency('http'):
+            return send(session, request, **kwargs)
+
+    requests.Session.send = _send
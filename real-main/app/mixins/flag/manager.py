@@ -15,9 +15,13 @@ class FlagManagerMixin:
             self.flag_dynamo = FlagDynamo(self.item_type, clients['dynamo'])
 
     def unflag_all_by_user(self, user_id):
+        "Returns count of items unflagged"
+        cnt = 0
         for item_id in self.flag_dynamo.generate_item_ids_by_user(user_id):
             # this could be performance and edge-case optimized
             self.get_model(item_id).unflag(user_id)
+            cnt += 1
+        return cnt
 
     def on_flag_add(self, item_id, new_item):
         raise NotImplementedError('Subclasses must implement')
@@ -45,8 +45,12 @@ class AlbumManager:
         return self.init_album(album_item)
 
     def delete_all_by_user(self, user_id):
+        "Returns count of albums deleted"
+        cnt = 0
         for album_item in self.dynamo.generate_by_user(user_id):
             self.init_album(album_item).delete()
+            cnt += 1
+        return cnt
 
     def garbage_collect(self, now=None):
         now = now or pendulum.now('utc')
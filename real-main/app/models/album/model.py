@@ -1,12 +1,14 @@
+import concurrent.futures
 import hashlib
-import io
 import itertools
 import logging
 import os
 
 import PIL.Image
 
-from app.utils import image_size
+from app.models.post.enums import PostType
+from app.utils import LruCache, image_size
+from app.utils.memory_budget import pil_image_bytes
 
 from . import art
 from .exceptions import AlbumException
@@ -15,11 +17,17 @@ logger = logging.getLogger()
 
 CLOUDFRONT_FRONTEND_RESOURCES_DOMAIN = os.environ.get('CLOUDFRONT_FRONTEND_RESOURCES_DOMAIN')
 
+# bound on the posts fetched & images encoded and uploaded in parallel when generating art
+ART_MAX_WORKERS = 8
 
-class Album:
+# Tiles of posts' images rendered for their cells, keyed by (post_id, text, cell_dimensions), bounded by
+# their decoded size. The tiles of any one grid together cover a full art image (~25MB whether 2x2 or 4x4),
+# so room for two lets an album's tiles survive a change of posts alongside those that replaced them.
+ART_TILE_CACHE_BYTES = 2 * art.OUTPUT_DIMENSIONS[0] * art.OUTPUT_DIMENSIONS[1] * 3
+art_tile_cache = LruCache(ART_TILE_CACHE_BYTES, sizeof=pil_image_bytes)
 
-    jpeg_content_type = 'image/jpeg'
 
+class Album:
     def __init__(
         self,
         album_item,
@@ -120,21 +128,20 @@ class Album:
         if new_art_hash == old_art_hash:
             return self  # no changes
 
-        posts = [self.post_manager.get_post(post_id) for post_id in post_ids]
-        if len(posts) == 0:
+        if len(post_ids) == 0:
             new_native_image = None
-        elif len(posts) == 1:
-            new_native_image = posts[0].k4_jpeg_cache.readonly_image
+        elif len(post_ids) == 1:
+            post = self.post_manager.get_post(post_ids[0])
+            new_native_image = post.get_image_covering(art.OUTPUT_DIMENSIONS)
         else:
-            images = [post.p1080_jpeg_cache.readonly_image for post in posts]
-            new_native_image = art.generate_zoomed_grid(images)
+            cell_dimensions = art.get_cell_dimensions(len(post_ids))
+            posts = self.post_manager.get_posts(post_ids, with_image_items=True)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=ART_MAX_WORKERS) as executor:
+                tiles = list(executor.map(lambda pid: self.get_art_tile(posts[pid], cell_dimensions), post_ids))
+            new_native_image = art.paste_grid(tiles)
 
         if new_native_image:
-            # convert to jpeg
-            buf_out = io.BytesIO()
-            new_native_image.save(buf_out, format='JPEG', quality=100)
-            buf_out.seek(0)
-            self.save_art_images(new_art_hash, buf_out)
+            self.save_art_images(new_art_hash, new_native_image)
 
         self.item = self.dynamo.set_album_art_hash(self.id, new_art_hash)
 
@@ -145,22 +152,42 @@ class Album:
 
     def delete_art_images(self, art_hash):
         # remove the images from s3
-        for size in image_size.JPEGS:
-            path = self.get_art_image_path(size, art_hash=art_hash)
-            self.s3_uploads_client.delete_object(path)
-
-    def save_art_images(self, art_hash, native_image_buf):
-        # save the native size to S3
-        path = self.get_art_image_path(image_size.NATIVE, art_hash=art_hash)
-        self.s3_uploads_client.put_object(path, native_image_buf.read(), self.jpeg_content_type)
-
-        # generate and save thumbnails
-        native_image_buf.seek(0)
-        image = PIL.Image.open(native_image_buf)
+        # by prefix, to include any variants built on demand by cloudfront
+        prefix = '/'.join([self.get_art_image_path_prefix(), art_hash, ''])
+        self.s3_uploads_client.delete_objects_with_prefix(prefix)
+
+    def get_art_tile(self, post, cell_dimensions):
+        """
+        The post's image, zoomed & cropped to fill a cell of the art grid.
+
+        Tiles are cached across albums and calls, so when one post in an album changes only that post's
+        tile needs to be fetched and rendered. Text-only posts are keyed by their text, as it can be edited.
+        """
+        text = post.item['text'] if post.type == PostType.TEXT_ONLY else None
+        key = (post.id, text, cell_dimensions)
+        if (tile := art_tile_cache.get(key)) is None:
+            tile = art.generate_zoomed_tile(post.get_image_covering(cell_dimensions), cell_dimensions)
+            art_tile_cache.put(key, tile)
+        return tile
+
+    def save_art_images(self, art_hash, native_image):
+        "Encode the native image and its thumbnails, uploading them to S3 in parallel"
+        images = {image_size.NATIVE: native_image}
+        image = native_image
         for size in image_size.THUMBNAILS:  # ordered by decreasing size
-            image.thumbnail(size.max_dimensions, resample=PIL.Image.LANCZOS)
-            in_mem_file = io.BytesIO()
-            image.save(in_mem_file, format='JPEG', quality=100, icc_profile=image.info.get('icc_profile'))
-            in_mem_file.seek(0)
+            dimensions = size.get_thumbnail_dimensions(*image.size)
+            if dimensions != image.size:
+                image = image.resize(dimensions, resample=PIL.Image.LANCZOS, reducing_gap=2.0)
+            else:
+                # Image.save() mutates the image, so concurrent encodes can't share one
+                image = image.copy()
+            images[size] = image
+
+        def save(size, image):
             path = self.get_art_image_path(size, art_hash=art_hash)
-            self.s3_uploads_client.put_object(path, in_mem_file.read(), self.jpeg_content_type)
+            self.s3_uploads_client.put_object(path, size.encoder.encode(image), size.encoder.content_type)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=ART_MAX_WORKERS) as executor:
+            futures = [executor.submit(save, size, image) for size, image in images.items()]
+        for future in futures:
+            future.result()  # re-raise any errors
@@ -61,11 +61,11 @@ class BlockDynamo:
             self.pk(blocker_user_id, block_item['blockedUserId'])
             for block_item in self.generate_blocks_by_blocker(blocker_user_id)
         )
-        self.client.batch_delete_items(key_generator)
+        return self.client.batch_delete_items(key_generator)
 
     def delete_all_blocks_of_user(self, blocked_user_id):
         key_generator = (
             self.pk(block_item['blockerUserId'], blocked_user_id)
             for block_item in self.generate_blocks_by_blocked(blocked_user_id)
         )
-        self.client.batch_delete_items(key_generator)
+        return self.client.batch_delete_items(key_generator)
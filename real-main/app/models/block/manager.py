@@ -65,6 +65,6 @@ class BlockManager:
         """
         Unblock everyone who the user has blocked, or has blocked the user.
         Intended to be called with admin-level authentication (not authenticated as the user themselves).
+        Returns count of blocks removed.
         """
-        self.dynamo.delete_all_blocks_by_user(user_id)
-        self.dynamo.delete_all_blocks_of_user(user_id)
+        return self.dynamo.delete_all_blocks_by_user(user_id) + self.dynamo.delete_all_blocks_of_user(user_id)
@@ -1,3 +1,4 @@
+import concurrent.futures
 import logging
 
 import pendulum
@@ -6,6 +7,9 @@ from .exceptions import CardAlreadyExists
 
 logger = logging.getLogger()
 
+# bound on the updates in flight at once when clearing notify_user_at of many cards
+CLEAR_MAX_WORKERS = 8
+
 
 class CardDynamo:
     def __init__(self, dynamo_client):
@@ -20,6 +24,10 @@ class CardDynamo:
     def get_card(self, card_id, strongly_consistent=False):
         return self.client.get_item(self.pk(card_id), ConsistentRead=strongly_consistent)
 
+    def batch_get_cards(self, card_ids):
+        "Get many cards in as few requests as possible. Order not maintained, cards that don't exist omitted."
+        return self.client.batch_get(self.pk(card_id) for card_id in card_ids)
+
     def add_card(
         self,
         card_id,
@@ -79,6 +87,24 @@ class CardDynamo:
         }
         return self.client.update_item(query_kwargs)
 
+    def clear_notify_user_at_batch(self, card_ids):
+        """
+        Clear notify_user_at of many cards, with concurrent updates. A card that has since been deleted
+        is skipped with a logged warning, and doesn't stop the others from being cleared.
+        """
+
+        def clear(card_id):
+            query_kwargs = {
+                'Key': self.pk(card_id),
+                'UpdateExpression': 'REMOVE gsiK1PartitionKey, gsiK1SortKey',
+            }
+            self.client.update_item(query_kwargs, failure_warning=f'No card `{card_id}` to clear')
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=CLEAR_MAX_WORKERS) as executor:
+            futures = [executor.submit(clear, card_id) for card_id in card_ids]
+        for future in futures:
+            future.result()  # re-raise any errors
+
     def generate_cards_by_user(self, user_id, pks_only=False):
         query_kwargs = {
             'KeyConditionExpression': 'gsiA1PartitionKey = :pk AND begins_with(gsiA1SortKey, :sk_prefix)',
@@ -112,6 +138,11 @@ class CardDynamo:
         return self.client.generate_all_query(query_kwargs)
 
     def generate_card_ids_by_notify_user_at(self, cutoff_at, only_user_ids=None):
+        gen = self.generate_user_card_ids_by_notify_user_at(cutoff_at, only_user_ids=only_user_ids)
+        return (card_id for user_id, card_id in gen)
+
+    def generate_user_card_ids_by_notify_user_at(self, cutoff_at, only_user_ids=None):
+        "Generate (userId, cardId) tuples of cards to notify their users of at or before `cutoff_at`"
         query_kwargs = {
             'KeyConditionExpression': 'gsiK1PartitionKey = :c AND gsiK1SortKey < :at_trailing',
             'ExpressionAttributeValues': {':c': 'card', ':at_trailing': cutoff_at.to_iso8601_string() + '/~'},
@@ -120,7 +151,7 @@ class CardDynamo:
         gen = self.client.generate_all_query(query_kwargs)
         # Note dynamo does not let you apply a FilterExpression to the index/key used in a query
         # 'Filter Expression can only contain non-primary key attributes'
+        gen = ((item['gsiK1SortKey'].split('/')[-1], item['partitionKey'].split('/')[1]) for item in gen)
         if only_user_ids:
-            gen = (item for item in gen if item['gsiK1SortKey'].split('/')[-1] in only_user_ids)
-        gen = (item['partitionKey'].split('/')[1] for item in gen)
+            gen = ((user_id, card_id) for user_id, card_id in gen if user_id in only_user_ids)
         return gen
@@ -1,9 +1,13 @@
+import collections
+import concurrent.futures
+import itertools
 import logging
 from functools import partialmethod
 
 import pendulum
 
 from app import models
+from app.utils import RateLimiter
 
 from . import templates
 from .appsync import CardAppSync
@@ -14,6 +18,12 @@ from .model import Card
 
 logger = logging.getLogger()
 
+# users whose notifications are sent concurrently, and users whose cards are loaded together
+NOTIFY_USERS_MAX_WORKERS = 16
+NOTIFY_USERS_LOAD_CHUNK_SIZE = 50
+# keep well under pinpoint's throttling of send_users_messages
+NOTIFY_USERS_MAX_SENDS_PER_SECOND = 50
+
 
 class CardManager:
     def __init__(self, clients, managers=None):
@@ -34,6 +44,10 @@ class CardManager:
         item = self.dynamo.get_card(card_id, strongly_consistent=strongly_consistent)
         return self.init_card(item) if item else None
 
+    def get_cards(self, card_ids):
+        "Bulk load cards, returning a dict of card_id -> Card for those that exist"
+        return {card.id: card for card in map(self.init_card, self.dynamo.batch_get_cards(set(card_ids)))}
+
     def init_card(self, item):
         kwargs = {
             'appsync': getattr(self, 'appsync', None),
@@ -83,6 +97,10 @@ class CardManager:
         """
         Send out push notifications to all users for cards as needed.
         Use `only_usernames` if you don't want to send notifcations to all users.
+
+        Due cards are grouped by user and loaded in batches. Each user's notifications are sent in order,
+        with up to NOTIFY_USERS_MAX_WORKERS users in flight at once and sends to pinpoint rate limited.
+        Returns counts of (notifications attempted, notifications sent successfully).
         """
         # determine which users we should be sending notifcations to, if we're only doing some
         if only_usernames is None:
@@ -90,17 +108,59 @@ class CardManager:
         elif only_usernames == []:
             return 0, 0
         else:
-            only_users = [self.user_manager.get_user_by_username(username) for username in only_usernames]
-            only_user_ids = [user.id for user in only_users if user]
-
-        # send on notifcations for cards for those users
-        now = pendulum.now('utc')
+            only_user_ids = list(self.user_manager.get_user_ids_by_usernames(only_usernames).values())
+            if not only_user_ids:
+                return 0, 0
+
+        # group the due cards by user, in the order their first notification came due
+        now = now or pendulum.now('utc')
+        card_ids_by_user = collections.defaultdict(list)
+        for user_id, card_id in self.dynamo.generate_user_card_ids_by_notify_user_at(
+            now, only_user_ids=only_user_ids
+        ):
+            card_ids_by_user[user_id].append(card_id)
+
+        # send on notifcations for cards for those users, loading the cards of a chunk of users at a time
+        rate_limiter = RateLimiter(NOTIFY_USERS_MAX_SENDS_PER_SECOND, burst=NOTIFY_USERS_MAX_WORKERS)
+        user_card_ids = iter(card_ids_by_user.values())
+        with concurrent.futures.ThreadPoolExecutor(max_workers=NOTIFY_USERS_MAX_WORKERS) as executor:
+            futures = []
+            while chunk := list(itertools.islice(user_card_ids, NOTIFY_USERS_LOAD_CHUNK_SIZE)):
+                card_items = self.dynamo.batch_get_cards(itertools.chain.from_iterable(chunk))
+                cards_by_id = {card.id: card for card in map(self.init_card, card_items)}
+                for card_ids in chunk:
+                    cards = [cards_by_id[card_id] for card_id in card_ids if card_id in cards_by_id]
+                    futures.append(executor.submit(self.notify_user_of_cards, cards, rate_limiter))
+            counts = [future.result() for future in futures]
+        return sum(cnt for cnt, _ in counts), sum(cnt for _, cnt in counts)
+
+    def notify_user_of_cards(self, cards, rate_limiter):
+        """
+        Send the notifications for one user's cards, in order, then clear the notify_user_at of those sent.
+        Errors are logged rather than raised. The cards not sent are left to be retried by a later run.
+        Returns counts of (notifications attempted, notifications sent successfully).
+        """
         total_count, success_count = 0, 0
-        for card_id in self.dynamo.generate_card_ids_by_notify_user_at(now, only_user_ids=only_user_ids):
-            card = self.get_card(card_id)
-            success_count += card.notify_user()
-            total_count += 1
-            card.clear_notify_user_at()
+        sent_card_ids = []
+        try:
+            for card in cards:
+                rate_limiter.acquire()
+                success_count += card.notify_user()
+                total_count += 1
+                sent_card_ids.append(card.id)
+        except Exception as err:
+            logger.exception(f'Unable to send notifications for cards of user `{cards[0].user_id}`: {err}')
+
+        # clear the cards sent even if a later one failed, so they don't get sent again
+        try:
+            self.dynamo.clear_notify_user_at_batch(sent_card_ids)
+        except Exception as err:
+            logger.warning(f'Unable to clear notify_user_at of cards in batch, clearing one by one: {err}')
+            for card_id in sent_card_ids:
+                try:
+                    self.dynamo.clear_notify_user_at(card_id)
+                except Exception as card_err:
+                    logger.exception(f'Unable to clear notify_user_at of card `{card_id}`: {card_err}')
         return total_count, success_count
 
     def on_card_add(self, card_id, new_item):
@@ -111,7 +111,9 @@ class ChatManager(FlagManagerMixin, ViewManagerMixin, ManagerBase):
         return self.get_chat(chat_id, strongly_consistent=True)
 
     def leave_all_chats(self, user_id):
+        "Returns count of chats left"
         user = None
+        cnt = 0
         for chat_id in self.member_dynamo.generate_chat_ids_by_user(user_id):
             chat = self.get_chat(chat_id)
             if not chat:
@@ -122,6 +124,8 @@ class ChatManager(FlagManagerMixin, ViewManagerMixin, ManagerBase):
             else:
                 user = user or self.user_manager.get_user(user_id)
                 chat.leave(user)
+            cnt += 1
+        return cnt
 
     def record_views(self, chat_ids, user_id, viewed_at=None):
         for chat_id, view_count in dict(collections.Counter(chat_ids)).items():
@@ -9,7 +9,7 @@ class ChatMessageAppSync:
     def __init__(self, appsync_client):
         self.client = appsync_client
 
-    def trigger_notification(self, notification_type, user_id, message):
+    def trigger_notification(self, notification_type, user_id, message, context=None):
         mutation = gql.gql(
             '''
             mutation TriggerChatMessageNotification ($input: ChatMessageNotificationInput!) {
@@ -48,7 +48,7 @@ class ChatMessageAppSync:
             'messageId': message.id,
             'chatId': message.chat_id,
             'authorUserId': message.user_id,
-            'authorEncoded': message.get_author_encoded(user_id),
+            'authorEncoded': message.get_author_encoded(user_id, context=context),
             'type': notification_type,
             'text': message.item['text'],
             'textTaggedUserIds': message.item.get('textTags', []),
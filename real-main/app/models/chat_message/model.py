@@ -1,4 +1,5 @@
 import decimal
+import itertools
 import json
 import logging
 
@@ -65,9 +66,12 @@ class ChatMessage(FlagModelMixin):
         self.item = self.dynamo.get_chat_message(self.id, strongly_consistent=strongly_consistent)
         return self
 
-    def serialize(self, caller_user_id):
+    def serialize(self, caller_user_id, context=None):
         resp = self.item.copy()
-        resp['author'] = self.user_manager.get_user(self.user_id).serialize(caller_user_id)
+        if context:
+            resp['author'] = context.serialize_user(self.user_id, caller_user_id)
+        else:
+            resp['author'] = self.user_manager.get_user(self.user_id).serialize(caller_user_id)
         return resp
 
     def edit(self, text, now=None):
@@ -89,7 +93,7 @@ class ChatMessage(FlagModelMixin):
             raise ChatMessageException(f'User is not part of chat of message `{self.id}`')
         return super().flag(user)
 
-    def trigger_notifications(self, notification_type, user_ids=None):
+    def trigger_notifications(self, notification_type, user_ids=None, context=None):
         """
         Trigger onChatMessageNotification to be sent to clients.
 
@@ -97,32 +101,37 @@ class ChatMessage(FlagModelMixin):
         sent to those user_ids even if they aren't found as members in the DB.
         This is useful when members of the chat have just been added and thus
         dynamo may not have converged yet.
+
+        The author and their relationships with all the recipients are loaded in bulk,
+        into `context` if given, so the author can be serialized for each recipient.
         """
-        user_ids = user_ids or []
+        recipient_user_ids = []
         already_notified_user_ids = set([self.user_id])  # don't notify the msg author
-
-        for user_id in user_ids:
+        member_user_ids = self.chat_manager.member_dynamo.generate_user_ids_by_chat(self.chat_id)
+        for user_id in itertools.chain(user_ids or [], member_user_ids):
             if user_id in already_notified_user_ids:
                 continue
-            self.appsync.trigger_notification(notification_type, user_id, self)
+            recipient_user_ids.append(user_id)
             already_notified_user_ids.add(user_id)
 
-        for user_id in self.chat_manager.member_dynamo.generate_user_ids_by_chat(self.chat_id):
-            if user_id in already_notified_user_ids:
-                continue
-            self.appsync.trigger_notification(notification_type, user_id, self)
+        context = context or self.user_manager.serializer_context()
+        if self.user_id:
+            context.prefetch([self.user_id], recipient_user_ids)
+        for user_id in recipient_user_ids:
+            self.appsync.trigger_notification(notification_type, user_id, self, context=context)
 
-    def get_author_encoded(self, user_id):
+    def get_author_encoded(self, user_id, context=None):
         """
         Return the author in a serialized, stringified form if they exist and there is no
         blocking relationship between the given user and the author.
         """
-        if not self.author:
+        author = context.get_user(self.user_id) if context and self.user_id else self.author
+        if not author:
             return None
-        serialized = self.author.serialize(user_id)
+        serialized = author.serialize(user_id, context=context)
         if serialized['blockerStatus'] == BlockStatus.BLOCKING:
             return None
-        serialized['blockedStatus'] = self.block_manager.get_block_status(user_id, self.author.id)
+        serialized['blockedStatus'] = (context or self.block_manager).get_block_status(user_id, author.id)
         if serialized['blockedStatus'] == BlockStatus.BLOCKING:
             return None
         return json.dumps(serialized, cls=DecimalJsonEncoder)
@@ -61,6 +61,14 @@ class CommentDynamo:
         }
         return self.client.generate_all_query(query_kwargs)
 
+    def generate_pks_by_post(self, post_id):
+        query_kwargs = {
+            'KeyConditionExpression': Key('gsiA1PartitionKey').eq(f'comment/{post_id}'),
+            'IndexName': 'GSI-A1',
+            'ProjectionExpression': 'partitionKey, sortKey',
+        }
+        return self.client.generate_all_query(query_kwargs)
+
     def generate_by_user(self, user_id):
         query_kwargs = {
             'KeyConditionExpression': Key('gsiA2PartitionKey').eq(f'comment/{user_id}'),
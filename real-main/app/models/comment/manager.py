@@ -80,8 +80,12 @@ class CommentManager(FlagManagerMixin, ManagerBase):
         return self.init_comment(comment_item)
 
     def delete_all_by_user(self, user_id):
+        "Returns count of comments deleted"
+        cnt = 0
         for comment_item in self.dynamo.generate_by_user(user_id):
             self.init_comment(comment_item).delete()
+            cnt += 1
+        return cnt
 
     def delete_all_on_post(self, post_id):
         for comment_item in self.dynamo.generate_by_post(post_id):
@@ -103,6 +103,8 @@ class FollowerManager:
             self.dynamo.delete_following(item)
 
     def reset_follower_items(self, followed_user_id):
+        "Returns count of follower items reset"
+        cnt = 0
         for item in self.dynamo.generate_follower_items(followed_user_id):
             # they were following us, then do an unfollow() to keep their counts correct
             if item['followStatus'] == FollowStatus.FOLLOWING:
@@ -110,8 +112,12 @@ class FollowerManager:
             else:
                 # TODO: do as batch write
                 self.dynamo.delete_following(item)
+            cnt += 1
+        return cnt
 
     def reset_followed_items(self, follower_user_id):
+        "Returns count of followed items reset"
+        cnt = 0
         for item in self.dynamo.generate_followed_items(follower_user_id):
             # if we were following them, then do an unfollow() to keep their counts correct
             if item['followStatus'] == FollowStatus.FOLLOWING:
@@ -119,6 +125,8 @@ class FollowerManager:
             else:
                 # TODO: do as batch write
                 self.dynamo.delete_following(item)
+            cnt += 1
+        return cnt
 
     def refresh_first_story(self, story_prev=None, story_now=None):
         "Refresh the firstStory items, if needed, after the a story has changed."
@@ -73,9 +73,12 @@ class LikeManager:
             self.init_like(like_item).dislike()
 
     def dislike_all_by_user(self, liked_by_user_id):
-        "Dislike all likes by a user"
+        "Dislike all likes by a user. Returns count of likes disliked."
+        cnt = 0
         for like_item in self.dynamo.generate_by_liked_by(liked_by_user_id):
             self.init_like(like_item).dislike()
+            cnt += 1
+        return cnt
 
     def dislike_all_by_user_from_user(self, liked_by_user_id, posted_by_user_id):
         "Dislike all likes by one user on posts from another user"
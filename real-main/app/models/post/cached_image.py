@@ -4,11 +4,32 @@ import PIL.Image
 import PIL.ImageOps
 import pyheif
 
+from app.utils.image_size import NATIVE
+from app.utils.memory_budget import pil_image_bytes
+
 from .exceptions import PostException
 
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_ORIENTATIONS_TRANSPOSED = (5, 6, 7, 8)  # orientations that swap width and height
+
 
 class CachedImage:
-    def __init__(self, post_id, image_size=None, s3_client=None, s3_path=None, source=None, content_type=None):
+    def __init__(
+        self,
+        post_id,
+        image_size=None,
+        s3_client=None,
+        s3_path=None,
+        source=None,
+        content_type=None,
+        fallback=None,
+        memory_budget=None,
+    ):
+        """
+        If a `fallback` is passed in, it is called to build the image if the S3 object doesn't exist.
+        If a `memory_budget` is passed in, the bytes held by this cache are accounted against it.
+        Multiple caches may share one, to track the peak memory used across all of a post's images.
+        """
         assert (s3_client and s3_path) or source, 'Either s3 kwargs or source kwargs required'
 
         self.post_id = post_id
@@ -16,17 +37,21 @@ class CachedImage:
         self.s3_client = s3_client
         self.s3_path = s3_path
         self.source = source
+        self.fallback = fallback
         self.content_type = content_type or (image_size.content_type if image_size else None)
+        self.memory_budget = memory_budget
 
         # if self._image is set, that's the latest data
         # if self._image is not set, then self._data will contain the latest data
         self._data = None
         self._image = None
+        self._held_bytes = 0
+        self._dimensions = None  # remembered from the image header when we decoded at reduced scale
 
         # Possible values and meanings:
         #   - True: what's in the cache is known to match the source
         #   - False: what's in the cache is thought to be different than the source
-        #   - None: cache has never been filled
+        #   - None: cache has never been filled, or was released
         self.is_synced = None
 
     @property
@@ -35,65 +60,160 @@ class CachedImage:
         It's not really readonly, the name is just to scare the client into not mutating it.
         Use readonly_image.copy() first if you want to make changes.
         """
-        if not self._image and not self._data:
+        if not self._image and not self._data and self.source:
             self.refresh()
-        if not self._image and self._data:
-            self._fill_image_from_data()
+        if not self._image:
+            fetching = not self._data
+            try:
+                fh = self._open()
+            except PostException:
+                if not self.fallback:
+                    raise
+                # not built & stored yet, so build it now. It's not in S3, so the cache isn't synced.
+                self._hold(image=self.fallback())
+                self.is_synced = False
+                return self._image
+            image, _ = self._decode(fh)
+            if fetching:
+                self.is_synced = True
+            # once decoded, there's no need to keep the encoded data around if it can be re-fetched
+            self._hold(data=None if self.is_synced else self._data, image=image)
         return self._image
 
-    def _fill_image_from_data(self):
-        fh = io.BytesIO(self._data)
+    @property
+    def is_decoded(self):
+        return self._image is not None
+
+    @property
+    def held_bytes(self):
+        "Approximate bytes of encoded data and decoded pixels held in memory"
+        return self._held_bytes
+
+    def _hold(self, data=None, image=None):
+        self._data = data
+        self._image = image
+        self._dimensions = None
+        held_bytes = (len(data) if data else 0) + (pil_image_bytes(image) if image else 0)
+        if self.memory_budget:
+            self.memory_budget.acquire(held_bytes)
+            self.memory_budget.release(self._held_bytes)
+        self._held_bytes = held_bytes
+
+    def _open(self):
+        """
+        A readable file handle on the encoded image.
+        If we don't have the data in memory, the S3 object is streamed straight into the decoder
+        without being kept around.
+        """
+        return io.BytesIO(self._data) if self._data else self._stream()
+
+    def _stream(self):
+        try:
+            return self.s3_client.get_object_data_stream(self.s3_path)
+        except self.s3_client.exceptions.NoSuchKey as err:
+            raise PostException(f'{self.s3_path} image data not found for post `{self.post_id}`') from err
+
+    def _decode(self, fh, image_size=None, reducing_gap=2.0):
+        """
+        Decode the image, returning it along with the (width, height) of the full image.
+        If an `image_size` is passed, jpegs are decoded at reduced scale (DCT scaling)
+        to at least `reducing_gap` times that size's thumbnail dimensions.
+        """
         if self.content_type == 'image/heic':
             try:
                 heif_file = pyheif.read(fh)
             except (ValueError, pyheif.error.HeifError) as err:
                 raise PostException(f'Unable to read HEIC file for post `{self.post_id}`: {err}') from err
-            self._image = PIL.Image.frombytes(
-                heif_file.mode, heif_file.size, heif_file.data, 'raw', heif_file.mode, heif_file.stride
+            # frombuffer shares memory with the decoded heif data where Pillow supports that for the mode
+            image = PIL.Image.frombuffer(
+                heif_file.mode, heif_file.size, heif_file.data, 'raw', heif_file.mode, heif_file.stride, 1
             )
-        elif self.content_type == 'image/jpeg':
+            return image, image.size
+        if self.content_type == 'image/jpeg':
             try:
-                self._image = PIL.ImageOps.exif_transpose(PIL.Image.open(fh))
-            except PostException:
-                raise
+                image = PIL.Image.open(fh)
+                full_dimensions = image.size
+                if image.getexif().get(EXIF_ORIENTATION_TAG) in EXIF_ORIENTATIONS_TRANSPOSED:
+                    full_dimensions = tuple(reversed(full_dimensions))
+                if image_size:
+                    width, height = image_size.get_thumbnail_dimensions(*full_dimensions)
+                    image.draft(None, (width * reducing_gap, height * reducing_gap))
+                return PIL.ImageOps.exif_transpose(image), full_dimensions
             except Exception as err:
                 raise PostException(
                     f'Unable to decode native jpeg data for post `{self.post_id}`: {err}'
                 ) from err
+        raise PostException(f'Unrecognized content-type `{self.content_type}`')
+
+    def get_draft_image(self, image_size, reducing_gap=2.0):
+        """
+        Get a readonly image large enough to be thumbnailed down to `image_size` with good quality.
+
+        If the full image has not already been decoded, jpeg draft mode is used to decode at a
+        reduced scale (DCT scaling), to at least `reducing_gap` times the thumbnail's dimensions.
+        The reduced image is not cached, but the full dimensions from its header are.
+        """
+        if self._image or self.content_type != 'image/jpeg' or self.source:
+            return self.readonly_image
+
+        fetching = not self._data
+        image, full_dimensions = self._decode(self._open(), image_size=image_size, reducing_gap=reducing_gap)
+        if fetching:
+            self.is_synced = True
+        if image.size == full_dimensions:
+            # we decoded the whole thing, so don't waste that work
+            self._hold(data=None if self.is_synced else self._data, image=image)
         else:
-            raise PostException(f'Unrecognized content-type `{self.content_type}`')
+            self._dimensions = full_dimensions
+        return image
 
-    def set_image(self, image):
-        self._data = None
-        self._image = image.copy()
+    @property
+    def dimensions(self):
+        "The (width, height) of the image, read from the jpeg header rather than decoding if possible"
+        if self._dimensions:
+            return self._dimensions
+        if self._image or self.content_type != 'image/jpeg' or self.source:
+            return self.readonly_image.size
+        try:
+            image = PIL.Image.open(self._open())
+        except PostException:
+            raise
+        except Exception as err:
+            raise PostException(f'Unable to decode native jpeg data for post `{self.post_id}`: {err}') from err
+        if image.getexif().get(EXIF_ORIENTATION_TAG) in EXIF_ORIENTATIONS_TRANSPOSED:
+            return tuple(reversed(image.size))
+        return image.size
+
+    def set_image(self, image, copy=False):
+        "Set `copy=True` if the caller may mutate `image` after handing it off"
+        self._hold(image=image.copy() if copy else image)
         self.is_synced = False
         return self
 
     def set_data(self, fh):
         fh.seek(0)
-        self._data = fh.read()
-        self._image = None
+        self._hold(data=fh.read())
         self.is_synced = False
         return self
 
     def clear(self):
         if not (self.is_synced and self._image is None and self._data is None):
-            self._data = None
-            self._image = None
+            self._hold()
             self.is_synced = False
         return self
 
+    def release(self):
+        "Drop what's held in memory, if it matches the source and so can be re-fetched when needed"
+        if self.is_synced:
+            self._hold()
+            self.is_synced = None
+        return self
+
     def refresh(self):
         if self.source:
-            self._data = None
-            self._image = self.source()
+            self._hold(image=self.source())
         else:
-            try:
-                fh = self.s3_client.get_object_data_stream(self.s3_path)
-            except self.s3_client.exceptions.NoSuchKey as err:
-                raise PostException(f'{self.s3_path} image data not found for post `{self.post_id}`') from err
-            self._data = fh.read()
-            self._image = None
+            self._hold(data=self._stream().read())
         self.is_synced = True
         return self
 
@@ -111,11 +231,11 @@ class CachedImage:
             return self
 
         try:
-            self._image = self.readonly_image.crop((ul_x, ul_y, lr_x, lr_y))
+            image = self.readonly_image.crop((ul_x, ul_y, lr_x, lr_y))
         except Exception as err:
-            raise PostException(f'Unable to crop image for post `{self.id}`: {err}') from err
+            raise PostException(f'Unable to crop image for post `{self.post_id}`: {err}') from err
 
-        self._data = None
+        self._hold(image=image)
         self.is_synced = False
         return self
 
@@ -133,22 +253,11 @@ class CachedImage:
                     fh = io.BytesIO(self._data)
                 elif self._image:
                     assert self.content_type == 'image/jpeg', 'Non-jpeg images can only be flushed back empty'
-                    fh = io.BytesIO()
-                    kwargs = {  # Note: Pillow's Image.save treats None differently than not present for some kwargs
-                        k: v
-                        for k, v in {
-                            'format': 'JPEG',
-                            'quality': 100,  # per spec
-                            'icc_profile': self._image.info.get('icc_profile'),
-                            'exif': self._image.info.get('exif'),
-                        }.items()
-                        if v is not None
-                    }
+                    encoder = (self.image_size and self.image_size.encoder) or NATIVE.encoder
                     try:
-                        self._image.save(fh, **kwargs)
+                        fh = io.BytesIO(encoder.encode(self._image))
                     except Exception as err:
                         raise PostException(f'Unable to save pil image for post `{self.post_id}`: {err}') from err
-                    fh.seek(0)
                 self.s3_client.put_object(self.s3_path, fh, self.content_type)
             self.is_synced = True
         return self
@@ -1,5 +1,6 @@
-__all__ = ['PostDynamo', 'PostImageDynamo', 'PostOriginalMetadataDynamo']
+__all__ = ['PostDynamo', 'PostImageDynamo', 'PostOriginalMetadataDynamo', 'PostPerceptualHashDynamo']
 
 from .base import PostDynamo
 from .image import PostImageDynamo
 from .original_metadata import PostOriginalMetadataDynamo
+from .perceptual_hash import PostPerceptualHashDynamo
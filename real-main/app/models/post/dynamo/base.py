@@ -1,5 +1,6 @@
 import collections
 import functools
+import itertools
 import logging
 
 import pendulum
@@ -51,19 +52,57 @@ class PostDynamo:
             query_kwargs['FilterExpression'] = filter_exp(PostStatus.COMPLETED)
         return self.client.generate_all_query(query_kwargs)
 
-    def generate_expired_post_pks_by_day(self, date, cut_off_time=None):
+    def generate_dependent_pks(self, post_id):
+        "Generate the pks of all the items in the post's partition, other than the post item itself"
+        query_kwargs = {
+            'KeyConditionExpression': Key('partitionKey').eq(f'post/{post_id}') & Key('sortKey').gt('-'),
+            'ProjectionExpression': 'partitionKey, sortKey',
+        }
+        return self.client.generate_all_query(query_kwargs)
+
+    def generate_expired_post_pks_by_day(self, date, cut_off_time=None, after_time=None):
+        """
+        Generate pks of posts that expire on `date`, in order of expiry time, before `cut_off_time` and
+        at or after `after_time` if given. The pks include the expiry time as `gsiK1SortKey`.
+        """
         key_conditions = [Key('gsiK1PartitionKey').eq(f'post/{date}')]
-        if cut_off_time:
+        if after_time:
+            key_conditions.append(Key('gsiK1SortKey').gte(str(after_time)))
+        elif cut_off_time:
             key_conditions.append(Key('gsiK1SortKey').lt(str(cut_off_time)))
         query_kwargs = {
             'KeyConditionExpression': functools.reduce(lambda a, b: a & b, key_conditions),
             'IndexName': 'GSI-K1',
-            'ProjectionExpression': 'partitionKey, sortKey',
+            'ProjectionExpression': 'partitionKey, sortKey, gsiK1SortKey',
         }
-        return self.client.generate_all_query(query_kwargs)
+        post_pks = self.client.generate_all_query(query_kwargs)
+        if after_time and cut_off_time:
+            # dynamo allows only one condition on the sort key, so apply the other as we go
+            post_pks = itertools.takewhile(lambda pk: pk['gsiK1SortKey'] < str(cut_off_time), post_pks)
+        return post_pks
+
+    def expired_posts_sweep_key(self, sweep):
+        return {'partitionKey': f'postExpirySweep/{sweep}', 'sortKey': '-'}
+
+    def get_expired_posts_swept_through(self, sweep):
+        """
+        Returns (date_str, time_str) of the expiry the sweep has processed posts up to, or None.
+        The time is None for sweeps that process whole days at a time.
+        """
+        item = self.client.get_item(self.expired_posts_sweep_key(sweep))
+        return (item['sweptThroughDate'], item.get('sweptThroughTime')) if item else None
+
+    def set_expired_posts_swept_through(self, sweep, date, time=None):
+        attributes = {'schemaVersion': 0, 'sweptThroughDate': str(date)}
+        if time is not None:
+            attributes['sweptThroughTime'] = str(time)
+        return self.client.set_attributes(self.expired_posts_sweep_key(sweep), **attributes)
 
     def generate_expired_post_pks_with_scan(self, cut_off_date):
-        "Do a table **scan** to generate pks of expired posts. Does *not* include cut_off_date."
+        """
+        Do a table **scan** to generate pks of expired posts. Does *not* include cut_off_date.
+        Cost grows with the whole table, so only for manual repairs.
+        """
         query_kwargs = {
             'FilterExpression': (
                 Attr('partitionKey').begins_with('post/') & Attr('expiresAt').lt(str(cut_off_date))
@@ -147,7 +186,32 @@ class PostDynamo:
     def increment_viewed_by_count(self, post_id):
         return self.client.increment_count(self.pk(post_id), 'viewedByCount')
 
-    def set_post_status(self, post_item, status, status_reason=None, original_post_id=None, album_rank=None):
+    def set_viewed_by_sketch(self, post_id, sketch_bytes, viewed_by_count, prev_sketch_bytes=None):
+        """
+        Set the viewedBy sketch along with the count it backs.
+        Fails with ConditionalCheckFailedException if the sketch has changed since `prev_sketch_bytes` was read.
+        """
+        query_kwargs = {
+            'Key': self.pk(post_id),
+            'UpdateExpression': 'SET viewedBySketch = :vbs, viewedByCount = :vbc',
+            'ExpressionAttributeValues': {':vbs': sketch_bytes, ':vbc': viewed_by_count},
+        }
+        if prev_sketch_bytes:
+            query_kwargs['ConditionExpression'] = 'viewedBySketch = :pvbs'
+            query_kwargs['ExpressionAttributeValues'][':pvbs'] = prev_sketch_bytes
+        else:
+            query_kwargs['ConditionExpression'] = 'attribute_not_exists(viewedBySketch)'
+        return self.client.update_item(query_kwargs)
+
+    def set_post_status(
+        self,
+        post_item,
+        status,
+        status_reason=None,
+        original_post_id=None,
+        album_rank=None,
+        keep_set_as_user_photo=False,
+    ):
         album_id = post_item.get('albumId')
 
         assert (album_rank is not None) is bool(
@@ -180,8 +244,9 @@ class PostDynamo:
             exp_sets.append('gsiA1SortKey = :gsiA1SortKey')
             exp_values[':gsiA1SortKey'] = f'{status}/{post_item["expiresAt"]}'
 
-        # the setAsUserPhoto attr is not needed after reaching COMPLETED, so delete it if it exists
-        if status == PostStatus.COMPLETED:
+        # the setAsUserPhoto attr is not needed after reaching COMPLETED, so delete it if it exists,
+        # unless it's still needed for after the post has been verified
+        if status == PostStatus.COMPLETED and not keep_set_as_user_photo:
             exp_removes.append('setAsUserPhoto')
 
         query_kwargs = {
@@ -269,21 +334,61 @@ class PostDynamo:
         }
         return self.client.update_item(query_kwargs)
 
-    def set_is_verified(self, post_id, is_verified, hidden=False):
+    def set_is_verified(self, post_id, is_verified, hidden=False, remove_set_as_user_photo=False):
+        "Also clears any verification retry, as the post then has a result"
         query_kwargs = {
             'Key': self.pk(post_id),
             'UpdateExpression': 'SET isVerified = :visibleValue',
             'ExpressionAttributeValues': {},
         }
+        exp_removes = ['gsiA4PartitionKey', 'gsiA4SortKey', 'verificationAttempts']
+        if remove_set_as_user_photo:
+            exp_removes.append('setAsUserPhoto')
         if hidden:
             query_kwargs['UpdateExpression'] += ', isVerifiedHiddenValue = :hiddenValue'
             query_kwargs['ExpressionAttributeValues'][':visibleValue'] = True
             query_kwargs['ExpressionAttributeValues'][':hiddenValue'] = is_verified
         else:
-            query_kwargs['UpdateExpression'] += ' REMOVE isVerifiedHiddenValue'
+            exp_removes.append('isVerifiedHiddenValue')
             query_kwargs['ExpressionAttributeValues'][':visibleValue'] = is_verified
+        query_kwargs['UpdateExpression'] += ' REMOVE ' + ', '.join(exp_removes)
         return self.client.update_item(query_kwargs)
 
+    def set_verification_retry_at(self, post_id, retry_at, attempts):
+        "`attempts` is the number of verification attempts that have failed so far"
+        query_kwargs = {
+            'Key': self.pk(post_id),
+            'UpdateExpression': 'SET gsiA4PartitionKey = :pk, gsiA4SortKey = :sk, verificationAttempts = :va',
+            'ExpressionAttributeValues': {
+                ':pk': 'postVerification',
+                ':sk': retry_at.int_timestamp,
+                ':va': attempts,
+            },
+        }
+        return self.client.update_item(
+            query_kwargs, failure_warning=f'Failed to set verification retry for post `{post_id}`'
+        )
+
+    def clear_verification_retry(self, post_id):
+        query_kwargs = {
+            'Key': self.pk(post_id),
+            'UpdateExpression': 'REMOVE gsiA4PartitionKey, gsiA4SortKey, verificationAttempts',
+        }
+        return self.client.update_item(
+            query_kwargs, failure_warning=f'Failed to clear verification retry for post `{post_id}`'
+        )
+
+    def generate_post_ids_to_retry_verification(self, now=None):
+        now = now or pendulum.now('utc')
+        query_kwargs = {
+            'KeyConditionExpression': (
+                Key('gsiA4PartitionKey').eq('postVerification') & Key('gsiA4SortKey').lte(now.int_timestamp)
+            ),
+            'ProjectionExpression': 'partitionKey',
+            'IndexName': 'GSI-A4',
+        }
+        return map(lambda item: item['partitionKey'].split('/')[1], self.client.generate_all_query(query_kwargs))
+
     def get_first_with_checksum(self, checksum):
         query_kwargs = {
             'KeyConditionExpression': Key('gsiK2PartitionKey').eq(f'postChecksum/{checksum}'),
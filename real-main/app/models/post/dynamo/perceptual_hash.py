@@ -0,0 +1,87 @@
+import itertools
+import logging
+
+from boto3.dynamodb.conditions import Key
+
+from .. import perceptual_hash
+
+logger = logging.getLogger()
+
+
+class PostPerceptualHashDynamo:
+    """
+    A banded index over the perceptual hashes of posts' images.
+
+    The 64-bit hash is split into `band_count` bands, each indexed in its own GSI-K1 partition.
+    By the pigeonhole principle, any two hashes within `band_count - 1` bits of each other match
+    exactly on at least one band, so finding all near duplicates takes just `band_count` queries.
+    The full hash is stored in the GSI sort key, so candidates can be checked without fetching them.
+    """
+
+    band_count = 4
+    band_bits = perceptual_hash.HASH_BITS // band_count
+    max_distance = band_count - 1
+    # the most posts checked per band, oldest first, so a crowded band can't make a lookup unbounded
+    max_candidates_per_band = 100
+
+    def __init__(self, dynamo_client):
+        self.client = dynamo_client
+
+    def key(self, post_id, band):
+        return {'partitionKey': f'post/{post_id}', 'sortKey': f'perceptualHash/{band}'}
+
+    def band_values(self, phash):
+        mask = (1 << self.band_bits) - 1
+        return [(phash >> (band * self.band_bits)) & mask for band in range(self.band_count)]
+
+    def band_partition_key(self, band, band_value):
+        return f'postPerceptualHash/{band}/{band_value:0{self.band_bits // 4}x}'
+
+    def get_perceptual_hash(self, post_id, strongly_consistent=False):
+        item = self.client.get_item(self.key(post_id, 0), ConsistentRead=strongly_consistent)
+        return perceptual_hash.from_str(item['perceptualHash']) if item else None
+
+    def add(self, post_id, posted_at_str, phash):
+        phash_str = perceptual_hash.to_str(phash)
+        items = (
+            {
+                **self.key(post_id, band),
+                'schemaVersion': 0,
+                'perceptualHash': phash_str,
+                'gsiK1PartitionKey': self.band_partition_key(band, band_value),
+                'gsiK1SortKey': f'{posted_at_str}/{phash_str}',
+            }
+            for band, band_value in enumerate(self.band_values(phash))
+        )
+        return self.client.batch_put_items(items)
+
+    def delete(self, post_id):
+        return self.client.batch_delete(self.key(post_id, band) for band in range(self.band_count))
+
+    def generate_near_duplicates(self, phash):
+        """
+        Yields (posted_at_str, post_id) of posts with hashes within `max_distance` bits of `phash`,
+        from among the `max_candidates_per_band` earliest posted in each of its bands.
+        """
+        seen_post_ids = set()
+        for band, band_value in enumerate(self.band_values(phash)):
+            query_kwargs = {
+                'KeyConditionExpression': Key('gsiK1PartitionKey').eq(self.band_partition_key(band, band_value)),
+                'IndexName': 'GSI-K1',
+                'Limit': self.max_candidates_per_band,
+            }
+            candidates = self.client.generate_all_query(query_kwargs)
+            for keys in itertools.islice(candidates, self.max_candidates_per_band):
+                post_id = keys['partitionKey'].split('/')[1]
+                if post_id in seen_post_ids:
+                    continue
+                seen_post_ids.add(post_id)
+                posted_at_str, phash_str = keys['gsiK1SortKey'].rsplit('/', 1)
+                distance = perceptual_hash.hamming_distance(phash, perceptual_hash.from_str(phash_str))
+                if distance <= self.max_distance:
+                    yield posted_at_str, post_id
+
+    def get_first_near_duplicate(self, phash):
+        "Returns the post_id of the first posted near duplicate, if any"
+        first = min(self.generate_near_duplicates(phash), default=None)
+        return first[1] if first else None
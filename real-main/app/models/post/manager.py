@@ -1,6 +1,8 @@
 import collections
+import concurrent.futures
 import itertools
 import logging
+import os
 
 import pendulum
 
@@ -13,19 +15,33 @@ from app.models.like.enums import LikeStatus
 from app.utils import GqlNotificationType
 
 from .appsync import PostAppSync
-from .dynamo import PostDynamo, PostImageDynamo, PostOriginalMetadataDynamo
+from .dynamo import PostDynamo, PostImageDynamo, PostOriginalMetadataDynamo, PostPerceptualHashDynamo
 from .enums import PostStatus, PostType
 from .exceptions import PostException
 from .model import Post
 
 logger = logging.getLogger()
 
+VIEWED_BY_SKETCHES_ENABLED = os.environ.get('VIEWED_BY_SKETCHES_ENABLED')
+
+# bound on the posts marked as deleting & queried for their dependent items in parallel
+DELETE_MAX_WORKERS = 8
+
+# expired posts are fetched & deleted in batches, with progress recorded after each
+EXPIRED_POSTS_BATCH_SIZE = 100
+
+# the expiry index is eventually consistent, so expiries more recent than this are left for the next run
+EXPIRED_POSTS_INDEX_LAG = pendulum.duration(seconds=10)
+
+# how many days' expiry partitions the daily sweep looks back over, at most
+EXPIRED_POSTS_LOOK_BACK_DAYS = 7
+
 
 class PostManager(FlagManagerMixin, TrendingManagerMixin, ViewManagerMixin, ManagerBase):
 
     item_type = 'post'
 
-    def __init__(self, clients, managers=None):
+    def __init__(self, clients, managers=None, viewed_by_sketches_enabled=VIEWED_BY_SKETCHES_ENABLED):
         super().__init__(clients, managers=managers)
         managers = managers or {}
         managers['post'] = self
@@ -43,6 +59,9 @@ class PostManager(FlagManagerMixin, TrendingManagerMixin, ViewManagerMixin, Mana
             self.dynamo = PostDynamo(clients['dynamo'])
             self.image_dynamo = PostImageDynamo(clients['dynamo'])
             self.original_metadata_dynamo = PostOriginalMetadataDynamo(clients['dynamo'])
+            self.perceptual_hash_dynamo = PostPerceptualHashDynamo(clients['dynamo'])
+        # back viewedByCount & postViewedByCount with HyperLogLog sketches rather than exact counters
+        self.viewed_by_sketches_enabled = bool(viewed_by_sketches_enabled)
 
     def get_model(self, item_id, strongly_consistent=False):
         return self.get_post(item_id, strongly_consistent=strongly_consistent)
@@ -51,12 +70,29 @@ class PostManager(FlagManagerMixin, TrendingManagerMixin, ViewManagerMixin, Mana
         post_item = self.dynamo.get_post(post_id, strongly_consistent=strongly_consistent)
         return self.init_post(post_item) if post_item else None
 
+    def get_posts(self, post_ids, with_image_items=False):
+        """
+        Bulk load posts, returning a dict of post_id -> Post for those that exist.
+        Set `with_image_items` to also bulk load the image items of the posts that may have one.
+        """
+        post_ids = set(post_ids)
+        post_items = self.dynamo.client.batch_get(self.dynamo.pk(post_id) for post_id in post_ids)
+        posts = {post_item['postId']: self.init_post(post_item) for post_item in post_items}
+        if with_image_items:
+            image_post_ids = [post.id for post in posts.values() if post.type != PostType.TEXT_ONLY]
+            image_items = self.image_dynamo.client.batch_get(self.image_dynamo.pk(pid) for pid in image_post_ids)
+            image_items_by_post_id = {item['partitionKey'][len('post/') :]: item for item in image_items}
+            for post in posts.values():
+                post._image_item = image_items_by_post_id.get(post.id, {})
+        return posts
+
     def init_post(self, post_item):
         kwargs = {
             'post_appsync': getattr(self, 'appsync', None),
             'post_dynamo': getattr(self, 'dynamo', None),
             'post_image_dynamo': getattr(self, 'image_dynamo', None),
             'post_original_metadata_dynamo': getattr(self, 'original_metadata_dynamo', None),
+            'post_perceptual_hash_dynamo': getattr(self, 'perceptual_hash_dynamo', None),
             'flag_dynamo': getattr(self, 'flag_dynamo', None),
             'trending_dynamo': getattr(self, 'trending_dynamo', None),
             'view_dynamo': getattr(self, 'view_dynamo', None),
@@ -199,56 +235,148 @@ class PostManager(FlagManagerMixin, TrendingManagerMixin, ViewManagerMixin, Mana
             return
 
         results = []
+        post_viewed_by_sketches = {} if self.viewed_by_sketches_enabled else None
         for post_id, view_count in grouped_post_ids.items():
             post = self.get_post(post_id)
             if not post:
                 logger.warning(f'Cannot record view(s) by user `{user_id}` on DNE post `{post_id}`')
                 continue
-            results.append(post.record_view_count(user_id, view_count, viewed_at=viewed_at))
+            results.append(
+                post.record_view_count(
+                    user_id, view_count, viewed_at=viewed_at, post_viewed_by_sketches=post_viewed_by_sketches
+                )
+            )
+
+        # merge the batch into the post owners' sketches, once per owner
+        for posted_by_user_id, sketch in (post_viewed_by_sketches or {}).items():
+            self.user_manager.merge_post_viewed_by_sketch(posted_by_user_id, sketch)
 
         if any(results):
             self.user_manager.dynamo.update_last_post_view_at(user_id, now=viewed_at)
 
     def delete_recently_expired_posts(self, now=None):
-        "Delete posts that expired yesterday or today"
-        now = now or pendulum.now('utc')
+        "Delete posts that expired yesterday or today, resuming from where the last run got to"
+        now = (now or pendulum.now('utc')) - EXPIRED_POSTS_INDEX_LAG
         yesterday = now - pendulum.duration(days=1)
 
-        # Every run we operate on all posts that expired yesterday, and any that have expired so far today.
-        # Techinically we only need to operate on yesterday's posts on today's first run,
-        # but in the interest of avoiding any 'left behind' posts we do it every time.
-
-        yesterdays_post_pks = self.dynamo.generate_expired_post_pks_by_day(yesterday.date())
-        todays_post_pks = self.dynamo.generate_expired_post_pks_by_day(now.date(), now.time())
-
-        # scan for expired posts
-        for post_pk in itertools.chain(yesterdays_post_pks, todays_post_pks):
-            post_item = self.dynamo.client.get_item(post_pk)
-            user_item = self.user_manager.dynamo.get_user(post_item['postedByUserId'])
+        # Every run we operate on all posts that expired yesterday, and any that have expired so far today,
+        # other than those a previous run has already swept through. Posts that expire at the exact time
+        # the last run got to are swept again, as others may share that time. Those already deleted are
+        # dropped when the batch is loaded. Any 'left behind' posts, ex: ones whose expiry was moved
+        # into the past, are caught by the daily sweep of older expired posts.
+        swept_date, swept_time = self.dynamo.get_expired_posts_swept_through('recent') or (None, None)
+        for date, cut_off_time in ((yesterday.date(), None), (now.date(), now.time())):
+            if swept_date and str(date) < swept_date:
+                continue
+            after_time = swept_time if str(date) == swept_date else None
+            post_pks = self.dynamo.generate_expired_post_pks_by_day(date, cut_off_time, after_time=after_time)
+            while post_pks_batch := list(itertools.islice(post_pks, EXPIRED_POSTS_BATCH_SIZE)):
+                self.delete_expired_posts(post_pks_batch)
+                swept_time = post_pks_batch[-1]['gsiK1SortKey']
+                self.dynamo.set_expired_posts_swept_through('recent', date, swept_time)
+
+    def delete_expired_posts(self, post_pks):
+        "Delete the posts with the given pks, logging each of them"
+        post_pks = [{k: pk[k] for k in ('partitionKey', 'sortKey')} for pk in post_pks]
+        post_items = sorted(self.dynamo.client.batch_get(post_pks), key=lambda item: item['expiresAt'])
+        user_pks = [self.user_manager.dynamo.pk(user_id) for user_id in {i['postedByUserId'] for i in post_items}]
+        usernames = {
+            user_item['userId']: user_item['username']
+            for user_item in self.dynamo.client.batch_get(user_pks, projection_expression='userId, username')
+        }
+        for post_item in post_items:
             logger.warning(
-                f'Deleting expired post with pk ({post_pk["partitionKey"]}, {post_pk["sortKey"]}):'
-                + f', posted by `{user_item["username"]}`'
+                f'Deleting expired post with pk ({post_item["partitionKey"]}, {post_item["sortKey"]}):'
+                + f', posted by `{usernames.get(post_item["postedByUserId"])}`'
                 + f', posted at `{post_item.get("postedAt")}`'
                 + f', with text `{post_item.get("text")}`'
                 + f', with status `{post_item.get("postStatus")}`'
                 + f', expired at `{post_item.get("expiresAt")}`'
             )
-            self.init_post(post_item).delete()
+        return self.delete_posts(post_items)
 
     def delete_older_expired_posts(self, now=None):
-        "Delete posts that expired yesterday or earlier, via full table scan"
+        """
+        Delete posts that expired yesterday or earlier, sweeping the expiry partition of each day
+        that hasn't been fully swept yet, going back at most EXPIRED_POSTS_LOOK_BACK_DAYS.
+        """
         now = now or pendulum.now('utc')
-        today = now.date()
-
-        # scan for expired posts
-        for post_pk in self.dynamo.generate_expired_post_pks_with_scan(today):  # excludes today
-            logger.warning(f'Deleting expired post with pk ({post_pk["partitionKey"]}, {post_pk["sortKey"]})')
-            post_item = self.dynamo.client.get_item(post_pk)
-            self.init_post(post_item).delete()
+        yesterday = now.date().subtract(days=1)
+
+        date = now.date().subtract(days=EXPIRED_POSTS_LOOK_BACK_DAYS)
+        if swept_through := self.dynamo.get_expired_posts_swept_through('daily'):
+            date = max(date, pendulum.parse(swept_through[0]).date().add(days=1))
+        while date <= yesterday:
+            post_pks = self.dynamo.generate_expired_post_pks_by_day(date)
+            while post_pks_batch := list(itertools.islice(post_pks, EXPIRED_POSTS_BATCH_SIZE)):
+                self.delete_expired_posts(post_pks_batch)
+            self.dynamo.set_expired_posts_swept_through('daily', date)
+            date = date.add(days=1)
+
+    def delete_expired_posts_with_scan(self, now=None):
+        """
+        Delete posts that expired yesterday or earlier, via full table scan.
+        Expensive, so not run on a schedule: a manual repair tool for any posts the sweeps left behind.
+        """
+        now = now or pendulum.now('utc')
+        post_pks = self.dynamo.generate_expired_post_pks_with_scan(now.date())  # excludes today
+        while post_pks_batch := list(itertools.islice(post_pks, EXPIRED_POSTS_BATCH_SIZE)):
+            self.delete_expired_posts(post_pks_batch)
 
     def delete_all_by_user(self, user_id):
-        for post_item in self.dynamo.generate_posts_by_user(user_id):
-            self.init_post(post_item).delete()
+        "Returns count of posts deleted"
+        post_items = list(self.dynamo.generate_posts_by_user(user_id))
+        return self.delete_posts(post_items, s3_prefix=f'{user_id}/post/')
+
+    def delete_posts(self, post_items, s3_prefix=None):
+        """
+        Delete posts in bulk, with the same effect as calling Post.delete() on each of them.
+
+        The posts' dependent items are found with key-only queries and deleted in parallel batches,
+        their media is deleted with batched calls to S3, and the followed first story is refreshed
+        once per user rather than once per post. If all the posts' media lives under one S3 prefix
+        (ex: when deleting all of a user's posts), pass it as `s3_prefix` to clear it in one go.
+        Returns count of posts deleted.
+        """
+        if not post_items:
+            return 0
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=DELETE_MAX_WORKERS) as executor:
+            # mark the posts and the media as in the deleting process
+            prev_items = post_items
+            post_items = list(
+                executor.map(lambda item: self.dynamo.set_post_status(item, PostStatus.DELETING), prev_items)
+            )
+
+            # collect the keys of likes, comments, images, metadata, trending indexes, etc
+            def collect_dependent_pks(post_id):
+                return [
+                    *self.dynamo.generate_dependent_pks(post_id),
+                    *self.comment_manager.dynamo.generate_pks_by_post(post_id),
+                ]
+
+            post_ids = [post_item['postId'] for post_item in post_items]
+            dependent_pks = [pk for pks in executor.map(collect_dependent_pks, post_ids) for pk in pks]
+
+        # if any were the first followed story, refresh that. Only the earliest-expiring completed
+        # story of each user could have been, and none of their others deleted here can take its place.
+        first_stories = {}
+        for prev_item, post_item in zip(prev_items, post_items):
+            if prev_item.get('expiresAt') and prev_item['postStatus'] == PostStatus.COMPLETED:
+                user_id = post_item['postedByUserId']
+                if user_id not in first_stories or post_item['expiresAt'] < first_stories[user_id]['expiresAt']:
+                    first_stories[user_id] = post_item
+        for post_item in first_stories.values():
+            self.follower_manager.refresh_first_story(story_prev=post_item)
+
+        # do the deletes for real
+        self.dynamo.client.parallel_batch_delete(dependent_pks)
+        if s3_prefix:
+            s3_prefixes = [s3_prefix]
+        else:
+            s3_prefixes = [f'{item["postedByUserId"]}/post/{item["postId"]}/' for item in post_items]
+        self.clients['s3_uploads'].delete_objects_with_prefixes(s3_prefixes)
+        return self.dynamo.client.parallel_batch_delete(self.dynamo.pk(post_id) for post_id in post_ids)
 
     def on_flag_add(self, post_id, new_item):
         post_item = self.dynamo.increment_flag_count(post_id)
@@ -262,6 +390,13 @@ class PostManager(FlagManagerMixin, TrendingManagerMixin, ViewManagerMixin, Mana
             logger.warning(f'Force archiving post `{post_id}` from flagging')
             post.archive(forced=True)
 
+    def on_flag_delete(self, post_id, old_item):
+        # a post's flags are deleted along with it, in which case there's no count to keep in sync
+        post_item = self.dynamo.get_post(post_id)
+        if not post_item or post_item['postStatus'] == PostStatus.DELETING:
+            return
+        super().on_flag_delete(post_id, old_item)
+
     def on_comment_add(self, comment_id, new_item):
         comment = self.comment_manager.init_comment(new_item)
         by_post_owner = comment.user_id == comment.post.user_id
@@ -338,6 +473,30 @@ class PostManager(FlagManagerMixin, TrendingManagerMixin, ViewManagerMixin, Mana
         if new_post.status == PostStatus.COMPLETED and old_post.status in initial_statuses:
             self.appsync.client.fire_notification(new_post.user_id, GqlNotificationType.POST_COMPLETED, **kwargs)
 
+    def on_post_status_change_verify_image(self, post_id, new_item, old_item):
+        if new_item.get('postType') != PostType.IMAGE or new_item.get('postStatus') != PostStatus.COMPLETED:
+            return
+        if 'isVerified' in new_item:
+            return
+        self.init_post(new_item).verify()
+
+    def retry_post_verifications(self, now=None):
+        "Retry verifying posts whose earlier verification failed. Returns (total, verified) counts."
+        now = now or pendulum.now('utc')
+        total_cnt, verified_cnt = 0, 0
+        for post_id in self.dynamo.generate_post_ids_to_retry_verification(now=now):
+            total_cnt += 1
+            post = self.get_post(post_id)
+            if not post:
+                continue
+            if post.status != PostStatus.COMPLETED or post.is_verified is not None:
+                # verification of a post that is no longer completed restarts if it is completed again
+                self.dynamo.clear_verification_retry(post_id)
+                continue
+            post.verify(now=now)
+            verified_cnt += post.is_verified is not None
+        return total_cnt, verified_cnt
+
     def on_post_verification_hidden_change_update_is_verified(self, post_id, new_item, old_item=None):
         old_verif_hidden = old_item.get('verificationHidden', False)
         new_verif_hidden = new_item.get('verificationHidden', False)
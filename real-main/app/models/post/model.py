@@ -1,8 +1,8 @@
 import base64
+import concurrent.futures
 import io
 import logging
 
-import colorthief
 import pendulum
 import PIL.Image
 
@@ -12,11 +12,14 @@ from app.mixins.view.model import ViewModelMixin
 from app.models.follower.enums import FollowStatus
 from app.models.user.enums import UserPrivacyStatus, UserSubscriptionLevel
 from app.models.user.exceptions import UserException
-from app.utils import image_size
+from app.utils import HyperLogLog, image_size
+from app.utils.memory_budget import MemoryBudget, pil_image_bytes
 
 from .cached_image import CachedImage
 from .enums import PostNotificationType, PostStatus, PostType
 from .exceptions import PostException
+from .palette import get_palette
+from .perceptual_hash import dhash
 from .text_image import generate_text_image
 
 logger = logging.getLogger()
@@ -27,10 +30,18 @@ VIDEO_HLS_PREFIX = 'video-hls/video'
 VIDEO_POSTER_PREFIX = 'video-poster/poster'
 IMAGE_DIR = 'image'
 
+# Thumbnails built as soon as an image is processed, ordered by decreasing size. Others are built on
+# demand by the cloudfront origin-response handler (real-cloudfront/edge_app) the first time they're fetched.
+EAGER_THUMBNAILS = (image_size.P1080, image_size.P480, image_size.P64)
 
-class ColorThiefFromImage(colorthief.ColorThief):
-    def __init__(self, image):
-        self.image = image
+# bounds on the resources used to build & upload thumbnails in parallel
+THUMBNAIL_MAX_WORKERS = 4
+THUMBNAIL_MEMORY_CAP_BYTES = 256 * 1024 * 1024
+
+# how long to wait before trying again to verify a post whose verification failed, doubled with each
+# failed attempt. After the last attempt (about 21 hours in) the post is given up on as not verified.
+VERIFICATION_RETRY_DELAY = pendulum.duration(minutes=5)
+VERIFICATION_MAX_ATTEMPTS = 9
 
 
 class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
@@ -44,6 +55,7 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
         post_dynamo=None,
         post_image_dynamo=None,
         post_original_metadata_dynamo=None,
+        post_perceptual_hash_dynamo=None,
         cloudfront_client=None,
         mediaconvert_client=None,
         post_verification_client=None,
@@ -67,6 +79,8 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
             self.image_dynamo = post_image_dynamo
         if post_original_metadata_dynamo is not None:
             self.original_metadata_dynamo = post_original_metadata_dynamo
+        if post_perceptual_hash_dynamo is not None:
+            self.perceptual_hash_dynamo = post_perceptual_hash_dynamo
 
         if cloudfront_client is not None:
             self.cloudfront_client = cloudfront_client
@@ -98,14 +112,24 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
         self.type = self.item['postType']
         self.user_id = item['postedByUserId']
 
-        # lazy caches
+        # set by set_perceptual_hash(), for complete() to look for near duplicates with
+        self.perceptual_hash = None
+
+        # lazy caches, with the memory they hold tracked across all of them
+        self.image_memory = MemoryBudget()
         if self.type == PostType.TEXT_ONLY:
             text = self.item['text']
             self.k4_jpeg_cache = CachedImage(
-                self.id, source=lambda: generate_text_image(text, image_size.K4.max_dimensions)
+                self.id,
+                source=lambda: generate_text_image(text, image_size.K4.max_dimensions),
+                memory_budget=self.image_memory,
             )
             self.p1080_jpeg_cache = CachedImage(
-                self.id, source=lambda: generate_text_image(text, image_size.P1080.max_dimensions)
+                self.id,
+                source=lambda: generate_text_image(
+                    text, image_size.P1080.max_dimensions, render_dimensions=image_size.K4.max_dimensions
+                ),
+                memory_budget=self.image_memory,
             )
         elif s3_uploads_client:
             self.native_heic_cache = CachedImage(
@@ -113,42 +137,57 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
                 image_size=image_size.NATIVE_HEIC,
                 s3_client=s3_uploads_client,
                 s3_path=self.get_image_path(image_size.NATIVE_HEIC),
+                memory_budget=self.image_memory,
             )
             self.native_jpeg_cache = CachedImage(
                 self.id,
                 image_size=image_size.NATIVE,
                 s3_client=s3_uploads_client,
                 s3_path=self.get_image_path(image_size.NATIVE),
+                memory_budget=self.image_memory,
             )
             self.k4_jpeg_cache = CachedImage(
                 self.id,
                 image_size=image_size.K4,
                 s3_client=s3_uploads_client,
                 s3_path=self.get_image_path(image_size.K4),
+                fallback=lambda: self.build_thumbnail(image_size.K4),
+                memory_budget=self.image_memory,
             )
             self.p1080_jpeg_cache = CachedImage(
                 self.id,
                 image_size=image_size.P1080,
                 s3_client=s3_uploads_client,
                 s3_path=self.get_image_path(image_size.P1080),
+                fallback=lambda: self.build_thumbnail(image_size.P1080),
+                memory_budget=self.image_memory,
             )
             self.p480_jpeg_cache = CachedImage(
                 self.id,
                 image_size=image_size.P480,
                 s3_client=s3_uploads_client,
                 s3_path=self.get_image_path(image_size.P480),
+                fallback=lambda: self.build_thumbnail(image_size.P480),
+                memory_budget=self.image_memory,
             )
             self.p64_jpeg_cache = CachedImage(
                 self.id,
                 image_size=image_size.P64,
                 s3_client=s3_uploads_client,
                 s3_path=self.get_image_path(image_size.P64),
+                fallback=lambda: self.build_thumbnail(image_size.P64),
+                memory_budget=self.image_memory,
             )
 
     @property
     def status(self):
         return self.item['postStatus']
 
+    @property
+    def image_peak_bytes(self):
+        "Peak bytes held in memory across all this post's cached images, for sizing the lambda"
+        return self.image_memory.peak_bytes
+
     @property
     def posted_at(self):
         return pendulum.parse(self.item['postedAt'])
@@ -233,6 +272,10 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
         path = self.get_image_path(size)
         return self.cloudfront_client.generate_presigned_url(path, ['GET', 'HEAD'])
 
+    def get_image_readonly_urls(self, sizes):
+        paths = [self.get_image_path(size) for size in sizes]
+        return self.cloudfront_client.generate_presigned_urls(paths, ['GET', 'HEAD'])
+
     def get_image_writeonly_url(self):
         assert self.type == PostType.IMAGE
         size = image_size.NATIVE_HEIC if self.image_item.get('imageFormat') == 'HEIC' else image_size.NATIVE
@@ -241,19 +284,95 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
 
     def serialize(self, caller_user_id):
         resp = self.item.copy()
+        resp.pop('viewedBySketch', None)
         resp['postedBy'] = self.user_manager.get_user(self.user_id).serialize(caller_user_id)
         return resp
 
+    def build_thumbnail(self, size):
+        "Build a thumbnail from the native jpeg, for when it has not been built and stored in S3"
+        image = self.native_jpeg_cache.get_draft_image(size)
+        dimensions = size.get_thumbnail_dimensions(*image.size)
+        if dimensions == image.size:
+            return image
+        try:
+            return image.resize(dimensions, resample=PIL.Image.LANCZOS, reducing_gap=2.0)
+        except Exception as err:
+            raise PostException(f'Unable to thumbnail image as jpeg for post `{self.id}`: {err}') from err
+
+    def get_image_covering(self, dimensions):
+        """
+        A readonly image from the smallest of the post's thumbnails that, once cropped to the aspect ratio
+        of `dimensions`, still covers them. If none do, the smallest of the largest available is used.
+        """
+        if self.type == PostType.TEXT_ONLY:
+            text, render_dimensions = self.item['text'], image_size.K4.max_dimensions
+            return generate_text_image(text, dimensions, render_dimensions=render_dimensions)
+        image_item = self.image_item or {}
+        if 'width' in image_item and 'height' in image_item:
+            native_dimensions = (int(image_item['width']), int(image_item['height']))
+        else:
+            native_dimensions = self.native_jpeg_cache.dimensions
+        caches = (self.p480_jpeg_cache, self.p1080_jpeg_cache, self.k4_jpeg_cache)  # ordered by increasing size
+        for cache in caches:
+            width, height = cache.image_size.get_thumbnail_dimensions(*native_dimensions)
+            if width >= dimensions[0] and height >= dimensions[1]:
+                break
+            if (width, height) == native_dimensions:
+                break  # larger thumbnails won't be any larger
+        return cache.readonly_image
+
     def build_image_thumbnails(self):
-        image = self.native_jpeg_cache.readonly_image.copy()
-        # ordered by decreasing size
-        for cache in (self.k4_jpeg_cache, self.p1080_jpeg_cache, self.p480_jpeg_cache, self.p64_jpeg_cache):
+        """
+        Decode the native jpeg once (at reduced scale if possible), build each of the EAGER_THUMBNAILS from
+        the next larger one, and encode & upload them concurrently. Memory held by decoded
+        images waiting to be flushed is capped, and the peak is recorded on `thumbnails_peak_bytes`.
+        """
+        caches = [
+            cache
+            for cache in (self.k4_jpeg_cache, self.p1080_jpeg_cache, self.p480_jpeg_cache, self.p64_jpeg_cache)
+            if cache.image_size in EAGER_THUMBNAILS
+        ]
+        image = self.native_jpeg_cache.get_draft_image(caches[0].image_size)
+        budget = MemoryBudget(THUMBNAIL_MEMORY_CAP_BYTES)
+        # a draft decoded at reduced scale isn't held by the native cache, so account for it here
+        draft_bytes = 0 if self.native_jpeg_cache.is_decoded else pil_image_bytes(image)
+        self.image_memory.acquire(draft_bytes)
+
+        def flush(cache, nbytes):
             try:
-                image.thumbnail(cache.image_size.max_dimensions, resample=PIL.Image.LANCZOS)
-            except Exception as err:
-                raise PostException(f'Unable to thumbnail image as jpeg for post `{self.id}`: {err}') from err
-            cache.set_image(image)
-            cache.flush()
+                cache.flush()
+            finally:
+                budget.release(nbytes)
+
+        try:
+            futures = []
+            with concurrent.futures.ThreadPoolExecutor(max_workers=THUMBNAIL_MAX_WORKERS) as executor:
+                image_handed_out = False
+                # ordered by decreasing size
+                for cache in caches:
+                    dimensions = cache.image_size.get_thumbnail_dimensions(*image.size)
+                    if dimensions != image.size:
+                        try:
+                            image = image.resize(dimensions, resample=PIL.Image.LANCZOS, reducing_gap=2.0)
+                        except Exception as err:
+                            raise PostException(
+                                f'Unable to thumbnail image as jpeg for post `{self.id}`: {err}'
+                            ) from err
+                    elif image_handed_out:
+                        # Image.save() mutates the image, so concurrent encodes can't share one
+                        image = image.copy()
+                    image_handed_out = True
+                    nbytes = pil_image_bytes(image)
+                    budget.acquire(nbytes)
+                    cache.set_image(image, copy=False)
+                    futures.append(executor.submit(flush, cache, nbytes))
+        finally:
+            self.image_memory.release(draft_bytes)
+        for future in futures:
+            future.result()  # re-raise any errors from the workers
+
+        self.thumbnails_peak_bytes = budget.peak_bytes
+        logger.info(f'Post `{self.id}`: built thumbnails with peak of `{budget.peak_bytes}` bytes of images held')
 
     def process_image_upload(self, image_data=None, now=None):
         assert self.type == PostType.IMAGE, 'Can only process_image_upload() for IMAGE posts'
@@ -277,7 +396,10 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
             source_cached_image.crop(crop)
 
         if source_cached_image != self.native_jpeg_cache:
-            self.native_jpeg_cache.set_image(source_cached_image.readonly_image)  # set_image makes a copy
+            # hand the decoded image off to the native jpeg cache, rather than holding it in both
+            image = source_cached_image.readonly_image
+            source_cached_image.release()
+            self.native_jpeg_cache.set_image(image)
 
         if self.native_jpeg_cache.is_synced is False:
             self.native_jpeg_cache.flush()
@@ -290,8 +412,9 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
         self.build_image_thumbnails()
         self.set_height_and_width()
         self.set_colors()
-        self.set_is_verified()
         self.set_checksum()
+        self.set_perceptual_hash()
+        logger.info(f'Post `{self.id}`: processed image upload with peak of `{self.image_peak_bytes}` bytes held')
         self.complete(now=now)
 
     def start_processing_video_upload(self):
@@ -342,6 +465,11 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
             post_id = self.dynamo.get_first_with_checksum(checksum)
             if post_id and post_id != self.id:
                 original_post_id = post_id
+            # fall back to looking for re-encoded or resized copies
+            if not original_post_id and self.perceptual_hash is not None:
+                post_id = self.perceptual_hash_dynamo.get_first_near_duplicate(self.perceptual_hash)
+                if post_id and post_id != self.id:
+                    original_post_id = post_id
         set_as_user_photo = self.item.get('setAsUserPhoto')
 
         album_id = self.item.get('albumId')
@@ -352,25 +480,29 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
             self.item = self.dynamo.set_album_id(self.item, None)
         album_rank = album.get_last_rank() if album else None
 
+        # image posts still awaiting verification get some steps in verify() instead
+        verification_pending = self.type == PostType.IMAGE and self.is_verified is None
+
         # complete the post
         self.item = self.dynamo.set_post_status(
-            self.item, PostStatus.COMPLETED, original_post_id=original_post_id, album_rank=album_rank,
+            self.item,
+            PostStatus.COMPLETED,
+            original_post_id=original_post_id,
+            album_rank=album_rank,
+            keep_set_as_user_photo=verification_pending,
         )
 
         # update the user's profile photo, if needed
-        if set_as_user_photo:
-            try:
-                self.user.update_photo(self.id)
-            except UserException as err:
-                logger.warning(f'Unable to set user photo with post `{self.id}`: {err}')
+        if set_as_user_photo and not verification_pending:
+            self.set_as_user_photo()
 
         # update the first story if needed
         if self.item.get('expiresAt'):
             self.follower_manager.refresh_first_story(story_now=self.item)
 
         # give new posts a free bump into trending, but not their user
-        trending_kwargs = {'now': now, 'multiplier': self.get_trending_multiplier()}
-        self.trending_increment_score(**trending_kwargs)
+        if not verification_pending:
+            self.trending_increment_score(now=now, multiplier=self.get_trending_multiplier())
 
         # alert frontend
         self.appsync.trigger_notification(PostNotificationType.COMPLETED, self)
@@ -445,6 +577,8 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
         if self.image_item:
             self.image_dynamo.delete(self.id)
         self.original_metadata_dynamo.delete(self.id)
+        if self.type == PostType.IMAGE:
+            self.perceptual_hash_dynamo.delete(self.id)
         self.dynamo.delete_post(self.id)
 
         return self
@@ -477,36 +611,108 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
         return self
 
     def set_height_and_width(self):
-        width, height = self.native_jpeg_cache.readonly_image.size
+        width, height = self.native_jpeg_cache.dimensions
         self._image_item = self.image_dynamo.set_height_and_width(self.id, height, width)
         return self
 
     def set_colors(self):
         try:
-            colors = ColorThiefFromImage(self.native_jpeg_cache.readonly_image).get_palette(color_count=5)
+            colors = get_palette(self.p480_jpeg_cache.readonly_image, color_count=5)
         except Exception as err:
-            logger.warning(f'ColorTheif failed to get palette with error `{err}` for post `{self.id}`')
+            logger.warning(f'Failed to get palette with error `{err}` for post `{self.id}`')
         else:
             self._image_item = self.image_dynamo.set_colors(self.id, colors)
         return self
 
+    def set_perceptual_hash(self):
+        """
+        Index the perceptual hash of the 64p thumbnail, which is expected to already be in memory.
+        Images too plain to have a meaningful hash aren't indexed.
+        """
+        self.perceptual_hash = dhash(self.p64_jpeg_cache.readonly_image)
+        if self.perceptual_hash is not None:
+            self.perceptual_hash_dynamo.add(self.id, self.item['postedAt'], self.perceptual_hash)
+        return self
+
     def set_checksum(self):
         path = self.get_image_path(image_size.NATIVE)
         checksum = self.s3_uploads_client.get_object_checksum(path)
         self.item = self.dynamo.set_checksum(self.id, self.item['postedAt'], checksum)
         return self
 
-    def set_is_verified(self):
-        path = self.get_image_path(image_size.NATIVE)
-        image_url = self.cloudfront_client.generate_presigned_url(path, ['GET', 'HEAD'])
-        is_verified = self.post_verification_client.verify_image(
-            image_url,
-            image_format=self.image_item.get('imageFormat'),
-            original_format=self.image_item.get('originalFormat'),
-            taken_in_real=self.image_item.get('takenInReal'),
-        )
+    def set_is_verified(self, is_verified=None, remove_set_as_user_photo=False):
+        "Calls the post verification service, unless the result is passed in as `is_verified`"
+        if is_verified is None:
+            path = self.get_image_path(image_size.NATIVE)
+            image_url = self.cloudfront_client.generate_presigned_url(path, ['GET', 'HEAD'])
+            is_verified = self.post_verification_client.verify_image(
+                image_url,
+                image_format=self.image_item.get('imageFormat'),
+                original_format=self.image_item.get('originalFormat'),
+                taken_in_real=self.image_item.get('takenInReal'),
+            )
         hidden = self.item.get('verificationHidden', False)
-        self.item = self.dynamo.set_is_verified(self.id, is_verified, hidden=hidden)
+        self.item = self.dynamo.set_is_verified(
+            self.id, is_verified, hidden=hidden, remove_set_as_user_photo=remove_set_as_user_photo
+        )
+        return self
+
+    def verify(self, now=None):
+        """
+        Verify the image of a completed post.
+
+        This runs as its own stage after the post is completed, so that a slow or failing
+        verification service doesn't hold up upload processing. The result is re-used from
+        any earlier post with the same checksum, if available.
+
+        If verification fails, the post is left without a result and scheduled for a retry
+        by the `retry_post_verifications` cron, backing off exponentially. Once it has failed
+        VERIFICATION_MAX_ATTEMPTS times, the post is marked as not verified.
+        """
+        assert self.type == PostType.IMAGE, 'Can only verify() IMAGE posts'
+        if self.status != PostStatus.COMPLETED or self.is_verified is not None:
+            return self
+
+        now = now or pendulum.now('utc')
+        # complete() leaves setAsUserPhoto in place for us
+        set_as_user_photo = self.item.get('setAsUserPhoto')
+        try:
+            is_verified = self.get_is_verified_by_checksum()
+            self.set_is_verified(is_verified=is_verified, remove_set_as_user_photo=True)
+        except Exception as err:
+            attempts = int(self.item.get('verificationAttempts', 0)) + 1
+            if attempts < VERIFICATION_MAX_ATTEMPTS:
+                retry_at = now + VERIFICATION_RETRY_DELAY * 2 ** (attempts - 1)
+                logger.error(f'Unable to verify post `{self.id}`, will retry at `{retry_at}`: {err}')
+                self.item = self.dynamo.set_verification_retry_at(self.id, retry_at, attempts) or self.item
+                return self
+            logger.error(f'Unable to verify post `{self.id}` after {attempts} attempts, giving up: {err}')
+            self.set_is_verified(is_verified=False, remove_set_as_user_photo=True)
+
+        # the steps of complete() that depend on the verification result
+        if set_as_user_photo:
+            self.set_as_user_photo()
+        self.trending_increment_score(now=now, multiplier=self.get_trending_multiplier())
+        return self
+
+    def get_is_verified_by_checksum(self):
+        "The verification result of the first post with the same checksum, if there is one with a result"
+        checksum = self.item.get('checksum')
+        post_id = self.dynamo.get_first_with_checksum(checksum) if checksum else None
+        if not post_id or post_id == self.id:
+            return None
+        post_item = self.dynamo.get_post(post_id)
+        if not post_item:
+            return None
+        if post_item.get('verificationHidden', False):
+            return post_item.get('isVerifiedHiddenValue')
+        return post_item.get('isVerified')
+
+    def set_as_user_photo(self):
+        try:
+            self.user.update_photo(self.id)
+        except UserException as err:
+            logger.warning(f'Unable to set user photo with post `{self.id}`: {err}')
         return self
 
     def set_expires_at(self, expires_at):
@@ -598,7 +804,12 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
 
         return super().flag(user)
 
-    def record_view_count(self, user_id, view_count, viewed_at=None):
+    def record_view_count(self, user_id, view_count, viewed_at=None, post_viewed_by_sketches=None):
+        """
+        If viewedBy sketches are enabled, `post_viewed_by_sketches` may be passed in to collect
+        additions to the post owners' postViewedBy sketches so the caller can merge them in as a batch.
+        Otherwise, additions are merged into the post owner's sketch immediately.
+        """
         if self.status != PostStatus.COMPLETED:
             logger.warning(f'Cannot record views by user `{user_id}` on non-COMPLETED post `{self.id}`')
             return False
@@ -616,7 +827,16 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
             self.user.trending_increment_score(**trending_kwargs)
 
         # record the viewedBy on the post and user
-        if is_new_view:
+        if self.post_manager.viewed_by_sketches_enabled:
+            viewed_by_sketch = HyperLogLog()
+            viewed_by_sketch.add(user_id)
+            self.merge_viewed_by_sketch(viewed_by_sketch)
+            # the user's sketch counts distinct (post, viewer) pairs, ie the sum of their posts' viewedByCounts
+            sketches = post_viewed_by_sketches if post_viewed_by_sketches is not None else {}
+            sketches.setdefault(self.user_id, HyperLogLog()).add(f'{self.id}/{user_id}')
+            if post_viewed_by_sketches is None:
+                self.user_manager.merge_post_viewed_by_sketch(self.user_id, sketches[self.user_id])
+        elif is_new_view:
             self.dynamo.increment_viewed_by_count(self.id)
             self.user_manager.dynamo.increment_post_viewed_by_count(self.user_id)
 
@@ -624,10 +844,38 @@ class Post(FlagModelMixin, TrendingModelMixin, ViewModelMixin):
         if self.original_post_id != self.id:
             original_post = self.post_manager.get_post(self.original_post_id)
             if original_post:
-                original_post.record_view_count(user_id, view_count, viewed_at=viewed_at)
+                original_post.record_view_count(
+                    user_id, view_count, viewed_at=viewed_at, post_viewed_by_sketches=post_viewed_by_sketches
+                )
 
         return True
 
+    def merge_viewed_by_sketch(self, sketch, retries=3):
+        "Merge `sketch` into the post's viewedBy sketch. Only writes to dynamo if the sketch changed."
+        for _ in range(retries):
+            prev_sketch_bytes = self.item.get('viewedBySketch')
+            viewed_by_sketch = HyperLogLog.from_bytes(prev_sketch_bytes) if prev_sketch_bytes else HyperLogLog()
+            prev_sketch_count = viewed_by_sketch.count()
+            if not viewed_by_sketch.merge(sketch):
+                return self
+            # add the sketch's growth to the stored count, as posts viewed before sketches were enabled
+            # have an exact count their sketch doesn't cover. A viewer counted exactly who views again is
+            # counted a second time when they first land in the sketch, but only that once, so the overcount
+            # is bounded by the exact count. Estimates can wobble, so never go backwards.
+            viewed_by_count = self.viewed_by_count + max(viewed_by_sketch.count() - prev_sketch_count, 0)
+            try:
+                self.item = self.dynamo.set_viewed_by_sketch(
+                    self.id, viewed_by_sketch.to_bytes(), viewed_by_count, prev_sketch_bytes=prev_sketch_bytes
+                )
+                return self
+            except self.dynamo.client.exceptions.ConditionalCheckFailedException:
+                # lost a race with a concurrent merge (or the post was deleted), so start over
+                self.refresh_item(strongly_consistent=True)
+                if not self.item:
+                    return self
+        logger.warning(f'Failed to merge viewedBy sketch for post `{self.id}` after {retries} attempts')
+        return self
+
     def get_trending_multiplier(self):
         multiplier = 1
         if self.is_verified is False:  # note that non-image posts have is_verified value of None
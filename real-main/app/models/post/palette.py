@@ -0,0 +1,80 @@
+QUANTIZE_BITS = 5
+MAX_KMEANS_ITERATIONS = 20
+
+
+def get_palette(image, color_count=5):
+    """
+    Get the dominant colors of an image as a list of (r, g, b) tuples, most dominant first.
+
+    Intended to run over a thumbnail. Pixels are bucketed into a histogram with QUANTIZE_BITS
+    bits per channel, and the histogram buckets are then clustered with weighted k-means.
+    As colorthief does, mostly-transparent and nearly-white pixels are ignored.
+    Fewer than `color_count` colors are returned if the image doesn't have that many distinct colors.
+    """
+    # imported here as numpy is slow to import, and most of the lambdas that import posts never get palettes
+    import numpy as np
+
+    assert color_count > 0, 'Must request at least one color'
+    pixels = np.asarray(image.convert('RGBA')).reshape(-1, 4)
+    pixels = pixels[(pixels[:, 3] >= 125) & (pixels[:, :3].min(axis=1) <= 250), :3]
+    if not len(pixels):
+        raise ValueError('Image has no opaque, non-white pixels')
+
+    # histogram over the quantized colors, with each bucket positioned at the mean of its pixels
+    shift = 8 - QUANTIZE_BITS
+    quantized = (pixels >> shift).astype(np.int32)
+    keys = (quantized[:, 0] << (2 * QUANTIZE_BITS)) | (quantized[:, 1] << QUANTIZE_BITS) | quantized[:, 2]
+    bucket_count = 1 << (3 * QUANTIZE_BITS)
+    counts = np.bincount(keys, minlength=bucket_count)
+    occupied = counts.nonzero()[0]
+    counts = counts[occupied]
+    buckets = np.stack(
+        [np.bincount(keys, weights=pixels[:, c], minlength=bucket_count)[occupied] for c in range(3)], axis=1
+    )
+    buckets /= counts[:, None]
+    weights = counts.astype(np.float64)
+    weighted_buckets = buckets * weights[:, None]
+
+    centers = _initial_centers(buckets, weights, min(color_count, len(buckets)))
+    labels = None
+    for _ in range(MAX_KMEANS_ITERATIONS):
+        new_labels = _nearest(buckets, centers)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        cluster_weights = np.bincount(labels, weights=weights, minlength=len(centers))
+        occupied = cluster_weights > 0
+        cluster_sums = np.stack(
+            [np.bincount(labels, weights=weighted_buckets[:, c], minlength=len(centers)) for c in range(3)],
+            axis=1,
+        )
+        centers = cluster_sums[occupied] / cluster_weights[occupied, None]
+        if not occupied.all():
+            labels = None  # the labels index into the old centers, so can't be compared
+
+    cluster_weights = np.bincount(_nearest(buckets, centers), weights=weights, minlength=len(centers))
+    order = np.argsort(-cluster_weights, kind='stable')
+    return [tuple(int(v) for v in np.rint(centers[i])) for i in order if cluster_weights[i] > 0]
+
+
+def _nearest(points, centers):
+    """
+    Index of the nearest center to each point.
+    |p - c|^2 = |p|^2 - 2p.c + |c|^2, and |p|^2 doesn't affect the argmin.
+    """
+    return ((centers ** 2).sum(axis=1) - 2 * points @ centers.T).argmin(axis=1)
+
+
+def _initial_centers(buckets, weights, k):
+    "Deterministic k-means++ style seeding: start at the most common color, then go for far-away popular colors"
+    import numpy as np
+
+    centers = [buckets[weights.argmax()]]
+    min_distances = ((buckets - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        index = (weights * min_distances).argmax()
+        if min_distances[index] == 0:
+            break
+        centers.append(buckets[index])
+        min_distances = np.minimum(min_distances, ((buckets - buckets[index]) ** 2).sum(axis=1))
+    return np.array(centers, dtype=np.float64)
@@ -0,0 +1,45 @@
+import PIL.Image
+
+HASH_BITS = 64
+
+# images with less range in brightness than this across the grid are too flat to hash meaningfully
+MIN_GRID_CONTRAST = 16
+# likewise hashes with fewer bits set, or unset, than this: they come from near-uniform images and gradients
+MIN_BITS_SET = 6
+
+
+def dhash(image):
+    """
+    Difference hash of an image, as an int of HASH_BITS bits.
+
+    The image is shrunk to a 9x8 grayscale grid and each bit records whether brightness increases
+    between horizontally adjacent cells. Re-encoding, resizing or mild color adjustments of an image
+    change few if any bits. Cheap enough to run on any of the thumbnails.
+
+    Returns None for images with too little in them to tell apart, such as blank ones, which would
+    otherwise all hash to about the same value.
+    """
+    grid = image.convert('L').resize((9, 8), resample=PIL.Image.BOX)
+    pixels = list(grid.getdata())
+    if max(pixels) - min(pixels) < MIN_GRID_CONTRAST:
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+            value = (value << 1) | (right > left)
+    if not MIN_BITS_SET <= bin(value).count('1') <= HASH_BITS - MIN_BITS_SET:
+        return None
+    return value
+
+
+def hamming_distance(hash1, hash2):
+    return bin(hash1 ^ hash2).count('1')
+
+
+def to_str(value):
+    return f'{value:0{HASH_BITS // 4}x}'
+
+
+def from_str(value_str):
+    return int(value_str, 16)
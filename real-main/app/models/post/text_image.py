@@ -1,3 +1,6 @@
+import functools
+import hashlib
+import io
 import logging
 import os.path
 
@@ -5,25 +8,81 @@ import PIL.Image
 import PIL.ImageDraw
 import PIL.ImageFont
 
+from app.utils import LruCache
+
 font_path = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'fonts', 'OpenSans-Regular.ttf')
 logger = logging.getLogger()
 
+# Rendered images are big (~25MB for 4k), so only the most recent few are kept around. That's enough
+# for the different sizes of a post, and for a post that's being served repeatedly in a warm lambda.
+RENDERED_CACHE_SIZE = 4
+
+
+@functools.lru_cache(maxsize=1)
+def get_font_data():
+    with open(font_path, 'rb') as fh:
+        return fh.read()
+
+
+@functools.lru_cache(maxsize=32)
+def get_font(font_size):
+    "The font parsed at the given size. Parsing the font file is expensive, so cached per size."
+    return PIL.ImageFont.truetype(io.BytesIO(get_font_data()), size=font_size)
 
-def generate_text_image(text, dimensions, font_size=None):
-    "Generate an image with text nicely wrapped and centered"
+
+# keyed by a hash of the text and the dimensions
+rendered_cache = LruCache(RENDERED_CACHE_SIZE)
+
+
+def generate_text_image(text, dimensions, render_dimensions=None):
+    """
+    Generate an image with text nicely wrapped and centered.
+
+    If `render_dimensions` are passed (with the same aspect ratio, and larger), the image is rendered
+    at that size and then downscaled. That lets all sizes of a post share a single rendering.
+    Rendered images are memoized, so treat the return value as read-only.
+    """
     assert text, 'Must be called with some text to render'
+    dimensions = tuple(dimensions)
+    render_dimensions = tuple(render_dimensions or dimensions)
 
+    key = (hashlib.sha256(text.encode('utf-8')).digest(), dimensions)
+    if (image := rendered_cache.get(key)) is not None:
+        return image
+
+    if render_dimensions == dimensions:
+        image = render_text_image(text, dimensions)
+    else:
+        image = generate_text_image(text, render_dimensions).resize(
+            dimensions, resample=PIL.Image.LANCZOS, reducing_gap=2.0
+        )
+    rendered_cache.put(key, image)
+    return image
+
+
+def render_text_image(text, dimensions):
     image_width, image_height = dimensions
-    image_aspect_ratio = image_width / image_height
     img = PIL.Image.new('RGB', dimensions)
+    draw = PIL.ImageDraw.Draw(img)
 
-    font_size = font_size or image_height // 10
+    # lay out at the default font size, and if that's too wide to fit, shrink the font to fit
+    font_size = image_height // 10
+    aspect_ratio = image_width / image_height
+    wrapped, text_width, text_height, line_spacing = layout_text(draw, text, font_size, aspect_ratio)
+    max_text_width = image_width * 0.9
+    if text_width > max_text_width:
+        font_size = int(font_size * max_text_width / text_width)
+        wrapped, text_width, text_height, line_spacing = layout_text(draw, text, font_size, aspect_ratio)
 
-    with open(font_path, 'rb') as fh:
-        font = PIL.ImageFont.truetype(fh, size=font_size)
+    # write out the text in center of the image
+    xy = ((image_width - text_width) / 2, (image_height - text_height) / 2 - line_spacing / 2)
+    draw.text(xy, wrapped, align='center', fill=(255, 255, 255), font=get_font(font_size))
+    return img
 
-    # we want our text to match, more or less, the aspect ratio of the overall image
-    draw = PIL.ImageDraw.Draw(img)
+
+def layout_text(draw, text, font_size, aspect_ratio):
+    "Wrap the text to, more or less, the aspect ratio. Returns (wrapped_text, width, height, line_spacing)"
+    font = get_font(font_size)
 
     # determine how big horizontal and vertical spaces are
     size_1 = draw.textsize('Z Z', font=font)
@@ -35,63 +94,25 @@ def generate_text_image(text, dimensions, font_size=None):
     # tokenize then wrap the text so it looks good
     raw_tokens = text.split()
     token_widths = [draw.textsize(raw_token, font=font)[0] for raw_token in raw_tokens]
-    text, text_width, text_height = rectangle_wrap(
-        raw_tokens, token_widths, token_spacing, line_spacing, line_height, image_aspect_ratio
+    wrapped, text_width, text_height = rectangle_wrap(
+        raw_tokens, token_widths, token_spacing, line_spacing, line_height, aspect_ratio
     )
 
     logger.debug(f'Computed text size: ({text_width}, {text_height})')
-    logger.debug(f'Actual text size:   {draw.textsize(text, font=font)}')
-
-    # if it's too big to fit in the image, shrink the font size and re-run the algo
-    max_text_width = image_width * 0.9
-    if text_width > max_text_width:
-        font_size = int(font_size * max_text_width / text_width)
-        return generate_text_image(text, dimensions, font_size=font_size)
-
-    # write out the text in center of the image
-    xy = ((image_width - text_width) / 2, (image_height - text_height) / 2 - line_spacing / 2)
-    draw.text(xy, text, align='center', fill=(255, 255, 255), font=font)
-    return img
-
-
-class Token:
-    "A word in a variable-width font"
+    return wrapped, text_width, text_height, line_spacing
 
-    def __init__(self, token, token_width):
-        self._token = token
-        self._token_width = token_width
 
-    def __str__(self):
-        return self._token
-
-    def __len__(self):
-        return self._token_width
-
-
-class Line:
-    "A line of text in a variable-width font"
-
-    def __init__(self, tokens, token_spacing):
-        self._tokens = tokens
-        self._token_spacing = token_spacing
-
-    @property
-    def first_token(self):
-        return self._tokens[0] if self._tokens else None
-
-    def pop_first_token(self):
-        return self._tokens.pop(0)
-
-    def append_token(self, token):
-        self._tokens.append(token)
-
-    def __str__(self):
-        return ' '.join(str(t) for t in self._tokens)
-
-    def __len__(self):
-        if not self._tokens:
-            return 0
-        return sum(len(t) for t in self._tokens) + (len(self._tokens) - 1) * self._token_spacing
+def greedy_wrap(token_widths, token_spacing, max_width):
+    "Break tokens into lines no wider than max_width, filling each line as full as possible"
+    lines, line, line_width = [], [], 0
+    for index, width in enumerate(token_widths):
+        if line and line_width + token_spacing + width > max_width:
+            lines.append((line, line_width))
+            line, line_width = [], 0
+        line_width = line_width + token_spacing + width if line else width
+        line.append(index)
+    lines.append((line, line_width))
+    return lines
 
 
 def rectangle_wrap(raw_tokens, token_widths, token_spacing, line_spacing, line_height, desired_aspect_ratio):
@@ -99,49 +120,30 @@ def rectangle_wrap(raw_tokens, token_widths, token_spacing, line_spacing, line_h
     Given a series of tokens, their widths, information about spacing and a desired aspect ratio,
     return a block of text that closely matches the desired aspect ratio.
 
+    Wrapping wider gives fewer, wider lines and so a wider block of text. We binary search over the
+    max line width for the narrowest wrapping that reaches the desired aspect ratio.
+
     Note that python standard library textwrap module assumes a monospace font, where as this
     utility is designed to work with variable width font.
     """
-    tokens = [Token(*args) for args in zip(raw_tokens, token_widths)]
-
-    # start all tokens in separate lines, we will iteratively move tokens up lines
-    lines = [Line([token], token_spacing) for token in tokens]
-    text_width = max(len(line) for line in lines)
-    text_height = len(lines) * line_height + (len(lines) - 1) * line_spacing
-
-    # iteratively flow tokens up the paragraph until we have just passed our desired aspect ratio
-    while (line_cnt := len(lines)) > 1 and text_width / text_height < desired_aspect_ratio:
-
-        # operate until we have shrunk our line cnt
-        while len(lines) == line_cnt:
-
-            # determine what our next text_width needs to be to change the token distribution
-            this_line, next_line = lines[0], lines[1]
-            min_new_text_width = len(this_line) + token_spacing + len(next_line.first_token)
-            line_num_to_grow = 0
-            for i, this_line in enumerate(lines[1:-1]):
-                next_line = lines[i + 2]
-                this_new_text_width = len(this_line) + token_spacing + len(next_line.first_token)
-                if this_new_text_width < min_new_text_width:
-                    min_new_text_width = this_new_text_width
-                    line_num_to_grow = i
-
-            # flow tokens up for subsequent lines
-            line_num = line_num_to_grow
-            while line_num < len(lines) - 1:
-                this_line, next_line = lines[line_num], lines[line_num + 1]
-                if len(next_line) == 0:
-                    lines.pop(line_num + 1)
-                    break
-                new_line_width = len(this_line) + token_spacing + len(next_line.first_token)
-                if new_line_width <= min_new_text_width:
-                    this_line.append_token(next_line.pop_first_token())
-                    continue
-                line_num += 1
-
-        # re-compute our overall size
-        text_width = max(len(line) for line in lines)
+
+    def wrap(max_width):
+        lines = greedy_wrap(token_widths, token_spacing, max_width)
+        text_width = max(line_width for _, line_width in lines)
         text_height = len(lines) * line_height + (len(lines) - 1) * line_spacing
+        return lines, text_width, text_height
+
+    low = max(token_widths)  # every token on its own line
+    high = sum(token_widths) + (len(token_widths) - 1) * token_spacing  # all tokens on one line
+    while low < high:
+        mid = (low + high) // 2
+        _, text_width, text_height = wrap(mid)
+        if text_width / text_height < desired_aspect_ratio:
+            low = mid + 1
+        else:
+            high = mid
+    lines, text_width, text_height = wrap(low)
 
     # serialize to our rectangle of text
-    return ('\n'.join(str(line) for line in lines), text_width, text_height)
+    text = '\n'.join(' '.join(raw_tokens[index] for index in line) for line, _ in lines)
+    return (text, text_width, text_height)
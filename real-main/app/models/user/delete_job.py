@@ -0,0 +1,110 @@
+import concurrent.futures
+import logging
+import time
+
+import pendulum
+
+logger = logging.getLogger()
+
+USER_DELETE_MAX_WORKERS = 8
+
+# a run of a user delete job holds it for at most this long, the max lambda timeout
+USER_DELETE_JOB_LEASE = pendulum.duration(minutes=15)
+
+# stage name -> (stages that must complete first, function of the user that runs the stage & returns a count)
+STAGES = {
+    # for REQUESTED and DENIED, just delete them
+    # for FOLLOWING, unfollow so that the other user's counts remain correct
+    'followed': ((), lambda user: user.follower_manager.reset_followed_items(user.id)),
+    'followers': ((), lambda user: user.follower_manager.reset_follower_items(user.id)),
+    # unflag everything we've flagged
+    'postFlags': ((), lambda user: user.post_manager.unflag_all_by_user(user.id)),
+    'commentFlags': ((), lambda user: user.comment_manager.unflag_all_by_user(user.id)),
+    # delete all our likes & comments & albums & posts. Deleting a post deletes the likes and comments
+    # on it, and updates its album, so our posts go only once the rest are gone.
+    'likes': ((), lambda user: user.like_manager.dislike_all_by_user(user.id)),
+    'comments': (('commentFlags',), lambda user: user.comment_manager.delete_all_by_user(user.id)),
+    'albums': ((), lambda user: user.album_manager.delete_all_by_user(user.id)),
+    'posts': (
+        ('postFlags', 'likes', 'comments', 'albums'),
+        lambda user: user.post_manager.delete_all_by_user(user.id),
+    ),
+    # remove all blocks of and by us
+    'blocks': ((), lambda user: user.block_manager.unblock_all_blocks(user.id)),
+    # leave all chats we are part of (auto-deletes direct & solo chats)
+    'chats': ((), lambda user: user.chat_manager.leave_all_chats(user.id)),
+    # remove our trending item, if it's there
+    'trending': ((), lambda user: int(bool(user.trending_dynamo.delete(user.id)))),
+    # delete current and old profile photos
+    'photos': ((), lambda user: user.clear_photo_s3_objects()),
+}
+
+
+class UserDeleteJob:
+    """
+    Deletes everything that belongs to a user, then the user themselves.
+
+    The work is split into stages, and stages that don't depend on each other run concurrently. Each
+    completed stage is checkpointed in the job item along with a count of what it processed, so a job
+    cut short (ex: by a lambda timeout) resumes where it left off. Stages are safe to re-run, as they
+    only process what remains.
+    """
+
+    def __init__(self, user, job_item, job_dynamo, max_workers=USER_DELETE_MAX_WORKERS):
+        self.user = user
+        self.job_item = job_item
+        self.job_dynamo = job_dynamo
+        self.max_workers = max_workers
+
+    @property
+    def stage_counts(self):
+        return self.job_item['stageCounts']
+
+    def run(self, deadline=None):
+        """
+        Run the stages not yet completed. No new stages are started after `deadline`, a time.monotonic()
+        value. Returns True if the user was deleted, or False if there are stages left for another run.
+        """
+        pending = [name for name in STAGES if name not in self.stage_counts]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            while pending or running:
+                if deadline is None or time.monotonic() < deadline:
+                    for name in [name for name in pending if self.is_ready(name)]:
+                        pending.remove(name)
+                        running[executor.submit(STAGES[name][1], self.user)] = name
+                if not running:
+                    break
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    self.complete_stage(name, future.result() or 0)
+
+        if pending:
+            return False
+        self.finish()
+        return True
+
+    def is_ready(self, name):
+        return all(dependency in self.stage_counts for dependency in STAGES[name][0])
+
+    def complete_stage(self, name, count):
+        self.job_dynamo.set_stage_count(self.user.id, name, count)
+        self.stage_counts[name] = count
+
+    def finish(self):
+        # cognito first, so that a job cut short after the profile is gone has nothing left to do
+        cognito_client = self.user.cognito_client
+        try:
+            if self.job_item.get('skipCognito'):
+                # release our preferred_username from cognito
+                cognito_client.clear_user_attribute(self.user.id, 'preferred_username')
+            else:
+                cognito_client.delete_identity_pool_entry(self.user.id)
+                cognito_client.delete_user_pool_entry(self.user.id)
+        except cognito_client.user_pool_client.exceptions.UserNotFoundException:
+            logger.warning(f'No cognito user pool entry found when deleting user `{self.user.id}`')
+
+        # delete our own profile, then the job. Leave our stale item around so we can serialize
+        self.user.dynamo.delete_user(self.user.id)
+        self.job_dynamo.delete(self.user.id)
@@ -1,7 +1,9 @@
 __all__ = [
     'UserDynamo',
     'UserContactAttributeDynamo',
+    'UserDeleteJobDynamo',
 ]
 
 from .base import UserDynamo
 from .contact_attribute import UserContactAttributeDynamo
+from .delete_job import UserDeleteJobDynamo
@@ -1,8 +1,9 @@
 import collections
 import logging
+from functools import partialmethod
 
 import pendulum
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
 
 from ..enums import UserPrivacyStatus, UserStatus, UserSubscriptionLevel
 from ..exceptions import UserAlreadyExists, UserAlreadyGrantedSubscription
@@ -36,6 +37,37 @@ class UserDynamo:
     def delete_user(self, user_id):
         return self.client.delete_item(self.pk(user_id))
 
+    def generate_users_with_scan(self, segment=0, total_segments=1, projection_expression=None):
+        """
+        Do a table **scan** to generate user profile items, or just one segment of them for a parallel scan.
+        Cost grows with the whole table, so only for full reindexes & manual repairs.
+        """
+        query_kwargs = {
+            'FilterExpression': Attr('partitionKey').begins_with('user/') & Attr('sortKey').eq('profile'),
+            'Segment': segment,
+            'TotalSegments': total_segments,
+        }
+        if projection_expression:
+            query_kwargs['ProjectionExpression'] = projection_expression
+        return self.client.generate_all_scan(query_kwargs)
+
+    def cache_version_key(self, cache_name, bucket):
+        return {'partitionKey': f'{cache_name}CacheVersion/{bucket}', 'sortKey': '-'}
+
+    def get_cache_versions(self, cache_name, buckets):
+        "Returns a dict of bucket -> version, for those of the buckets that have a version"
+        items = self.client.batch_get(self.cache_version_key(cache_name, bucket) for bucket in buckets)
+        return {int(item['partitionKey'].split('/')[1]): item['version'] for item in items}
+
+    def set_cache_version(self, cache_name, bucket, version):
+        key = self.cache_version_key(cache_name, bucket)
+        return self.client.set_attributes(key, schemaVersion=0, version=version)
+
+    get_caller_cache_versions = partialmethod(get_cache_versions, 'caller')
+    set_caller_cache_version = partialmethod(set_cache_version, 'caller')
+    get_username_cache_versions = partialmethod(get_cache_versions, 'username')
+    set_username_cache_version = partialmethod(set_cache_version, 'username')
+
     def add_user(
         self, user_id, username, full_name=None, email=None, phone=None, placeholder_photo_code=None, now=None
     ):
@@ -188,13 +220,26 @@ class UserDynamo:
             query_kwargs['ExpressionAttributeValues'] = {':aev': version}
         return self.client.update_item(query_kwargs)
 
-    def set_last_client(self, user_id, client):
+    def set_last_client(self, user_id, client, now=None, not_set_since=None):
+        """
+        Set `not_set_since` to only write if lastClient hasn't been set since then.
+        Returns None if the write was skipped because of that.
+        """
+        now = now or pendulum.now('utc')
         query_kwargs = {
             'Key': self.pk(user_id),
-            'UpdateExpression': 'SET lastClient = :lc',
-            'ExpressionAttributeValues': {':lc': client},
+            'UpdateExpression': 'SET lastClient = :lc, lastClientSetAt = :lcsa',
+            'ExpressionAttributeValues': {':lc': client, ':lcsa': now.to_iso8601_string()},
         }
-        return self.client.update_item(query_kwargs)
+        if not_set_since:
+            query_kwargs['ConditionExpression'] = (
+                'attribute_not_exists(lastClientSetAt) or lastClientSetAt <= :nss'
+            )
+            query_kwargs['ExpressionAttributeValues'][':nss'] = not_set_since.to_iso8601_string()
+        try:
+            return self.client.update_item(query_kwargs)
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return None
 
     def grant_subscription(self, user_id, sub_level, sub_granted_at, sub_expires_at):
         assert sub_level != UserSubscriptionLevel.BASIC, "Cannot grant BASIC subscriptions"
@@ -347,6 +392,23 @@ class UserDynamo:
     def increment_post_viewed_by_count(self, user_id):
         return self.client.increment_count(self.pk(user_id), 'postViewedByCount')
 
+    def set_post_viewed_by_sketch(self, user_id, sketch_bytes, post_viewed_by_count, prev_sketch_bytes=None):
+        """
+        Set the postViewedBy sketch along with the count it backs.
+        Fails with ConditionalCheckFailedException if the sketch has changed since `prev_sketch_bytes` was read.
+        """
+        query_kwargs = {
+            'Key': self.pk(user_id),
+            'UpdateExpression': 'SET postViewedBySketch = :pvbs, postViewedByCount = :pvbc',
+            'ExpressionAttributeValues': {':pvbs': sketch_bytes, ':pvbc': post_viewed_by_count},
+        }
+        if prev_sketch_bytes:
+            query_kwargs['ConditionExpression'] = 'postViewedBySketch = :prevpvbs'
+            query_kwargs['ExpressionAttributeValues'][':prevpvbs'] = prev_sketch_bytes
+        else:
+            query_kwargs['ConditionExpression'] = 'attribute_not_exists(postViewedBySketch)'
+        return self.client.update_item(query_kwargs)
+
     def add_user_deleted(self, user_id, now=None):
         now = now or pendulum.now('utc')
         deleted_at_str = now.to_iso8601_string()
@@ -0,0 +1,85 @@
+import logging
+
+import pendulum
+
+logger = logging.getLogger()
+
+
+class UserDeleteJobDynamo:
+    "The progress of deleting a user, one item per user being deleted"
+
+    schema_version = 0
+
+    def __init__(self, dynamo_client):
+        self.client = dynamo_client
+
+    def pk(self, user_id):
+        return {'partitionKey': f'userDeleteJob/{user_id}', 'sortKey': '-'}
+
+    def get(self, user_id, strongly_consistent=False):
+        return self.client.get_item(self.pk(user_id), ConsistentRead=strongly_consistent)
+
+    def add(self, user_id, skip_cognito=False, now=None):
+        "Add the job, or return the existing one if the user is already being deleted"
+        now = now or pendulum.now('utc')
+        created_at_str = now.to_iso8601_string()
+        item = {
+            **self.pk(user_id),
+            'schemaVersion': self.schema_version,
+            'userId': user_id,
+            'createdAt': created_at_str,
+            'skipCognito': skip_cognito,
+            'stageCounts': {},
+            'gsiK1PartitionKey': 'userDeleteJob',
+            'gsiK1SortKey': created_at_str,
+        }
+        try:
+            return self.client.add_item({'Item': item})
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return self.get(user_id, strongly_consistent=True)
+
+    def delete(self, user_id):
+        return self.client.delete_item(self.pk(user_id))
+
+    def set_stage_count(self, user_id, stage, count):
+        "Record that a stage completed, having processed `count` items"
+        query_kwargs = {
+            'Key': self.pk(user_id),
+            'UpdateExpression': 'SET stageCounts.#stage = :cnt',
+            'ExpressionAttributeNames': {'#stage': stage},
+            'ExpressionAttributeValues': {':cnt': count},
+        }
+        return self.client.update_item(query_kwargs)
+
+    def acquire_lease(self, user_id, lease_duration, now=None):
+        """
+        Lease the job to the caller, so that overlapping runs don't work on it at the same time.
+        Returns the job item if leased, or None if it doesn't exist or another run holds the lease.
+        """
+        now = now or pendulum.now('utc')
+        query_kwargs = {
+            'Key': self.pk(user_id),
+            'UpdateExpression': 'SET leasedUntil = :lu',
+            'ConditionExpression': 'attribute_not_exists(leasedUntil) OR leasedUntil < :now',
+            'ExpressionAttributeValues': {
+                ':lu': (now + lease_duration).to_iso8601_string(),
+                ':now': now.to_iso8601_string(),
+            },
+        }
+        try:
+            return self.client.update_item(query_kwargs)
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return None
+
+    def release_lease(self, user_id):
+        query_kwargs = {'Key': self.pk(user_id), 'UpdateExpression': 'REMOVE leasedUntil'}
+        return self.client.update_item(query_kwargs, failure_warning=f'No delete job for user `{user_id}`')
+
+    def generate_user_ids(self):
+        "Generate the userIds of all users being deleted, oldest job first"
+        query_kwargs = {
+            'KeyConditionExpression': 'gsiK1PartitionKey = :gsik1pk',
+            'ExpressionAttributeValues': {':gsik1pk': 'userDeleteJob'},
+            'IndexName': 'GSI-K1',
+        }
+        return (item['partitionKey'].split('/')[1] for item in self.client.generate_all_query(query_kwargs))
@@ -1,7 +1,9 @@
+import concurrent.futures
 import logging
 import os
 import random
 import re
+import time
 from functools import partialmethod
 
 import pendulum
@@ -11,18 +13,35 @@ from app.mixins.base import ManagerBase
 from app.mixins.trending.manager import TrendingManagerMixin
 from app.models.follower.enums import FollowStatus
 from app.models.post.enums import PostStatus
-from app.utils import GqlNotificationType
+from app.utils import GqlNotificationType, HyperLogLog
 
-from .dynamo import UserContactAttributeDynamo, UserDynamo
+from .delete_job import USER_DELETE_JOB_LEASE, UserDeleteJob
+from .dynamo import UserContactAttributeDynamo, UserDeleteJobDynamo, UserDynamo
 from .enums import UserStatus, UserSubscriptionLevel
 from .exceptions import UserAlreadyExists, UserValidationException
 from .model import User
+from .serializer_context import SerializerContext
 from .validate import UserValidate
+from .versioned_cache import VersionedCache, get_version_bucket
 
 logger = logging.getLogger()
 
 S3_PLACEHOLDER_PHOTOS_DIRECTORY = os.environ.get('S3_PLACEHOLDER_PHOTOS_DIRECTORY')
 
+# cache of caller profiles, see VersionedCache
+CALLER_CACHE_SIZE = 1000
+CALLER_CACHE_TTL_SECONDS = 60
+CALLER_CACHE_VERSION_CHECK_SECONDS = 5
+
+# cache of username -> userId for resolving @username tags & the like, see VersionedCache
+USERNAME_CACHE_SIZE = 10000
+USERNAME_CACHE_TTL_SECONDS = 300
+USERNAME_CACHE_VERSION_CHECK_SECONDS = 5
+USERNAME_LOOKUP_MAX_WORKERS = 8
+
+# segments of the table scanned at once by a full elasticsearch reindex
+REINDEX_SEGMENTS = 8
+
 
 class UserManager(TrendingManagerMixin, ManagerBase):
 
@@ -61,8 +80,21 @@ class UserManager(TrendingManagerMixin, ManagerBase):
                 setattr(self, f'{client_name}_client', clients[client_name])
         if 'dynamo' in clients:
             self.dynamo = UserDynamo(clients['dynamo'])
+            self.delete_job_dynamo = UserDeleteJobDynamo(clients['dynamo'])
             self.email_dynamo = UserContactAttributeDynamo(clients['dynamo'], 'userEmail')
             self.phone_number_dynamo = UserContactAttributeDynamo(clients['dynamo'], 'userPhoneNumber')
+            self.caller_cache = VersionedCache(
+                self.dynamo.get_caller_cache_versions,
+                CALLER_CACHE_SIZE,
+                CALLER_CACHE_TTL_SECONDS,
+                CALLER_CACHE_VERSION_CHECK_SECONDS,
+            )
+            self.username_cache = VersionedCache(
+                self.dynamo.get_username_cache_versions,
+                USERNAME_CACHE_SIZE,
+                USERNAME_CACHE_TTL_SECONDS,
+                USERNAME_CACHE_VERSION_CHECK_SECONDS,
+            )
         self.validate = UserValidate()
         self.placeholder_photos_directory = placeholder_photos_directory
 
@@ -78,6 +110,22 @@ class UserManager(TrendingManagerMixin, ManagerBase):
         user_item = self.dynamo.get_user(user_id, strongly_consistent=strongly_consistent)
         return self.init_user(user_item) if user_item else None
 
+    def get_caller_user(self, user_id):
+        """
+        Like get_user(), but served from a short-lived warm-lambda cache when possible.
+        The profile may be up to CALLER_CACHE_TTL_SECONDS stale, other than its status.
+        """
+        user_item = self.caller_cache.get(user_id)
+        if user_item is None:
+            user_item = self.dynamo.get_user(user_id)
+            if user_item:
+                self.caller_cache.put(user_id, user_item)
+        return self.init_user(user_item) if user_item else None
+
+    def serializer_context(self):
+        "A context for serializing many users & the objects that embed them, see SerializerContext"
+        return SerializerContext(self)
+
     def get_user_by_username(self, username):
         user_item = self.dynamo.get_user_by_username(username)
         return self.init_user(user_item) if user_item else None
@@ -85,6 +133,7 @@ class UserManager(TrendingManagerMixin, ManagerBase):
     def init_user(self, user_item):
         kwargs = {
             'dynamo': getattr(self, 'dynamo', None),
+            'delete_job_dynamo': getattr(self, 'delete_job_dynamo', None),
             'trending_dynamo': getattr(self, 'trending_dynamo', None),
             'album_manager': getattr(self, 'album_manager', None),
             'block_manager': getattr(self, 'block_manager', None),
@@ -219,13 +268,81 @@ class UserManager(TrendingManagerMixin, ManagerBase):
         representing all the users tagged in the text.
         """
         username_tags = set(re.findall(self.username_tag_regex, text))
-        # note that dynamo does not support batch gets using GSI's, and the username is in a GSI
-        text_tags = []
-        for tag in username_tags:
-            user_item = self.dynamo.get_user_by_username(tag[1:])
+        user_ids = self.get_user_ids_by_usernames(tag[1:] for tag in username_tags)
+        return [{'tag': tag, 'userId': user_ids[tag[1:]]} for tag in username_tags if tag[1:] in user_ids]
+
+    def get_user_ids_by_usernames(self, usernames):
+        "Returns a dict of username -> userId for those of `usernames` that belong to a user"
+        user_ids = {username: self.username_cache.get(username) for username in usernames}
+
+        # note that dynamo does not support batch gets using GSI's, and the username is in a GSI,
+        # so the usernames not already cached are looked up with concurrent queries
+        uncached_usernames = [username for username, user_id in user_ids.items() if user_id is None]
+        if len(uncached_usernames) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=USERNAME_LOOKUP_MAX_WORKERS) as executor:
+                user_items = executor.map(self.dynamo.get_user_by_username, uncached_usernames)
+        else:
+            user_items = [self.dynamo.get_user_by_username(username) for username in uncached_usernames]
+        for username, user_item in zip(uncached_usernames, user_items):
             if user_item:
-                text_tags.append({'tag': tag, 'userId': user_item['userId']})
-        return text_tags
+                user_ids[username] = user_item['userId']
+                self.username_cache.put(username, user_item['userId'])
+
+        return {username: user_id for username, user_id in user_ids.items() if user_id}
+
+    def run_delete_jobs(self, deadline=None):
+        """
+        Work on the jobs of all users being deleted, oldest first, until done or until `deadline`,
+        a time.monotonic() value. Jobs that don't finish are picked up again by a later run.
+        Returns a dict of userId -> stage counts of the jobs that finished.
+        """
+        finished = {}
+        for user_id in self.delete_job_dynamo.generate_user_ids():
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            job_item = self.delete_job_dynamo.acquire_lease(user_id, USER_DELETE_JOB_LEASE)
+            if not job_item:
+                continue  # another run is working on it, or it just finished
+            user = self.get_user(user_id, strongly_consistent=True)
+            if not user:
+                # a previous run deleted the profile, the last step, but didn't get to delete the job
+                self.delete_job_dynamo.delete(user_id)
+                continue
+            job = UserDeleteJob(user, job_item, self.delete_job_dynamo)
+            try:
+                done = job.run(deadline=deadline)
+            except Exception as err:
+                # leave it for a later run, and don't let it hold up the jobs behind it
+                logger.exception(f'Error running delete job for user `{user_id}`: {err}')
+                done = False
+            if done:
+                finished[user_id] = job.stage_counts
+            else:
+                self.delete_job_dynamo.release_lease(user_id)
+        return finished
+
+    def merge_post_viewed_by_sketch(self, user_id, sketch, retries=3):
+        "Merge `sketch` into the user's postViewedBy sketch. Only writes to dynamo if the sketch changed."
+        user_item = self.dynamo.get_user(user_id)
+        for _ in range(retries):
+            if not user_item:
+                return
+            prev_sketch_bytes = user_item.get('postViewedBySketch')
+            user_sketch = HyperLogLog.from_bytes(prev_sketch_bytes) if prev_sketch_bytes else HyperLogLog()
+            prev_sketch_count = user_sketch.count()
+            if not user_sketch.merge(sketch):
+                return
+            # add the sketch's growth to the stored count, which may have started out exact (see Post)
+            count = user_item.get('postViewedByCount', 0) + max(user_sketch.count() - prev_sketch_count, 0)
+            try:
+                self.dynamo.set_post_viewed_by_sketch(
+                    user_id, user_sketch.to_bytes(), count, prev_sketch_bytes=prev_sketch_bytes
+                )
+                return
+            except self.dynamo.client.exceptions.ConditionalCheckFailedException:
+                # lost a race with a concurrent merge (or the user was deleted), so start over
+                user_item = self.dynamo.get_user(user_id, strongly_consistent=True)
+        logger.warning(f'Failed to merge postViewedBy sketch for user `{user_id}` after {retries} attempts')
 
     def clear_expired_subscriptions(self, now=None):
         "Clear expired subscriptions. Return a count of how many were cleared"
@@ -284,9 +401,43 @@ class UserManager(TrendingManagerMixin, ManagerBase):
         sync_user_status_due_to, 'is_forced_disabling_criteria_met_by_posts', 'posts'
     )
 
+    def bump_cache_version(self, cache_name, key):
+        "Stamp a new version on the bucket of `key`, so lambdas drop what they have cached in that bucket"
+        version = f'{pendulum.now("utc").to_iso8601_string()}/{key}'
+        self.dynamo.set_cache_version(cache_name, get_version_bucket(key), version)
+
+    def on_user_status_change_bump_caller_cache_version(self, user_id, new_item=None, old_item=None):
+        self.bump_cache_version('caller', user_id)
+
+    def on_username_change_bump_username_cache_version(self, user_id, new_item=None, old_item=None):
+        # the cache is keyed by username, and only the old one can be cached
+        if old_item:
+            self.bump_cache_version('username', old_item['username'])
+
     def sync_elasticsearch(self, user_id, new_item, old_item=None):
         self.elasticsearch_client.put_user(user_id, new_item['username'], new_item.get('fullName'))
 
+    def reindex_elasticsearch(self, total_segments=REINDEX_SEGMENTS):
+        """
+        Index every user in elasticsearch. Segments of the table are scanned in parallel, each streaming
+        its users into requests to the _bulk api. Returns count of users indexed successfully.
+        """
+
+        es = self.elasticsearch_client
+
+        def index_action(item):
+            user_id = item['userId']
+            return 'index', user_id, es.build_user_doc(user_id, item['username'], item.get('fullName'))
+
+        def reindex_segment(segment):
+            user_items = self.dynamo.generate_users_with_scan(
+                segment, total_segments, projection_expression='userId, username, fullName'
+            )
+            return es.bulk(map(index_action, user_items))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=total_segments) as executor:
+            return sum(executor.map(reindex_segment, range(total_segments)))
+
     def sync_pinpoint_attribute(self, dynamo_name, pinpoint_name, user_id, new_item, old_item=None):
         value = new_item.get(dynamo_name)
         if value is not None:
@@ -8,6 +8,7 @@ from app.mixins.trending.model import TrendingModelMixin
 from app.models.post.enums import PostStatus, PostType
 from app.utils import image_size
 
+from .delete_job import USER_DELETE_JOB_LEASE, UserDeleteJob
 from .enums import UserPrivacyStatus, UserStatus, UserSubscriptionLevel
 from .exceptions import UserException, UserValidationException, UserVerificationException
 from .validate import UserValidate
@@ -17,6 +18,9 @@ logger = logging.getLogger()
 S3_PLACEHOLDER_PHOTOS_DIRECTORY = os.environ.get('S3_PLACEHOLDER_PHOTOS_DIRECTORY')
 CLOUDFRONT_FRONTEND_RESOURCES_DOMAIN = os.environ.get('CLOUDFRONT_FRONTEND_RESOURCES_DOMAIN')
 
+# lastClient is written at most once per interval per user, as each write runs the profile's stream handlers
+LAST_CLIENT_MIN_INTERVAL = pendulum.duration(hours=1)
+
 # annoying this needs to exist
 CONTACT_ATTRIBUTE_NAMES = {
     'email': {'short': 'email', 'cognito': 'email', 'dynamo': 'email'},
@@ -35,6 +39,7 @@ class User(TrendingModelMixin):
         user_item,
         clients,
         dynamo=None,
+        delete_job_dynamo=None,
         album_manager=None,
         block_manager=None,
         chat_manager=None,
@@ -53,6 +58,8 @@ class User(TrendingModelMixin):
                 setattr(self, f'{client_name}_client', clients[client_name])
         if dynamo:
             self.dynamo = dynamo
+        if delete_job_dynamo:
+            self.delete_job_dynamo = delete_job_dynamo
         if album_manager:
             self.album_manager = album_manager
         if block_manager:
@@ -130,11 +137,12 @@ class User(TrendingModelMixin):
         self.item = self.dynamo.get_user(self.id, strongly_consistent=strongly_consistent)
         return self
 
-    def serialize(self, caller_user_id):
+    def serialize(self, caller_user_id, context=None):
         assert self.item
         resp = self.item.copy()
-        resp['blockerStatus'] = self.block_manager.get_block_status(self.id, caller_user_id)
-        resp['followedStatus'] = self.follower_manager.get_follow_status(caller_user_id, self.id)
+        resp.pop('postViewedBySketch', None)
+        resp['blockerStatus'] = (context or self.block_manager).get_block_status(self.id, caller_user_id)
+        resp['followedStatus'] = (context or self.follower_manager).get_follow_status(caller_user_id, self.id)
         return resp
 
     def enable(self):
@@ -164,50 +172,32 @@ class User(TrendingModelMixin):
             raise Exception(f'Unrecognized user status `{self.status}`')
         return self
 
-    def delete(self, skip_cognito=False):
+    def start_delete(self, skip_cognito=False):
+        """
+        Put the user in DELETING status and queue up a job to delete them and everything of theirs.
+        Returns the job item. See UserDeleteJob.
+        """
         if self.status != UserStatus.DELETING:
             self.item = self.dynamo.set_user_status(self.id, UserStatus.DELETING)
+        return self.delete_job_dynamo.add(self.id, skip_cognito=skip_cognito)
 
-        # for REQUESTED and DENIED, just delete them
-        # for FOLLOWING, unfollow so that the other user's counts remain correct
-        self.follower_manager.reset_followed_items(self.id)
-        self.follower_manager.reset_follower_items(self.id)
-
-        # unflag everything we've flagged
-        self.post_manager.unflag_all_by_user(self.id)
-        self.comment_manager.unflag_all_by_user(self.id)
-
-        # delete all our likes & comments & albums & posts
-        self.like_manager.dislike_all_by_user(self.id)
-        self.comment_manager.delete_all_by_user(self.id)
-        self.album_manager.delete_all_by_user(self.id)
-        self.post_manager.delete_all_by_user(self.id)
-
-        # remove all blocks of and by us
-        self.block_manager.unblock_all_blocks(self.id)
-
-        # leave all chats we are part of (auto-deletes direct & solo chats)
-        self.chat_manager.leave_all_chats(self.id)
-
-        # remove our trending item, if it's there
-        self.trending_delete()
-
-        # delete current and old profile photos
-        self.clear_photo_s3_objects()
-
-        # delete our own profile. Leave our stale item around so we can serialize
-        self.dynamo.delete_user(self.id)
-
-        if skip_cognito:
-            # release our preferred_username from cognito
-            try:
-                self.cognito_client.clear_user_attribute(self.id, 'preferred_username')
-            except self.cognito_client.user_pool_client.exceptions.UserNotFoundException:
-                logger.warning(f'No cognito user pool entry found when deleting user `{self.id}`')
-        else:
-            self.cognito_client.delete_user_pool_entry(self.id)
-            self.cognito_client.delete_identity_pool_entry(self.id)
-
+    def delete(self, skip_cognito=False):
+        """
+        Delete the user and everything of theirs, all in this call.
+        Holds the lease on the delete job so the deleteUsers job doesn't run it at the same time.
+        """
+        self.start_delete(skip_cognito=skip_cognito)
+        job_item = self.delete_job_dynamo.acquire_lease(self.id, USER_DELETE_JOB_LEASE)
+        if not job_item:
+            raise UserException(f'User `{self.id}` is already being deleted')
+        # if a job was already queued, we still handle cognito as asked
+        job_item['skipCognito'] = skip_cognito
+        try:
+            UserDeleteJob(self, job_item, self.delete_job_dynamo).run()
+        except Exception:
+            # let the deleteUsers job pick up where we left off
+            self.delete_job_dynamo.release_lease(self.id)
+            raise
         return self
 
     def set_accepted_eula_version(self, version):
@@ -240,9 +230,17 @@ class User(TrendingModelMixin):
         self.item = self.dynamo.set_user_privacy_status(self.id, privacy_status)
         return self
 
-    def set_last_client(self, client):
-        if self.item.get('lastClient') != client:
-            self.item = self.dynamo.set_last_client(self.id, client)
+    def set_last_client(self, client, now=None):
+        if self.item.get('lastClient') == client:
+            return self
+        now = now or pendulum.now('utc')
+        not_set_since = now - LAST_CLIENT_MIN_INTERVAL
+        last_set_at = self.item.get('lastClientSetAt')
+        if last_set_at and pendulum.parse(last_set_at) > not_set_since:
+            return self
+        # our copy of the item may be stale, so dynamo has the final say on whether the interval has passed
+        item = self.dynamo.set_last_client(self.id, client, now=now, not_set_since=not_set_since)
+        self.item = item or self.item
         return self
 
     def update_username(self, username):
@@ -295,6 +293,9 @@ class User(TrendingModelMixin):
         assert post.type == PostType.IMAGE
         for size in image_size.JPEGS:
             source_path = post.get_s3_image_path(size)
+            # thumbnails not built eagerly are built on demand by cloudfront, next to the copied native image
+            if size in image_size.THUMBNAILS and not self.s3_uploads_client.exists(source_path):
+                continue
             dest_path = self.get_photo_path(size, photo_post_id=post.id)
             self.s3_uploads_client.copy_object(source_path, dest_path)
 
@@ -320,8 +321,9 @@ class User(TrendingModelMixin):
         return self
 
     def clear_photo_s3_objects(self):
+        "Returns count of objects deleted"
         photo_dir_prefix = '/'.join([self.id, 'profile-photo', ''])
-        self.s3_uploads_client.delete_objects_with_prefix(photo_dir_prefix)
+        return self.s3_uploads_client.delete_objects_with_prefixes([photo_dir_prefix])
 
     def start_change_contact_attribute(self, attribute_name, attribute_value):
         assert attribute_name in CONTACT_ATTRIBUTE_NAMES
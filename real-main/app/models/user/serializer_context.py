@@ -0,0 +1,80 @@
+import itertools
+
+from app.models.block.enums import BlockStatus
+from app.models.follower.enums import FollowStatus
+
+
+class SerializerContext:
+    """
+    Serializes users, and the objects that embed them, for the length of one request or batch.
+
+    Call prefetch() with the users that will be serialized and who they'll be serialized for, and the
+    profiles and the block & follow relationships between them are loaded in bulk, once, then reused
+    across everything serialized with this context. Anything not prefetched is loaded on first use.
+    """
+
+    def __init__(self, user_manager):
+        self.user_manager = user_manager
+        self.block_manager = user_manager.block_manager
+        self.follower_manager = user_manager.follower_manager
+        self.user_items = {}  # user_id -> item, or None if the user doesn't exist
+        self.block_statuses = {}  # (blocker_user_id, blocked_user_id) -> BlockStatus
+        self.follow_statuses = {}  # (follower_user_id, followed_user_id) -> FollowStatus
+
+    def prefetch(self, user_ids, caller_user_ids):
+        "Bulk load the profiles of `user_ids`, and their relationships to & from each of `caller_user_ids`"
+        user_ids = set(filter(None, user_ids))
+        caller_user_ids = set(filter(None, caller_user_ids))
+
+        user_dynamo = self.user_manager.dynamo
+        new_user_ids = user_ids - self.user_items.keys()
+        self.user_items.update({user_id: None for user_id in new_user_ids})
+        for item in user_dynamo.client.batch_get(user_dynamo.pk(user_id) for user_id in new_user_ids):
+            self.user_items[item['userId']] = item
+
+        pairs = [pair for pair in itertools.product(user_ids, caller_user_ids) if pair[0] != pair[1]]
+        block_pairs = {
+            block_pair
+            for user_id, caller_user_id in pairs
+            for block_pair in ((user_id, caller_user_id), (caller_user_id, user_id))
+            if block_pair not in self.block_statuses
+        }
+        block_dynamo = self.block_manager.dynamo
+        self.block_statuses.update({block_pair: BlockStatus.NOT_BLOCKING for block_pair in block_pairs})
+        for item in block_dynamo.client.batch_get(block_dynamo.pk(*block_pair) for block_pair in block_pairs):
+            self.block_statuses[(item['blockerUserId'], item['blockedUserId'])] = BlockStatus.BLOCKING
+
+        follow_pairs = {
+            (caller_user_id, user_id)
+            for user_id, caller_user_id in pairs
+            if (caller_user_id, user_id) not in self.follow_statuses
+        }
+        follower_dynamo = self.follower_manager.dynamo
+        self.follow_statuses.update({follow_pair: FollowStatus.NOT_FOLLOWING for follow_pair in follow_pairs})
+        for item in follower_dynamo.client.batch_get(follower_dynamo.pk(*pair) for pair in follow_pairs):
+            self.follow_statuses[(item['followerUserId'], item['followedUserId'])] = item['followStatus']
+        return self
+
+    def get_user(self, user_id):
+        if user_id not in self.user_items:
+            self.user_items[user_id] = self.user_manager.dynamo.get_user(user_id)
+        user_item = self.user_items[user_id]
+        # a fresh copy of the item each time, so what's cached can't be changed
+        return self.user_manager.init_user(user_item.copy()) if user_item else None
+
+    def get_block_status(self, blocker_user_id, blocked_user_id):
+        key = (blocker_user_id, blocked_user_id)
+        if key not in self.block_statuses:
+            self.block_statuses[key] = self.block_manager.get_block_status(blocker_user_id, blocked_user_id)
+        return self.block_statuses[key]
+
+    def get_follow_status(self, follower_user_id, followed_user_id):
+        key = (follower_user_id, followed_user_id)
+        if key not in self.follow_statuses:
+            self.follow_statuses[key] = self.follower_manager.get_follow_status(
+                follower_user_id, followed_user_id
+            )
+        return self.follow_statuses[key]
+
+    def serialize_user(self, user_id, caller_user_id):
+        return self.get_user(user_id).serialize(caller_user_id, context=self)
@@ -0,0 +1,58 @@
+import copy
+import threading
+import time
+import zlib
+
+from app.utils import LruCache
+
+# keys are spread over this many buckets, each versioned on its own
+VERSION_BUCKET_COUNT = 16
+
+
+def get_version_bucket(key):
+    "The bucket of the key, stable across lambdas"
+    return zlib.crc32(key.encode('utf-8')) % VERSION_BUCKET_COUNT
+
+
+class VersionedCache:
+    """
+    A cache of per-user lookups that lives across warm lambda invocations, ex: caller profiles for
+    cheaply checking that the caller of an api call exists and is ACTIVE.
+
+    Entries expire after `ttl` seconds. On top of that, keys are hashed into VERSION_BUCKET_COUNT buckets,
+    and a stream handler stamps a new version on a key's bucket whenever what's cached for it may have
+    changed. Seeing a new version drops just that bucket. The versions are read at most once every
+    `version_check_seconds`, so that costs one batch read per lambda, not per call.
+    """
+
+    def __init__(self, versions_getter, maxsize, ttl, version_check_seconds):
+        self.versions_getter = versions_getter
+        self.version_check_seconds = version_check_seconds
+        bucket_maxsize = -(-maxsize // VERSION_BUCKET_COUNT)
+        self.buckets = [LruCache(bucket_maxsize, ttl=ttl) for _ in range(VERSION_BUCKET_COUNT)]
+        self.versions = {}
+        self.version_checked_at = None
+        self.lock = threading.Lock()
+
+    def check_version(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.version_checked_at is not None and now - self.version_checked_at < self.version_check_seconds:
+                return
+            versions = self.versions_getter(range(VERSION_BUCKET_COUNT))
+            for bucket, items in enumerate(self.buckets):
+                if versions.get(bucket) != self.versions.get(bucket):
+                    items.clear()
+            self.versions, self.version_checked_at = versions, now
+
+    def get(self, key):
+        self.check_version()
+        item = self.buckets[get_version_bucket(key)].get(key)
+        # copies, so callers can't change what's cached
+        return copy.deepcopy(item) if item is not None else None
+
+    def put(self, key, item):
+        self.buckets[get_version_bucket(key)].put(key, copy.deepcopy(item))
+
+    def pop(self, key):
+        self.buckets[get_version_bucket(key)].pop(key)
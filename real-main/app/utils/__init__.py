@@ -1,4 +1,12 @@
 __all__ = [
     'GqlNotificationType',
+    'HyperLogLog',
+    'LazyObject',
+    'LruCache',
+    'RateLimiter',
 ]
 from .gql_notification_type import GqlNotificationType
+from .hyperloglog import HyperLogLog
+from .lazy_object import LazyObject
+from .lru_cache import LruCache
+from .rate_limiter import RateLimiter
@@ -0,0 +1,70 @@
+import hashlib
+import math
+import zlib
+
+from boto3.dynamodb.types import Binary
+
+
+class HyperLogLog:
+    """
+    A HyperLogLog sketch for approximate distinct counting.
+
+    Sketches are mergeable (the union of two sketches is the register-wise max) and
+    serialize to a compact binary format suitable for storing as a dynamo Binary attribute.
+    With the default precision of 12, the standard error of count() is about 1.6%.
+    """
+
+    default_precision = 12
+    hash_bits = 64
+
+    def __init__(self, precision=None, registers=None):
+        self.precision = precision or self.default_precision
+        assert 4 <= self.precision <= 16, f'Invalid HyperLogLog precision `{self.precision}`'
+        self.register_count = 1 << self.precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.register_count)
+        assert len(self.registers) == self.register_count, 'Register count does not match precision'
+
+    @classmethod
+    def from_bytes(cls, data):
+        "Accepts bytes or a boto3 Binary, as generated by to_bytes()"
+        raw = zlib.decompress(data.value if isinstance(data, Binary) else data)
+        return cls(precision=raw[0], registers=raw[1:])
+
+    def to_bytes(self):
+        # registers of sparse sketches are mostly zeros, so they compress very well
+        return zlib.compress(bytes([self.precision]) + bytes(self.registers), 9)
+
+    def add(self, value):
+        "Add a string to the sketch. Returns True if the sketch changed."
+        digest = hashlib.sha1(value.encode('utf-8')).digest()
+        hashed = int.from_bytes(digest[:8], 'big')
+        index = hashed >> (self.hash_bits - self.precision)
+        remaining_bits = self.hash_bits - self.precision
+        remainder = hashed & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        "Merge another sketch of the same precision into this one. Returns True if this sketch changed."
+        assert self.precision == other.precision, 'Cannot merge HyperLogLogs of different precision'
+        changed = False
+        for index, (mine, theirs) in enumerate(zip(self.registers, other.registers)):
+            if theirs > mine:
+                self.registers[index] = theirs
+                changed = True
+        return changed
+
+    def count(self):
+        "Estimated number of distinct values added to the sketch"
+        m = self.register_count
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        raw_estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zero_registers = self.registers.count(0)
+        if raw_estimate <= 2.5 * m and zero_registers:
+            # small range correction: linear counting
+            return round(m * math.log(m / zero_registers))
+        # with a 64-bit hash, no large range correction is needed
+        return round(raw_estimate)
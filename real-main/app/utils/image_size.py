@@ -1,21 +1,115 @@
+import io
+import math
+
+import PIL.Image
+
 # keep in sync with object created handlers defined serverless.yml
+# keep in sync with real-cloudfront/edge_app/thumbnails/image_size.py, test_image_size checks they agree
+
+
+class EncoderProfile:
+    """
+    How an image is encoded when saved: the file format, whether to carry over its exif data, and the
+    kwargs to pass to Pillow's Image.save()
+    """
+
+    def __init__(self, image_format, content_type, file_ext, keep_exif=True, **save_kwargs):
+        self.image_format = image_format
+        self.content_type = content_type
+        self.file_ext = file_ext
+        self.keep_exif = keep_exif
+        self.save_kwargs = save_kwargs
+
+    def __repr__(self):
+        kwargs = ', '.join(f'{k}={v}' for k, v in self.save_kwargs.items())
+        return f'{self.image_format}({kwargs})'
+
+    @property
+    def is_available(self):
+        "Not all Pillow builds can write all formats (ex: WEBP needs Pillow built against libwebp)"
+        PIL.Image.init()
+        return self.image_format in PIL.Image.SAVE
+
+    def encode(self, image):
+        "Returns the encoded bytes, preserving the image's color profile and, if kept, its exif data"
+        fh = io.BytesIO()
+        kwargs = {  # Note: Pillow's Image.save treats None differently than not present for some kwargs
+            k: v
+            for k, v in {
+                'icc_profile': image.info.get('icc_profile'),
+                'exif': image.info.get('exif') if self.keep_exif else None,
+                **self.save_kwargs,
+            }.items()
+            if v is not None
+        }
+        image.save(fh, format=self.image_format, **kwargs)
+        return fh.getvalue()
+
+
+# Thumbnails are built already rotated upright, so the orientation tag is of no use to them, and the rest
+# of the exif data (which can include an embedded preview image) would only bloat the smaller sizes.
+
+
+def jpeg(quality):
+    return EncoderProfile(
+        'JPEG', 'image/jpeg', 'jpg', keep_exif=False, quality=quality, progressive=True, optimize=True
+    )
+
+
+def webp(quality):
+    return EncoderProfile('WEBP', 'image/webp', 'webp', keep_exif=False, quality=quality, method=4)
 
 
 class _ImageSize:
-    def __init__(self, name, max_dimensions, content_type='image/jpeg', file_ext='jpg'):
+    def __init__(
+        self, name, max_dimensions, content_type='image/jpeg', file_ext='jpg', encoder=None, variants=()
+    ):
+        """
+        The `encoder` is used to write images of this size, and `variants` are alternative encodings
+        served instead to clients that accept them. The variants are built on demand by cloudfront.
+        """
         self.name = name
         self.max_dimensions = max_dimensions
         file_ext = file_ext or self.default_file_ext
         self.filename = f'{self.name}.{file_ext}'
         self.content_type = content_type
+        self.encoder = encoder
+        self.variants = variants
+
+    def get_variant_filename(self, variant):
+        return f'{self.name}.{variant.file_ext}'
+
+    def get_thumbnail_dimensions(self, width, height):
+        """
+        The (width, height) an image of the given dimensions should be shrunk to so that it fits
+        within max_dimensions, preserving aspect ratio. Matches the rounding of PIL's Image.thumbnail().
+        """
+        if not self.max_dimensions:
+            return width, height
+        max_width, max_height = self.max_dimensions
+        if max_width >= width and max_height >= height:
+            return width, height
+
+        def round_aspect(number, key):
+            return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+        aspect = width / height
+        if max_width / max_height >= aspect:
+            new_width = round_aspect(max_height * aspect, key=lambda n: abs(aspect - n / max_height))
+            return new_width, max_height
+        new_height = round_aspect(max_width / aspect, key=lambda n: 0 if n == 0 else abs(aspect - max_width / n))
+        return max_width, new_height
 
 
 NATIVE_HEIC = _ImageSize('native', None, content_type='image/heic', file_ext='heic')
-NATIVE = _ImageSize('native', None)
-K4 = _ImageSize('4K', (3840, 2160))  # TODO: change name to '4k' with lowercase k
-P1080 = _ImageSize('1080p', (1920, 1080))
-P480 = _ImageSize('480p', (854, 480))
-P64 = _ImageSize('64p', (114, 64))
+# The native image is the master copy that every thumbnail and variant built at the edge is re-encoded from,
+# so it is kept at quality 100, and isn't made progressive or optimized as those only help serving it.
+NATIVE = _ImageSize('native', None, encoder=EncoderProfile('JPEG', 'image/jpeg', 'jpg', quality=100))
+# TODO: change name to '4k' with lowercase k
+K4 = _ImageSize('4K', (3840, 2160), encoder=jpeg(90), variants=(webp(85),))
+P1080 = _ImageSize('1080p', (1920, 1080), encoder=jpeg(90), variants=(webp(85),))
+P480 = _ImageSize('480p', (854, 480), encoder=jpeg(85), variants=(webp(80),))
+P64 = _ImageSize('64p', (114, 64), encoder=jpeg(80), variants=(webp(75),))
 
 JPEGS = (NATIVE, K4, P1080, P480, P64)
 THUMBNAILS = (K4, P1080, P480, P64)  # ordered by decreasing size
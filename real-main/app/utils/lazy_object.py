@@ -0,0 +1,32 @@
+import threading
+
+
+class LazyObject:
+    """
+    Stands in for the object returned by `factory`, which is only called when the object is first used.
+    Attribute access & assignment are passed through to the object.
+    """
+
+    def __init__(self, factory):
+        self.__dict__['_factory'] = factory
+        self.__dict__['_lock'] = threading.Lock()
+
+    @property
+    def is_constructed(self):
+        return '_object' in self.__dict__
+
+    def get_object(self):
+        if '_object' not in self.__dict__:
+            with self._lock:
+                if '_object' not in self.__dict__:
+                    self.__dict__['_object'] = self._factory()
+        return self.__dict__['_object']
+
+    def __getattr__(self, name):
+        return getattr(self.get_object(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get_object(), name, value)
+
+    def __repr__(self):
+        return repr(self.get_object()) if self.is_constructed else f'<LazyObject of {self._factory!r}>'
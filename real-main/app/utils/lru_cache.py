@@ -0,0 +1,68 @@
+import collections
+import threading
+import time
+
+
+class LruCache:
+    """
+    A small thread-safe cache that evicts the least recently used entries beyond `maxsize`.
+    If `ttl` (in seconds) is given, entries are also forgotten that long after they were put.
+    If `sizeof` is given, `maxsize` bounds the sum of `sizeof(value)` over the entries rather than their count.
+    An entry too big to fit on its own is not cached.
+    """
+
+    def __init__(self, maxsize, ttl=None, sizeof=None):
+        assert maxsize > 0, 'Cache size must be positive'
+        assert ttl is None or ttl > 0, 'Cache ttl must be positive'
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 1)
+        self.size = 0
+        self._items = collections.OrderedDict()
+        self._sizes = {}
+        self._expires_at = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            if self.ttl is not None and self._expires_at[key] <= time.monotonic():
+                self._remove(key)
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            self._remove(key)
+            if size > self.maxsize:
+                return
+            self._items[key] = value
+            self._sizes[key] = size
+            self.size += size
+            if self.ttl is not None:
+                self._expires_at[key] = time.monotonic() + self.ttl
+            while self.size > self.maxsize:
+                self._remove(next(iter(self._items)))
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._remove(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self._expires_at.clear()
+            self.size = 0
+
+    def _remove(self, key, default=None):
+        "Remove the entry, returning its value. Must be called with the lock held."
+        self._expires_at.pop(key, None)
+        self.size -= self._sizes.pop(key, 0)
+        return self._items.pop(key, default)
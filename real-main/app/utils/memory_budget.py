@@ -0,0 +1,38 @@
+import threading
+
+
+class MemoryBudget:
+    """
+    Thread-safe accounting of bytes held against a cap, tracking the peak.
+
+    acquire() blocks until the requested bytes fit under the cap. A request larger
+    than the cap is let through only when nothing else is held, so it can't deadlock.
+    With no cap, nothing blocks and this is just accounting.
+    """
+
+    def __init__(self, cap_bytes=None):
+        assert cap_bytes is None or cap_bytes > 0, 'Memory cap must be positive'
+        self.cap_bytes = cap_bytes
+        self.held_bytes = 0
+        self.peak_bytes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes):
+        with self._condition:
+            self._condition.wait_for(lambda: self._fits(nbytes))
+            self.held_bytes += nbytes
+            self.peak_bytes = max(self.peak_bytes, self.held_bytes)
+
+    def _fits(self, nbytes):
+        return self.cap_bytes is None or self.held_bytes == 0 or self.held_bytes + nbytes <= self.cap_bytes
+
+    def release(self, nbytes):
+        with self._condition:
+            self.held_bytes -= nbytes
+            assert self.held_bytes >= 0, 'Released more bytes than were acquired'
+            self._condition.notify_all()
+
+
+def pil_image_bytes(image):
+    "Approximate size in memory of the decoded pixels of a PIL image"
+    return image.width * image.height * len(image.getbands())
@@ -0,0 +1,31 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket. acquire() blocks as needed so that, on average, no more than `rate`
+    acquisitions happen per second, allowing bursts of up to `burst` at once.
+    """
+
+    def __init__(self, rate, burst=1):
+        assert rate > 0, 'Rate must be positive'
+        assert burst >= 1, 'Burst must be at least one'
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        "Take a token, waiting for it if need be. Returns the seconds waited."
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            # going negative reserves a token yet to be refilled, so waiters queue up fairly
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
@@ -1,4 +1,7 @@
 import urllib
+from unittest.mock import patch
+
+import pendulum
 
 from app.clients import CloudFrontClient
 
@@ -64,3 +67,66 @@ def test_generate_presigned_url():
     parsed_qs = urllib.parse.parse_qs(parsed.query)
     assert set(parsed_qs.keys()) == set(['Method', 'Expires', 'Key-Pair-Id', 'Signature'])
     assert set(parsed_qs['Method']) == set(methods)
+
+
+def test_default_expiry_is_rounded_up_to_a_bucket():
+    client = CloudFrontClient(get_key_pair, domain='cf.net')
+    now = pendulum.parse('2020-06-01T12:34:56Z')
+    assert client.get_default_expires_at(now) == pendulum.parse('2020-06-03T13:00:00Z')
+    assert client.get_default_expires_at(now.set(minute=59)) == pendulum.parse('2020-06-03T13:00:00Z')
+    assert client.get_default_expires_at(pendulum.parse('2020-06-01T13:00:00Z')) == pendulum.parse(
+        '2020-06-03T13:00:00Z'
+    )
+
+
+def test_generate_presigned_url_is_cached():
+    # a fixed expiry, so the default can't roll over to the next bucket part way through
+    client = CloudFrontClient(get_key_pair, domain='cf.net')
+    expires_at = pendulum.parse('2020-06-03T13:00:00Z')
+    url = client.generate_presigned_url('uid/mid', ['GET'], expires_at=expires_at)
+
+    with patch.object(client, 'get_cloudfront_signer') as get_signer:
+        assert client.generate_presigned_url('uid/mid', ['GET'], expires_at=expires_at) == url
+        assert get_signer.call_count == 0
+
+    # different methods, paths or expiries are signed separately
+    assert client.generate_presigned_url('uid/mid', ['PUT'], expires_at=expires_at) != url
+    assert client.generate_presigned_url('uid/mid2', ['GET'], expires_at=expires_at) != url
+    expires_at_2 = expires_at + pendulum.duration(hours=1)
+    assert client.generate_presigned_url('uid/mid', ['GET'], expires_at=expires_at_2) != url
+
+
+def test_generate_presigned_urls():
+    client = CloudFrontClient(get_key_pair, domain='cf.net')
+    paths = ['uid/p1', 'uid/p2', 'uid/p1']
+    expires_at = pendulum.parse('2020-06-03T13:00:00Z')
+    urls = client.generate_presigned_urls(paths, ['GET', 'HEAD'], expires_at=expires_at)
+    assert urls == [client.generate_presigned_url(path, ['GET', 'HEAD'], expires_at=expires_at) for path in paths]
+    assert [urllib.parse.urlparse(url).path for url in urls] == ['/uid/p1', '/uid/p2', '/uid/p1']
+
+    # with the default expiry, all the urls share the same one
+    urls = client.generate_presigned_urls(paths, ['GET', 'HEAD'])
+    assert len({urllib.parse.parse_qs(urllib.parse.urlparse(url).query)['Expires'][0] for url in urls}) == 1
+
+
+def test_generate_presigned_cookies_is_cached():
+    # a fixed expiry, so the default can't roll over to the next bucket part way through
+    client = CloudFrontClient(get_key_pair, domain='cf.net')
+    expires_at = pendulum.parse('2020-06-03T13:00:00Z')
+    path = 'uid/post/pid/video-hls/video*'
+    cookies = client.generate_presigned_cookies(path, expires_at=expires_at)
+    assert set(cookies.keys()) == {
+        'ExpiresAt',
+        'CloudFront-Policy',
+        'CloudFront-Signature',
+        'CloudFront-Key-Pair-Id',
+    }
+    assert pendulum.parse(cookies['ExpiresAt']) == expires_at
+
+    # cached copies can't be mutated by callers
+    cookies['ExpiresAt'] = 'mutated'
+    with patch.object(client, 'get_private_key') as get_private_key:
+        cached = client.generate_presigned_cookies(path, expires_at=expires_at)
+        assert get_private_key.call_count == 0
+    assert cached['ExpiresAt'] != 'mutated'
+    assert cached['CloudFront-Signature'] == cookies['CloudFront-Signature']
@@ -1,4 +1,8 @@
+import json
+import logging
+
 import pytest
+import requests
 import requests_mock
 
 from app.clients import ElasticSearchClient
@@ -85,3 +89,93 @@ def test_delete_user(elasticsearch_client, monkeypatch):
 
     assert len(m.request_history) == 1
     assert m.request_history[0].method == 'DELETE'
+
+
+def test_build_bulk_body(elasticsearch_client):
+    body = elasticsearch_client.build_bulk_body(
+        [('index', 'uid1', {'userId': 'uid1', 'username': 'u1'}), ('delete', 'uid2', None)]
+    )
+    assert [json.loads(line) for line in body.splitlines()] == [
+        {'index': {'_index': 'users', '_id': 'uid1'}},
+        {'userId': 'uid1', 'username': 'u1'},
+        {'delete': {'_index': 'users', '_id': 'uid2'}},
+    ]
+    assert body.endswith('\n')
+
+
+def test_bulk(elasticsearch_client, monkeypatch, caplog):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'foo')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'bar')
+    monkeypatch.setattr('app.clients.elasticsearch.BULK_MAX_ACTIONS', 2)
+
+    actions = [('index', f'uid{i}', {'userId': f'uid{i}'}) for i in range(3)] + [('delete', 'uid3', None)]
+    responses = [
+        {
+            'json': {
+                'items': [{'index': {'_id': 'uid0', 'status': 201}}, {'index': {'_id': 'uid1', 'status': 200}}]
+            }
+        },
+        {
+            'json': {
+                'items': [
+                    {'index': {'_id': 'uid2', 'status': 400, 'error': 'bad'}},
+                    {'delete': {'_id': 'uid3', 'status': 404}},
+                ]
+            }
+        },
+    ]
+    url = 'https://real.es.amazonaws.com/_bulk'
+    with requests_mock.mock() as m:
+        m.post(url, responses)
+        with caplog.at_level(logging.WARNING):
+            assert elasticsearch_client.bulk(iter(actions)) == 3
+
+    # sent in chunks, over one session
+    assert len(m.request_history) == 2
+    assert m.request_history[0].headers['Content-Type'].startswith('application/x-ndjson')
+    assert len(m.request_history[0].text.splitlines()) == 4
+    assert len(m.request_history[1].text.splitlines()) == 3
+    assert len(caplog.records) == 1
+    assert 'Failed to index user `uid2`' in caplog.records[0].msg
+
+
+def test_batch_collapses_to_latest_per_user(elasticsearch_client, monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'foo')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'bar')
+
+    with requests_mock.mock() as m:
+        m.post('https://real.es.amazonaws.com/_bulk', json={'items': []})
+        with elasticsearch_client.batch():
+            elasticsearch_client.put_user('uid1', 'first', None)
+            elasticsearch_client.put_user('uid2', 'other', None)
+            with elasticsearch_client.batch():
+                elasticsearch_client.put_user('uid1', 'second', 'Zoë Ñame')
+            elasticsearch_client.delete_user('uid2')
+            assert m.request_history == []
+
+    assert len(m.request_history) == 1
+    assert [json.loads(line) for line in m.request_history[0].text.splitlines()] == [
+        {'index': {'_index': 'users', '_id': 'uid1'}},
+        {'userId': 'uid1', 'username': 'second', 'fullName': 'Zoë Ñame'},
+        {'delete': {'_index': 'users', '_id': 'uid2'}},
+    ]
+
+    # no longer batching
+    with requests_mock.mock() as m:
+        m.delete(elasticsearch_client.build_user_url('uid2'), json={})
+        elasticsearch_client.delete_user('uid2')
+    assert len(m.request_history) == 1
+
+
+def test_batch_logs_send_errors(elasticsearch_client, monkeypatch, caplog):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'foo')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'bar')
+
+    with requests_mock.mock() as m:
+        m.post('https://real.es.amazonaws.com/_bulk', exc=requests.exceptions.ConnectionError)
+        with caplog.at_level(logging.ERROR):
+            with elasticsearch_client.batch():
+                elasticsearch_client.put_user('uid1', 'first', None)
+    assert len(caplog.records) == 1
+    assert 'Unable to send batch of 1 actions' in caplog.records[0].msg
+    assert elasticsearch_client.batched_actions is None
@@ -1,5 +1,6 @@
 "A test library for pinpoint designed to be run against a live Pinpoint Application"
 
+import logging
 import os
 import uuid
 from unittest.mock import Mock, call
@@ -145,7 +146,7 @@ def test_update_and_delete_user_endpoint(real_pinpoint_client, channel_type, add
     assert user_endpoints[endpoint_id1]['Address'] == address2
     assert user_endpoints[endpoint_id2]['Address'] == address1
 
-    # update the endpoint again, verify that the extra endpoint is deleted as clean-up
+    # updating lists the user's endpoints, and deletes the extra endpoint as clean-up
     assert pinpoint_client.update_user_endpoint(user_id, channel_type, address1) == endpoint_id2
     user_endpoints = pinpoint_client.get_user_endpoints(user_id, channel_type=channel_type)
     assert len(user_endpoints) == 1
@@ -194,3 +195,181 @@ def test_enable_disable_and_delete_user_endpoints(real_pinpoint_client):
     # delete them, verify
     pinpoint_client.delete_user_endpoints(user_id)
     assert pinpoint_client.get_user_endpoints(user_id) == {}
+
+
+def endpoints_resp(*endpoints):
+    items = [
+        {'Id': endpoint_id, 'ChannelType': channel_type, 'Address': address}
+        for endpoint_id, channel_type, address in endpoints
+    ]
+    return {'EndpointsResponse': {'Item': items}}
+
+
+def test_update_user_endpoint_always_lists(mocked_pinpoint_client):
+    pinpoint_client = mocked_pinpoint_client
+    client = pinpoint_client.client
+    client.get_user_endpoints.return_value = endpoints_resp(('eid1', 'EMAIL', 'a@real.app'))
+
+    assert pinpoint_client.update_user_endpoint('uid', 'EMAIL', 'b@real.app') == 'eid1'
+    item = {'Id': 'eid1', 'Address': 'b@real.app', 'ChannelType': 'EMAIL', 'User': {'UserId': 'uid'}}
+    assert client.mock_calls == [
+        call.get_user_endpoints(ApplicationId='testing-pinpoint-app-id', UserId='uid'),
+        call.update_endpoints_batch(
+            ApplicationId='testing-pinpoint-app-id', EndpointBatchRequest={'Item': [item]}
+        ),
+    ]
+
+    # another lambda created an SMS endpoint, which a later update finds rather than creating a second one
+    client.reset_mock()
+    client.get_user_endpoints.return_value = endpoints_resp(
+        ('eid1', 'EMAIL', 'b@real.app'), ('eid2', 'SMS', '+14155551212')
+    )
+    assert pinpoint_client.update_user_endpoint('uid', 'SMS', '+12125551212') == 'eid2'
+    pinpoint_client.delete_user_endpoint('uid', 'EMAIL')
+    assert [c[0] for c in client.mock_calls] == [
+        'get_user_endpoints',
+        'update_endpoints_batch',
+        'get_user_endpoints',
+        'delete_endpoint',
+    ]
+    assert client.delete_endpoint.mock_calls == [call(ApplicationId='testing-pinpoint-app-id', EndpointId='eid1')]
+
+    # a user with no endpoint of the type gets a new one
+    client.get_user_endpoints.return_value = endpoints_resp()
+    assert pinpoint_client.update_user_endpoint('uid', 'APNS', 'token') not in (None, 'eid1', 'eid2')
+
+
+def test_update_user_endpoint_deletes_extras(mocked_pinpoint_client):
+    pinpoint_client = mocked_pinpoint_client
+    client = pinpoint_client.client
+    client.get_user_endpoints.return_value = endpoints_resp(
+        ('eid1', 'EMAIL', 'a@real.app'), ('eid2', 'EMAIL', 'b@real.app'), ('eid3', 'SMS', '+14155551212')
+    )
+    assert pinpoint_client.update_user_endpoint('uid', 'EMAIL', 'b@real.app') == 'eid2'
+    assert client.delete_endpoint.mock_calls == [call(ApplicationId='testing-pinpoint-app-id', EndpointId='eid1')]
+
+
+def test_user_endpoints_status(mocked_pinpoint_client):
+    pinpoint_client = mocked_pinpoint_client
+    client = pinpoint_client.client
+    client.get_user_endpoints.return_value = endpoints_resp(
+        ('eid1', 'EMAIL', 'a@real.app'), ('eid2', 'APNS', 't')
+    )
+    pinpoint_client.disable_user_endpoints('uid')
+    assert client.get_user_endpoints.call_count == 1
+    assert client.update_endpoints_batch.mock_calls == [
+        call(
+            ApplicationId='testing-pinpoint-app-id',
+            EndpointBatchRequest={
+                'Item': [
+                    {'Id': 'eid1', 'User': {'UserId': 'uid'}, 'EndpointStatus': 'INACTIVE'},
+                    {'Id': 'eid2', 'User': {'UserId': 'uid'}, 'EndpointStatus': 'INACTIVE'},
+                ]
+            },
+        )
+    ]
+
+
+def test_batch_merges_changes_per_user(mocked_pinpoint_client):
+    pinpoint_client = mocked_pinpoint_client
+    client = pinpoint_client.client
+    client.get_user_endpoints.side_effect = lambda UserId, **kwargs: {
+        'uid1': endpoints_resp(('eid1', 'EMAIL', 'x@real.app')),
+        'uid3': endpoints_resp(('eid3', 'SMS', '+14155551212')),
+    }[UserId]
+
+    with pinpoint_client.batch():
+        assert pinpoint_client.update_user_endpoint('uid1', 'EMAIL', 'a@real.app') is None
+        with pinpoint_client.batch():
+            pinpoint_client.update_user_endpoint('uid1', 'EMAIL', 'b@real.app')
+        pinpoint_client.update_user_endpoint('uid2', 'EMAIL', 'c@real.app')
+        pinpoint_client.delete_user_endpoints('uid2')
+        pinpoint_client.update_user_endpoint('uid3', 'SMS', '+12125551212')
+        pinpoint_client.enable_user_endpoints('uid3')
+        assert client.mock_calls == []
+
+    # each user's endpoints are listed once, except those of the user whose endpoints all get deleted
+    assert client.get_user_endpoints.mock_calls == [
+        call(ApplicationId='testing-pinpoint-app-id', UserId='uid1'),
+        call(ApplicationId='testing-pinpoint-app-id', UserId='uid3'),
+    ]
+    assert client.delete_user_endpoints.mock_calls == [
+        call(ApplicationId='testing-pinpoint-app-id', UserId='uid2')
+    ]
+    items = [
+        {'Id': 'eid1', 'Address': 'b@real.app', 'ChannelType': 'EMAIL', 'User': {'UserId': 'uid1'}},
+        {
+            'Id': 'eid3',
+            'Address': '+12125551212',
+            'ChannelType': 'SMS',
+            'User': {'UserId': 'uid3'},
+            'EndpointStatus': 'ACTIVE',
+        },
+    ]
+    assert client.update_endpoints_batch.mock_calls == [
+        call(ApplicationId='testing-pinpoint-app-id', EndpointBatchRequest={'Item': items})
+    ]
+    assert pinpoint_client.batched_changes is None
+
+
+def test_batch_logs_errors(mocked_pinpoint_client, caplog):
+    pinpoint_client = mocked_pinpoint_client
+    client = pinpoint_client.client
+    client.get_user_endpoints.side_effect = [endpoints_resp(('eid1', 'EMAIL', 'x@real.app')), Exception('nope')]
+
+    with caplog.at_level(logging.ERROR):
+        with pinpoint_client.batch():
+            pinpoint_client.update_user_endpoint('uid1', 'EMAIL', 'a@real.app')
+            pinpoint_client.update_user_endpoint('uid2', 'EMAIL', 'b@real.app')
+    assert len(caplog.records) == 1
+    assert 'Unable to change endpoints of user `uid2`' in caplog.records[0].msg
+
+    # the other user's change still went through
+    assert len(client.update_endpoints_batch.mock_calls) == 1
+    assert client.update_endpoints_batch.call_args.kwargs['EndpointBatchRequest']['Item'][0]['Id'] == 'eid1'
+    assert pinpoint_client.batched_changes is None
+
+
+def test_batch_isolates_rejected_users(mocked_pinpoint_client, caplog):
+    pinpoint_client = mocked_pinpoint_client
+    client = pinpoint_client.client
+    client.get_user_endpoints.return_value = endpoints_resp()
+
+    # pinpoint rejects any request that includes uid2's endpoint
+    def update_endpoints_batch(ApplicationId, EndpointBatchRequest):
+        if any(item['User']['UserId'] == 'uid2' for item in EndpointBatchRequest['Item']):
+            raise Exception('bad address')
+
+    client.update_endpoints_batch.side_effect = update_endpoints_batch
+    with caplog.at_level(logging.WARNING):
+        with pinpoint_client.batch():
+            for user_id in ('uid1', 'uid2', 'uid3'):
+                pinpoint_client.update_user_endpoint(user_id, 'EMAIL', f'{user_id}@real.app')
+    assert len(caplog.records) == 2
+    assert 'retrying per user' in caplog.records[0].msg
+    assert 'Unable to update endpoints of user `uid2`' in caplog.records[1].msg
+
+    # the other users' changes still went through, each on its own
+    sent_user_ids = [
+        [item['User']['UserId'] for item in c.kwargs['EndpointBatchRequest']['Item']]
+        for c in client.update_endpoints_batch.mock_calls
+    ]
+    assert sent_user_ids == [['uid1', 'uid2', 'uid3'], ['uid1'], ['uid2'], ['uid3']]
+
+
+def test_batch_chunks_by_user(mocked_pinpoint_client, monkeypatch):
+    monkeypatch.setattr('app.clients.pinpoint.UPDATE_BATCH_MAX_ITEMS', 3)
+    pinpoint_client = mocked_pinpoint_client
+    client = pinpoint_client.client
+    client.get_user_endpoints.return_value = endpoints_resp()
+
+    # a user's endpoints are never split across requests
+    with pinpoint_client.batch():
+        for user_id in ('uid1', 'uid2', 'uid3'):
+            pinpoint_client.update_user_endpoint(user_id, 'EMAIL', f'{user_id}@real.app')
+            pinpoint_client.update_user_endpoint(user_id, 'SMS', '+14155551212')
+    sent_user_ids = [
+        [item['User']['UserId'] for item in c.kwargs['EndpointBatchRequest']['Item']]
+        for c in client.update_endpoints_batch.mock_calls
+    ]
+    assert sent_user_ids == [['uid1', 'uid1'], ['uid2', 'uid2'], ['uid3', 'uid3']]
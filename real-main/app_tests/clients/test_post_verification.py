@@ -1,6 +1,8 @@
 import pytest
+import requests
 
 from app.clients import PostVerificationClient
+from app.clients.post_verification import CircuitBreaker, PostVerificationServiceUnavailable
 
 
 @pytest.fixture
@@ -65,3 +67,66 @@ def test_verify_image_handle_bad_resp_fmt(post_verification_client, requests_moc
     # do the call
     with pytest.raises(Exception, match='Unable to parse response'):
         post_verification_client.verify_image('https://image-url')
+
+
+def test_verify_image_circuit_breaker(post_verification_client, requests_mock):
+    breaker = post_verification_client.circuit_breaker
+    requests_mock.post('https://url-root/verify/image', status_code=503, text='down')
+
+    # server errors count towards opening the circuit
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(Exception, match='Post verification service error `503`'):
+            post_verification_client.verify_image('https://image-url')
+    assert len(requests_mock.request_history) == breaker.failure_threshold
+
+    # circuit is now open, so we fail fast without a request
+    with pytest.raises(PostVerificationServiceUnavailable, match='circuit breaker is open'):
+        post_verification_client.verify_image('https://image-url')
+    assert len(requests_mock.request_history) == breaker.failure_threshold
+
+
+def test_verify_image_connection_error(post_verification_client, requests_mock):
+    requests_mock.post('https://url-root/verify/image', exc=requests.exceptions.ConnectTimeout)
+    with pytest.raises(PostVerificationServiceUnavailable, match='request failed'):
+        post_verification_client.verify_image('https://image-url')
+    assert post_verification_client.circuit_breaker.failure_count == 1
+
+
+def test_verify_image_uses_timeout(post_verification_client, requests_mock):
+    requests_mock.post('https://url-root/verify/image', json={'errors': [], 'data': {'isVerified': True}})
+    post_verification_client.verify_image('https://image-url')
+    assert requests_mock.request_history[0].timeout == PostVerificationClient.timeout
+
+
+def test_circuit_breaker():
+    now = [0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+    assert breaker.allow()
+
+    # one failure isn't enough to open it, and a success resets the count
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+
+    # two in a row is
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 9
+    assert not breaker.allow()
+
+    # after the reset period a single trial call is allowed, a failure re-opens the circuit
+    now[0] = 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    now[0] = 19
+    assert not breaker.allow()
+
+    # a successful trial call closes it
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
+    assert breaker.allow()
@@ -0,0 +1,22 @@
+from unittest import mock
+
+import pytest
+
+
+def test_delete_objects_with_prefixes(s3_uploads_client):
+    for path in ('a/1', 'a/2', 'b/1', 'c/1'):
+        s3_uploads_client.put_object(path, b'data', 'text/plain')
+
+    assert s3_uploads_client.delete_objects_with_prefixes(['a/', 'b/', 'd/'], max_workers=2) == 3
+    assert [s3_uploads_client.exists(path) for path in ('a/1', 'a/2', 'b/1', 'c/1')] == [False] * 3 + [True]
+    assert s3_uploads_client.delete_objects_with_prefixes([]) == 0
+
+
+def test_delete_objects_with_prefixes_errors(s3_uploads_client):
+    for path in ('a/1', 'a/2'):
+        s3_uploads_client.put_object(path, b'data', 'text/plain')
+
+    errors = [{'Key': 'a/2', 'Code': 'AccessDenied', 'Message': 'Access Denied'}]
+    with mock.patch.object(s3_uploads_client.boto_client, 'delete_objects', return_value={'Errors': errors}):
+        with pytest.raises(Exception, match='Failed to delete 1 of 2 objects.*a/2.*AccessDenied'):
+            s3_uploads_client.delete_objects_with_prefixes(['a/'])
@@ -0,0 +1,48 @@
+import concurrent.futures
+import threading
+
+import boto3
+import pytest
+
+from app.clients.thread_local import ThreadLocalResource, get_default_session
+
+
+def test_resource_per_thread():
+    resources = ThreadLocalResource('dynamodb', get_default_session())
+    resource = resources.resource
+    table = resources.get_sub_resource('Table', 'the-table')
+    assert table.name == 'the-table'
+
+    # the same thread gets the same resource & sub resources
+    assert resources.resource is resource
+    assert resources.get_sub_resource('Table', 'the-table') is table
+    assert resources.get_sub_resource('Table', 'other-table') is not table
+
+    # other threads get their own
+    barrier = threading.Barrier(2)
+
+    def get_resources():
+        barrier.wait()  # make sure each call is on its own thread
+        return resources.resource, resources.get_sub_resource('Table', 'the-table')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(get_resources) for _ in range(2)]
+    (resource1, table1), (resource2, table2) = [future.result() for future in futures]
+    assert len({id(resource), id(resource1), id(resource2)}) == 3
+    assert len({id(table), id(table1), id(table2)}) == 3
+    assert table1.name == table2.name == 'the-table'
+
+
+def test_worker_threads_raise_the_clients_exceptions(dynamo_client, monkeypatch):
+    key = {'partitionKey': 'pk', 'sortKey': '-'}
+    dynamo_client.add_item({'Item': key})
+
+    # boto3's default session is replaced after the client is created, ex: by a nested moto mock
+    monkeypatch.setattr(boto3, 'DEFAULT_SESSION', None)
+
+    def add_item_again():
+        with pytest.raises(dynamo_client.exceptions.ConditionalCheckFailedException):
+            dynamo_client.add_item({'Item': key})
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(add_item_again).result()
@@ -1,10 +1,16 @@
+import json
 import os
+import sys
+from unittest.mock import patch
 
 import pytest
 
 # turning off route autodiscovery
 os.environ['APPSYNC_ROUTE_AUTODISCOVERY_PATH'] = ''
 from app.handlers.appsync import dispatch, routes  # noqa: E402 isort:skip
+from app.handlers.appsync.exceptions import ClientException  # noqa: E402 isort:skip
+
+dispatch_module = sys.modules['app.handlers.appsync.dispatch']
 
 
 @pytest.fixture
@@ -83,3 +89,95 @@ def test_context_passed(setup_one_route, api_key_authed_event):
             'kwargs': {'source': {'anotherField': 42}, 'context': {'foo': 'bar'}, 'client': {}},
         },
     }
+
+
+@pytest.fixture
+def setup_one_batch_route():
+    routes.clear()
+
+    @routes.register_batch('Type.field')
+    def mocked_batch_handler(caller_user_id, sources_and_arguments, **kwargs):  # pylint: disable=unused-variable
+        return [{'caller_user_id': caller_user_id, 'source': source} for source, _ in sources_and_arguments]
+
+
+def test_batch_success(setup_one_batch_route, cognito_authed_event):
+    events = [{**cognito_authed_event, 'source': {'anotherField': i}} for i in range(3)]
+    assert dispatch(events, {}) == [
+        {'success': {'caller_user_id': '42-42', 'source': {'anotherField': i}}} for i in range(3)
+    ]
+    assert dispatch([], {}) == []
+
+
+def test_batch_handler_used_for_single_event(setup_one_batch_route, cognito_authed_event):
+    assert dispatch(cognito_authed_event, {}) == {
+        'success': {'caller_user_id': '42-42', 'source': {'anotherField': 42}},
+    }
+
+
+def test_batch_falls_back_to_handler_per_event(setup_one_route, api_key_authed_event):
+    events = [api_key_authed_event, {**api_key_authed_event, 'source': None}]
+    resps = dispatch(events, {'foo': 'bar'})
+    assert [resp['success']['kwargs']['source'] for resp in resps] == [{'anotherField': 42}, None]
+    assert all(resp['success']['kwargs']['context'] == {'foo': 'bar'} for resp in resps)
+
+
+def test_batch_client_error(cognito_authed_event):
+    routes.clear()
+
+    @routes.register_batch('Type.field')
+    def mocked_batch_handler(caller_user_id, sources_and_arguments, **kwargs):
+        raise ClientException('nope')
+
+    resps = dispatch([cognito_authed_event, cognito_authed_event], {})
+    assert [resp['error']['message'] for resp in resps] == ['ClientError: nope'] * 2
+    assert resps[0] is not resps[1]
+
+
+def test_batch_client_error_per_item(cognito_authed_event):
+    routes.clear()
+
+    @routes.register_batch('Type.field')
+    def mocked_batch_handler(caller_user_id, sources_and_arguments, **kwargs):
+        return [
+            ClientException(f'nope {source["i"]}') if source['i'] else source
+            for source, _ in sources_and_arguments
+        ]
+
+    events = [{**cognito_authed_event, 'source': {'i': i}} for i in range(3)]
+    resps = dispatch(events, {})
+    assert resps[0] == {'success': {'i': 0}}
+    assert [resp['error']['message'] for resp in resps[1:]] == ['ClientError: nope 1', 'ClientError: nope 2']
+
+    # a single event also gets its error
+    assert dispatch(events[1], {})['error']['message'] == 'ClientError: nope 1'
+
+
+def test_batch_client_error_raised_for_one_item(cognito_authed_event):
+    routes.clear()
+
+    @routes.register_batch('Type.field')
+    def mocked_batch_handler(caller_user_id, sources_and_arguments, **kwargs):
+        if any(source['i'] == 1 for source, _ in sources_and_arguments):
+            raise ClientException('nope 1')
+        return [source for source, _ in sources_and_arguments]
+
+    # the other items still resolve
+    events = [{**cognito_authed_event, 'source': {'i': i}} for i in range(3)]
+    resps = dispatch(events, {})
+    assert resps[0] == {'success': {'i': 0}}
+    assert resps[1]['error']['message'] == 'ClientError: nope 1'
+    assert resps[2] == {'success': {'i': 2}}
+
+
+def test_batch_of_mixed_fields_raises_exception(setup_one_batch_route, cognito_authed_event):
+    events = [cognito_authed_event, {**cognito_authed_event, 'field': 'Type.otherField'}]
+    with pytest.raises(Exception, match='has events for other fields or callers'):
+        dispatch(events, {})
+
+
+def test_metrics_recorded(setup_one_route, cognito_authed_event, capsys):
+    with patch.object(dispatch_module, 'METRICS_SAMPLE_RATE', 1):
+        dispatch(cognito_authed_event, {})
+    line = json.loads(capsys.readouterr().out.strip().split('\n')[-1])
+    assert line['field'] == 'Type.field'
+    assert line['wallTime'] >= 0
@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+
+# slow to import, and only needed by the few resolvers that process images, so imported where they're used
+LAZY_IMPORTS = {'numpy'}
+
+# counts the boto3 clients created while importing the handlers
+import_script = '''
+import json
+import botocore.session
+
+created = []
+create_client = botocore.session.Session.create_client
+
+
+def counting_create_client(self, service_name, *args, **kwargs):
+    created.append(service_name)
+    return create_client(self, service_name, *args, **kwargs)
+
+
+botocore.session.Session.create_client = counting_create_client
+import app.handlers.appsync.handlers
+print(json.dumps(created))
+'''
+
+
+def import_handlers():
+    "Import the handlers in a fresh interpreter. Returns (boto3 clients created, `-X importtime` report lines)"
+    root_dir = os.path.join(os.path.dirname(__file__), '..', '..', '..')
+    env = {**os.environ, 'APPSYNC_ROUTE_AUTODISCOVERY_PATH': 'app.handlers.appsync.handlers'}
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', import_script],
+        cwd=root_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = [line for line in proc.stderr.splitlines() if line.startswith('import time:')]
+    return json.loads(proc.stdout.splitlines()[-1]), report
+
+
+def parse_report(report):
+    "Returns a list of (cumulative_seconds, module_name) for each import in an `-X importtime` report"
+    imports = []
+    for line in report[1:]:  # skip the header
+        _, cumulative, name = line[len('import time:') :].split('|')
+        imports.append((int(cumulative) / 1e6, name.strip()))
+    return imports
+
+
+def test_import_constructs_no_clients_and_skips_slow_imports():
+    created, report = import_handlers()
+    imports = parse_report(report)
+
+    # clients are slow to construct, so constructing them at import slows down every cold start.
+    # The x-ray sdk creates its own clients, all of ours should be created lazily.
+    assert set(created) <= {'xray'}, f'Clients created on import: {created}'
+
+    # timings are too noisy to assert on, so check for imports known to be slow instead
+    lazy_imported = {name.split('.')[0] for _, name in imports} & LAZY_IMPORTS
+    slowest = '\n'.join(f'{seconds:.3f}s {name}' for seconds, name in sorted(imports, reverse=True)[:15])
+    assert not lazy_imported, f'Imported {sorted(lazy_imported)} on import. Slowest imports:\n{slowest}'
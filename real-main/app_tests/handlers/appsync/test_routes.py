@@ -36,3 +36,16 @@ def test_discover():
         'Type.field1': mock_handlers.handler_1,
         'Type.field2': mock_handlers.handler_2,
     }
+
+
+def test_register_batch():
+    @routes.register_batch('Mytype.myfield')
+    def myfunc():
+        pass
+
+    assert routes.cache == {}
+    assert routes.batch_cache == {'Mytype.myfield': myfunc}
+    assert routes.get_batch_handler('Mytype.myfield') is myfunc
+    assert routes.get_handler('Mytype.myfield') is None
+    routes.clear()
+    assert routes.batch_cache == {}
@@ -1,9 +1,9 @@
-import io
 import logging
 import uuid
 from os import path
 from unittest.mock import Mock, patch
 
+import PIL.Image
 import pytest
 
 from app.models.album.exceptions import AlbumException
@@ -146,32 +146,43 @@ def test_save_art_images(album):
         assert not album.s3_uploads_client.exists(path)
 
     # save an image as the art
-    with open(grant_horz_path, 'rb') as fh:
-        image_data = fh.read()
-    album.save_art_images(art_hash, io.BytesIO(image_data))
+    image = PIL.Image.open(grant_horz_path)
+    album.save_art_images(art_hash, image)
 
-    # check all sizes are in S3
+    # check all sizes are in S3, and the image we passed in wasn't modified
     for size in image_size.JPEGS:
         path = album.get_art_image_path(size, art_hash)
         assert album.s3_uploads_client.exists(path)
+    assert image.size == (240, 120)
 
     # check the value of the native image
     native_path = album.get_art_image_path(image_size.NATIVE, art_hash)
-    assert album.s3_uploads_client.get_object_data_stream(native_path).read() == image_data
+    assert PIL.Image.open(album.s3_uploads_client.get_object_data_stream(native_path)).size == (240, 120)
 
     # save an new image as the art
-    with open(grant_vert_path, 'rb') as fh:
-        image_data = fh.read()
-    album.save_art_images(art_hash, io.BytesIO(image_data))
+    album.save_art_images(art_hash, PIL.Image.open(grant_vert_path))
 
     # check all sizes are in S3
     for size in image_size.JPEGS:
         path = album.get_art_image_path(size, art_hash)
         assert album.s3_uploads_client.exists(path)
 
-    # check the value of the native image
+    # check the value of the native image, and a thumbnail
     native_path = album.get_art_image_path(image_size.NATIVE, art_hash)
-    assert album.s3_uploads_client.get_object_data_stream(native_path).read() == image_data
+    assert PIL.Image.open(album.s3_uploads_client.get_object_data_stream(native_path)).size == (120, 320)
+    p64_path = album.get_art_image_path(image_size.P64, art_hash)
+    assert PIL.Image.open(album.s3_uploads_client.get_object_data_stream(p64_path)).size == (24, 64)
+
+
+def test_save_art_images_encodes_separate_images(album):
+    # the art is smaller than all but the smallest thumbnail, but Image.save() mutates the image,
+    # so the concurrent encodes must each get their own
+    encode = image_size.EncoderProfile.encode
+    with patch.object(image_size.EncoderProfile, 'encode', autospec=True, side_effect=encode) as encode_mock:
+        album.save_art_images('the hash', PIL.Image.open(grant_horz_path))
+    images = [call.args[1] for call in encode_mock.mock_calls]
+    assert len(images) == len(image_size.JPEGS)
+    assert len({id(image) for image in images}) == len(images)
 
 
 def test_increment_rank_count(album, caplog):
@@ -2,9 +2,12 @@ import base64
 import uuid
 from decimal import Decimal
 from os import path
+from unittest.mock import patch
 
 import pytest
 
+from app.models.album import art
+from app.models.album.model import art_tile_cache
 from app.models.post.enums import PostType
 from app.utils import image_size
 
@@ -241,3 +244,48 @@ def test_1_4_9_16_posts_in_album(
     assert native_path_16 != native_path_9
     assert (native_data_16 := album.s3_uploads_client.get_object_data_stream(native_path_16).read())
     assert native_data_16 != native_data_9
+
+
+def test_changing_one_post_only_renders_its_tile(album, post1, post2, post3, post4, post5, post_manager):
+    art_tile_cache.clear()
+    post_dynamo = post_manager.dynamo
+    for rank, post in enumerate([post1, post2, post3, post4]):
+        post.item = post_dynamo.set_album_id(post.item, album.id, album_rank=Decimal(rank))
+
+    # the first time, all the tiles are rendered
+    with patch.object(art, 'generate_zoomed_tile', wraps=art.generate_zoomed_tile) as tile_mock:
+        album.update_art_if_needed()
+    assert tile_mock.call_count == 4
+    assert (native_path_1 := album.get_art_image_path(image_size.NATIVE))
+    native_data_1 = album.s3_uploads_client.get_object_data_stream(native_path_1).read()
+
+    # swap out one post, only its tile is rendered
+    post4.item = post_dynamo.set_album_id(post4.item, None)
+    post5.item = post_dynamo.set_album_id(post5.item, album.id, album_rank=Decimal(3))
+    with patch.object(art, 'generate_zoomed_tile', wraps=art.generate_zoomed_tile) as tile_mock:
+        album.update_art_if_needed()
+    assert tile_mock.call_count == 1
+    assert album.get_art_image_path(image_size.NATIVE) != native_path_1
+
+    # swap it back, nothing is rendered and we get the same art as before
+    post5.item = post_dynamo.set_album_id(post5.item, None)
+    post4.item = post_dynamo.set_album_id(post4.item, album.id, album_rank=Decimal(3))
+    with patch.object(art, 'generate_zoomed_tile', wraps=art.generate_zoomed_tile) as tile_mock:
+        album.update_art_if_needed()
+    assert tile_mock.call_count == 0
+    assert album.get_art_image_path(image_size.NATIVE) == native_path_1
+    assert album.s3_uploads_client.get_object_data_stream(native_path_1).read() == native_data_1
+
+
+def test_posts_loaded_in_one_batch(album, post1, post2, post3, post4, post_manager):
+    art_tile_cache.clear()
+    post_dynamo = post_manager.dynamo
+    for rank, post in enumerate([post1, post2, post3, post4]):
+        post.item = post_dynamo.set_album_id(post.item, album.id, album_rank=Decimal(rank))
+
+    with patch.object(album.post_manager, 'get_post') as get_post_mock:
+        with patch.object(album.post_manager, 'get_posts', wraps=album.post_manager.get_posts) as get_posts_mock:
+            album.update_art_if_needed()
+    assert get_post_mock.call_count == 0
+    assert get_posts_mock.call_count == 1
+    assert album.get_art_image_path(image_size.NATIVE)
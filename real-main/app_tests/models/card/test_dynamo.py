@@ -1,3 +1,4 @@
+from unittest import mock
 from uuid import uuid4
 
 import pendulum
@@ -124,6 +125,37 @@ def test_clear_notify_user_at(card_dynamo):
     assert card_dynamo.get_card(card_id) == card_item
 
 
+def test_clear_notify_user_at_batch(card_dynamo):
+    now = pendulum.now('utc')
+    card_ids = [str(uuid4()) for _ in range(30)]
+    for card_id in card_ids:
+        card_dynamo.add_card(card_id, 'uid', 't', 'a', notify_user_at=now)
+    assert len(list(card_dynamo.generate_card_ids_by_notify_user_at(now))) == 30
+
+    # more than are cleared at once
+    card_dynamo.clear_notify_user_at_batch(card_ids[:27])
+    assert sorted(card_dynamo.generate_card_ids_by_notify_user_at(now)) == sorted(card_ids[27:])
+    assert 'gsiK1SortKey' not in card_dynamo.get_card(card_ids[0])
+
+    # a card deleted in the meantime doesn't stop the others from being cleared, each with its own update
+    card_dynamo.delete_card(card_ids[28])
+    card_dynamo.client.transact_write_items = mock.Mock()
+    card_dynamo.client.update_item = mock.Mock(wraps=card_dynamo.client.update_item)
+    card_dynamo.clear_notify_user_at_batch(card_ids[27:])
+    assert list(card_dynamo.generate_card_ids_by_notify_user_at(now)) == []
+    assert card_dynamo.client.update_item.call_count == 3
+    assert card_dynamo.client.transact_write_items.call_count == 0
+    assert card_dynamo.get_card(card_ids[28]) is None
+
+
+def test_batch_get_cards(card_dynamo):
+    card_id_1, card_id_2 = str(uuid4()), str(uuid4())
+    card_item_1 = card_dynamo.add_card(card_id_1, 'uid', 't1', 'a')
+    card_item_2 = card_dynamo.add_card(card_id_2, 'uid', 't2', 'a')
+    card_items = card_dynamo.batch_get_cards([card_id_1, card_id_2, 'cid-dne'])
+    assert sorted(card_items, key=lambda item: item['title']) == [card_item_1, card_item_2]
+
+
 def test_delete_card(card_dynamo):
     # delelte a card that DNE
     card_id = str(uuid4())
@@ -327,3 +359,20 @@ def test_generate_card_ids_by_notify_user_at_only_user_ids(card_dynamo):
             card_dynamo.generate_card_ids_by_notify_user_at(now, only_user_ids=[user_id_1, user_id_2, user_id_3])
         )
     ) == sorted([card_id_10, card_id_20, card_id_21, card_id_30, card_id_31, card_id_32])
+
+
+def test_generate_user_card_ids_by_notify_user_at(card_dynamo):
+    now = pendulum.now('utc')
+    card_id_1, card_id_2, card_id_3 = str(uuid4()), str(uuid4()), str(uuid4())
+    card_dynamo.add_card(card_id_1, 'uid1', 't', 'a', notify_user_at=now - pendulum.duration(seconds=2))
+    card_dynamo.add_card(card_id_2, 'uid2', 't', 'a', notify_user_at=now - pendulum.duration(seconds=1))
+    card_dynamo.add_card(card_id_3, 'uid1', 't', 'a', notify_user_at=now)
+    assert list(card_dynamo.generate_user_card_ids_by_notify_user_at(now)) == [
+        ('uid1', card_id_1),
+        ('uid2', card_id_2),
+        ('uid1', card_id_3),
+    ]
+    assert list(card_dynamo.generate_user_card_ids_by_notify_user_at(now, only_user_ids=['uid1'])) == [
+        ('uid1', card_id_1),
+        ('uid1', card_id_3),
+    ]
@@ -1,3 +1,4 @@
+import logging
 from unittest.mock import call, patch
 from uuid import uuid4
 
@@ -97,6 +98,23 @@ def test_add_or_update_card(user, template, card_manager):
     assert new_card.item == card.item
 
 
+def test_get_cards(card_manager, chat_card_template, comment_card_template, requested_followers_card_template):
+    assert card_manager.get_cards([]) == {}
+    card1 = card_manager.add_or_update_card(chat_card_template)
+    card2 = card_manager.add_or_update_card(comment_card_template)
+
+    # cards that don't exist are omitted, duplicates are fine
+    card_ids = [card1.id, requested_followers_card_template.card_id, card2.id, card1.id]
+    cards = card_manager.get_cards(card_ids)
+    assert cards.keys() == {card1.id, card2.id}
+    assert cards[card1.id].item == card1.item
+    assert cards[card2.id].item == card2.item
+    assert cards[card2.id].post_id == comment_card_template.post_id
+
+    card2.delete()
+    assert card_manager.get_cards(card_ids).keys() == {card1.id}
+
+
 @pytest.mark.skip(reason="No cards with only_usernames set exist at the moment")
 def test_add_or_update_card_with_only_usernames(user, template, card_manager):
     # verify starting state
@@ -238,7 +256,8 @@ def test_notify_users(card_manager, pinpoint_client, user, user2, TestCardTempla
 
     # add a card with a notification in the far future
     card1 = card_manager.add_or_update_card(
-        TestCardTemplate(user.id, title='t1', action='a1', notify_user_after=pendulum.duration(hours=1)), now=now,
+        TestCardTemplate(user.id, title='t1', action='a1', notify_user_after=pendulum.duration(hours=1)),
+        now=now,
     )
     assert card1.notify_user_at == now + pendulum.duration(hours=1)
 
@@ -296,10 +315,13 @@ def test_notify_users(card_manager, pinpoint_client, user, user2, TestCardTempla
     pinpoint_client.reset_mock()
     cnts = card_manager.notify_users()
     assert cnts == (2, 2)
-    assert pinpoint_client.mock_calls == [
-        call.send_user_apns(user.id, 'a5', 't5', body='s'),
-        call.send_user_apns(user2.id, 'a4', 't4', body=None),
-    ]
+    # users are notified concurrently, so in no particular order
+    assert sorted(pinpoint_client.mock_calls) == sorted(
+        [
+            call.send_user_apns(user.id, 'a5', 't5', body='s'),
+            call.send_user_apns(user2.id, 'a4', 't4', body=None),
+        ]
+    )
     assert card1.item == card1.refresh_item().item
     assert card2.item == card2.refresh_item().item
     assert card4.refresh_item().notify_user_at is None
@@ -310,7 +332,8 @@ def test_notify_users_failed_notification(card_manager, pinpoint_client, user, T
     # add card with a notification in the immediate past
     now = pendulum.now('utc')
     card = card_manager.add_or_update_card(
-        TestCardTemplate(user.id, title='t', action='a', notify_user_after=pendulum.duration()), now=now,
+        TestCardTemplate(user.id, title='t', action='a', notify_user_after=pendulum.duration()),
+        now=now,
     )
     assert card.notify_user_at == now
 
@@ -352,10 +375,12 @@ def test_notify_users_only_usernames(card_manager, pinpoint_client, user, user2,
     pinpoint_client.reset_mock()
     cnts = card_manager.notify_users(only_usernames=[user.username, user3.username])
     assert cnts == (2, 2)
-    assert pinpoint_client.mock_calls == [
-        call.send_user_apns(user.id, 'a1', 't1', body=None),
-        call.send_user_apns(user3.id, 'a3', 't3', body=None),
-    ]
+    assert sorted(pinpoint_client.mock_calls) == sorted(
+        [
+            call.send_user_apns(user.id, 'a1', 't1', body=None),
+            call.send_user_apns(user3.id, 'a3', 't3', body=None),
+        ]
+    )
     assert card1.refresh_item().notify_user_at is None
     assert card2.refresh_item().notify_user_at
     assert card3.refresh_item().notify_user_at is None
@@ -403,11 +428,103 @@ def test_notify_users_only_usernames(card_manager, pinpoint_client, user, user2,
     pinpoint_client.reset_mock()
     cnts = card_manager.notify_users()
     assert cnts == (3, 3)
-    assert pinpoint_client.mock_calls == [
-        call.send_user_apns(user.id, 'a1', 't1', body=None),
-        call.send_user_apns(user2.id, 'a2', 't2', body=None),
-        call.send_user_apns(user3.id, 'a3', 't3', body=None),
-    ]
+    assert sorted(pinpoint_client.mock_calls) == sorted(
+        [
+            call.send_user_apns(user.id, 'a1', 't1', body=None),
+            call.send_user_apns(user2.id, 'a2', 't2', body=None),
+            call.send_user_apns(user3.id, 'a3', 't3', body=None),
+        ]
+    )
     assert card1.refresh_item().notify_user_at is None
     assert card2.refresh_item().notify_user_at is None
     assert card3.refresh_item().notify_user_at is None
+
+
+def test_notify_users_in_order_per_user(card_manager, pinpoint_client, user, user2, TestCardTemplate):
+    pinpoint_client.configure_mock(**{'send_user_apns.return_value': True})
+    now = pendulum.now('utc')
+    for title, after in (('t1', -3), ('t2', -1), ('t3', -2)):
+        card_manager.add_or_update_card(
+            TestCardTemplate(
+                user.id, title=title, action='a', notify_user_after=pendulum.duration(seconds=after)
+            ),
+            now=now,
+        )
+    card_manager.add_or_update_card(
+        TestCardTemplate(user2.id, title='t4', action='a', notify_user_after=pendulum.duration(seconds=-2)),
+        now=now,
+    )
+
+    # the cards are loaded in one batch, not one by one
+    with patch.object(card_manager.dynamo, 'get_card') as get_card_mock:
+        assert card_manager.notify_users(now=now) == (4, 4)
+    assert get_card_mock.call_count == 0
+    user_calls = [c for c in pinpoint_client.mock_calls if c.args[0] == user.id]
+    assert [c.args[2] for c in user_calls] == ['t1', 't3', 't2']
+    assert list(card_manager.dynamo.generate_card_ids_by_notify_user_at(now)) == []
+
+
+def test_notify_users_error_leaves_cards_of_that_user(
+    card_manager, pinpoint_client, user, user2, TestCardTemplate
+):
+    def send_user_apns(user_id, *args, **kwargs):
+        if user_id == user.id:
+            raise Exception('nope')
+        return True
+
+    pinpoint_client.configure_mock(**{'send_user_apns.side_effect': send_user_apns})
+    card1 = card_manager.add_or_update_card(
+        TestCardTemplate(user.id, title='t1', action='a1', notify_user_after=pendulum.duration(seconds=-1))
+    )
+    card2 = card_manager.add_or_update_card(
+        TestCardTemplate(user2.id, title='t2', action='a2', notify_user_after=pendulum.duration(seconds=-1))
+    )
+    assert card_manager.notify_users() == (1, 1)
+    assert card1.refresh_item().notify_user_at
+    assert card2.refresh_item().notify_user_at is None
+
+
+def test_notify_users_error_clears_cards_already_sent(card_manager, pinpoint_client, user, TestCardTemplate):
+    pinpoint_client.configure_mock(**{'send_user_apns.side_effect': [True, Exception('nope')]})
+    now = pendulum.now('utc')
+    card1 = card_manager.add_or_update_card(
+        TestCardTemplate(user.id, title='t1', action='a1', notify_user_after=pendulum.duration(seconds=-2)),
+        now=now,
+    )
+    card2 = card_manager.add_or_update_card(
+        TestCardTemplate(user.id, title='t2', action='a2', notify_user_after=pendulum.duration(seconds=-1)),
+        now=now,
+    )
+    assert card_manager.notify_users(now=now) == (1, 1)
+    assert card1.refresh_item().notify_user_at is None
+    assert card2.refresh_item().notify_user_at
+
+
+def test_notify_users_batch_clear_error_clears_one_by_one(
+    card_manager, pinpoint_client, user, TestCardTemplate, caplog
+):
+    pinpoint_client.configure_mock(**{'send_user_apns.return_value': True})
+    now = pendulum.now('utc')
+    card1 = card_manager.add_or_update_card(
+        TestCardTemplate(user.id, title='t1', action='a1', notify_user_after=pendulum.duration(seconds=-2)),
+        now=now,
+    )
+    card2 = card_manager.add_or_update_card(
+        TestCardTemplate(user.id, title='t2', action='a2', notify_user_after=pendulum.duration(seconds=-1)),
+        now=now,
+    )
+    with patch.object(card_manager.dynamo, 'clear_notify_user_at_batch', side_effect=Exception('nope')):
+        with caplog.at_level(logging.WARNING):
+            assert card_manager.notify_users(now=now) == (2, 2)
+    assert len(caplog.records) == 1
+    assert 'clearing one by one' in caplog.records[0].msg
+    assert card1.refresh_item().notify_user_at is None
+    assert card2.refresh_item().notify_user_at is None
+
+
+def test_notify_users_only_usernames_dne(card_manager, pinpoint_client, user, TestCardTemplate):
+    card_manager.add_or_update_card(
+        TestCardTemplate(user.id, title='t1', action='a1', notify_user_after=pendulum.duration(seconds=-1))
+    )
+    assert card_manager.notify_users(only_usernames=['not-a-username']) == (0, 0)
+    assert pinpoint_client.mock_calls == []
@@ -18,7 +18,7 @@ def user1(user_manager, post_manager, image_data_b64, cognito_client):
     cognito_client.create_verified_user_pool_entry(user_id, username, f'{username}@real.app')
     user = user_manager.create_cognito_only_user(user_id, username)
     # give the user a profile photo so that it will show up in the message notification trigger calls
-    post = post_manager.add_post(user, 'pid', PostType.IMAGE, image_input={'imageData': image_data_b64})
+    post = post_manager.add_post(user, 'pid', PostType.IMAGE, image_input={'imageData': image_data_b64}).verify()
     user.update_photo(post.id)
     yield user
 
@@ -1,6 +1,7 @@
 import json
 import uuid
 from unittest import mock
+from unittest.mock import patch
 
 import pendulum
 import pytest
@@ -16,7 +17,7 @@ def user1(user_manager, post_manager, grant_data_b64, cognito_client):
     cognito_client.create_verified_user_pool_entry(user_id, username, f'{username}@real.app')
     user = user_manager.create_cognito_only_user(user_id, username)
     # give the user a profile photo so that it will show up in the message notification trigger calls
-    post = post_manager.add_post(user, 'pid', PostType.IMAGE, image_input={'imageData': grant_data_b64})
+    post = post_manager.add_post(user, 'pid', PostType.IMAGE, image_input={'imageData': grant_data_b64}).verify()
     user.update_photo(post.id)
     yield user
 
@@ -118,7 +119,9 @@ def test_get_author_encoded(chat_message_manager, user1, user2, user3, chat, blo
 def test_trigger_notifications_direct(message, chat, user1, user2, appsync_client):
     message.appsync = mock.Mock()
     message.trigger_notifications('ntype')
-    assert message.appsync.mock_calls == [mock.call.trigger_notification('ntype', user2.id, message)]
+    assert message.appsync.mock_calls == [
+        mock.call.trigger_notification('ntype', user2.id, message, context=mock.ANY)
+    ]
 
 
 def test_trigger_notifications_user_ids(message, chat, user1, user2, user3, appsync_client):
@@ -127,8 +130,8 @@ def test_trigger_notifications_user_ids(message, chat, user1, user2, user3, apps
     message.appsync = mock.Mock()
     message.trigger_notifications('ntype', user_ids=[user2.id, user3.id])
     assert message.appsync.mock_calls == [
-        mock.call.trigger_notification('ntype', user2.id, message),
-        mock.call.trigger_notification('ntype', user3.id, message),
+        mock.call.trigger_notification('ntype', user2.id, message, context=mock.ANY),
+        mock.call.trigger_notification('ntype', user3.id, message, context=mock.ANY),
     ]
 
 
@@ -143,8 +146,8 @@ def test_trigger_notifications_group(chat_manager, chat_message_manager, user1,
     message.appsync = mock.Mock()
     message.trigger_notifications('ntype')
     assert message.appsync.mock_calls == [
-        mock.call.trigger_notification('ntype', user1.id, message),
-        mock.call.trigger_notification('ntype', user3.id, message),
+        mock.call.trigger_notification('ntype', user1.id, message, context=mock.ANY),
+        mock.call.trigger_notification('ntype', user3.id, message, context=mock.ANY),
     ]
 
     # add system message, notifications are triggered automatically
@@ -219,3 +222,25 @@ def test_on_add_or_edit(message, system_message):
         mock.call().__bool__(),
         mock.call().on_message_add(system_message),
     ]
+
+
+def test_trigger_notifications_loads_author_relationships_once(
+    chat_manager, chat_message_manager, block_manager, user1, user2, user3, appsync_client, dynamo_client
+):
+    group_chat = chat_manager.add_group_chat('cid', user1)
+    group_chat.add(user1, [user2.id, user3.id])
+    block_manager.block(user3, user1)
+    message = chat_message_manager.add_chat_message('mid', 'lore', group_chat.id, user1.id)
+
+    appsync_client.reset_mock()
+    with patch.object(dynamo_client, 'get_item', wraps=dynamo_client.get_item) as get_item:
+        message.trigger_notifications('ntype')
+    assert get_item.call_count == 0
+    assert len(appsync_client.send.mock_calls) == 2
+    authors_encoded = {
+        call.args[1]['input']['userId']: call.args[1]['input']['authorEncoded']
+        for call in appsync_client.send.mock_calls
+    }
+    assert json.loads(authors_encoded[user2.id])['userId'] == user1.id
+    assert json.loads(authors_encoded[user2.id])['blockedStatus'] == BlockStatus.NOT_BLOCKING
+    assert authors_encoded[user3.id] is None
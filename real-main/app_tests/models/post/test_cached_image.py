@@ -0,0 +1,117 @@
+import io
+from unittest import mock
+
+import PIL.Image
+import pytest
+
+from app.models.post.cached_image import CachedImage
+from app.models.post.exceptions import PostException
+from app.utils import image_size
+from app.utils.memory_budget import MemoryBudget, pil_image_bytes
+
+grant_width, grant_height = 240, 320
+
+
+@pytest.fixture
+def s3_path():
+    yield 'pid/image/native.jpg'
+
+
+@pytest.fixture
+def jpeg_cache(s3_uploads_client, s3_path, grant_data):
+    s3_uploads_client.put_object(s3_path, grant_data, 'image/jpeg')
+    yield CachedImage(
+        'pid',
+        image_size=image_size.NATIVE,
+        s3_client=s3_uploads_client,
+        s3_path=s3_path,
+        memory_budget=MemoryBudget(),
+    )
+
+
+@pytest.fixture
+def heic_cache(s3_uploads_client, heic_data):
+    path = 'pid/image/native.heic'
+    s3_uploads_client.put_object(path, heic_data, 'image/heic')
+    yield CachedImage('pid', image_size=image_size.NATIVE_HEIC, s3_client=s3_uploads_client, s3_path=path)
+
+
+def test_readonly_image_streams_from_s3_without_keeping_data(jpeg_cache):
+    assert jpeg_cache.is_synced is None
+    assert jpeg_cache.held_bytes == 0
+
+    image = jpeg_cache.readonly_image
+    assert image.size == (grant_width, grant_height)
+    assert jpeg_cache.is_synced is True
+    assert jpeg_cache.is_decoded is True
+    assert jpeg_cache._data is None
+    assert jpeg_cache.held_bytes == pil_image_bytes(image)
+    assert jpeg_cache.memory_budget.held_bytes == pil_image_bytes(image)
+
+
+def test_readonly_image_not_found(s3_uploads_client):
+    cache = CachedImage('pid', image_size=image_size.NATIVE, s3_client=s3_uploads_client, s3_path='nope.jpg')
+    with pytest.raises(PostException, match='image data not found'):
+        cache.readonly_image
+
+
+def test_readonly_image_keeps_unflushed_data(jpeg_cache, grant_data):
+    jpeg_cache.set_data(io.BytesIO(grant_data))
+    jpeg_cache.readonly_image
+    assert jpeg_cache.is_synced is False
+    assert jpeg_cache._data == grant_data
+    assert jpeg_cache.held_bytes == len(grant_data) + grant_width * grant_height * 3
+
+
+def test_get_draft_image_reduced_scale(jpeg_cache, s3_uploads_client):
+    image = jpeg_cache.get_draft_image(image_size.P64)
+    assert image.size == (grant_width // 2, grant_height // 2)
+    assert jpeg_cache.is_synced is True
+    assert jpeg_cache.is_decoded is False
+    assert jpeg_cache.held_bytes == 0
+
+    # the full dimensions were remembered from the header, no need to go back to s3
+    with mock.patch.object(s3_uploads_client, 'get_object_data_stream') as get_stream:
+        assert jpeg_cache.dimensions == (grant_width, grant_height)
+    assert get_stream.mock_calls == []
+
+
+def test_get_draft_image_full_scale_is_cached(jpeg_cache):
+    image = jpeg_cache.get_draft_image(image_size.K4)
+    assert image.size == (grant_width, grant_height)
+    assert jpeg_cache.is_decoded is True
+    assert jpeg_cache.readonly_image is image
+
+
+def test_set_image_does_not_copy_by_default(jpeg_cache):
+    image = PIL.Image.new('RGB', (10, 20))
+    assert jpeg_cache.set_image(image).readonly_image is image
+    assert jpeg_cache.set_image(image, copy=True).readonly_image is not image
+    assert jpeg_cache.is_synced is False
+
+
+def test_release(jpeg_cache):
+    # nothing to release if the cache doesn't match the source
+    image = PIL.Image.new('RGB', (10, 20))
+    jpeg_cache.set_image(image).release()
+    assert jpeg_cache.is_synced is False
+    assert jpeg_cache.readonly_image is image
+
+    # once flushed, memory can be released and the image re-fetched as needed
+    jpeg_cache.flush().release()
+    assert jpeg_cache.is_synced is None
+    assert jpeg_cache.held_bytes == 0
+    assert jpeg_cache.memory_budget.held_bytes == 0
+    assert jpeg_cache.memory_budget.peak_bytes == 600
+    assert jpeg_cache.readonly_image.size == (10, 20)
+    assert jpeg_cache.is_synced is True
+
+
+def test_heic_decode(heic_cache, heic_dims):
+    image = heic_cache.readonly_image
+    assert image.size == heic_dims
+    assert heic_cache._data is None
+    assert heic_cache.dimensions == heic_dims
+
+    heic_cache.release()
+    assert heic_cache.is_decoded is False
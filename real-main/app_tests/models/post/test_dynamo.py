@@ -305,6 +305,34 @@ def test_set_post_status_album_rank_handled_correctly_to_and_from_COMPLETED_in_a
     assert post_item['gsiK3SortKey'] == -1
 
 
+def test_set_viewed_by_sketch(post_dynamo):
+    post_id = 'pid'
+
+    # can't set for post that doesnt exist
+    with pytest.raises(post_dynamo.client.exceptions.ConditionalCheckFailedException):
+        post_dynamo.set_viewed_by_sketch(post_id, b'sketch1', 1)
+
+    # create the post, set the first sketch
+    post_dynamo.add_pending_post('uid', post_id, 'ptype', text='lore ipsum')
+    post_item = post_dynamo.set_viewed_by_sketch(post_id, b'sketch1', 1)
+    assert post_item['viewedBySketch'].value == b'sketch1'
+    assert post_item['viewedByCount'] == 1
+
+    # can't set a first sketch again
+    with pytest.raises(post_dynamo.client.exceptions.ConditionalCheckFailedException):
+        post_dynamo.set_viewed_by_sketch(post_id, b'sketch2', 2)
+
+    # can't overwrite the sketch if the previous value doesn't match
+    with pytest.raises(post_dynamo.client.exceptions.ConditionalCheckFailedException):
+        post_dynamo.set_viewed_by_sketch(post_id, b'sketch2', 2, prev_sketch_bytes=b'other')
+
+    # overwrite the sketch
+    post_item = post_dynamo.set_viewed_by_sketch(post_id, b'sketch2', 2, prev_sketch_bytes=b'sketch1')
+    assert post_item['viewedBySketch'].value == b'sketch2'
+    assert post_item['viewedByCount'] == 2
+    assert post_dynamo.get_post(post_id) == post_item
+
+
 def test_set_checksum(post_dynamo):
     post_id = 'pid'
     posted_at_str = pendulum.now('utc').to_iso8601_string()
@@ -402,6 +430,41 @@ def test_post_set_is_verified(post_dynamo):
     assert 'isVerifiedHiddenValue' not in post_item
 
 
+def test_post_verification_retry(post_dynamo, caplog):
+    post_id_1, post_id_2 = str(uuid4()), str(uuid4())
+    now = pendulum.now('utc')
+    retry_at_1, retry_at_2 = now + pendulum.duration(minutes=1), now + pendulum.duration(minutes=2)
+
+    # can't set for post that doesnt exist
+    with caplog.at_level(logging.WARNING):
+        assert post_dynamo.set_verification_retry_at(post_id_1, retry_at_1, 1) is None
+    assert len(caplog.records) == 1
+    assert 'Failed to set verification retry' in caplog.records[0].msg
+    assert post_dynamo.get_post(post_id_1) is None
+
+    # schedule retries for two posts, verify they come up when due
+    post_dynamo.add_pending_post(str(uuid4()), post_id_1, 'ptype')
+    post_dynamo.add_pending_post(str(uuid4()), post_id_2, 'ptype')
+    post_item = post_dynamo.set_verification_retry_at(post_id_1, retry_at_1, 1)
+    assert post_item['gsiA4PartitionKey'] == 'postVerification'
+    assert post_item['gsiA4SortKey'] == retry_at_1.int_timestamp
+    assert post_item['verificationAttempts'] == 1
+    post_dynamo.set_verification_retry_at(post_id_2, retry_at_2, 3)
+    assert list(post_dynamo.generate_post_ids_to_retry_verification(now=now)) == []
+    assert list(post_dynamo.generate_post_ids_to_retry_verification(now=retry_at_1)) == [post_id_1]
+    assert list(post_dynamo.generate_post_ids_to_retry_verification(now=retry_at_2)) == [post_id_1, post_id_2]
+
+    # setting a result clears the retry, as does clearing it directly
+    post_item = post_dynamo.set_is_verified(post_id_1, True)
+    assert 'gsiA4PartitionKey' not in post_item
+    assert 'gsiA4SortKey' not in post_item
+    assert 'verificationAttempts' not in post_item
+    post_item = post_dynamo.clear_verification_retry(post_id_2)
+    assert 'gsiA4PartitionKey' not in post_item
+    assert 'verificationAttempts' not in post_item
+    assert list(post_dynamo.generate_post_ids_to_retry_verification(now=retry_at_2)) == []
+
+
 def test_set_expires_at_matches_creating_story_directly(post_dynamo):
     # create a post with a lifetime, then delete it
     user_id = 'uid'
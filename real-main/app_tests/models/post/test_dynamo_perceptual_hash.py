@@ -0,0 +1,70 @@
+import pytest
+
+from app.models.post.dynamo import PostPerceptualHashDynamo
+
+
+@pytest.fixture
+def pph_dynamo(dynamo_client):
+    yield PostPerceptualHashDynamo(dynamo_client)
+
+
+def test_add_get_delete(pph_dynamo):
+    post_id = 'pid'
+    phash = 0x0123456789ABCDEF
+    assert pph_dynamo.get_perceptual_hash(post_id) is None
+
+    assert pph_dynamo.add(post_id, '2020-01-01T00:00:00.000000Z', phash) == pph_dynamo.band_count
+    assert pph_dynamo.get_perceptual_hash(post_id) == phash
+    item = pph_dynamo.client.get_item(pph_dynamo.key(post_id, 1))
+    assert item['perceptualHash'] == '0123456789abcdef'
+    assert item['gsiK1PartitionKey'] == 'postPerceptualHash/1/89ab'
+    assert item['gsiK1SortKey'] == '2020-01-01T00:00:00.000000Z/0123456789abcdef'
+
+    pph_dynamo.delete(post_id)
+    assert pph_dynamo.get_perceptual_hash(post_id) is None
+    for band in range(pph_dynamo.band_count):
+        assert pph_dynamo.client.get_item(pph_dynamo.key(post_id, band)) is None
+
+
+def test_band_values(pph_dynamo):
+    assert pph_dynamo.band_values(0x0123456789ABCDEF) == [0xCDEF, 0x89AB, 0x4567, 0x0123]
+    assert pph_dynamo.band_values(0) == [0, 0, 0, 0]
+
+
+def test_get_first_near_duplicate(pph_dynamo):
+    phash = 0x0123456789ABCDEF
+    assert pph_dynamo.get_first_near_duplicate(phash) is None
+
+    # a post with a hash too far away, in every band
+    pph_dynamo.add('pid0', '2020-01-01T00:00:00.000000Z', phash ^ 0x0001000100010001)
+    assert pph_dynamo.get_first_near_duplicate(phash) is None
+
+    # add a near duplicate that differs in three bands
+    pph_dynamo.add('pid2', '2020-01-03T00:00:00.000000Z', phash ^ 0x0000000100010001)
+    assert pph_dynamo.get_first_near_duplicate(phash) == 'pid2'
+
+    # add an exact duplicate that was posted later
+    pph_dynamo.add('pid3', '2020-01-04T00:00:00.000000Z', phash)
+    assert pph_dynamo.get_first_near_duplicate(phash) == 'pid2'
+
+    # add an earlier near duplicate
+    pph_dynamo.add('pid1', '2020-01-02T00:00:00.000000Z', phash ^ 0x8000000000000000)
+    assert pph_dynamo.get_first_near_duplicate(phash) == 'pid1'
+
+    # delete it
+    pph_dynamo.delete('pid1')
+    assert pph_dynamo.get_first_near_duplicate(phash) == 'pid2'
+
+
+def test_get_first_near_duplicate_limits_candidates(pph_dynamo):
+    phash = 0x0123456789ABCDEF
+    pph_dynamo.max_candidates_per_band = 2
+
+    # two posts that share only the last band, then a near duplicate that also shares only that band
+    pph_dynamo.add('pid1', '2020-01-01T00:00:00.000000Z', phash ^ 0x0000FFFFFFFFFFFF)
+    pph_dynamo.add('pid2', '2020-01-02T00:00:00.000000Z', phash ^ 0x0000FFFFFFFFFFFF)
+    pph_dynamo.add('pid3', '2020-01-03T00:00:00.000000Z', phash ^ 0x0000000100010001)
+    assert pph_dynamo.get_first_near_duplicate(phash) is None
+
+    pph_dynamo.max_candidates_per_band = 3
+    assert pph_dynamo.get_first_near_duplicate(phash) == 'pid3'
@@ -1,5 +1,6 @@
 import logging
 import uuid
+from unittest import mock
 
 import pendulum
 import pytest
@@ -7,6 +8,7 @@ import stringcase
 
 from app.models.post.enums import PostStatus, PostType
 from app.models.post.exceptions import PostException
+from app.models.post.manager import EXPIRED_POSTS_INDEX_LAG
 from app.utils import image_size
 
 
@@ -45,6 +47,25 @@ def test_get_post_dne(post_manager):
     assert post_manager.get_post('pid-dne') is None
 
 
+def test_get_posts(post_manager, user):
+    post_manager.add_post(user, 'pid1', PostType.TEXT_ONLY, text='t')
+    post_manager.add_post(user, 'pid2', PostType.IMAGE, image_input={'imageFormat': 'HEIC'})
+    assert post_manager.get_posts([]) == {}
+
+    posts = post_manager.get_posts(['pid1', 'pid2', 'pid-dne', 'pid2'])
+    assert set(posts.keys()) == {'pid1', 'pid2'}
+    assert posts['pid1'].item['text'] == 't'
+    assert posts['pid2'].type == PostType.IMAGE
+    assert not hasattr(posts['pid2'], '_image_item')
+
+    # image items get loaded in bulk too, if requested
+    posts = post_manager.get_posts(['pid1', 'pid2'], with_image_items=True)
+    assert posts['pid1'].image_item == {}
+    with mock.patch.object(post_manager.image_dynamo, 'get') as image_get:
+        assert posts['pid2'].image_item['imageFormat'] == 'HEIC'
+        assert image_get.call_count == 0
+
+
 def test_add_post_errors(post_manager, user):
     # try to add a post without any content (no text or media)
     with pytest.raises(PostException, match='without text'):
@@ -445,8 +466,8 @@ def test_delete_recently_expired_posts(post_manager, user, caplog):
     )
     assert post_expired_last_week.item['expiresAt'] < (now - pendulum.duration(days=6)).to_iso8601_string()
 
-    # run the deletion run
-    post_manager.delete_recently_expired_posts()
+    # run the deletion run, once the expiry is old enough to be in the index
+    post_manager.delete_recently_expired_posts(now=now + EXPIRED_POSTS_INDEX_LAG * 2)
 
     # check we logged one delete
     assert len(caplog.records) == 1
@@ -461,6 +482,97 @@ def test_delete_recently_expired_posts(post_manager, user, caplog):
     assert post_expired_last_week.refresh_item().item
 
 
+def test_delete_recently_expired_posts_resumes(post_manager, user, caplog):
+    now = pendulum.parse('2020-06-09T12:00:00Z')
+    lifetime_duration = pendulum.duration(hours=1)
+
+    def add_post_expiring_at(expires_at):
+        return post_manager.add_post(
+            user,
+            str(uuid.uuid4()),
+            PostType.TEXT_ONLY,
+            text='t',
+            lifetime_duration=lifetime_duration,
+            now=expires_at - lifetime_duration,
+        )
+
+    # two posts expired yesterday, one today, and one has yet to expire
+    post1 = add_post_expiring_at(now - pendulum.duration(hours=20))
+    post2 = add_post_expiring_at(now - pendulum.duration(hours=14))
+    post3 = add_post_expiring_at(now - pendulum.duration(hours=2))
+    post4 = add_post_expiring_at(now + pendulum.duration(minutes=1))
+
+    # the first run deletes the expired posts, with owners fetched in a batch rather than one by one
+    post_manager.user_manager.dynamo.get_user = mock.Mock(wraps=post_manager.user_manager.dynamo.get_user)
+    with caplog.at_level(logging.WARNING):
+        post_manager.delete_recently_expired_posts(now=now)
+    assert post_manager.user_manager.dynamo.get_user.call_count == 0
+    assert len(caplog.records) == 3
+    assert [post.id in record.msg for post, record in zip((post1, post2, post3), caplog.records)] == [True] * 3
+    assert all(user.username in record.msg for record in caplog.records)
+    assert [post.refresh_item().item for post in (post1, post2, post3)] == [None, None, None]
+    assert post_manager.dynamo.get_expired_posts_swept_through('recent') == ('2020-06-09', '10:00:00')
+
+    # a post that expires before where the sweep got to is left for the daily sweep of older posts
+    post5 = add_post_expiring_at(now - pendulum.duration(hours=3))
+
+    # the next run picks up from where the last one left off
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        post_manager.delete_recently_expired_posts(now=now + pendulum.duration(minutes=2))
+    assert len(caplog.records) == 1
+    assert post4.id in caplog.records[0].msg
+    assert post4.refresh_item().item is None
+    assert post5.refresh_item().item
+    assert post_manager.dynamo.get_expired_posts_swept_through('recent') == ('2020-06-09', '12:01:00')
+
+
+def test_delete_recently_expired_posts_sweeps_again_at_the_same_time(post_manager, user, caplog):
+    now = pendulum.parse('2020-06-09T12:00:00Z')
+    expires_at = now - pendulum.duration(hours=1)
+    lifetime_duration = pendulum.duration(hours=1)
+
+    def add_post_expiring_at(expires_at):
+        return post_manager.add_post(
+            user,
+            str(uuid.uuid4()),
+            PostType.TEXT_ONLY,
+            text='t',
+            lifetime_duration=lifetime_duration,
+            now=expires_at - lifetime_duration,
+        )
+
+    # the first run sweeps through the one post
+    post1 = add_post_expiring_at(expires_at)
+    post_manager.delete_recently_expired_posts(now=now)
+    assert post1.refresh_item().item is None
+    assert post_manager.dynamo.get_expired_posts_swept_through('recent') == ('2020-06-09', '11:00:00')
+
+    # a post that expires at the same time, but that the first run didn't see, is picked up by the next run
+    post2 = add_post_expiring_at(expires_at)
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        post_manager.delete_recently_expired_posts(now=now + pendulum.duration(minutes=1))
+    assert len(caplog.records) == 1
+    assert post2.id in caplog.records[0].msg
+    assert post2.refresh_item().item is None
+
+
+def test_delete_recently_expired_posts_leaves_most_recent_expiries(post_manager, user):
+    now = pendulum.parse('2020-06-09T12:00:00Z')
+    lifetime_duration = pendulum.duration(hours=1)
+    posted_at = now - lifetime_duration
+    post = post_manager.add_post(
+        user, 'pid1', PostType.TEXT_ONLY, text='t', lifetime_duration=lifetime_duration, now=posted_at
+    )
+
+    # the index may not have caught up with the post yet, so it is left for the next run
+    post_manager.delete_recently_expired_posts(now=now + EXPIRED_POSTS_INDEX_LAG / 2)
+    assert post.refresh_item().item
+    post_manager.delete_recently_expired_posts(now=now + EXPIRED_POSTS_INDEX_LAG * 2)
+    assert post.refresh_item().item is None
+
+
 def test_delete_older_expired_posts(post_manager, user, caplog):
     now = pendulum.now('utc')
 
@@ -510,6 +622,109 @@ def test_delete_older_expired_posts(post_manager, user, caplog):
     assert post_expired_last_week.refresh_item().item is None
 
 
+def test_delete_older_expired_posts_sweeps_each_day_once(post_manager, user, caplog):
+    now = pendulum.parse('2020-06-09T12:00:00Z')
+    lifetime_duration = pendulum.duration(hours=1)
+
+    def add_post_expiring_at(expires_at):
+        return post_manager.add_post(
+            user,
+            str(uuid.uuid4()),
+            PostType.TEXT_ONLY,
+            text='t',
+            lifetime_duration=lifetime_duration,
+            now=expires_at - lifetime_duration,
+        )
+
+    post_last_month = add_post_expiring_at(now - pendulum.duration(days=30))
+    post_last_week = add_post_expiring_at(now - pendulum.duration(days=6))
+    post_yesterday = add_post_expiring_at(now - pendulum.duration(days=1))
+
+    # the first run looks back over a bounded window, so misses the one from last month
+    post_manager.dynamo.generate_expired_post_pks_by_day = mock.Mock(
+        wraps=post_manager.dynamo.generate_expired_post_pks_by_day
+    )
+    post_manager.delete_older_expired_posts(now=now)
+    assert post_manager.dynamo.generate_expired_post_pks_by_day.call_count == 7
+    assert post_last_month.refresh_item().item
+    assert post_last_week.refresh_item().item is None
+    assert post_yesterday.refresh_item().item is None
+    assert post_manager.dynamo.get_expired_posts_swept_through('daily') == ('2020-06-08', None)
+
+    # running again the same day sweeps nothing, the next day sweeps just one day
+    post_manager.dynamo.generate_expired_post_pks_by_day.reset_mock()
+    post_manager.delete_older_expired_posts(now=now)
+    assert post_manager.dynamo.generate_expired_post_pks_by_day.call_count == 0
+    post_manager.delete_older_expired_posts(now=now + pendulum.duration(days=1))
+    assert post_manager.dynamo.generate_expired_post_pks_by_day.mock_calls == [mock.call(now.date())]
+    assert post_manager.dynamo.get_expired_posts_swept_through('daily') == ('2020-06-09', None)
+
+    # the scan catches what the sweep left behind
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        post_manager.delete_expired_posts_with_scan(now=now)
+    assert len(caplog.records) == 1
+    assert post_last_month.id in caplog.records[0].msg
+    assert post_last_month.refresh_item().item is None
+
+
+def test_retry_post_verifications(post_manager, user, grant_data_b64):
+    image_input = {'imageData': grant_data_b64}
+    post1 = post_manager.add_post(user, str(uuid.uuid4()), PostType.IMAGE, image_input=image_input)
+    post2 = post_manager.add_post(user, str(uuid.uuid4()), PostType.IMAGE, image_input=image_input)
+    post3 = post_manager.add_post(user, str(uuid.uuid4()), PostType.IMAGE, image_input=image_input)
+
+    # verification of all three fails
+    now = pendulum.now('utc')
+    post_manager.clients['post_verification'].configure_mock(**{'verify_image.side_effect': Exception('nope')})
+    for post in (post1, post2, post3):
+        post.verify(now=now)
+        assert post.refresh_item().is_verified is None
+
+    # nothing to retry until the retry delay has passed
+    assert post_manager.retry_post_verifications(now=now) == (0, 0)
+
+    # post2 is archived and post3 is deleted in the meantime, so only post1 is verified
+    post2.archive()
+    post_manager.dynamo.client.delete_item(post_manager.dynamo.pk(post3.id))
+    post_manager.clients['post_verification'].configure_mock(
+        **{'verify_image.side_effect': None, 'verify_image.return_value': True}
+    )
+    retry_at = now + pendulum.duration(minutes=5)
+    assert post_manager.retry_post_verifications(now=retry_at) == (2, 1)
+    assert post1.refresh_item().is_verified is True
+    assert post1.trending_item
+    assert post2.refresh_item().is_verified is None
+
+    # nothing is left to retry
+    assert post_manager.retry_post_verifications(now=retry_at) == (0, 0)
+
+
+def test_retry_post_verifications_backs_off_then_gives_up(post_manager, user, grant_data_b64):
+    image_input = {'imageData': grant_data_b64}
+    post = post_manager.add_post(user, str(uuid.uuid4()), PostType.IMAGE, image_input=image_input)
+    post_manager.clients['post_verification'].configure_mock(**{'verify_image.side_effect': Exception('nope')})
+
+    # each failed attempt doubles the wait before the next one
+    now = pendulum.now('utc')
+    post.verify(now=now)
+    delay = pendulum.duration(minutes=5)
+    for attempts in range(1, 9):
+        assert post.refresh_item().item['verificationAttempts'] == attempts
+        assert post.is_verified is None
+        assert post_manager.retry_post_verifications(now=now + delay - pendulum.duration(seconds=1)) == (0, 0)
+        now += delay
+        delay *= 2
+        assert post_manager.retry_post_verifications(now=now) == (1, int(attempts == 8))
+
+    # after the last attempt the post is not verified, and gets the steps that wait on the result
+    assert post.refresh_item().is_verified is False
+    assert 'verificationAttempts' not in post.item
+    assert post.refresh_trending_item().trending_item
+    assert post_manager.retry_post_verifications(now=now + pendulum.duration(days=1)) == (0, 0)
+    assert post_manager.clients['post_verification'].verify_image.call_count == 9
+
+
 def test_set_post_status_to_error(post_manager, user_manager, user):
     # create a COMPLETED post, verify cannot transition it to ERROR
     post = post_manager.add_post(user, 'pid1', PostType.TEXT_ONLY, text='t')
@@ -556,6 +771,20 @@ def test_record_views(post_manager, user, user2, posts, caplog):
     assert user2.refresh_item().item['lastPostViewAt']
 
 
+def test_record_views_with_sketches_merges_user_sketch_once_per_batch(post_manager, user, user2, posts):
+    post1, post2 = posts
+    post_manager.viewed_by_sketches_enabled = True
+    post_manager.user_manager.merge_post_viewed_by_sketch = mock.Mock(
+        wraps=post_manager.user_manager.merge_post_viewed_by_sketch
+    )
+
+    post_manager.record_views([post1.id, post2.id, post1.id], user2.id)
+    assert post_manager.user_manager.merge_post_viewed_by_sketch.call_count == 1
+    assert post1.refresh_item().item['viewedByCount'] == 1
+    assert post2.refresh_item().item['viewedByCount'] == 1
+    assert user.refresh_item().item['postViewedByCount'] == 2
+
+
 def test_delete_all_by_user(post_manager, user):
     assert list(post_manager.dynamo.generate_posts_by_user(user.id)) == []
 
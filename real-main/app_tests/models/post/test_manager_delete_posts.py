@@ -0,0 +1,87 @@
+import uuid
+from unittest import mock
+
+import pendulum
+import pytest
+
+from app.models.like.enums import LikeStatus
+from app.models.post.enums import PostType
+from app.utils import image_size
+
+
+@pytest.fixture
+def user(user_manager, cognito_client):
+    user_id, username = str(uuid.uuid4()), str(uuid.uuid4())[:8]
+    cognito_client.create_verified_user_pool_entry(user_id, username, f'{username}@real.app')
+    yield user_manager.create_cognito_only_user(user_id, username)
+
+
+user2 = user
+
+
+@pytest.fixture
+def image_post(post_manager, user, image_data_b64):
+    post = post_manager.add_post(
+        user,
+        str(uuid.uuid4()),
+        PostType.IMAGE,
+        image_input={'imageData': image_data_b64, 'originalMetadata': '{}'},
+    )
+    yield post.verify()
+
+
+@pytest.fixture
+def stories(post_manager, user):
+    yield [
+        post_manager.add_post(
+            user,
+            str(uuid.uuid4()),
+            PostType.TEXT_ONLY,
+            text='t',
+            lifetime_duration=pendulum.duration(hours=hours),
+        )
+        for hours in (3, 1, 2)
+    ]
+
+
+def test_delete_posts_none(post_manager):
+    assert post_manager.delete_posts([]) == 0
+
+
+def test_delete_posts_and_all_dependents(post_manager, like_manager, comment_manager, user, user2, image_post):
+    post = image_post
+    like_manager.like_post(user2, post, LikeStatus.ONYMOUSLY_LIKED)
+    comment = comment_manager.add_comment(str(uuid.uuid4()), post.id, user2.id, 'lore')
+    post.trending_increment_score()
+    assert like_manager.get_like(user2.id, post.id)
+    assert post_manager.image_dynamo.get(post.id)
+    assert post_manager.original_metadata_dynamo.get(post.id)
+    assert post_manager.perceptual_hash_dynamo.get_perceptual_hash(post.id) is not None
+    assert post_manager.trending_dynamo.get(post.id)
+    assert post_manager.clients['s3_uploads'].exists(post.get_image_path(image_size.NATIVE))
+
+    assert post_manager.delete_posts([post.item]) == 1
+
+    # check the post and everything hanging off of it is gone
+    assert post.refresh_item().item is None
+    assert like_manager.get_like(user2.id, post.id) is None
+    assert comment_manager.get_comment(comment.id) is None
+    assert post_manager.image_dynamo.get(post.id) is None
+    assert post_manager.original_metadata_dynamo.get(post.id) is None
+    assert post_manager.perceptual_hash_dynamo.get_perceptual_hash(post.id) is None
+    assert post_manager.trending_dynamo.get(post.id) is None
+    for size in image_size.JPEGS:
+        assert not post_manager.clients['s3_uploads'].exists(post.get_image_path(size))
+
+
+def test_delete_all_by_user_refreshes_first_story_once(post_manager, user, stories, image_post):
+    post_manager.follower_manager = mock.Mock(post_manager.follower_manager)
+
+    post_manager.delete_all_by_user(user.id)
+    assert list(post_manager.dynamo.generate_posts_by_user(user.id)) == []
+
+    # only the story that expires first could have been the followed first story
+    assert len(post_manager.follower_manager.refresh_first_story.mock_calls) == 1
+    story_prev = post_manager.follower_manager.refresh_first_story.call_args.kwargs['story_prev']
+    assert story_prev['postId'] == stories[1].id
+    assert not post_manager.clients['s3_uploads'].exists(image_post.get_image_path(image_size.NATIVE))
@@ -82,6 +82,22 @@ def test_on_flag_add_force_archive_by_crowdsourced_criteria(post_manager, post,
     assert post.status == PostStatus.ARCHIVED
 
 
+def test_on_flag_delete_skips_post_being_deleted(post_manager, post, user2, flag_item, caplog):
+    post_manager.on_flag_add(post.id, new_item=flag_item)
+    assert post.refresh_item().item.get('flagCount', 0) == 1
+
+    # the post is being deleted, its flag count is left alone
+    post.item = post.dynamo.set_post_status(post.item, PostStatus.DELETING)
+    post_manager.on_flag_delete(post.id, old_item=flag_item)
+    assert post.refresh_item().item.get('flagCount', 0) == 1
+
+    # the post is gone, nothing is attempted
+    post.dynamo.delete_post(post.id)
+    with caplog.at_level(logging.WARNING):
+        post_manager.on_flag_delete(post.id, old_item=flag_item)
+    assert caplog.records == []
+
+
 def test_on_like_add(post_manager, post, like_onymous, like_anonymous):
     # check starting state
     post.refresh_item()
@@ -445,3 +461,28 @@ def test_on_post_verification_hidden_change_update_is_verified(post_manager, pos
         post.refresh_item()
         assert post.item['isVerified'] is is_verified
         assert 'isVerifiedHiddenValue' not in post.item
+
+
+def test_on_post_status_change_verify_image(post_manager, user, post, image_data_b64):
+    # text-only posts are ignored
+    old_item = {**post.item, 'postStatus': PostStatus.PENDING}
+    with patch.object(post_manager, 'init_post') as init_post_mock:
+        post_manager.on_post_status_change_verify_image(post.id, new_item=post.item, old_item=old_item)
+    assert init_post_mock.mock_calls == []
+
+    # an image post that has just completed gets verified
+    image_post = post_manager.add_post(
+        user, str(uuid4()), PostType.IMAGE, image_input={'imageData': image_data_b64}
+    )
+    assert image_post.status == PostStatus.COMPLETED
+    assert 'isVerified' not in image_post.item
+    old_item = {**image_post.item, 'postStatus': PostStatus.PROCESSING}
+    post_manager.on_post_status_change_verify_image(image_post.id, new_item=image_post.item, old_item=old_item)
+    assert image_post.refresh_item().item['isVerified'] is True
+
+    # already verified, so no-op
+    with patch.object(post_manager, 'init_post') as init_post_mock:
+        post_manager.on_post_status_change_verify_image(
+            image_post.id, new_item=image_post.item, old_item=old_item
+        )
+    assert init_post_mock.mock_calls == []
@@ -7,6 +7,7 @@ from unittest import mock
 import pendulum
 import pytest
 
+from app.clients.post_verification import PostVerificationServiceUnavailable
 from app.models.post.enums import PostStatus, PostType
 from app.models.post.exceptions import PostException
 from app.models.post.model import Post
@@ -23,11 +24,11 @@ heic_width = 4032
 heic_height = 3024
 
 grant_colors = [
-    {'r': 51, 'g': 58, 'b': 45},
-    {'r': 186, 'g': 206, 'b': 228},
-    {'r': 145, 'g': 154, 'b': 169},
-    {'r': 158, 'g': 180, 'b': 205},
-    {'r': 130, 'g': 123, 'b': 125},
+    {'r': 60, 'g': 67, 'b': 48},
+    {'r': 13, 'g': 12, 'b': 15},
+    {'r': 101, 'g': 109, 'b': 93},
+    {'r': 183, 'g': 207, 'b': 233},
+    {'r': 148, 'g': 154, 'b': 165},
 ]
 
 
@@ -70,9 +71,10 @@ def pending_image_post_heic(post_manager, user2):
 
 @pytest.fixture
 def image_post(user, post_manager, grant_data_b64):
-    yield post_manager.add_post(
+    post = post_manager.add_post(
         user, str(uuid.uuid4()), PostType.IMAGE, image_input={'imageData': grant_data_b64}
     )
+    yield post.verify()
 
 
 @pytest.fixture
@@ -157,6 +159,26 @@ def test_get_image_readonly_url(cloudfront_client, s3_uploads_client):
     assert cloudfront_client.mock_calls == [mock.call.generate_presigned_url(expected_path, ['GET', 'HEAD'])]
 
 
+def test_get_image_readonly_urls(cloudfront_client, s3_uploads_client):
+    item = {
+        'postedByUserId': 'user-id',
+        'postId': 'post-id',
+        'postType': PostType.IMAGE,
+        'postStatus': PostStatus.COMPLETED,
+    }
+    expected_urls = ['url-native', 'url-480p']
+    cloudfront_client.configure_mock(**{'generate_presigned_urls.return_value': expected_urls})
+
+    post = Post(item, cloudfront_client=cloudfront_client, s3_uploads_client=s3_uploads_client)
+    assert post.get_image_readonly_urls([image_size.NATIVE, image_size.P480]) == expected_urls
+
+    expected_paths = [
+        f'user-id/post/post-id/image/{image_size.NATIVE.filename}',
+        f'user-id/post/post-id/image/{image_size.P480.filename}',
+    ]
+    assert cloudfront_client.mock_calls == [mock.call.generate_presigned_urls(expected_paths, ['GET', 'HEAD'])]
+
+
 def test_get_hls_access_cookies(cloudfront_client, s3_uploads_client):
     user_id = 'uid'
     post_id = 'pid'
@@ -260,6 +282,115 @@ def test_set_is_verified_maximal(pending_image_post):
     ]
 
 
+def test_verify_skips_posts_not_completed_or_already_verified(pending_image_post, image_post):
+    pending_image_post.post_verification_client = mock.Mock()
+    image_post.post_verification_client = mock.Mock()
+    assert image_post.is_verified is True
+
+    pending_image_post.verify()
+    image_post.verify()
+    assert 'isVerified' not in pending_image_post.refresh_item().item
+    assert pending_image_post.post_verification_client.mock_calls == []
+    assert image_post.post_verification_client.mock_calls == []
+
+
+def test_verify(post_manager, user, grant_data_b64):
+    post = post_manager.add_post(
+        user, str(uuid.uuid4()), PostType.IMAGE, image_input={'imageData': grant_data_b64}, set_as_user_photo=True
+    )
+    post.post_verification_client = mock.Mock(**{'verify_image.return_value': True})
+
+    # post is completed, but verification and the steps dependent on it have not yet happened
+    assert post.status == PostStatus.COMPLETED
+    assert post.is_verified is None
+    assert post.trending_item is None
+    assert 'photoPostId' not in user.refresh_item().item
+    assert post.item['setAsUserPhoto'] is True
+
+    post.verify()
+    assert post.is_verified is True
+    assert post.refresh_item().is_verified is True
+    assert len(post.post_verification_client.mock_calls) == 1
+    assert post.trending_item
+    assert user.refresh_item().item['photoPostId'] == post.id
+    assert 'setAsUserPhoto' not in post.item
+
+
+@pytest.mark.parametrize(
+    'verify_image_kwargs',
+    [{'side_effect': Exception('nope')}, {'side_effect': PostVerificationServiceUnavailable('circuit open')}],
+)
+def test_verify_service_failure(post_manager, user, grant_data_b64, caplog, verify_image_kwargs):
+    post = post_manager.add_post(
+        user, str(uuid.uuid4()), PostType.IMAGE, image_input={'imageData': grant_data_b64}, set_as_user_photo=True
+    )
+    post.post_verification_client = mock.Mock(**{f'verify_image.{k}': v for k, v in verify_image_kwargs.items()})
+
+    # the post is left without a result and scheduled for a retry
+    now = pendulum.now('utc')
+    with caplog.at_level(logging.ERROR):
+        post.verify(now=now)
+    assert len(caplog.records) == 1
+    assert f'Unable to verify post `{post.id}`' in caplog.records[0].msg
+    assert post.is_verified is None
+    assert post.refresh_item().is_verified is None
+    assert post.item['setAsUserPhoto'] is True
+    assert post.trending_item is None
+    assert 'photoPostId' not in user.refresh_item().item
+    retry_at = now + pendulum.duration(minutes=5)
+    assert list(post_manager.dynamo.generate_post_ids_to_retry_verification(now=retry_at)) == [post.id]
+    assert list(post_manager.dynamo.generate_post_ids_to_retry_verification(now=now)) == []
+
+    # the retry succeeds, and the steps dependent on verification then happen
+    post.post_verification_client = mock.Mock(**{'verify_image.return_value': True})
+    post.verify(now=retry_at)
+    assert post.is_verified is True
+    assert post.refresh_item().is_verified is True
+    assert 'setAsUserPhoto' not in post.item
+    assert post.trending_item
+    assert user.refresh_item().item['photoPostId'] == post.id
+    assert list(post_manager.dynamo.generate_post_ids_to_retry_verification(now=retry_at)) == []
+
+
+def test_verify_checksum_lookup_failure(post_manager, user, grant_data_b64, caplog):
+    image_input = {'imageData': grant_data_b64}
+    post = post_manager.add_post(user, str(uuid.uuid4()), PostType.IMAGE, image_input=image_input)
+    post.post_verification_client = mock.Mock(**{'verify_image.return_value': True})
+
+    now = pendulum.now('utc')
+    with mock.patch.object(post.dynamo, 'get_first_with_checksum', side_effect=Exception('dynamo down')):
+        with caplog.at_level(logging.ERROR):
+            post.verify(now=now)
+    assert len(caplog.records) == 1
+    assert 'dynamo down' in caplog.records[0].msg
+    assert post.refresh_item().is_verified is None
+    assert post.post_verification_client.mock_calls == []
+    retry_at = now + pendulum.duration(minutes=5)
+    assert list(post_manager.dynamo.generate_post_ids_to_retry_verification(now=retry_at)) == [post.id]
+
+
+@pytest.mark.parametrize('is_verified', [True, False])
+def test_verify_reuses_result_from_same_checksum(post_manager, user, user2, grant_data_b64, is_verified):
+    post_manager.clients['post_verification'].configure_mock(**{'verify_image.return_value': is_verified})
+    image_input = {'imageData': grant_data_b64}
+    post1 = post_manager.add_post(user, str(uuid.uuid4()), PostType.IMAGE, image_input=image_input)
+    post2 = post_manager.add_post(user2, str(uuid.uuid4()), PostType.IMAGE, image_input=image_input)
+    assert post1.item['checksum'] == post2.item['checksum']
+
+    # verify the first post, and then hide the first post's verification status
+    post1.verify()
+    assert len(post_manager.clients['post_verification'].mock_calls) == 1
+    old_item = post1.item.copy()
+    post1.set(verification_hidden=True)
+    post_manager.on_post_verification_hidden_change_update_is_verified(post1.id, post1.item, old_item)
+    assert post1.refresh_item().is_verified is True
+
+    # second post gets the result without a call to the service
+    post2.verify()
+    assert post2.is_verified is is_verified
+    assert len(post_manager.clients['post_verification'].mock_calls) == 1
+
+
 def test_set_expires_at(post):
     # add a post without an expires at
     assert 'expiresAt' not in post.item
@@ -687,7 +818,7 @@ def test_build_image_thumbnails_video_post(user, processing_video_post, s3_uploa
 
     # check final state
     assert s3_uploads_client.exists(post.get_image_path(image_size.NATIVE))
-    assert s3_uploads_client.exists(post.get_image_path(image_size.K4))
+    assert not s3_uploads_client.exists(post.get_image_path(image_size.K4))  # built on demand
     assert s3_uploads_client.exists(post.get_image_path(image_size.P1080))
     assert s3_uploads_client.exists(post.get_image_path(image_size.P480))
     assert s3_uploads_client.exists(post.get_image_path(image_size.P64))
@@ -733,20 +864,20 @@ def test_set_colors(s3_uploads_client, pending_image_post):
     post = pending_image_post
     assert 'colors' not in post.image_item
 
-    # put an image in the bucket
-    s3_path = post.get_image_path(image_size.NATIVE)
+    # put an image in the bucket, palette is taken from the 480p thumbnail
+    s3_path = post.get_image_path(image_size.P480)
     s3_uploads_client.put_object(s3_path, open(grant_path, 'rb'), 'image/jpeg')
 
     post.set_colors()
     assert post.image_item['colors'] == grant_colors
 
 
-def test_set_colors_colortheif_fails(s3_uploads_client, pending_image_post, caplog):
+def test_set_colors_fails(s3_uploads_client, pending_image_post, caplog):
     post = pending_image_post
     assert 'colors' not in post.image_item
 
-    # put an image in the bucket
-    s3_path = post.get_image_path(image_size.NATIVE)
+    # put an all-white image in the bucket
+    s3_path = post.get_image_path(image_size.P480)
     s3_uploads_client.put_object(s3_path, open(blank_path, 'rb'), 'image/jpeg')
 
     assert len(caplog.records) == 0
@@ -756,7 +887,7 @@ def test_set_colors_colortheif_fails(s3_uploads_client, pending_image_post, capl
 
     assert len(caplog.records) == 1
     assert caplog.records[0].levelname == 'WARNING'
-    assert 'ColorTheif' in caplog.records[0].msg
+    assert 'Failed to get palette' in caplog.records[0].msg
     assert f'`{post.id}`' in caplog.records[0].msg
 
 
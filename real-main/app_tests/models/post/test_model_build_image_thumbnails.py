@@ -1,6 +1,7 @@
 import io
 import uuid
 from os import path
+from unittest import mock
 
 import PIL.Image
 import pytest
@@ -50,11 +51,10 @@ def test_build_image_thumbnails_wide_image(s3_uploads_client, processing_image_p
 
     post.build_image_thumbnails()
 
-    # check the 4k thumbnail is there, and that it is the right size
+    # check the 4k thumbnail is not there, but is the right size when built on demand
     path_4k = post.get_image_path(image_size.K4)
-    assert s3_uploads_client.exists(path_4k)
-    image = PIL.Image.open(s3_uploads_client.get_object_data_stream(path_4k))
-    width, height = image.size
+    assert not s3_uploads_client.exists(path_4k)
+    width, height = post.k4_jpeg_cache.readonly_image.size
     assert width == 3840
     assert height < 2160
 
@@ -98,11 +98,10 @@ def test_build_image_thumbnails_tall_image(s3_uploads_client, processing_image_p
 
     post.build_image_thumbnails()
 
-    # check the 4k thumbnail is there, and that it is the right size
+    # check the 4k thumbnail is not there, but is the right size when built on demand
     path_4k = post.get_image_path(image_size.K4)
-    assert s3_uploads_client.exists(path_4k)
-    image = PIL.Image.open(s3_uploads_client.get_object_data_stream(path_4k))
-    width, height = image.size
+    assert not s3_uploads_client.exists(path_4k)
+    width, height = post.k4_jpeg_cache.readonly_image.size
     assert width < 3840
     assert height == 2160
 
@@ -145,11 +144,9 @@ def test_build_image_thumbnails_respect_exif_orientation(s3_uploads_client, proc
     # check that the thumbnailing process respected the exif orientation tag,
     # by looking at width and height of output image
 
-    # check 4k
-    path_4k = post.get_image_path(image_size.K4)
-    assert s3_uploads_client.exists(path_4k)
-    image = PIL.Image.open(s3_uploads_client.get_object_data_stream(path_4k))
-    width, height = image.size
+    # check 4k, built on demand
+    assert not s3_uploads_client.exists(post.get_image_path(image_size.K4))
+    width, height = post.k4_jpeg_cache.readonly_image.size
     assert width == grant_rotated_width
     assert height == grant_rotated_height
 
@@ -192,10 +189,6 @@ def test_build_image_thumbnails_content_type(s3_uploads_client, processing_image
     # check the height and width of the thumbnails to make sure the
     # thumbnailing process correctly accounted for the exif orientation header
 
-    # check 4k content type
-    path_4k = post.get_image_path(image_size.K4)
-    assert s3_uploads_client.bucket.Object(path_4k).content_type == 'image/jpeg'
-
     # check 1080p content type
     path_1080 = post.get_image_path(image_size.P1080)
     assert s3_uploads_client.bucket.Object(path_1080).content_type == 'image/jpeg'
@@ -207,3 +200,97 @@ def test_build_image_thumbnails_content_type(s3_uploads_client, processing_image
     # check 64p content type
     path_64 = post.get_image_path(image_size.P64)
     assert s3_uploads_client.bucket.Object(path_64).content_type == 'image/jpeg'
+
+
+def test_build_image_thumbnails_records_peak_memory(s3_uploads_client, processing_image_post):
+    post = processing_image_post
+    path = post.get_image_path(image_size.NATIVE)
+    s3_uploads_client.put_object(path, open(blank_path, 'rb'), 'image/jpeg')
+    native_width, native_height = PIL.Image.open(blank_path).size
+
+    post.build_image_thumbnails()
+
+    # at least the 1080p thumbnail was held, but never a full decode of the native image
+    path_1080 = post.get_image_path(image_size.P1080)
+    width, height = PIL.Image.open(s3_uploads_client.get_object_data_stream(path_1080)).size
+    assert post.thumbnails_peak_bytes >= width * height * 3
+    assert post.thumbnails_peak_bytes < native_width * native_height * 3 * 2
+
+
+def test_build_image_thumbnails_encodes_separate_images(s3_uploads_client, processing_image_post):
+    post = processing_image_post
+    path = post.get_image_path(image_size.NATIVE)
+    s3_uploads_client.put_object(path, open(grant_path, 'rb'), 'image/jpeg')
+
+    # grant is smaller than all but the smallest thumbnail, but Image.save() mutates the image,
+    # so the concurrent encodes must each get their own
+    encode = image_size.EncoderProfile.encode
+    with mock.patch.object(image_size.EncoderProfile, 'encode', autospec=True, side_effect=encode) as encode_mock:
+        post.build_image_thumbnails()
+    images = [call.args[1] for call in encode_mock.mock_calls]
+    assert len(images) == 3
+    assert len({id(image) for image in images}) == 3
+    assert [image.size for image in images[:2]] == [(grant_width, grant_height)] * 2
+
+
+def test_build_image_thumbnails_from_draft_decode(s3_uploads_client, processing_image_post):
+    post = processing_image_post
+    path = post.get_image_path(image_size.NATIVE)
+    s3_uploads_client.put_object(path, open(blank_path, 'rb'), 'image/jpeg')
+
+    # the draft decode is at reduced scale, but always at least as big as the 4k thumbnail
+    image = post.native_jpeg_cache.get_draft_image(image_size.K4)
+    assert image.size[0] >= 3840
+    assert image.size[0] <= PIL.Image.open(blank_path).size[0]
+
+    # grant is small enough that the draft decode is a full decode, which is kept
+    path = post.get_image_path(image_size.NATIVE)
+    s3_uploads_client.put_object(path, open(grant_path, 'rb'), 'image/jpeg')
+    post.native_jpeg_cache.clear()
+    image = post.native_jpeg_cache.get_draft_image(image_size.K4)
+    assert image.size == (grant_width, grant_height)
+    assert post.native_jpeg_cache.readonly_image is image
+
+
+def test_build_thumbnail_on_demand(s3_uploads_client, processing_image_post):
+    post = processing_image_post
+    path = post.get_image_path(image_size.NATIVE)
+    s3_uploads_client.put_object(path, open(blank_path, 'rb'), 'image/jpeg')
+
+    # matches what build_image_thumbnails would have built
+    assert post.build_thumbnail(image_size.K4).size == (3840, 1920)
+    assert post.build_thumbnail(image_size.P64).size == (114, 57)
+
+    # a thumbnail that's missing from S3 is built on demand, but isn't written back
+    post.build_image_thumbnails()
+    assert post.k4_jpeg_cache.readonly_image.size == (3840, 1920)
+    assert post.k4_jpeg_cache.is_synced is False
+    assert not s3_uploads_client.exists(post.get_image_path(image_size.K4))
+
+    # a thumbnail that's there is read from S3
+    post.p480_jpeg_cache.release()
+    assert post.p480_jpeg_cache.readonly_image.size == (854, 427)
+    assert post.p480_jpeg_cache.is_synced is True
+
+
+def test_get_image_covering(s3_uploads_client, processing_image_post):
+    post = processing_image_post
+    path = post.get_image_path(image_size.NATIVE)
+    s3_uploads_client.put_object(path, open(blank_path, 'rb'), 'image/jpeg')
+    post.build_image_thumbnails()
+    post.p1080_jpeg_cache.release()
+    post.p480_jpeg_cache.release()
+
+    # the smallest thumbnail that covers the dimensions is used
+    assert post.get_image_covering((960, 540)).size == (1920, 960)
+    assert post.p1080_jpeg_cache.is_decoded
+    assert not post.p480_jpeg_cache.is_decoded
+    assert post.get_image_covering((1920, 1080)).size == (3840, 1920)
+
+    # an image smaller than the dimensions has all thumbnails the same size, so the smallest is used
+    s3_uploads_client.put_object(path, open(grant_path, 'rb'), 'image/jpeg')
+    post.native_jpeg_cache.clear()
+    post.build_image_thumbnails()
+    post.p480_jpeg_cache.release()
+    assert post.get_image_covering((1920, 1080)).size == (grant_width, grant_height)
+    assert post.p480_jpeg_cache.is_decoded
@@ -1,8 +1,10 @@
+import io
 import logging
 import uuid
 from unittest import mock
 
 import pendulum
+import PIL.Image
 import pytest
 
 from app.models.post.enums import PostStatus, PostType
@@ -197,6 +199,56 @@ def test_complete_with_original_post(post_manager, post_with_media, post_with_me
     assert post2.item['originalPostId'] == post1.id
 
 
+def test_complete_with_near_duplicate_original_post(
+    post_manager, post_with_media, post_with_media_with_expiration, grant_data
+):
+    post1, post2 = post_with_media, post_with_media_with_expiration
+    post1.follower_manager = mock.Mock(post1.follower_manager)
+    post2.follower_manager = mock.Mock(post2.follower_manager)
+
+    # same picture, but the second has been re-encoded at a smaller size so the checksums differ
+    post2.dynamo.set_checksum(post2.id, post2.item['postedAt'], 'checksum-other')
+    image = PIL.Image.open(io.BytesIO(grant_data))
+    post1.p64_jpeg_cache.set_image(image)
+    post2.p64_jpeg_cache.set_image(image.resize((image.width // 2, image.height // 2)))
+    post1.set_perceptual_hash()
+    post2.set_perceptual_hash()
+
+    # complete the post that has the earlier postedAt, should not get an originalPostId
+    post1.complete()
+    assert 'originalPostId' not in post1.item
+
+    # complete the post with the later postedAt, *should* get an originalPostId
+    # uses the hash it already has, rather than reading it back
+    post2.perceptual_hash_dynamo = mock.Mock(wraps=post2.perceptual_hash_dynamo)
+    post2.complete()
+    assert post2.perceptual_hash_dynamo.get_perceptual_hash.call_count == 0
+    assert post2.item['originalPostId'] == post1.id
+    post2.refresh_item()
+    assert post2.item['originalPostId'] == post1.id
+
+
+def test_complete_with_blank_images_not_near_duplicates(
+    post_manager, post_with_media, post_with_media_with_expiration
+):
+    post1, post2 = post_with_media, post_with_media_with_expiration
+    post1.follower_manager = mock.Mock(post1.follower_manager)
+    post2.follower_manager = mock.Mock(post2.follower_manager)
+
+    # two different blank images, too plain to be hashed, so they aren't indexed
+    post2.dynamo.set_checksum(post2.id, post2.item['postedAt'], 'checksum-other')
+    post1.p64_jpeg_cache.set_image(PIL.Image.new('RGB', (64, 64), 'white'))
+    post2.p64_jpeg_cache.set_image(PIL.Image.new('RGB', (64, 64), 'black'))
+    post1.set_perceptual_hash()
+    post2.set_perceptual_hash()
+    assert post1.perceptual_hash is None
+    assert post1.perceptual_hash_dynamo.get_perceptual_hash(post1.id) is None
+
+    post1.complete()
+    post2.complete()
+    assert 'originalPostId' not in post2.item
+
+
 def test_complete_with_set_as_user_photo(post_manager, user, post_with_media, post_set_as_user_photo):
     # complete the post without use_as_user_photo, verify user photo change api no called
     post_with_media.user.update_photo = mock.Mock()
@@ -237,6 +289,7 @@ def test_which_posts_get_free_trending(post_manager, user, image_data_b64, grant
     post = post_manager.add_post(
         user, str(uuid.uuid4()), PostType.IMAGE, image_input={'imageData': grant_data_b64}, now=now,
     )
+    post.verify(now=now)
     assert post.is_verified is False
     assert post.original_post_id == post.id
     assert post.trending_item['gsiA4SortKey'] == 0.5
@@ -246,6 +299,7 @@ def test_which_posts_get_free_trending(post_manager, user, image_data_b64, grant
     post = post_manager.add_post(
         user, str(uuid.uuid4()), PostType.IMAGE, image_input={'imageData': image_data_b64}, now=now,
     )
+    post.verify(now=now)
     assert post.is_verified is True
     assert post.original_post_id == post.id
     assert post.trending_item['gsiA4SortKey'] == 1
@@ -254,6 +308,7 @@ def test_which_posts_get_free_trending(post_manager, user, image_data_b64, grant
     post = post_manager.add_post(
         user, str(uuid.uuid4()), PostType.IMAGE, image_input={'imageData': image_data_b64}, now=now,
     )
+    post.verify(now=now)
     assert post.is_verified is True
     assert post.original_post_id != post.id
     assert post.trending_item is None
@@ -37,7 +37,8 @@ def post_with_album(album_manager, post_manager, user, image_data_b64):
 
 @pytest.fixture
 def completed_post_with_media(post_manager, user, image_data_b64):
-    yield post_manager.add_post(user, 'pid3', PostType.IMAGE, image_input={'imageData': image_data_b64})
+    post = post_manager.add_post(user, 'pid3', PostType.IMAGE, image_input={'imageData': image_data_b64})
+    yield post.verify()
 
 
 @pytest.fixture
@@ -107,6 +108,7 @@ def test_delete_pending_media_post(post_manager, post_with_media, user_manager):
 
 def test_delete_completed_media_post(post_manager, completed_post_with_media, user_manager):
     post = completed_post_with_media
+    assert post_manager.perceptual_hash_dynamo.get_perceptual_hash(post.id) is not None
 
     # mock out some calls to far-flung other managers
     post.comment_manager = mock.Mock(CommentManager({}))
@@ -128,6 +130,7 @@ def test_delete_completed_media_post(post_manager, completed_post_with_media, us
 
     assert not post.item
     assert not post.image_item
+    assert post_manager.perceptual_hash_dynamo.get_perceptual_hash(post.id) is None
 
     # check calls to mocked out managers
     assert post.comment_manager.mock_calls == [
@@ -59,7 +59,7 @@ def test_start_processing_video_upload_success(processing_video_post, s3_uploads
     assert post.item['postStatus'] == PostStatus.COMPLETED
     assert not s3_uploads_client.exists(post.get_poster_path())
     assert s3_uploads_client.exists(post.get_image_path(image_size.NATIVE))
-    assert s3_uploads_client.exists(post.get_image_path(image_size.K4))
+    assert not s3_uploads_client.exists(post.get_image_path(image_size.K4))  # built on demand
     assert s3_uploads_client.exists(post.get_image_path(image_size.P1080))
     assert s3_uploads_client.exists(post.get_image_path(image_size.P480))
     assert s3_uploads_client.exists(post.get_image_path(image_size.P64))
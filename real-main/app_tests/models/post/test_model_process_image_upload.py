@@ -78,6 +78,7 @@ def test_process_image_upload_success_jpeg(pending_post, s3_uploads_client, gran
     post.set_colors = mock.Mock(wraps=post.set_colors)
     post.set_is_verified = mock.Mock(wraps=post.set_is_verified)
     post.set_checksum = mock.Mock(wraps=post.set_checksum)
+    post.set_perceptual_hash = mock.Mock(wraps=post.set_perceptual_hash)
     post.complete = mock.Mock(wraps=post.complete)
 
     now = pendulum.now('utc')
@@ -88,8 +89,9 @@ def test_process_image_upload_success_jpeg(pending_post, s3_uploads_client, gran
     assert post.build_image_thumbnails.mock_calls == [mock.call()]
     assert post.set_height_and_width.mock_calls == [mock.call()]
     assert post.set_colors.mock_calls == [mock.call()]
-    assert post.set_is_verified.mock_calls == [mock.call()]
+    assert post.set_is_verified.mock_calls == []  # verification is its own stage, after completion
     assert post.set_checksum.mock_calls == [mock.call()]
+    assert post.set_perceptual_hash.mock_calls == [mock.call()]
     assert post.complete.mock_calls == [mock.call(now=now)]
 
     assert post.item['postStatus'] == PostStatus.COMPLETED
@@ -112,6 +114,7 @@ def test_process_image_upload_success_jpeg_with_crop(pending_post, s3_uploads_cl
     post.set_colors = mock.Mock(wraps=post.set_colors)
     post.set_is_verified = mock.Mock(wraps=post.set_is_verified)
     post.set_checksum = mock.Mock(wraps=post.set_checksum)
+    post.set_perceptual_hash = mock.Mock(wraps=post.set_perceptual_hash)
     post.complete = mock.Mock(wraps=post.complete)
 
     now = pendulum.now('utc')
@@ -122,8 +125,9 @@ def test_process_image_upload_success_jpeg_with_crop(pending_post, s3_uploads_cl
     assert post.build_image_thumbnails.mock_calls == [mock.call()]
     assert post.set_height_and_width.mock_calls == [mock.call()]
     assert post.set_colors.mock_calls == [mock.call()]
-    assert post.set_is_verified.mock_calls == [mock.call()]
+    assert post.set_is_verified.mock_calls == []  # verification is its own stage, after completion
     assert post.set_checksum.mock_calls == [mock.call()]
+    assert post.set_perceptual_hash.mock_calls == [mock.call()]
     assert post.complete.mock_calls == [mock.call(now=now)]
 
     assert post.item['postStatus'] == PostStatus.COMPLETED
@@ -148,6 +152,7 @@ def test_process_image_upload_success_heic_with_crop(pending_post, s3_uploads_cl
     post.set_colors = mock.Mock(wraps=post.set_colors)
     post.set_is_verified = mock.Mock(wraps=post.set_is_verified)
     post.set_checksum = mock.Mock(wraps=post.set_checksum)
+    post.set_perceptual_hash = mock.Mock(wraps=post.set_perceptual_hash)
     post.complete = mock.Mock(wraps=post.complete)
 
     now = pendulum.now('utc')
@@ -158,8 +163,9 @@ def test_process_image_upload_success_heic_with_crop(pending_post, s3_uploads_cl
     assert post.build_image_thumbnails.mock_calls == [mock.call()]
     assert post.set_height_and_width.mock_calls == [mock.call()]
     assert post.set_colors.mock_calls == [mock.call()]
-    assert post.set_is_verified.mock_calls == [mock.call()]
+    assert post.set_is_verified.mock_calls == []  # verification is its own stage, after completion
     assert post.set_checksum.mock_calls == [mock.call()]
+    assert post.set_perceptual_hash.mock_calls == [mock.call()]
     assert post.complete.mock_calls == [mock.call(now=now)]
 
     # check the heic image was deleted because of the crop
@@ -186,6 +192,12 @@ def test_process_image_upload_success_heic_with_no_crop(pending_post, s3_uploads
     # check the heic image was _not_ deleted because no crop was requested
     assert s3_uploads_client.exists(native_path)
 
+    # the decoded heic image was handed off to the native jpeg cache, not copied
+    assert post.native_heic_cache.is_decoded is False
+    assert post.native_jpeg_cache.is_decoded is True
+    width, height = post.native_jpeg_cache.readonly_image.size
+    assert width * height * 3 <= post.image_peak_bytes < 2 * width * height * 3
+
 
 def test_process_image_upload_success_heic_with_noop_crop(pending_post, s3_uploads_client, heic_data, heic_dims):
     post = pending_post
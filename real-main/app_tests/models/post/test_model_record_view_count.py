@@ -1,11 +1,13 @@
 import logging
 import uuid
+from unittest import mock
 
 import pendulum
 import pytest
 
 from app.models.post.enums import PostType
 from app.models.user.enums import UserSubscriptionLevel
+from app.utils import HyperLogLog
 
 
 @pytest.fixture
@@ -68,6 +70,77 @@ def test_record_view_count_increments_counters(post, user2, user3):
     assert post.user.refresh_item().item.get('postViewedByCount', 0) == 2
 
 
+def test_record_view_count_with_sketches(post, post2, user, user2, user3):
+    post.post_manager.viewed_by_sketches_enabled = True
+
+    # verify recording view by post owner doesn't create sketches
+    post.record_view_count(post.user_id, 2)
+    assert 'viewedBySketch' not in post.refresh_item().item
+    assert 'postViewedBySketch' not in post.user.refresh_item().item
+
+    # verify recording view by randos increments counters
+    post.record_view_count(user2.id, 2)
+    assert post.refresh_item().item['viewedByCount'] == 1
+    assert post.item['viewedBySketch']
+    assert post.user.refresh_item().item['postViewedByCount'] == 1
+    assert post.user.item['postViewedBySketch']
+    post.record_view_count(user3.id, 1)
+    assert post.refresh_item().item['viewedByCount'] == 2
+    assert post.user.refresh_item().item['postViewedByCount'] == 2
+
+    # verify a repeat view doesn't write to the post or the user
+    post.dynamo.set_viewed_by_sketch = mock.Mock(wraps=post.dynamo.set_viewed_by_sketch)
+    post.record_view_count(user2.id, 2)
+    assert post.dynamo.set_viewed_by_sketch.call_count == 0
+    assert post.refresh_item().item['viewedByCount'] == 2
+    assert post.user.refresh_item().item['postViewedByCount'] == 2
+
+    # verify the user's count is the sum over their posts, and not serialized
+    post2.record_view_count(user2.id, 1)
+    assert post2.refresh_item().item['viewedByCount'] == 1
+    assert post.user.refresh_item().item['postViewedByCount'] == 3
+    assert 'postViewedBySketch' not in post.user.serialize(user.id)
+    assert 'viewedBySketch' not in post.serialize(user.id)
+
+
+def test_merge_viewed_by_sketch_retries_on_race(post, user2, user3):
+    sketch = HyperLogLog()
+    sketch.add(user2.id)
+    post.merge_viewed_by_sketch(sketch)
+    assert post.item['viewedByCount'] == 1
+
+    # another process merges behind our back, so our copy of the item is stale
+    stale_item = post.item.copy()
+    sketch.add(user3.id)
+    post.merge_viewed_by_sketch(sketch)
+    assert post.item['viewedByCount'] == 2
+    post.item = stale_item
+
+    sketch = HyperLogLog()
+    sketch.add('uid4')
+    post.merge_viewed_by_sketch(sketch)
+    assert post.item['viewedByCount'] == 3
+    assert post.refresh_item().item['viewedByCount'] == 3
+
+
+def test_merge_viewed_by_sketch_adds_to_exact_count(post, user2, user3):
+    post.dynamo.increment_viewed_by_count(post.id)
+    post.dynamo.increment_viewed_by_count(post.id)
+    post.refresh_item()
+
+    # new viewers add to the count from before the post had a sketch
+    sketch = HyperLogLog()
+    sketch.add(user2.id)
+    post.merge_viewed_by_sketch(sketch)
+    assert post.item['viewedBySketch']
+    assert post.item['viewedByCount'] == 3
+
+    sketch.add(user3.id)
+    post.merge_viewed_by_sketch(sketch)
+    assert post.item['viewedByCount'] == 4
+    assert post.refresh_item().item['viewedByCount'] == 4
+
+
 def test_record_view_count_records_to_original_post_as_well(post, post2, user2):
     # verify post owner's view doesn't make it up to the original
     post.item['originalPostId'] = post2.id
@@ -108,6 +181,7 @@ def test_non_verified_image_posts_trend_with_lower_multiplier(post_manager, user
     post = post_manager.add_post(
         user, str(uuid.uuid4()), PostType.IMAGE, image_input={'imageData': image_data_b64}, now=now,
     )
+    post.verify(now=now)
     assert post.type == PostType.IMAGE
     assert post.is_verified is False
     assert post.original_post_id == post.id
@@ -168,6 +242,7 @@ def test_verified_image_posts_originality_determines_trending(post_manager, user
     post = post_manager.add_post(
         user, str(uuid.uuid4()), PostType.IMAGE, image_input={'imageData': image_data_b64}, now=now
     )
+    post.verify(now=now)
     assert post.type == PostType.IMAGE
     assert post.is_verified is True
     assert post.original_post_id == post.id
@@ -189,6 +264,7 @@ def test_verified_image_posts_originality_determines_trending(post_manager, user
     post2 = post_manager.add_post(
         user2, str(uuid.uuid4()), PostType.IMAGE, image_input={'imageData': image_data_b64}, now=now
     )
+    post2.verify(now=now)
     assert post2.type == PostType.IMAGE
     assert post2.is_verified is True
     assert post2.original_post_id == post.id
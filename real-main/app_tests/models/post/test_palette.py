@@ -0,0 +1,49 @@
+from os import path
+
+import PIL.Image
+import pytest
+
+from app.models.post.palette import get_palette
+
+grant_path = path.join(path.dirname(__file__), '..', '..', 'fixtures', 'grant.jpg')
+
+
+def test_single_color():
+    image = PIL.Image.new('RGB', (20, 10), (10, 100, 200))
+    assert get_palette(image) == [(10, 100, 200)]
+
+
+def test_fewer_colors_than_requested():
+    image = PIL.Image.new('RGB', (20, 10), (255, 0, 0))
+    image.paste((0, 0, 255), (0, 0, 5, 10))
+    assert get_palette(image, color_count=5) == [(255, 0, 0), (0, 0, 255)]
+
+
+def test_ordered_by_dominance():
+    image = PIL.Image.new('RGB', (100, 10), (0, 255, 0))
+    image.paste((255, 0, 0), (0, 0, 20, 10))
+    image.paste((0, 0, 255), (20, 0, 30, 10))
+    assert get_palette(image, color_count=3) == [(0, 255, 0), (255, 0, 0), (0, 0, 255)]
+
+
+def test_white_and_transparent_pixels_ignored():
+    image = PIL.Image.new('RGBA', (100, 10), (255, 255, 255, 255))
+    image.paste((0, 0, 0, 0), (0, 0, 50, 10))
+    image.paste((40, 50, 60, 255), (50, 0, 55, 10))
+    assert get_palette(image) == [(40, 50, 60)]
+
+
+def test_no_usable_pixels():
+    image = PIL.Image.new('RGB', (20, 10), (255, 255, 255))
+    with pytest.raises(ValueError, match='no opaque, non-white pixels'):
+        get_palette(image)
+
+
+def test_photo():
+    image = PIL.Image.open(grant_path)
+    colors = get_palette(image, color_count=5)
+    assert len(colors) == 5
+    assert len(set(colors)) == 5
+    assert all(len(color) == 3 and all(0 <= v <= 255 for v in color) for color in colors)
+    # deterministic
+    assert get_palette(image, color_count=5) == colors
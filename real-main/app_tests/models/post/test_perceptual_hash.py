@@ -0,0 +1,56 @@
+from os import path
+
+import PIL.Image
+import PIL.ImageEnhance
+
+from app.models.post import perceptual_hash
+
+grant_path = path.join(path.dirname(__file__), '..', '..', 'fixtures', 'grant.jpg')
+grant_horizontal_path = path.join(path.dirname(__file__), '..', '..', 'fixtures', 'grant-horizontal.jpg')
+blank_path = path.join(path.dirname(__file__), '..', '..', 'fixtures', 'big-blank.jpg')
+
+
+def test_dhash_stable_across_resize_and_reencode():
+    image = PIL.Image.open(grant_path)
+    phash = perceptual_hash.dhash(image)
+    assert 0 <= phash < 2 ** perceptual_hash.HASH_BITS
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail((114, 64), resample=PIL.Image.LANCZOS)
+    assert perceptual_hash.hamming_distance(phash, perceptual_hash.dhash(thumbnail)) <= 3
+
+    brighter = PIL.ImageEnhance.Brightness(image).enhance(1.1)
+    assert perceptual_hash.hamming_distance(phash, perceptual_hash.dhash(brighter)) <= 3
+
+
+def test_dhash_differs_for_different_images():
+    phash1 = perceptual_hash.dhash(PIL.Image.open(grant_path))
+    phash2 = perceptual_hash.dhash(PIL.Image.open(grant_horizontal_path))
+    assert perceptual_hash.hamming_distance(phash1, phash2) > 3
+
+
+def test_dhash_none_for_images_too_plain_to_hash():
+    # a blank image
+    assert perceptual_hash.dhash(PIL.Image.open(blank_path)) is None
+
+    # a very faint image
+    image = PIL.Image.open(grant_path)
+    assert perceptual_hash.dhash(PIL.ImageEnhance.Contrast(image).enhance(0.02)) is None
+
+    # a smooth gradient, left to right and right to left
+    gradient = PIL.Image.linear_gradient('L').rotate(90)
+    assert perceptual_hash.dhash(gradient) is None
+    assert perceptual_hash.dhash(gradient.rotate(180)) is None
+
+
+def test_hamming_distance():
+    assert perceptual_hash.hamming_distance(0, 0) == 0
+    assert perceptual_hash.hamming_distance(0b1010, 0b0110) == 2
+    assert perceptual_hash.hamming_distance(0, 2 ** 64 - 1) == 64
+
+
+def test_str_round_trip():
+    assert perceptual_hash.to_str(0) == '0' * 16
+    assert perceptual_hash.to_str(2 ** 64 - 1) == 'f' * 16
+    for value in (0, 1, 0xDEADBEEF, 2 ** 64 - 1):
+        assert perceptual_hash.from_str(perceptual_hash.to_str(value)) == value
@@ -4,11 +4,15 @@ Tests for generating images from text.
 These tests aren't intended to ensure the output looks correct,
 they're more just intended to ensure the alogirthm doesn't crash.
 """
+from unittest import mock
+
 import pytest
 
+from app.models.post import text_image
 from app.models.post.text_image import generate_text_image, rectangle_wrap
 
 dims_4k = (3840, 2160)
+dims_1080p = (1920, 1080)
 dims_64p = (114, 64)
 
 
@@ -46,3 +50,45 @@ def test_rectangle_wrap():
     assert text == 'a b c\nd e'
     assert text_height == 22
     assert text_width == 48
+
+
+def test_rectangle_wrap_single_token():
+    text, text_width, text_height = rectangle_wrap(['a'], [15], 2, 2, 10, 16 / 9)
+    assert text == 'a'
+    assert text_width == 15
+    assert text_height == 10
+
+
+def test_rectangle_wrap_long_text():
+    raw_tokens = [f't{i}' for i in range(1000)]
+    token_widths = [10 + i % 7 for i in range(1000)]
+    text, text_width, text_height = rectangle_wrap(raw_tokens, token_widths, 2, 2, 10, 16 / 9)
+
+    # nothing lost or re-ordered, and close to the desired aspect ratio
+    assert text.split() == raw_tokens
+    assert 16 / 9 <= text_width / text_height < 2
+
+
+def test_generate_text_image_memoized():
+    text_image.rendered_cache.clear()
+    image = generate_text_image('Fly high', dims_4k)
+    assert image.size == dims_4k
+    assert generate_text_image('Fly high', dims_4k) is image
+    assert generate_text_image('Fly higher', dims_4k) is not image
+
+
+def test_generate_text_image_render_then_downscale():
+    text_image.rendered_cache.clear()
+    with mock.patch.object(text_image, 'render_text_image', wraps=text_image.render_text_image) as render:
+        image_4k = generate_text_image('Fly high', dims_4k)
+        image_1080p = generate_text_image('Fly high', dims_1080p, render_dimensions=dims_4k)
+    assert image_1080p.size == dims_1080p
+    assert render.mock_calls == [mock.call('Fly high', dims_4k)]
+    assert generate_text_image('Fly high', dims_1080p, render_dimensions=dims_4k) is image_1080p
+    assert image_4k.getbbox()
+
+
+def test_get_font_cached_by_size():
+    assert text_image.get_font(40) is text_image.get_font(40)
+    assert text_image.get_font(40) is not text_image.get_font(41)
+    assert text_image.get_font(41).size == 41
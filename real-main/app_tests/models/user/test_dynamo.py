@@ -126,6 +126,25 @@ def test_get_user_by_username(user_dynamo):
     assert user_dynamo.get_user_by_username(username2)['userId'] == user_id2
 
 
+def test_generate_users_with_scan(user_dynamo):
+    assert list(user_dynamo.generate_users_with_scan()) == []
+    item1 = user_dynamo.add_user('uid1', 'uname1')
+    item2 = user_dynamo.add_user('uid2', 'uname2', full_name='Full Name')
+    user_dynamo.client.add_item(
+        {'Item': {'partitionKey': 'user/uid1', 'sortKey': 'trending', 'schemaVersion': 0}}
+    )
+
+    assert sorted(user_dynamo.generate_users_with_scan(), key=lambda item: item['userId']) == [item1, item2]
+    assert sorted(
+        user_dynamo.generate_users_with_scan(projection_expression='userId, fullName'),
+        key=lambda item: item['userId'],
+    ) == [{'userId': 'uid1'}, {'userId': 'uid2', 'fullName': 'Full Name'}]
+
+    # segments of a parallel scan cover all users between them (moto returns everything for every segment)
+    segments = [list(user_dynamo.generate_users_with_scan(segment, 3)) for segment in range(3)]
+    assert set(item['userId'] for items in segments for item in items) == {'uid1', 'uid2'}
+
+
 def test_delete_user(user_dynamo):
     user_id = 'my-user-id'
     username = 'my-USername'
@@ -440,6 +459,22 @@ def test_set_user_privacy_status(user_dynamo):
     assert user_item['privacyStatus'] == UserPrivacyStatus.PUBLIC
 
 
+def test_caller_cache_versions(user_dynamo):
+    assert user_dynamo.get_caller_cache_versions(range(4)) == {}
+    user_dynamo.set_caller_cache_version(1, 'v1')
+    assert user_dynamo.get_caller_cache_versions(range(4)) == {1: 'v1'}
+    user_dynamo.set_caller_cache_version(1, 'v2')
+    user_dynamo.set_caller_cache_version(3, 'v3')
+    assert user_dynamo.get_caller_cache_versions(range(4)) == {1: 'v2', 3: 'v3'}
+    assert user_dynamo.get_caller_cache_versions([0, 1]) == {1: 'v2'}
+
+    # caches are versioned independently
+    assert user_dynamo.get_username_cache_versions(range(4)) == {}
+    user_dynamo.set_username_cache_version(1, 'v4')
+    assert user_dynamo.get_username_cache_versions(range(4)) == {1: 'v4'}
+    assert user_dynamo.get_caller_cache_versions(range(4)) == {1: 'v2', 3: 'v3'}
+
+
 def test_set_last_client(user_dynamo):
     user_id = str(uuid4())
 
@@ -468,6 +503,54 @@ def test_set_last_client(user_dynamo):
     assert user_item['lastClient'] == client_2
 
 
+def test_set_last_client_not_set_since(user_dynamo):
+    user_id = str(uuid4())
+    user_dynamo.add_user(user_id, 'my-username')
+    now = pendulum.now('utc')
+
+    # with no lastClientSetAt, the write goes through
+    user_item = user_dynamo.set_last_client(user_id, {'version': 'v1'}, now=now, not_set_since=now)
+    assert user_item['lastClient'] == {'version': 'v1'}
+    assert user_item['lastClientSetAt'] == now.to_iso8601_string()
+
+    # set since, so skipped
+    later = now + pendulum.duration(minutes=1)
+    not_set_since = later - pendulum.duration(hours=1)
+    assert user_dynamo.set_last_client(user_id, {'version': 'v2'}, now=later, not_set_since=not_set_since) is None
+    assert user_dynamo.get_user(user_id)['lastClient'] == {'version': 'v1'}
+
+    # not set since, so written
+    user_item = user_dynamo.set_last_client(user_id, {'version': 'v2'}, now=later, not_set_since=now)
+    assert user_item['lastClient'] == {'version': 'v2'}
+    assert user_item['lastClientSetAt'] == later.to_iso8601_string()
+
+
+def test_set_post_viewed_by_sketch(user_dynamo):
+    user_id = str(uuid4())
+
+    # can't set for user that doesnt exist
+    with pytest.raises(user_dynamo.client.exceptions.ConditionalCheckFailedException):
+        user_dynamo.set_post_viewed_by_sketch(user_id, b'sketch1', 1)
+
+    # create the user, set the first sketch
+    user_dynamo.add_user(user_id, 'my-username')
+    user_item = user_dynamo.set_post_viewed_by_sketch(user_id, b'sketch1', 1)
+    assert user_item['postViewedBySketch'].value == b'sketch1'
+    assert user_item['postViewedByCount'] == 1
+
+    # can't set a first sketch again, or overwrite a sketch that has changed
+    with pytest.raises(user_dynamo.client.exceptions.ConditionalCheckFailedException):
+        user_dynamo.set_post_viewed_by_sketch(user_id, b'sketch2', 2)
+    with pytest.raises(user_dynamo.client.exceptions.ConditionalCheckFailedException):
+        user_dynamo.set_post_viewed_by_sketch(user_id, b'sketch2', 2, prev_sketch_bytes=b'other')
+
+    # overwrite the sketch
+    user_item = user_dynamo.set_post_viewed_by_sketch(user_id, b'sketch2', 2, prev_sketch_bytes=b'sketch1')
+    assert user_item['postViewedBySketch'].value == b'sketch2'
+    assert user_item['postViewedByCount'] == 2
+    assert user_dynamo.get_user(user_id) == user_item
+
+
 @pytest.mark.parametrize(
     'incrementor_name, decrementor_name, attribute_name',
     [
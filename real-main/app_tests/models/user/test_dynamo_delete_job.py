@@ -0,0 +1,70 @@
+import pendulum
+import pytest
+
+from app.models.user.dynamo import UserDeleteJobDynamo
+
+
+@pytest.fixture
+def job_dynamo(dynamo_client):
+    yield UserDeleteJobDynamo(dynamo_client)
+
+
+def test_add_get_delete(job_dynamo):
+    assert job_dynamo.get('uid') is None
+
+    now = pendulum.now('utc')
+    item = job_dynamo.add('uid', skip_cognito=True, now=now)
+    assert job_dynamo.get('uid') == item
+    assert item == {
+        'partitionKey': 'userDeleteJob/uid',
+        'sortKey': '-',
+        'schemaVersion': 0,
+        'userId': 'uid',
+        'createdAt': now.to_iso8601_string(),
+        'skipCognito': True,
+        'stageCounts': {},
+        'gsiK1PartitionKey': 'userDeleteJob',
+        'gsiK1SortKey': now.to_iso8601_string(),
+    }
+
+    # adding again leaves the existing job in place
+    job_dynamo.set_stage_count('uid', 'posts', 2)
+    assert job_dynamo.add('uid')['stageCounts'] == {'posts': 2}
+
+    job_dynamo.delete('uid')
+    assert job_dynamo.get('uid') is None
+
+
+def test_set_stage_count(job_dynamo):
+    job_dynamo.add('uid')
+    job_dynamo.set_stage_count('uid', 'posts', 2)
+    item = job_dynamo.set_stage_count('uid', 'likes', 0)
+    assert item['stageCounts'] == {'posts': 2, 'likes': 0}
+
+
+def test_lease(job_dynamo):
+    now = pendulum.now('utc')
+    lease = pendulum.duration(minutes=15)
+    assert job_dynamo.acquire_lease('uid', lease, now=now) is None
+
+    job_dynamo.add('uid')
+    item = job_dynamo.acquire_lease('uid', lease, now=now)
+    assert item['leasedUntil'] == (now + lease).to_iso8601_string()
+
+    # can't acquire it again until it expires, or is released
+    assert job_dynamo.acquire_lease('uid', lease, now=now + pendulum.duration(minutes=1)) is None
+    assert job_dynamo.acquire_lease('uid', lease, now=now + pendulum.duration(minutes=16))
+    job_dynamo.release_lease('uid')
+    assert job_dynamo.acquire_lease('uid', lease, now=now)
+
+    # releasing a lease on a job that's gone is a no-op
+    job_dynamo.delete('uid')
+    job_dynamo.release_lease('uid')
+
+
+def test_generate_user_ids(job_dynamo):
+    assert list(job_dynamo.generate_user_ids()) == []
+    now = pendulum.now('utc')
+    job_dynamo.add('uid2', now=now + pendulum.duration(seconds=1))
+    job_dynamo.add('uid1', now=now)
+    assert list(job_dynamo.generate_user_ids()) == ['uid1', 'uid2']
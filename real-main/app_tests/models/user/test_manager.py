@@ -1,5 +1,6 @@
 import logging
 import re
+import time
 import uuid
 from decimal import Decimal
 from unittest import mock
@@ -7,8 +8,10 @@ from unittest import mock
 import pendulum
 import pytest
 
+from app.models.user.enums import UserStatus
 from app.models.user.exceptions import UserAlreadyExists, UserValidationException
-from app.utils import GqlNotificationType
+from app.models.user.versioned_cache import VERSION_BUCKET_COUNT, get_version_bucket
+from app.utils import GqlNotificationType, HyperLogLog
 
 
 @pytest.fixture
@@ -45,6 +48,118 @@ def test_get_user_by_username(user_manager, user1):
     assert user.id == user1.id
 
 
+def test_get_caller_user(user_manager, user1):
+    assert user_manager.get_caller_user('uid-dne') is None
+
+    # first fetch goes to dynamo, second is served from the cache
+    user = user_manager.get_caller_user(user1.id)
+    assert user.item == user1.item
+    with mock.patch.object(user_manager.dynamo, 'get_user') as get_user:
+        assert user_manager.get_caller_user(user1.id).item == user1.item
+    assert get_user.call_count == 0
+
+    # a status change, stamped by the stream handler, is noticed
+    user1.disable()
+    user_manager.on_user_status_change_bump_caller_cache_version(user1.id, new_item=user1.item)
+    user_manager.caller_cache.version_checked_at = None
+    assert user_manager.get_caller_user(user1.id).status == UserStatus.DISABLED
+
+
+def test_caller_cache_version_bumped_per_bucket(user_manager, user1):
+    # the stamp only goes on the bucket of the user whose status changed
+    bucket = get_version_bucket(user1.id)
+    user_manager.on_user_status_change_bump_caller_cache_version(user1.id, new_item=user1.item)
+    versions = user_manager.dynamo.get_caller_cache_versions(range(VERSION_BUCKET_COUNT))
+    assert list(versions.keys()) == [bucket]
+    assert versions[bucket].endswith(f'/{user1.id}')
+
+    # so only the cached callers in that bucket are dropped
+    other_user_id = next(f'uid-{i}' for i in range(100) if get_version_bucket(f'uid-{i}') != bucket)
+    user_manager.caller_cache.version_checked_at = None
+    user_manager.caller_cache.put(user1.id, user1.item)
+    user_manager.caller_cache.put(other_user_id, {'userId': other_user_id})
+    user_manager.on_user_status_change_bump_caller_cache_version(user1.id, new_item=user1.item)
+    user_manager.caller_cache.version_checked_at = None
+    assert user_manager.caller_cache.get(user1.id) is None
+    assert user_manager.caller_cache.get(other_user_id) == {'userId': other_user_id}
+
+
+def test_run_delete_jobs(user_manager, user1, user2, cognito_client):
+    assert user_manager.run_delete_jobs() == {}
+
+    # user2's job is held by another run
+    user1.start_delete()
+    user2.start_delete()
+    user_manager.delete_job_dynamo.acquire_lease(user2.id, pendulum.duration(minutes=15))
+    finished = user_manager.run_delete_jobs()
+    assert list(finished) == [user1.id]
+    assert finished[user1.id]['posts'] == 0
+    assert user_manager.get_user(user1.id) is None
+    assert user_manager.get_user(user2.id).status == UserStatus.DELETING
+
+    # out of time, nothing is done
+    user_manager.delete_job_dynamo.release_lease(user2.id)
+    assert user_manager.run_delete_jobs(deadline=time.monotonic() - 1) == {}
+    assert user_manager.get_user(user2.id).status == UserStatus.DELETING
+
+    # a job whose profile is already gone is just cleaned up
+    user_manager.dynamo.delete_user(user2.id)
+    assert user_manager.run_delete_jobs() == {}
+    assert list(user_manager.delete_job_dynamo.generate_user_ids()) == []
+
+
+def test_run_delete_jobs_error_in_one_job(user_manager, user1, user2, caplog):
+    user1.start_delete()
+    user2.start_delete()
+
+    # user1's job hits an error, which doesn't stop user2's job
+    with mock.patch.object(user_manager, 'chat_manager') as chat_manager:
+        chat_manager.leave_all_chats.side_effect = [Exception('nope'), 0]
+        with caplog.at_level(logging.ERROR):
+            finished = user_manager.run_delete_jobs()
+    assert list(finished) == [user2.id]
+    assert len(caplog.records) == 1
+    assert f'user `{user1.id}`' in caplog.records[0].msg
+    assert 'nope' in caplog.records[0].msg
+
+    # user1's job is left for a later run
+    assert user_manager.get_user(user1.id).status == UserStatus.DELETING
+    assert 'leasedUntil' not in user_manager.delete_job_dynamo.get(user1.id)
+    assert list(user_manager.delete_job_dynamo.generate_user_ids()) == [user1.id]
+
+
+def test_merge_post_viewed_by_sketch_adds_to_exact_count(user_manager, user1):
+    user_manager.dynamo.increment_post_viewed_by_count(user1.id)
+    user_manager.dynamo.increment_post_viewed_by_count(user1.id)
+
+    # new (post, viewer) pairs add to the count from before the user had a sketch
+    sketch = HyperLogLog()
+    sketch.add('pid1/uid1')
+    user_manager.merge_post_viewed_by_sketch(user1.id, sketch)
+    assert user1.refresh_item().item['postViewedByCount'] == 3
+    assert user1.item['postViewedBySketch']
+
+    # merging in nothing new leaves the count alone
+    user_manager.merge_post_viewed_by_sketch(user1.id, sketch)
+    assert user1.refresh_item().item['postViewedByCount'] == 3
+
+    sketch.add('pid1/uid2')
+    user_manager.merge_post_viewed_by_sketch(user1.id, sketch)
+    assert user1.refresh_item().item['postViewedByCount'] == 4
+
+
+def test_merge_post_viewed_by_sketch_grows_count_above_sketch_estimate(user_manager, user1):
+    for _ in range(100):
+        user_manager.dynamo.increment_post_viewed_by_count(user1.id)
+
+    # the exact count is way above the new sketch's estimate, and still goes up with each new viewer
+    for i in range(5):
+        sketch = HyperLogLog()
+        sketch.add(f'pid1/uid{i}')
+        user_manager.merge_post_viewed_by_sketch(user1.id, sketch)
+        assert user1.refresh_item().item['postViewedByCount'] == 101 + i
+
+
 def test_create_cognito_user(user_manager, cognito_client):
     user_id = 'my-user-id'
     username = 'myusername'
@@ -191,7 +306,8 @@ def test_create_cognito_only_user_username_taken(user_manager, cognito_only_user
 
     # frontend does this part out-of-band: creates the user in cognito, no preferred_username
     cognito_client.user_pool_client.admin_create_user(
-        UserPoolId=cognito_client.user_pool_id, Username=user_id,
+        UserPoolId=cognito_client.user_pool_id,
+        Username=user_id,
     )
 
     # moto doesn't seem to honor the 'make preferred usernames unique' setting (using it as an alias)
@@ -337,7 +453,8 @@ def test_create_federated_user_email_taken(user_manager, provider):
     email = f'{username}@somedomain.com'
     user_manager.clients[provider].configure_mock(**{'get_verified_email.return_value': email})
     exception = user_manager.cognito_client.user_pool_client.exceptions.UsernameExistsException(
-        {'Error': {'Code': '<code>', 'Message': 'An account with the email already exists.'}}, '<operation name>',
+        {'Error': {'Code': '<code>', 'Message': 'An account with the email already exists.'}},
+        '<operation name>',
     )
     user_manager.cognito_client.user_pool_client.admin_create_user = mock.Mock(side_effect=exception)
     with pytest.raises(UserValidationException, match=f'Email `{email}` already taken'):
@@ -447,6 +564,39 @@ def test_get_text_tags(user_manager, user1, user2):
     )
 
 
+def test_get_text_tags_cached(user_manager, user1, user2):
+    text = f'hey @{user1.username} and @nopenope and @{user2.username}'
+    expected = sorted(
+        [{'tag': f'@{user1.username}', 'userId': user1.id}, {'tag': f'@{user2.username}', 'userId': user2.id}],
+        key=lambda x: x['tag'],
+    )
+
+    # first resolution goes to dynamo, then only the username that doesn't exist is looked up again
+    assert sorted(user_manager.get_text_tags(text), key=lambda x: x['tag']) == expected
+    with mock.patch.object(
+        user_manager.dynamo, 'get_user_by_username', wraps=user_manager.dynamo.get_user_by_username
+    ) as get_user_by_username:
+        assert sorted(user_manager.get_text_tags(text), key=lambda x: x['tag']) == expected
+    assert get_user_by_username.mock_calls == [mock.call('nopenope')]
+
+    # a username change, stamped by the stream handler, is noticed
+    old_username = user1.username
+    old_item = user1.item.copy()
+    user1.update_username('newname')
+    user_manager.on_username_change_bump_username_cache_version(user1.id, new_item=user1.item, old_item=old_item)
+    user_manager.username_cache.version_checked_at = None
+    assert user_manager.get_text_tags(f'@{old_username} @newname') == [{'tag': '@newname', 'userId': user1.id}]
+
+
+def test_get_user_ids_by_usernames(user_manager, user1, user2):
+    assert user_manager.get_user_ids_by_usernames([]) == {}
+    assert user_manager.get_user_ids_by_usernames(['nopenope']) == {}
+    assert user_manager.get_user_ids_by_usernames([user1.username, 'nopenope', user2.username]) == {
+        user1.username: user1.id,
+        user2.username: user2.id,
+    }
+
+
 def test_username_tag_regex(user_manager):
     reg = user_manager.username_tag_regex
 
@@ -77,6 +77,27 @@ def test_sync_elasticsearch(user_manager, user):
     assert elasticsearch_client_mock.mock_calls == [call.put_user(user.id, 'sp', 'fn')]
 
 
+def test_reindex_elasticsearch(user_manager, user, user2):
+    user_manager.dynamo.set_user_details(user2.id, full_name='Full Name')
+    bulk_actions = []
+
+    def bulk(actions):
+        bulk_actions.extend(actions)
+        return 42
+
+    # each segment is indexed with its own bulk request
+    with patch.object(user_manager, 'elasticsearch_client') as elasticsearch_client_mock:
+        elasticsearch_client_mock.bulk.side_effect = bulk
+        elasticsearch_client_mock.build_user_doc.side_effect = lambda *args: args
+        assert user_manager.reindex_elasticsearch(total_segments=3) == 126
+    assert len(elasticsearch_client_mock.bulk.mock_calls) == 3
+    # moto doesn't split a scan into segments, so each segment sees every user
+    assert set(bulk_actions) == {
+        ('index', user.id, (user.id, user.username, None)),
+        ('index', user2.id, (user2.id, user2.username, 'Full Name')),
+    }
+
+
 @pytest.mark.parametrize(
     'method_name, pinpoint_attribute, dynamo_attribute',
     [['sync_pinpoint_email', 'EMAIL', 'email'], ['sync_pinpoint_phone', 'SMS', 'phoneNumber']],
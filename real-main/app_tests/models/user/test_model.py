@@ -664,23 +664,35 @@ def test_set_last_client(user):
     assert user.item == user.refresh_item().item
     assert user.item['lastClient'] == client_1
 
-    # update it, verify
+    # updating it again straight away does no writes to dynamo
     client_2 = {
         'device': 'original razr',
         'element': 'out of it',
     }
     with patch.object(user, 'dynamo', Mock(wraps=user.dynamo)) as dynamo_mock:
         user.set_last_client(client_2)
+    assert dynamo_mock.mock_calls == []
+    assert user.item['lastClient'] == client_1
+
+    # update it once the interval has passed, verify
+    later = pendulum.now('utc') + pendulum.duration(hours=1, seconds=1)
+    with patch.object(user, 'dynamo', Mock(wraps=user.dynamo)) as dynamo_mock:
+        user.set_last_client(client_2, now=later)
     assert len(dynamo_mock.mock_calls) == 1
     assert user.item == user.refresh_item().item
     assert user.item['lastClient'] == client_2
 
     # verify setting it to the same value does no writes to dynamo
     with patch.object(user, 'dynamo', Mock(wraps=user.dynamo)) as dynamo_mock:
-        user.set_last_client(client_2)
+        user.set_last_client(client_2, now=later + pendulum.duration(hours=2))
     assert dynamo_mock.mock_calls == []
     assert user.item['lastClient'] == client_2
 
+    # verify a stale copy of the item doesn't get past the interval
+    user.item['lastClientSetAt'] = pendulum.now('utc').subtract(hours=2).to_iso8601_string()
+    user.set_last_client(client_1, now=later + pendulum.duration(minutes=1))
+    assert user.refresh_item().item['lastClient'] == client_2
+
 
 def test_grant_subscription_bonus(user):
     assert user.subscription_level == UserSubscriptionLevel.BASIC
@@ -1,10 +1,14 @@
 import logging
+import time
 import uuid
 from unittest import mock
 
+import pendulum
 import pytest
 
+from app.models.user.delete_job import UserDeleteJob
 from app.models.user.enums import UserStatus
+from app.models.user.exceptions import UserException
 from app.utils import image_size
 
 
@@ -13,13 +17,20 @@ def user(user_manager, cognito_client):
     user_id, username = str(uuid.uuid4()), str(uuid.uuid4())[:8]
     cognito_client.create_verified_user_pool_entry(user_id, username, f'{username}@real.app')
     user = user_manager.create_cognito_only_user(user_id, username)
-    user.follower_manager = mock.Mock(user.follower_manager)
-    user.post_manager = mock.Mock(user.post_manager)
-    user.comment_manager = mock.Mock(user.comment_manager)
-    user.like_manager = mock.Mock(user.like_manager)
-    user.album_manager = mock.Mock(user.album_manager)
-    user.block_manager = mock.Mock(user.block_manager)
-    user.chat_manager = mock.Mock(user.chat_manager)
+    # each stage of the delete job returns a count
+    user.follower_manager = mock.Mock(
+        user.follower_manager, **{'reset_followed_items.return_value': 1, 'reset_follower_items.return_value': 2}
+    )
+    user.post_manager = mock.Mock(
+        user.post_manager, **{'unflag_all_by_user.return_value': 0, 'delete_all_by_user.return_value': 3}
+    )
+    user.comment_manager = mock.Mock(
+        user.comment_manager, **{'unflag_all_by_user.return_value': 0, 'delete_all_by_user.return_value': 0}
+    )
+    user.like_manager = mock.Mock(user.like_manager, **{'dislike_all_by_user.return_value': 0})
+    user.album_manager = mock.Mock(user.album_manager, **{'delete_all_by_user.return_value': 0})
+    user.block_manager = mock.Mock(user.block_manager, **{'unblock_all_blocks.return_value': 0})
+    user.chat_manager = mock.Mock(user.chat_manager, **{'leave_all_chats.return_value': 0})
     yield user
 
 
@@ -37,6 +48,38 @@ def test_delete_user_removes_item_from_dynamo(user):
     assert user.refresh_item().item is None
 
 
+def test_delete_user_holds_the_job_lease(user):
+    # the deleteUsers job can't pick up the job while we're running it
+    def check_leased(user_id):
+        assert user.delete_job_dynamo.acquire_lease(user_id, pendulum.duration(minutes=15)) is None
+        return 0
+
+    user.block_manager.unblock_all_blocks.side_effect = check_leased
+    user.delete()
+    assert user.block_manager.unblock_all_blocks.call_count == 1
+    assert user.refresh_item().item is None
+    assert user.delete_job_dynamo.get(user.id) is None
+
+
+def test_delete_user_job_already_leased(user):
+    user.start_delete()
+    user.delete_job_dynamo.acquire_lease(user.id, pendulum.duration(minutes=15))
+    with pytest.raises(UserException, match='already being deleted'):
+        user.delete()
+    assert user.post_manager.mock_calls == []
+    assert user.refresh_item().item['userStatus'] == UserStatus.DELETING
+
+
+def test_delete_user_error_releases_lease(user):
+    user.chat_manager.leave_all_chats.side_effect = Exception('nope')
+    with pytest.raises(Exception, match='nope'):
+        user.delete()
+    assert user.refresh_item().item['userStatus'] == UserStatus.DELETING
+    job_item = user.delete_job_dynamo.get(user.id)
+    assert 'leasedUntil' not in job_item
+    assert 'chats' not in job_item['stageCounts']
+
+
 def test_delete_user_skip_cognito_releases_username(user, user2):
     # moto cognito has not yet implemented admin_delete_user_attributes
     user.cognito_client.user_pool_client.admin_delete_user_attributes = mock.Mock()
@@ -118,7 +161,8 @@ def test_delete_user_managers_all_called(user):
 
     # delete user, check final state
     user.delete()
-    assert user.follower_manager.mock_calls == [
+    # stages run concurrently, so in no particular order
+    assert sorted(user.follower_manager.mock_calls) == [
         mock.call.reset_followed_items(user.id),
         mock.call.reset_follower_items(user.id),
     ]
@@ -142,3 +186,52 @@ def test_delete_user_managers_all_called(user):
     assert user.chat_manager.mock_calls == [
         mock.call.leave_all_chats(user.id),
     ]
+
+
+def test_start_delete(user, user_manager):
+    job_item = user.start_delete()
+    assert user.item['userStatus'] == UserStatus.DELETING
+    assert user.refresh_item().item['userStatus'] == UserStatus.DELETING
+    assert job_item['userId'] == user.id
+    assert job_item['skipCognito'] is False
+    assert job_item['stageCounts'] == {}
+    assert list(user_manager.delete_job_dynamo.generate_user_ids()) == [user.id]
+
+    # nothing has been deleted yet
+    assert user.follower_manager.mock_calls == []
+    assert user.post_manager.mock_calls == []
+
+
+def test_delete_job_stage_counts_and_resume(user):
+    job_item = user.start_delete()
+
+    # out of time before starting, so nothing gets done
+    job = UserDeleteJob(user, job_item, user.delete_job_dynamo)
+    assert job.run(deadline=time.monotonic() - 1) is False
+    assert user.post_manager.mock_calls == []
+
+    # a previous run got some stages done, resume from there
+    user.delete_job_dynamo.set_stage_count(user.id, 'followed', 1)
+    user.delete_job_dynamo.set_stage_count(user.id, 'postFlags', 0)
+    job = UserDeleteJob(user, user.delete_job_dynamo.get(user.id), user.delete_job_dynamo)
+    assert job.run() is True
+    assert user.follower_manager.mock_calls == [mock.call.reset_follower_items(user.id)]
+    assert user.post_manager.mock_calls == [mock.call.delete_all_by_user(user.id)]
+    assert job.stage_counts == {
+        'followed': 1,
+        'followers': 2,
+        'postFlags': 0,
+        'commentFlags': 0,
+        'likes': 0,
+        'comments': 0,
+        'albums': 0,
+        'posts': 3,
+        'blocks': 0,
+        'chats': 0,
+        'trending': 0,
+        'photos': 0,
+    }
+
+    # the user and the job are gone
+    assert user.refresh_item().item is None
+    assert user.delete_job_dynamo.get(user.id) is None
@@ -4,6 +4,7 @@ from unittest import mock
 import pytest
 
 from app.models.post.enums import PostType
+from app.models.post.model import EAGER_THUMBNAILS
 from app.models.user.exceptions import UserException
 from app.utils import image_size
 
@@ -17,6 +18,9 @@ def user(user_manager, cognito_client):
 
 user2 = user
 
+# the sizes that exist in S3 once a post is processed, others are built on demand by cloudfront
+stored_sizes = (image_size.NATIVE, *EAGER_THUMBNAILS)
+
 
 @pytest.fixture
 def pending_post(user, post_manager):
@@ -30,17 +34,20 @@ def text_post(user, post_manager):
 
 @pytest.fixture
 def uploaded_post(user, post_manager, image_data_b64):
-    yield post_manager.add_post(user, 'post-id', PostType.IMAGE, image_input={'imageData': image_data_b64})
+    post = post_manager.add_post(user, 'post-id', PostType.IMAGE, image_input={'imageData': image_data_b64})
+    yield post.verify()
 
 
 @pytest.fixture
 def another_uploaded_post(user, post_manager, grant_data_b64):
-    yield post_manager.add_post(user, 'post-id-2', PostType.IMAGE, image_input={'imageData': grant_data_b64})
+    post = post_manager.add_post(user, 'post-id-2', PostType.IMAGE, image_input={'imageData': grant_data_b64})
+    yield post.verify()
 
 
 @pytest.fixture
 def another_users_post(user2, post_manager, grant_data_b64):
-    yield post_manager.add_post(user2, 'post-oid', PostType.IMAGE, image_input={'imageData': grant_data_b64})
+    post = post_manager.add_post(user2, 'post-oid', PostType.IMAGE, image_input={'imageData': grant_data_b64})
+    yield post.verify()
 
 
 def test_get_photo_path(user, uploaded_post):
@@ -123,13 +130,14 @@ def test_set_photo_multiple_times(user, uploaded_post, another_uploaded_post):
     assert user.item['photoPostId'] == uploaded_post.id
 
     # check it's in s3
-    for size in image_size.JPEGS:
+    for size in stored_sizes:
         path = user.get_photo_path(size)
         assert user.s3_uploads_client.exists(path)
+    assert not user.s3_uploads_client.exists(user.get_photo_path(image_size.K4))
 
     # pull the photo_data we just set up there
     org_bodies = {}
-    for size in image_size.JPEGS:
+    for size in stored_sizes:
         path = user.get_photo_path(size)
         org_bodies[size] = list(user.s3_uploads_client.get_object_data_stream(path))
 
@@ -142,14 +150,14 @@ def test_set_photo_multiple_times(user, uploaded_post, another_uploaded_post):
     assert user.item['photoPostId'] == another_uploaded_post.id
 
     # pull the new photo_data
-    for size in image_size.JPEGS:
+    for size in stored_sizes:
         path = user.get_photo_path(size)
         new_body = list(user.s3_uploads_client.get_object_data_stream(path))
         assert new_body != org_bodies[size]
 
     # verify the old images are still there
     # we don't delete them as there may still be un-expired signed urls pointing to the old images
-    for size in image_size.JPEGS:
+    for size in stored_sizes:
         path = user.get_photo_path(size, photo_post_id=uploaded_post.id)
         assert user.s3_uploads_client.exists(path)
 
@@ -164,7 +172,7 @@ def test_clear_photo_s3_objects(user, uploaded_post, another_uploaded_post):
     assert user.item['photoPostId'] == another_uploaded_post.id
 
     # verify a bunch of stuff is in S3 now, old and new
-    for size in image_size.JPEGS:
+    for size in stored_sizes:
         old_path = user.get_photo_path(size, photo_post_id=uploaded_post.id)
         new_path = user.get_photo_path(size, photo_post_id=another_uploaded_post.id)
         assert user.s3_uploads_client.exists(old_path)
@@ -174,7 +182,7 @@ def test_clear_photo_s3_objects(user, uploaded_post, another_uploaded_post):
     user.clear_photo_s3_objects()
 
     # verify all profile photos, old and new, were deleted from s3
-    for size in image_size.JPEGS:
+    for size in stored_sizes:
         old_path = user.get_photo_path(size, photo_post_id=uploaded_post.id)
         new_path = user.get_photo_path(size, photo_post_id=another_uploaded_post.id)
         assert not user.s3_uploads_client.exists(old_path)
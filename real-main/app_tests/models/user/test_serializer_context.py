@@ -0,0 +1,70 @@
+import uuid
+from unittest.mock import patch
+
+import pytest
+
+from app.models.block.enums import BlockStatus
+from app.models.follower.enums import FollowStatus
+
+
+@pytest.fixture
+def user1(user_manager, cognito_client):
+    user_id, username = str(uuid.uuid4()), str(uuid.uuid4())[:8]
+    cognito_client.create_verified_user_pool_entry(user_id, username, f'{username}@real.app')
+    yield user_manager.create_cognito_only_user(user_id, username)
+
+
+user2 = user1
+user3 = user1
+
+
+def test_prefetch_then_serialize_without_further_reads(
+    user_manager, block_manager, follower_manager, user1, user2, user3
+):
+    block_manager.block(user2, user1)
+    follower_manager.request_to_follow(user3, user1)
+
+    context = user_manager.serializer_context().prefetch([user1.id, 'uid-dne'], [user1.id, user2.id, user3.id])
+    with patch.object(
+        user_manager.dynamo.client, 'get_item', wraps=user_manager.dynamo.client.get_item
+    ) as get_item:
+        assert context.get_user('uid-dne') is None
+        assert context.get_user(user1.id).id == user1.id
+        assert context.get_block_status(user1.id, user2.id) == BlockStatus.NOT_BLOCKING
+        assert context.get_block_status(user2.id, user1.id) == BlockStatus.BLOCKING
+        assert context.get_block_status(user1.id, user1.id) == BlockStatus.SELF
+        assert context.get_follow_status(user3.id, user1.id) == FollowStatus.FOLLOWING
+        assert context.get_follow_status(user2.id, user1.id) == FollowStatus.NOT_FOLLOWING
+
+        resp = context.serialize_user(user1.id, user3.id)
+        assert resp['userId'] == user1.id
+        assert resp['blockerStatus'] == BlockStatus.NOT_BLOCKING
+        assert resp['followedStatus'] == FollowStatus.FOLLOWING
+    assert get_item.call_count == 0
+
+    # serializes the same as without a context
+    assert context.serialize_user(user1.id, user3.id) == user1.serialize(user3.id)
+    assert context.serialize_user(user1.id, user2.id) == user1.serialize(user2.id)
+
+
+def test_not_prefetched_loaded_once(user_manager, user1, user2):
+    block_manager = user_manager.block_manager
+    block_manager.block(user1, user2)
+    context = user_manager.serializer_context()
+
+    with patch.object(user_manager.dynamo, 'get_user', wraps=user_manager.dynamo.get_user) as get_user:
+        assert context.get_user(user1.id).id == user1.id
+        assert context.get_user(user1.id).id == user1.id
+    assert get_user.call_count == 1
+
+    with patch.object(block_manager, 'get_block_status', wraps=block_manager.get_block_status) as get_status:
+        assert context.get_block_status(user1.id, user2.id) == BlockStatus.BLOCKING
+        assert context.get_block_status(user1.id, user2.id) == BlockStatus.BLOCKING
+    assert get_status.call_count == 1
+
+
+def test_get_user_returns_fresh_copies(user_manager, user1):
+    context = user_manager.serializer_context().prefetch([user1.id], [])
+    user = context.get_user(user1.id)
+    user.item['username'] = 'changed'
+    assert context.get_user(user1.id).username == user1.username
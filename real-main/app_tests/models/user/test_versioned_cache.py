@@ -0,0 +1,59 @@
+from unittest.mock import Mock, patch
+
+from app.models.user.versioned_cache import VERSION_BUCKET_COUNT, VersionedCache, get_version_bucket
+
+
+def test_get_put_pop():
+    cache = VersionedCache(Mock(return_value={}), 10, 60, 5)
+    assert cache.get('uid') is None
+
+    item = {'userId': 'uid', 'lastClient': {'version': '1'}}
+    cache.put('uid', item)
+    item['lastClient']['version'] = '2'
+    cached = cache.get('uid')
+    assert cached == {'userId': 'uid', 'lastClient': {'version': '1'}}
+
+    # what's returned is a copy
+    cached['userId'] = 'changed'
+    assert cache.get('uid')['userId'] == 'uid'
+
+    cache.pop('uid')
+    assert cache.get('uid') is None
+
+
+def test_version_change_clears_bucket():
+    other_key = next(
+        f'uid-{i}' for i in range(100) if get_version_bucket(f'uid-{i}') != get_version_bucket('uid')
+    )
+    bucket = get_version_bucket('uid')
+    versions_getter = Mock(return_value={bucket: 'v1'})
+    cache = VersionedCache(versions_getter, 10, 60, 5)
+
+    with patch('app.models.user.versioned_cache.time.monotonic', return_value=100):
+        assert cache.get('uid') is None
+        cache.put('uid', {'userId': 'uid'})
+        cache.put(other_key, {'userId': other_key})
+    assert versions_getter.call_count == 1
+
+    # the versions aren't checked again until a while has passed
+    versions_getter.return_value = {bucket: 'v2'}
+    with patch('app.models.user.versioned_cache.time.monotonic', return_value=104):
+        assert cache.get('uid') == {'userId': 'uid'}
+    assert versions_getter.call_count == 1
+
+    # then a changed version clears that bucket, but not the others
+    with patch('app.models.user.versioned_cache.time.monotonic', return_value=105):
+        assert cache.get('uid') is None
+        assert cache.get(other_key) == {'userId': other_key}
+        cache.put('uid', {'userId': 'uid'})
+    assert versions_getter.call_count == 2
+
+    # and unchanged versions do not
+    with patch('app.models.user.versioned_cache.time.monotonic', return_value=110):
+        assert cache.get('uid') == {'userId': 'uid'}
+    assert versions_getter.call_count == 3
+
+
+def test_version_buckets():
+    assert get_version_bucket('uid') == get_version_bucket('uid')
+    assert len({get_version_bucket(f'uid-{i}') for i in range(1000)}) == VERSION_BUCKET_COUNT
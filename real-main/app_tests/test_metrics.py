@@ -0,0 +1,77 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app import metrics
+
+
+@pytest.fixture
+def warm():
+    with patch.object(metrics, '_cold_start', False):
+        yield
+
+
+def test_record_dependency_calls(warm, capsys):
+    with metrics.record('Test', {'field': 'Type.field'}, 1, batchSize=2):
+        with metrics.timed_dependency('dynamo'):
+            pass
+        with metrics.timed_dependency('dynamo'):
+            pass
+        with metrics.timed_dependency('s3'):
+            pass
+
+    line = json.loads(capsys.readouterr().out)
+    assert line['field'] == 'Type.field'
+    assert line['batchSize'] == 2
+    assert line['coldStart'] == 0
+    assert line['dynamoCalls'] == 2
+    assert line['s3Calls'] == 1
+    assert line['wallTime'] >= line['dynamoTime'] >= 0
+    cw_metrics = line['_aws']['CloudWatchMetrics'][0]
+    assert cw_metrics['Namespace'] == 'Test'
+    assert cw_metrics['Dimensions'] == [['field']]
+    assert {m['Name'] for m in cw_metrics['Metrics']} == {
+        'wallTime',
+        'coldStart',
+        'dynamoCalls',
+        'dynamoTime',
+        's3Calls',
+        's3Time',
+    }
+
+
+def test_record_sampling(warm, capsys):
+    with patch('app.metrics.random.random', return_value=0.5):
+        with metrics.record('Test', {'field': 'Type.field'}, 0.4):
+            pass
+        assert capsys.readouterr().out == ''
+
+        with metrics.record('Test', {'field': 'Type.field'}, 0.6):
+            pass
+        assert json.loads(capsys.readouterr().out)['field'] == 'Type.field'
+
+
+def test_record_cold_start_always_emitted(capsys):
+    with patch.object(metrics, '_cold_start', True):
+        assert metrics.is_cold_start() is True
+        with metrics.record('Test', {'field': 'Type.field'}, 0):
+            assert metrics.is_cold_start() is False
+        assert json.loads(capsys.readouterr().out)['coldStart'] == 1
+
+        with metrics.record('Test', {'field': 'Type.field'}, 0):
+            pass
+        assert capsys.readouterr().out == ''
+
+
+def test_timed_dependency_outside_recording():
+    with metrics.timed_dependency('dynamo'):
+        pass
+
+
+def test_patch_all_records_aws_calls(warm, dynamo_client, capsys):
+    metrics.patch_all()
+    metrics.patch_all()  # idempotent
+    with metrics.record('Test', {'field': 'Type.field'}, 1):
+        dynamo_client.get_item({'partitionKey': 'nope', 'sortKey': '-'})
+    assert json.loads(capsys.readouterr().out)['dynamoCalls'] == 1
@@ -0,0 +1,80 @@
+import pytest
+
+from app.utils import HyperLogLog
+
+
+def test_empty_sketch():
+    sketch = HyperLogLog()
+    assert sketch.count() == 0
+    assert sketch.precision == HyperLogLog.default_precision
+    assert len(sketch.registers) == 2 ** sketch.precision
+
+
+def test_invalid_precision():
+    with pytest.raises(AssertionError):
+        HyperLogLog(precision=3)
+    with pytest.raises(AssertionError):
+        HyperLogLog(precision=17)
+    with pytest.raises(AssertionError):
+        HyperLogLog(precision=8, registers=b'\0' * 100)
+
+
+def test_add_is_idempotent():
+    sketch = HyperLogLog()
+    assert sketch.add('uid1') is True
+    assert sketch.add('uid1') is False
+    assert sketch.count() == 1
+    assert sketch.add('uid2') is True
+    assert sketch.count() == 2
+
+
+@pytest.mark.parametrize('cnt', [10, 1000, 20000])
+def test_count_accuracy(cnt):
+    sketch = HyperLogLog()
+    for i in range(cnt):
+        sketch.add(f'user-{i}')
+    assert abs(sketch.count() - cnt) <= max(1, cnt * 0.06)
+
+
+def test_bytes_round_trip():
+    sketch = HyperLogLog()
+    for i in range(500):
+        sketch.add(f'user-{i}')
+    data = sketch.to_bytes()
+    # sparse sketches compress to much less than one byte per register
+    assert len(data) < len(sketch.registers)
+    copy = HyperLogLog.from_bytes(data)
+    assert copy.precision == sketch.precision
+    assert copy.registers == sketch.registers
+    assert copy.count() == sketch.count()
+
+
+def test_dynamo_round_trip(dynamo_client):
+    sketch = HyperLogLog()
+    for i in range(500):
+        sketch.add(f'user-{i}')
+    dynamo_client.add_item({'Item': {'partitionKey': 'pk', 'sortKey': '-', 'sketch': sketch.to_bytes()}})
+
+    # dynamo hands the sketch back as a boto3 Binary, not bytes
+    data = dynamo_client.get_item({'partitionKey': 'pk', 'sortKey': '-'})['sketch']
+    copy = HyperLogLog.from_bytes(data)
+    assert copy.registers == sketch.registers
+    assert copy.count() == sketch.count()
+
+
+def test_merge():
+    sketch1, sketch2 = HyperLogLog(), HyperLogLog()
+    for i in range(1000):
+        sketch1.add(f'user-{i}')
+    for i in range(500, 1500):
+        sketch2.add(f'user-{i}')
+
+    assert sketch1.merge(sketch2) is True
+    assert abs(sketch1.count() - 1500) <= 1500 * 0.05
+
+    # merging again changes nothing
+    assert sketch1.merge(sketch2) is False
+
+    # can't merge sketches of different precision
+    with pytest.raises(AssertionError):
+        sketch1.merge(HyperLogLog(precision=10))
@@ -0,0 +1,96 @@
+import importlib.util
+import io
+from os import path
+
+import PIL.Image
+import pytest
+
+from app.utils import image_size
+
+
+def test_variant_filename():
+    assert image_size.P480.filename == '480p.jpg'
+    assert image_size.P480.get_variant_filename(image_size.webp(80)) == '480p.webp'
+
+
+def test_every_jpeg_size_has_an_encoder():
+    for size in image_size.JPEGS:
+        assert size.encoder.content_type == 'image/jpeg'
+    assert image_size.NATIVE.encoder.save_kwargs == {'quality': 100}
+
+
+def test_is_available():
+    assert image_size.jpeg(80).is_available is True
+    assert image_size.EncoderProfile('NOPE', 'image/nope', 'nope').is_available is False
+
+
+@pytest.mark.parametrize('encoder', [image_size.jpeg(80), image_size.webp(80)])
+def test_encode(encoder):
+    if not encoder.is_available:
+        pytest.skip(f'{encoder!r} not supported by this build of Pillow')
+    exif = PIL.Image.Exif()
+    exif[0x010E] = 'description'
+    image = PIL.Image.new('RGB', (40, 20), color=(200, 100, 50))
+    image.info['exif'] = exif.tobytes()
+
+    decoded = PIL.Image.open(io.BytesIO(encoder.encode(image)))
+    assert decoded.format == encoder.image_format
+    assert decoded.size == (40, 20)
+    assert 'exif' not in decoded.info  # thumbnails don't carry over exif
+
+
+def test_encode_native_keeps_exif():
+    exif = PIL.Image.Exif()
+    exif[0x010E] = 'description'
+    image = PIL.Image.new('RGB', (40, 20))
+    image.info['exif'] = exif.tobytes()
+
+    decoded = PIL.Image.open(io.BytesIO(image_size.NATIVE.encoder.encode(image)))
+    assert decoded.getexif()[0x010E] == 'description'
+
+
+def test_encode_progressive_jpeg():
+    image = PIL.Image.new('RGB', (40, 20))
+    decoded = PIL.Image.open(io.BytesIO(image_size.jpeg(80).encode(image)))
+    assert decoded.info.get('progressive') == 1
+
+
+def test_matches_edge_image_size():
+    # the cloudfront edge functions have their own copy, as they can't import from real-main
+    edge_path = path.join(
+        path.dirname(__file__), '..', '..', '..', 'real-cloudfront', 'edge_app', 'thumbnails', 'image_size.py'
+    )
+    spec = importlib.util.spec_from_file_location('edge_image_size', edge_path)
+    edge_image_size = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(edge_image_size)
+
+    def describe_encoder(encoder):
+        return (
+            encoder.image_format,
+            encoder.content_type,
+            encoder.file_ext,
+            encoder.keep_exif,
+            encoder.save_kwargs,
+        )
+
+    def describe_size(size):
+        return (
+            size.name,
+            size.max_dimensions,
+            size.filename,
+            describe_encoder(size.encoder),
+            [describe_encoder(variant) for variant in size.variants],
+        )
+
+    assert describe_size(edge_image_size.NATIVE) == describe_size(image_size.NATIVE)
+    assert [describe_size(size) for size in edge_image_size.THUMBNAILS] == [
+        describe_size(size) for size in image_size.THUMBNAILS
+    ]
+    for quality in (50, 80):
+        for profile in ('jpeg', 'webp'):
+            edge_encoder = getattr(edge_image_size, profile)(quality)
+            assert describe_encoder(edge_encoder) == describe_encoder(getattr(image_size, profile)(quality))
+    for width, height in ((4000, 3000), (3000, 4000), (100, 50), (1, 5000)):
+        for edge_size, size in zip(edge_image_size.THUMBNAILS, image_size.THUMBNAILS):
+            edge_dimensions = edge_size.get_thumbnail_dimensions(width, height)
+            assert edge_dimensions == size.get_thumbnail_dimensions(width, height)
@@ -0,0 +1,32 @@
+from unittest.mock import Mock
+
+from app.utils import LazyObject
+
+
+class Thing:
+    def __init__(self):
+        self.value = 42
+
+    def double(self):
+        return self.value * 2
+
+
+def test_constructed_on_first_use():
+    factory = Mock(side_effect=Thing)
+    thing = LazyObject(factory)
+    assert thing.is_constructed is False
+    assert factory.call_count == 0
+    assert 'LazyObject' in repr(thing)
+
+    assert thing.double() == 84
+    assert thing.is_constructed is True
+    assert thing.value == 42
+    assert factory.call_count == 1
+    assert isinstance(thing.get_object(), Thing)
+
+
+def test_setattr_passed_through():
+    thing = LazyObject(Thing)
+    thing.value = 1
+    assert thing.double() == 2
+    assert thing.get_object().value == 1
@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.utils import LruCache
+
+
+def test_get_put():
+    cache = LruCache(2)
+    assert cache.get('a') is None
+    assert cache.get('a', 'default') == 'default'
+
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    assert len(cache) == 1
+
+
+def test_evicts_least_recently_used():
+    cache = LruCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # now 'b' is least recently used
+
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_pop_clear():
+    cache = LruCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.pop('a') == 1
+    assert cache.pop('a') is None
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_size_must_be_positive():
+    with pytest.raises(AssertionError):
+        LruCache(0)
+
+
+def test_ttl():
+    cache = LruCache(2, ttl=10)
+    with patch('app.utils.lru_cache.time.monotonic', return_value=100):
+        cache.put('a', 1)
+    with patch('app.utils.lru_cache.time.monotonic', return_value=109.9):
+        assert cache.get('a') == 1
+    with patch('app.utils.lru_cache.time.monotonic', return_value=110):
+        assert cache.get('a') is None
+        assert len(cache) == 0
+
+    with pytest.raises(AssertionError):
+        LruCache(2, ttl=0)
+
+
+def test_sizeof():
+    cache = LruCache(10, sizeof=len)
+    cache.put('a', 'aaaa')
+    cache.put('b', 'bbbb')
+    assert cache.size == 8
+
+    cache.put('a', 'aa')  # replacing an entry counts only its new size
+    assert cache.size == 6
+
+    cache.put('c', 'cccccc')  # 'b' is least recently used
+    assert cache.get('b') is None
+    assert cache.get('a') == 'aa'
+    assert cache.get('c') == 'cccccc'
+    assert cache.size == 8
+
+    cache.put('d', 'd' * 11)  # too big to ever fit, so not cached & nothing evicted
+    assert cache.get('d') is None
+    assert len(cache) == 2
+    assert cache.size == 8
+
+    assert cache.pop('c') == 'cccccc'
+    assert cache.size == 2
+    cache.clear()
+    assert cache.size == 0
@@ -0,0 +1,72 @@
+import threading
+
+import PIL.Image
+import pytest
+
+from app.utils.memory_budget import MemoryBudget, pil_image_bytes
+
+
+def test_acquire_release_tracks_peak():
+    budget = MemoryBudget(100)
+    assert budget.held_bytes == 0
+    assert budget.peak_bytes == 0
+
+    budget.acquire(40)
+    budget.acquire(60)
+    assert budget.held_bytes == 100
+    assert budget.peak_bytes == 100
+
+    budget.release(60)
+    budget.acquire(10)
+    assert budget.held_bytes == 50
+    assert budget.peak_bytes == 100
+
+    budget.release(50)
+    assert budget.held_bytes == 0
+
+
+def test_cannot_release_more_than_held():
+    budget = MemoryBudget(100)
+    budget.acquire(10)
+    with pytest.raises(AssertionError):
+        budget.release(20)
+
+
+def test_oversized_acquire_allowed_when_nothing_held():
+    budget = MemoryBudget(100)
+    budget.acquire(500)
+    assert budget.peak_bytes == 500
+
+
+def test_acquire_blocks_until_released():
+    budget = MemoryBudget(100)
+    budget.acquire(80)
+
+    acquired = threading.Event()
+
+    def acquire():
+        budget.acquire(50)
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.1)
+
+    budget.release(80)
+    assert acquired.wait(1)
+    thread.join()
+    assert budget.held_bytes == 50
+    assert budget.peak_bytes == 80
+
+
+def test_pil_image_bytes():
+    assert pil_image_bytes(PIL.Image.new('RGB', (10, 20))) == 600
+    assert pil_image_bytes(PIL.Image.new('L', (10, 20))) == 200
+
+
+def test_no_cap_never_blocks():
+    budget = MemoryBudget()
+    budget.acquire(500)
+    budget.acquire(500)
+    assert budget.held_bytes == 1000
+    assert budget.peak_bytes == 1000
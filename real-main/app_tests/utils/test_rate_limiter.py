@@ -0,0 +1,35 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.utils import RateLimiter
+
+
+def test_acquire_waits_for_tokens():
+    with patch('app.utils.rate_limiter.time.monotonic', return_value=100):
+        limiter = RateLimiter(10, burst=2)
+
+    with patch('app.utils.rate_limiter.time.monotonic', return_value=100), patch(
+        'app.utils.rate_limiter.time.sleep'
+    ) as sleep:
+        # the burst goes right through, after that each waits its turn
+        assert limiter.acquire() == 0
+        assert limiter.acquire() == 0
+        assert limiter.acquire() == pytest.approx(0.1)
+        assert limiter.acquire() == pytest.approx(0.2)
+    assert [c.args[0] for c in sleep.call_args_list] == [pytest.approx(0.1), pytest.approx(0.2)]
+
+    # tokens refill over time, up to the burst
+    with patch('app.utils.rate_limiter.time.monotonic', return_value=110), patch(
+        'app.utils.rate_limiter.time.sleep'
+    ):
+        assert limiter.acquire() == 0
+        assert limiter.acquire() == 0
+        assert limiter.acquire() == pytest.approx(0.1)
+
+
+def test_rate_and_burst_must_be_positive():
+    with pytest.raises(AssertionError):
+        RateLimiter(0)
+    with pytest.raises(AssertionError):
+        RateLimiter(1, burst=0)
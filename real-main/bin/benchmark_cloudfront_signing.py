@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+import time
+
+from cryptography.hazmat import backends
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+# https://stackoverflow.com/questions/16981921
+SCRIPT_PATH = os.path.realpath(os.path.join(os.getcwd(), os.path.expanduser(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(SCRIPT_PATH)))
+from app.clients import CloudFrontClient  # noqa E402
+
+sizes = ['native.jpg', '64p.jpg', '480p.jpg', '1080p.jpg', '4K.jpg']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark signing of CloudFront urls & cookies')
+    parser.add_argument('-p', dest='post_count', type=int, default=100, help='number of posts per batch')
+    parser.add_argument('-n', dest='repeat', type=int, default=3, help='number of timed runs')
+    args = parser.parse_args()
+    return args.post_count, args.repeat
+
+
+def generate_key_pair():
+    "A throwaway key pair, in the format stored in the secrets manager"
+    private_key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048, backend=backends.default_backend()
+    )
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()
+    )
+    return {'keyId': 'APKABENCHMARK', 'privateKey': ''.join(pem.decode('utf-8').splitlines()[1:-1])}
+
+
+def best_time(func, repeat, setup=None):
+    "Returns the best runtime in ms"
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    post_count, repeat = parse_args()
+    key_pair = generate_key_pair()
+    client = CloudFrontClient(lambda: key_pair, domain='benchmark.cloudfront.net')
+    paths = [f'uid/post/pid{i}/image/{size}' for i in range(post_count) for size in sizes]
+    cookie_paths = [f'uid/post/pid{i}/video-hls/video*' for i in range(post_count)]
+
+    cold = client.signed_cache.clear
+    url_cold_ms = best_time(lambda: client.generate_presigned_urls(paths, ['GET', 'HEAD']), repeat, setup=cold)
+    url_warm_ms = best_time(lambda: client.generate_presigned_urls(paths, ['GET', 'HEAD']), repeat)
+    cookie_cold_ms = best_time(
+        lambda: [client.generate_presigned_cookies(path) for path in cookie_paths], repeat, setup=cold
+    )
+    cookie_warm_ms = best_time(lambda: [client.generate_presigned_cookies(path) for path in cookie_paths], repeat)
+
+    print(f'{"signing":<8} {"count":>6} {"cold ms":>9} {"cold /s":>9} {"warm ms":>9} {"warm /s":>11}')
+    for label, count, cold_ms, warm_ms in (
+        ('urls', len(paths), url_cold_ms, url_warm_ms),
+        ('cookies', len(cookie_paths), cookie_cold_ms, cookie_warm_ms),
+    ):
+        print(
+            f'{label:<8} {count:>6} {cold_ms:>9.1f} {count / cold_ms * 1000:>9.0f} '
+            f'{warm_ms:>9.2f} {count / warm_ms * 1000:>11.0f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
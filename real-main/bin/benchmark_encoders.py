@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import PIL.Image
+
+# https://stackoverflow.com/questions/16981921
+SCRIPT_PATH = os.path.realpath(os.path.join(os.getcwd(), os.path.expanduser(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(SCRIPT_PATH)))
+from app.utils import image_size  # noqa E402
+
+fixtures_dir = os.path.join(os.path.dirname(os.path.dirname(SCRIPT_PATH)), 'app_tests', 'fixtures')
+
+SSIM_WINDOW = 8
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compare encoder profiles by output size & encode time versus SSIM, for each thumbnail size'
+    )
+    parser.add_argument(
+        'paths', nargs='*', help='images to benchmark against, defaults to the jpeg & png test fixtures'
+    )
+    parser.add_argument('-n', dest='repeat', type=int, default=3, help='number of timed runs per encoding')
+    parser.add_argument(
+        '-q',
+        dest='qualities',
+        type=int,
+        nargs='+',
+        default=[95, 85, 75, 60],
+        help='qualities to try for each format, in addition to the configured profiles',
+    )
+    args = parser.parse_args()
+    paths = args.paths or sorted(
+        glob.glob(os.path.join(fixtures_dir, '*.jpg')) + glob.glob(os.path.join(fixtures_dir, '*.png'))
+    )
+    return paths, args.repeat, args.qualities
+
+
+def candidate_profiles(size, qualities):
+    "Yields (label, encoder) of the configured profiles, the old baseline, and each format at each quality"
+    yield 'baseline', image_size.NATIVE.encoder
+    yield 'configured', size.encoder
+    for variant in size.variants:
+        yield 'configured', variant
+    for make_profile in (image_size.jpeg, image_size.webp):
+        for quality in qualities:
+            yield '', make_profile(quality)
+
+
+def best_time(func, repeat):
+    "Returns the result of the function and the best runtime in ms"
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings) * 1000
+
+
+def ssim(image1, image2):
+    "Mean structural similarity of the luma of two images, over non-overlapping windows"
+    arrays = []
+    for image in (image1, image2):
+        luma = np.asarray(image.convert('L'), dtype=np.float64)
+        height, width = (d - d % SSIM_WINDOW for d in luma.shape)
+        windows_shape = (height // SSIM_WINDOW, SSIM_WINDOW, width // SSIM_WINDOW, SSIM_WINDOW)
+        luma = luma[:height, :width].reshape(windows_shape)
+        arrays.append(luma.transpose(0, 2, 1, 3).reshape(-1, SSIM_WINDOW * SSIM_WINDOW))
+    x, y = arrays
+    if not len(x):  # image smaller than one window
+        x, y = (np.asarray(image.convert('L'), dtype=np.float64).reshape(1, -1) for image in (image1, image2))
+    mu_x, mu_y = x.mean(axis=1), y.mean(axis=1)
+    var_x, var_y = x.var(axis=1), y.var(axis=1)
+    covar = ((x - mu_x[:, None]) * (y - mu_y[:, None])).mean(axis=1)
+    numerator = (2 * mu_x * mu_y + SSIM_C1) * (2 * covar + SSIM_C2)
+    denominator = (mu_x ** 2 + mu_y ** 2 + SSIM_C1) * (var_x + var_y + SSIM_C2)
+    return float((numerator / denominator).mean())
+
+
+def main():
+    paths, repeat, qualities = parse_args()
+    print(f'{"image":<24} {"size":>6} {"profile":<56} {"bytes":>9} {"encode ms":>10} {"ssim":>7}')
+    for path in paths:
+        image = PIL.Image.open(path)
+        image.load()
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        name = os.path.basename(path)
+        for size in image_size.THUMBNAILS:
+            thumbnail = image.resize(
+                size.get_thumbnail_dimensions(*image.size), resample=PIL.Image.LANCZOS, reducing_gap=2.0
+            )
+            for label, encoder in candidate_profiles(size, qualities):
+                if not encoder.is_available:
+                    continue
+                data, encode_ms = best_time(
+                    lambda encoder=encoder, thumbnail=thumbnail: encoder.encode(thumbnail), repeat
+                )
+                decoded = PIL.Image.open(io.BytesIO(data))
+                profile = f'{encoder!r} {label}'.strip()
+                print(
+                    f'{name:<24} {size.name:>6} {profile:<56} {len(data):>9} {encode_ms:>10.1f} '
+                    f'{ssim(thumbnail, decoded):>7.4f}'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import colorthief
+import PIL.Image
+
+# https://stackoverflow.com/questions/16981921
+SCRIPT_PATH = os.path.realpath(os.path.join(os.getcwd(), os.path.expanduser(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(SCRIPT_PATH)))
+from app.models.post.palette import get_palette  # noqa E402
+
+fixtures_dir = os.path.join(os.path.dirname(os.path.dirname(SCRIPT_PATH)), 'app_tests', 'fixtures')
+dimensions_480p = (854, 480)
+
+
+class ColorThiefFromImage(colorthief.ColorThief):
+    def __init__(self, image):
+        self.image = image
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compare palette extraction against colorthief')
+    parser.add_argument(
+        'paths', nargs='*', help='images to benchmark against, defaults to the jpeg & png test fixtures'
+    )
+    parser.add_argument('-n', dest='repeat', type=int, default=5, help='number of timed runs per image')
+    parser.add_argument('-c', dest='color_count', type=int, default=5, help='number of colors in the palette')
+    args = parser.parse_args()
+    paths = args.paths or sorted(
+        glob.glob(os.path.join(fixtures_dir, '*.jpg')) + glob.glob(os.path.join(fixtures_dir, '*.png'))
+    )
+    return paths, args.repeat, args.color_count
+
+
+def best_time(func, repeat):
+    "Returns the result of the function and the best runtime in ms"
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings) * 1000
+
+
+def palette_distance(expected, actual):
+    "Mean distance in RGB space from each expected color to the closest actual color"
+    if not expected or not actual:
+        return float('nan')
+    return sum(min(sum((a - b) ** 2 for a, b in zip(e, c)) ** 0.5 for c in actual) for e in expected) / len(
+        expected
+    )
+
+
+def main():
+    paths, repeat, color_count = parse_args()
+    print(f'{"image":<24} {"size":>11} {"colorthief ms":>14} {"numpy ms":>9} {"speedup":>8} {"distance":>9}')
+    for path in paths:
+        image = PIL.Image.open(path)
+        image.load()
+        thumbnail = image.copy()
+        thumbnail.thumbnail(dimensions_480p, resample=PIL.Image.LANCZOS)
+
+        # colorthief over the full image is what set_colors used to do
+        try:
+            expected, expected_ms = best_time(
+                lambda image=image: ColorThiefFromImage(image).get_palette(color_count=color_count), repeat
+            )
+        except Exception:
+            expected, expected_ms = None, float('nan')
+        try:
+            actual, actual_ms = best_time(
+                lambda thumbnail=thumbnail: get_palette(thumbnail, color_count=color_count), repeat
+            )
+        except Exception:
+            actual, actual_ms = None, float('nan')
+
+        name = os.path.basename(path)
+        size = 'x'.join(str(d) for d in image.size)
+        speedup = expected_ms / actual_ms
+        distance = palette_distance(expected, actual)
+        print(f'{name:<24} {size:>11} {expected_ms:>14.1f} {actual_ms:>9.1f} {speedup:>7.1f}x {distance:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# https://stackoverflow.com/questions/16981921
+SCRIPT_PATH = os.path.realpath(os.path.join(os.getcwd(), os.path.expanduser(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(SCRIPT_PATH)))
+from app.models.post import text_image  # noqa E402
+
+dimensions_4k = (3840, 2160)
+dimensions_1080p = (1920, 1080)
+words = (
+    'the quick brown fox jumps over a lazy dog while supercalifragilisticexpialidocious clouds drift by'
+).split()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark rendering of text post images')
+    parser.add_argument(
+        '-w',
+        dest='word_counts',
+        type=int,
+        nargs='+',
+        default=[5, 50, 200, 1000],
+        help='number of words in each generated text',
+    )
+    parser.add_argument('-n', dest='repeat', type=int, default=3, help='number of timed runs per text')
+    args = parser.parse_args()
+    return args.word_counts, args.repeat
+
+
+def best_time(func, repeat, setup=None):
+    "Returns the best runtime in ms"
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def cold():
+    "Forget everything cached, as in a freshly started lambda"
+    text_image.rendered_cache.clear()
+    text_image.get_font.cache_clear()
+    text_image.get_font_data.cache_clear()
+
+
+def main():
+    word_counts, repeat = parse_args()
+    rng = random.Random(42)
+    print(f'{"words":>6} {"wrap ms":>8} {"4k cold ms":>11} {"4k+1080p cold ms":>17} {"4k+1080p warm ms":>17}')
+    for word_count in word_counts:
+        text = ' '.join(rng.choice(words) for _ in range(word_count))
+        token_widths = [len(word) * 40 for word in text.split()]
+
+        def both_sizes(text=text):
+            text_image.generate_text_image(text, dimensions_4k)
+            text_image.generate_text_image(text, dimensions_1080p, render_dimensions=dimensions_4k)
+
+        def wrap(text=text, token_widths=token_widths):
+            text_image.rectangle_wrap(text.split(), token_widths, 20, 10, 80, 16 / 9)
+
+        wrap_ms = best_time(wrap, repeat)
+        cold_4k_ms = best_time(
+            lambda text=text: text_image.generate_text_image(text, dimensions_4k), repeat, setup=cold
+        )
+        cold_both_ms = best_time(both_sizes, repeat, setup=cold)
+        warm_both_ms = best_time(both_sizes, repeat)
+        print(f'{word_count:>6} {wrap_ms:>8.2f} {cold_4k_ms:>11.1f} {cold_both_ms:>17.1f} {warm_both_ms:>17.3f}')
+
+
+if __name__ == '__main__':
+    main()
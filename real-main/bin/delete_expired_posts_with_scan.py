@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+
+import dotenv
+import pendulum
+
+dotenv.load_dotenv()
+
+S3_UPLOADS_BUCKET = os.environ.get('S3_UPLOADS_BUCKET')
+assert S3_UPLOADS_BUCKET, 'Environment variable S3_UPLOADS_BUCKET must be defined'
+
+# https://stackoverflow.com/questions/16981921
+SCRIPT_PATH = os.path.realpath(os.path.join(os.getcwd(), os.path.expanduser(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(SCRIPT_PATH)))
+from app.clients import DynamoClient, S3Client  # noqa E402
+from app.models import PostManager  # noqa E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            'Delete all posts that expired before today, found via a full table scan. '
+            + 'For cleaning up any posts left behind by the scheduled sweeps of expired posts.'
+        )
+    )
+    parser.add_argument(
+        '-d',
+        dest='date',
+        type=lambda s: pendulum.parse(s),
+        help='Act as if today were this date. Ex: 2020-05-19',
+    )
+    args = parser.parse_args()
+    return args.date
+
+
+def main():
+    now = parse_args() or pendulum.now('utc')
+    clients = {'dynamo': DynamoClient(), 's3_uploads': S3Client(S3_UPLOADS_BUCKET)}
+    post_manager = PostManager(clients)
+
+    print(f'Scanning for and deleting posts that expired before `{now.date()}`... ', end='')
+    post_manager.delete_expired_posts_with_scan(now=now)
+    print('done.')
+
+
+if __name__ == '__main__':
+    main()
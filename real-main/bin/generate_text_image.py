@@ -2,11 +2,13 @@
 
 import argparse
 import logging
+import os
 import sys
 
-# relative imports don't work from scripts, so depending on 'text_image' to be globally unique
-# https://stackoverflow.com/a/16985066
-import text_image
+# https://stackoverflow.com/questions/16981921
+SCRIPT_PATH = os.path.realpath(os.path.join(os.getcwd(), os.path.expanduser(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(SCRIPT_PATH)))
+from app.models.post import text_image  # noqa E402
 
 
 def parse_args():
@@ -30,8 +32,8 @@ def main():
     dimensions_480p = (854, 480)
     if debug:
         logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
-    output_buf = text_image.generate_text_image(text, dimensions_480p)
-    output_file.write(output_buf.read())
+    image = text_image.generate_text_image(text, dimensions_480p)
+    image.save(output_file, format='JPEG')
 
 
 if __name__ == '__main__':
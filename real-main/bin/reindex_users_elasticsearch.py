@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+import time
+
+import dotenv
+
+dotenv.load_dotenv()
+
+ELASTICSEARCH_DOMAIN = os.environ.get('ELASTICSEARCH_DOMAIN')
+assert ELASTICSEARCH_DOMAIN, 'Environment variable ELASTICSEARCH_DOMAIN must be defined'
+
+# https://stackoverflow.com/questions/16981921
+SCRIPT_PATH = os.path.realpath(os.path.join(os.getcwd(), os.path.expanduser(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(SCRIPT_PATH)))
+from app.clients import DynamoClient, ElasticSearchClient  # noqa E402
+from app.models import UserManager  # noqa E402
+from app.models.user.manager import REINDEX_SEGMENTS  # noqa E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            'Index every user in elasticsearch, found via a parallel full table scan. '
+            + 'For rebuilding the index, rather than touching lastManuallyReindexedAt on each user.'
+        )
+    )
+    parser.add_argument(
+        '-s',
+        dest='segments',
+        type=int,
+        default=REINDEX_SEGMENTS,
+        help='number of segments of the table to scan & index at once',
+    )
+    args = parser.parse_args()
+    return args.segments
+
+
+def main():
+    segments = parse_args()
+    clients = {'dynamo': DynamoClient(), 'elasticsearch': ElasticSearchClient(ELASTICSEARCH_DOMAIN)}
+    user_manager = UserManager(clients)
+
+    print(f'Scanning for and indexing users, {segments} segments at a time... ', end='', flush=True)
+    start = time.perf_counter()
+    cnt = user_manager.reindex_elasticsearch(total_segments=segments)
+    print(f'done, {cnt} users indexed in {time.perf_counter() - start:.1f}s.')
+
+
+if __name__ == '__main__':
+    main()